@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Script to add llm_time_ms column to audit_logs table
+"""
+import os
+from databricks import sql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABRICKS_HOST = os.getenv("DATABRICKS_HOST", "")
+DATABRICKS_TOKEN = os.getenv("DATABRICKS_TOKEN", "")
+DATABRICKS_HTTP_PATH = os.getenv("DATABRICKS_HTTP_PATH", "")
+
+def add_llm_time_column():
+    """Add llm_time_ms column to audit_logs table"""
+
+    # Read the SQL script
+    with open('add_llm_time_column.sql', 'r') as f:
+        sql_script = f.read()
+
+    print("🔨 Adding llm_time_ms column to audit_logs table...")
+
+    with sql.connect(
+        server_hostname=DATABRICKS_HOST.replace("https://", ""),
+        http_path=DATABRICKS_HTTP_PATH,
+        access_token=DATABRICKS_TOKEN
+    ) as connection:
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(sql_script)
+                print("  ✅ LLM time column added successfully")
+            except Exception as e:
+                print(f"  ⚠️ Failed to add column: {str(e)}")
+                # Check if column already exists
+                if "already exists" in str(e).lower():
+                    print("  ℹ️ Column may already exist")
+                else:
+                    raise
+
+    print("✅ LLM time setup complete!")
+
+if __name__ == "__main__":
+    add_llm_time_column()
@@ -0,0 +1,5 @@
+-- Add llm_time_ms column to audit_logs table
+ALTER TABLE arao.text_to_sql.audit_logs
+ADD COLUMNS (
+  llm_time_ms BIGINT COMMENT 'Time spent in model serving calls in milliseconds (LLM events only)'
+);
@@ -1,24 +1,56 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
+from contextlib import ExitStack
+from contextvars import ContextVar
 from datetime import datetime
 from pathlib import Path
+import asyncio
+import hashlib
+import hmac
+import json
 import os
-import openai
+import tempfile
 import uuid
 import time
 from dotenv import load_dotenv
 from databricks import sql
 
+from audit_rollup import AuditRollup, live_source, to_utc, utc_now
+from audit_spool import AuditSpool, build_merge
+from audit_writer import AuditWriter, build_batch_insert
+from connection_pool import ConnectionPool
+from executors import BoundedExecutor
+from llm_client import LLMClient, parse_model_limits
+from llm_output import extract_join_condition, incomplete_sql_reason, parse_generated_sql, parse_suggestions
+from latency_analytics import RANGES, build_raw_latency, build_rollup_latency, range_start, summarize_latency
+from local_warehouse import LocalWarehouse, parse_latency, seed_demo
+from metadata_cache import MetadataCache
+from metrics import MetricsRegistry, timed_connect
+from profiler import ProfileStore, SamplingProfiler, summarize
+from sql_results import column_names, rows_to_dicts
+from sql_stream import FORMATS as STREAM_FORMATS, ResultStream, TimedStreamingResponse, arrow_available, error_line
+from query_history import (
+    PREVIEW_CHARS, SESSION_STATUSES, assemble_session, build_history_page, build_session_events, build_session_page,
+    decode_cursor, lookback_windows, session_key,
+)
+from metadata_loader import describe_columns, load_schema_metadata
+from table_context import TableContextService
+from tracing import (
+    TracedJSONResponse, end_trace, record_span, server_timing_header, slow_request_entry, span, start_trace,
+)
+
 load_dotenv()
 
 app = FastAPI(
     title="Text to SQL API",
     description="Backend API for Text to SQL Application",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=TracedJSONResponse,
 )
 
 ENV = os.getenv("ENV", "development")
@@ -40,6 +72,125 @@ logger.info(f"DATABRICKS_HOST configured: {bool(DATABRICKS_HOST)}")
 logger.info(f"DATABRICKS_TOKEN configured: {bool(DATABRICKS_TOKEN)}")
 logger.info(f"DATABRICKS_HTTP_PATH configured: {bool(DATABRICKS_HTTP_PATH)}")
 
+# Runtime metrics served at /metrics in the Prometheus text format
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+
+metrics = MetricsRegistry(prefix="queryforge_")
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"),
+)
+WAREHOUSE_OPERATION_SECONDS = metrics.histogram(
+    "warehouse_operation_duration_seconds", "Warehouse connect, execute and fetch latency", ("operation",),
+)
+LLM_REQUEST_SECONDS = metrics.histogram(
+    "llm_request_duration_seconds", "Serving endpoint call latency by model", ("model", "status"),
+)
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens used by serving endpoint calls", ("model", "kind"))
+AUDIT_FLUSH_SECONDS = metrics.histogram(
+    "audit_flush_duration_seconds", "Latency of audit batch writes to the warehouse", ("status",),
+)
+
+# Per-request stage timings returned as Server-Timing and logged for slow requests
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "True").lower() == "true"
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "2000"))
+
+# Opt-in sampling profiler for single requests carrying X-Profile-Token
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", os.path.join(tempfile.gettempdir(), "queryforge-profiles"))
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "50"))
+
+profile_store = ProfileStore(PROFILING_DIR, max_files=PROFILING_MAX_FILES)
+
+def record_warehouse_operation(operation: str, seconds: float):
+    record_span(f"warehouse_{operation}", seconds)
+
+# Warehouse connection pool configuration
+WAREHOUSE_POOL_MIN_SIZE = int(os.getenv("WAREHOUSE_POOL_MIN_SIZE", "1"))
+WAREHOUSE_POOL_MAX_SIZE = int(os.getenv("WAREHOUSE_POOL_MAX_SIZE", "8"))
+WAREHOUSE_POOL_MAX_IDLE_SECONDS = float(os.getenv("WAREHOUSE_POOL_MAX_IDLE_SECONDS", "300"))
+WAREHOUSE_POOL_MAX_LIFETIME_SECONDS = float(os.getenv("WAREHOUSE_POOL_MAX_LIFETIME_SECONDS", "3600"))
+WAREHOUSE_POOL_CHECKOUT_TIMEOUT_SECONDS = float(os.getenv("WAREHOUSE_POOL_CHECKOUT_TIMEOUT_SECONDS", "30"))
+WAREHOUSE_POOL_HEALTH_CHECK_AFTER_SECONDS = float(os.getenv("WAREHOUSE_POOL_HEALTH_CHECK_AFTER_SECONDS", "30"))
+
+# Warehouse backend: "databricks" (SQL connector) or "local", an embedded SQLite stand-in
+# for tests, benchmarks and load tests that answers the statements the app issues
+WAREHOUSE_BACKEND = os.getenv("WAREHOUSE_BACKEND", "databricks").lower()
+if WAREHOUSE_BACKEND not in ("databricks", "local"):
+    raise ValueError(f"WAREHOUSE_BACKEND must be 'databricks' or 'local', got {WAREHOUSE_BACKEND!r}")
+LOCAL_WAREHOUSE_PATH = os.getenv("LOCAL_WAREHOUSE_PATH", ":memory:")
+# Injected latency, e.g. "connect=500,execute=150,fetch=10,jitter=0.2,seed=7" (milliseconds)
+LOCAL_WAREHOUSE_LATENCY = os.getenv("LOCAL_WAREHOUSE_LATENCY", "")
+LOCAL_WAREHOUSE_DEMO_ROWS = int(os.getenv("LOCAL_WAREHOUSE_DEMO_ROWS", "200"))
+
+local_warehouse = LocalWarehouse(
+    LOCAL_WAREHOUSE_PATH, latency=parse_latency(LOCAL_WAREHOUSE_LATENCY),
+) if WAREHOUSE_BACKEND == "local" else None
+
+def warehouse_configured() -> bool:
+    """Whether the configured warehouse backend can be reached at all"""
+    return local_warehouse is not None or bool(DATABRICKS_HOST and DATABRICKS_TOKEN and DATABRICKS_HTTP_PATH)
+
+def connect_warehouse():
+    """Open a new connection on the configured warehouse backend"""
+    if local_warehouse is not None:
+        return local_warehouse.connect()
+    return sql.connect(
+        server_hostname=DATABRICKS_HOST.replace("https://", ""),
+        http_path=DATABRICKS_HTTP_PATH,
+        access_token=DATABRICKS_TOKEN,
+        # Audit timestamps are UTC, so date_trunc and timestamp parameters must be too
+        session_configuration={"TIMEZONE": "UTC"},
+    )
+
+warehouse_connect = timed_connect(
+    connect_warehouse,
+    WAREHOUSE_OPERATION_SECONDS if METRICS_ENABLED else None,
+    record_warehouse_operation if TRACING_ENABLED else None,
+) if METRICS_ENABLED or TRACING_ENABLED else connect_warehouse
+
+# Shared by every endpoint so requests reuse open warehouse sessions
+warehouse_pool = ConnectionPool(
+    warehouse_connect,
+    min_size=WAREHOUSE_POOL_MIN_SIZE,
+    max_size=WAREHOUSE_POOL_MAX_SIZE,
+    max_idle_seconds=WAREHOUSE_POOL_MAX_IDLE_SECONDS,
+    max_lifetime_seconds=WAREHOUSE_POOL_MAX_LIFETIME_SECONDS,
+    checkout_timeout_seconds=WAREHOUSE_POOL_CHECKOUT_TIMEOUT_SECONDS,
+    health_check_after_seconds=WAREHOUSE_POOL_HEALTH_CHECK_AFTER_SECONDS,
+)
+
+# Blocking warehouse I/O runs on a dedicated bounded pool so it never stalls the event loop.
+# Workers default to the pool size so threads never queue on checkout.
+WAREHOUSE_EXECUTOR_WORKERS = int(os.getenv("WAREHOUSE_EXECUTOR_WORKERS", str(WAREHOUSE_POOL_MAX_SIZE)))
+WAREHOUSE_EXECUTOR_MAX_PENDING = int(os.getenv("WAREHOUSE_EXECUTOR_MAX_PENDING", "64"))
+
+warehouse_executor = BoundedExecutor("warehouse", WAREHOUSE_EXECUTOR_WORKERS, WAREHOUSE_EXECUTOR_MAX_PENDING)
+
+# /api/execute-sql/stream: rows per fetch, and the most rows one request may stream
+SQL_STREAM_BATCH_ROWS = int(os.getenv("SQL_STREAM_BATCH_ROWS", "5000"))
+SQL_STREAM_MAX_ROWS = int(os.getenv("SQL_STREAM_MAX_ROWS", "1000000"))
+# A stream holds its connection until the client has read the last chunk, so streams get their
+# own small pool and executor: slow clients can use those up, but never the shared ones
+SQL_STREAM_MAX_CONCURRENT = int(os.getenv("SQL_STREAM_MAX_CONCURRENT", "2"))
+# A client that takes longer than this to accept one chunk is disconnected
+SQL_STREAM_SEND_TIMEOUT_SECONDS = float(os.getenv("SQL_STREAM_SEND_TIMEOUT_SECONDS", "30"))
+
+stream_pool = ConnectionPool(
+    warehouse_connect,
+    min_size=0,
+    max_size=SQL_STREAM_MAX_CONCURRENT,
+    max_idle_seconds=WAREHOUSE_POOL_MAX_IDLE_SECONDS,
+    max_lifetime_seconds=WAREHOUSE_POOL_MAX_LIFETIME_SECONDS,
+    checkout_timeout_seconds=WAREHOUSE_POOL_CHECKOUT_TIMEOUT_SECONDS,
+    health_check_after_seconds=WAREHOUSE_POOL_HEALTH_CHECK_AFTER_SECONDS,
+)
+stream_executor = BoundedExecutor("stream", SQL_STREAM_MAX_CONCURRENT, SQL_STREAM_MAX_CONCURRENT)
+# Streams past the limit are turned away rather than queued behind stalled clients
+stream_slots = asyncio.Semaphore(SQL_STREAM_MAX_CONCURRENT)
+
 # Available Foundation Models
 AVAILABLE_MODELS = {
     "llama-maverick": {"id": "databricks-llama-4-maverick", "name": "Llama 4 Maverick", "description": "Fast and efficient for general tasks"},
@@ -53,6 +204,108 @@ AVAILABLE_MODELS = {
     "gpt-oss-120b": {"id": "databricks-gpt-oss-120b", "name": "GPT OSS 120B", "description": "Open source GPT-scale model"},
 }
 
+# Catalog browser metadata cache: per-level TTLs, then served stale while refreshing
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "2048"))
+METADATA_CACHE_STALE_SECONDS = float(os.getenv("METADATA_CACHE_STALE_SECONDS", "900"))
+
+metadata_cache = MetadataCache(
+    max_entries=METADATA_CACHE_MAX_ENTRIES,
+    ttl_seconds={
+        "catalogs": float(os.getenv("METADATA_CACHE_TTL_CATALOGS", "600")),
+        "schemas": float(os.getenv("METADATA_CACHE_TTL_SCHEMAS", "300")),
+        "tables": float(os.getenv("METADATA_CACHE_TTL_TABLES", "300")),
+        "columns": float(os.getenv("METADATA_CACHE_TTL_COLUMNS", "300")),
+    },
+    stale_seconds=METADATA_CACHE_STALE_SECONDS,
+)
+
+# Analytics responses shared by every viewer: fresh for a TTL, then served stale while one refresh runs
+ANALYTICS_ENDPOINTS = (
+    "dashboard-statistics", "query-history", "query-history/detail", "llm-analytics", "llm-costs-by-model",
+    "analytics/llm-usage", "analytics/top-queries", "analytics/summary", "analytics/bundle", "analytics/latency",
+)
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "30"))
+ANALYTICS_CACHE_TTL_QUERY_HISTORY = float(os.getenv("ANALYTICS_CACHE_TTL_QUERY_HISTORY", "10"))
+ANALYTICS_CACHE_STALE_SECONDS = float(os.getenv("ANALYTICS_CACHE_STALE_SECONDS", "300"))
+
+# Sessions per /api/query-history page
+QUERY_HISTORY_PAGE_SIZE = int(os.getenv("QUERY_HISTORY_PAGE_SIZE", "50"))
+QUERY_HISTORY_MAX_PAGE_SIZE = int(os.getenv("QUERY_HISTORY_MAX_PAGE_SIZE", "200"))
+
+analytics_cache = MetadataCache(
+    max_entries=int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "256")),
+    ttl_seconds={
+        "query-history": ANALYTICS_CACHE_TTL_QUERY_HISTORY,
+        "query-history/detail": ANALYTICS_CACHE_TTL_QUERY_HISTORY,
+    },
+    stale_seconds=ANALYTICS_CACHE_STALE_SECONDS,
+    levels=ANALYTICS_ENDPOINTS,
+    default_ttl_seconds=ANALYTICS_CACHE_TTL_SECONDS,
+)
+
+# Load a whole schema's columns from information_schema on the first column lookup
+METADATA_BULK_LOAD_ENABLED = os.getenv("METADATA_BULK_LOAD_ENABLED", "True").lower() == "true"
+MAX_BATCH_COLUMNS_TABLES = int(os.getenv("MAX_BATCH_COLUMNS_TABLES", "200"))
+
+# Table context (metadata + sample rows) fetched for LLM prompts
+TABLE_CONTEXT_CONCURRENCY = int(os.getenv("TABLE_CONTEXT_CONCURRENCY", "4"))
+TABLE_CONTEXT_TIMEOUT_SECONDS = float(os.getenv("TABLE_CONTEXT_TIMEOUT_SECONDS", "10"))
+TABLE_CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("TABLE_CONTEXT_CACHE_TTL_SECONDS", "600"))
+TABLE_CONTEXT_VERSION_CHECK_SECONDS = float(os.getenv("TABLE_CONTEXT_VERSION_CHECK_SECONDS", "60"))
+TABLE_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("TABLE_CONTEXT_CACHE_MAX_ENTRIES", "512"))
+
+# Parsed DESCRIBE EXTENDED output and sample rows, shared by the suggestion endpoints
+table_context_service = TableContextService(
+    warehouse_pool,
+    ttl_seconds=TABLE_CONTEXT_CACHE_TTL_SECONDS,
+    version_check_seconds=TABLE_CONTEXT_VERSION_CHECK_SECONDS,
+    max_entries=TABLE_CONTEXT_CACHE_MAX_ENTRIES,
+)
+
+# Serving endpoint client configuration
+# OpenAI-compatible base URL; point at backend/local_llm.py to run the LLM steps offline
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "") or f"{DATABRICKS_HOST}/serving-endpoints"
+LLM_API_KEY = os.getenv("LLM_API_KEY", "") or DATABRICKS_TOKEN
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "4"))
+# Per-model overrides, e.g. "databricks-gpt-5=2,databricks-llama-4-maverick=8"
+LLM_MODEL_CONCURRENCY_OVERRIDES = parse_model_limits(os.getenv("LLM_MODEL_CONCURRENCY_OVERRIDES", ""))
+
+# Model-call time of the current request, logged as llm_time_ms on its next audit event
+llm_call_seconds: ContextVar[float] = ContextVar("llm_call_seconds", default=0.0)
+
+def record_llm_call(model: str, seconds: float, response, error):
+    """Record latency and token usage of one serving endpoint call"""
+    llm_call_seconds.set(llm_call_seconds.get() + seconds)
+    record_span("llm", seconds)
+    if not METRICS_ENABLED:
+        return
+    status = "success" if response is not None else "error" if error is not None else "cancelled"
+    LLM_REQUEST_SECONDS.observe(seconds, model=model, status=status)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+        LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+
+# Single long-lived client so HTTP connections to the serving endpoint are kept alive
+llm_client = LLMClient(
+    api_key=LLM_API_KEY,
+    base_url=LLM_BASE_URL,
+    model_ids=[model["id"] for model in AVAILABLE_MODELS.values()],
+    default_concurrency=LLM_MODEL_CONCURRENCY,
+    model_concurrency=LLM_MODEL_CONCURRENCY_OVERRIDES,
+    max_connections=LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+    timeout_seconds=LLM_TIMEOUT_SECONDS,
+    connect_timeout_seconds=LLM_CONNECT_TIMEOUT_SECONDS,
+    max_retries=LLM_MAX_RETRIES,
+    on_call=record_llm_call,
+)
+
 # Enable CORS for both development and production
 app.add_middleware(
     CORSMiddleware,
@@ -60,8 +313,166 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile", "X-Profile-Samples", "X-Session-Id", "X-Max-Rows"],
 )
 
+def profiling_authorized(request: Request) -> bool:
+    """Whether profiling is enabled and the request carries the configured token"""
+    supplied = request.headers.get("X-Profile-Token")
+    return bool(PROFILING_ENABLED and PROFILING_TOKEN and supplied and hmac.compare_digest(supplied, PROFILING_TOKEN))
+
+# One profile at a time so concurrent profiled requests do not sample each other
+profiler_busy = asyncio.Lock()
+
+async def profile_request(request: Request, call_next):
+    """Run a sampling profiler around requests that carry the profiling token.
+
+    call_next returns once the response headers are ready, so the profile is
+    named in X-Profile up front and the sampler runs until the body (e.g. a
+    streamed SQL result) has been sent.
+    """
+    if not profiling_authorized(request):
+        return await call_next(request)
+    if profiler_busy.locked():
+        response = await call_next(request)
+        response.headers["X-Profile"] = "busy"
+        return response
+
+    await profiler_busy.acquire()
+    profiler = SamplingProfiler(
+        interval_seconds=PROFILING_INTERVAL_MS / 1000,
+        max_seconds=PROFILING_MAX_SECONDS,
+        thread_prefixes=("warehouse-io",),
+    )
+
+    async def finish():
+        try:
+            profiler.stop()
+            summary = summarize(profiler)
+            await asyncio.to_thread(profile_store.save, request.method, request.url.path, profiler.collapsed(), name)
+            logger.info(f"Profiled {request.method} {request.url.path} -> {name} {summary}")
+        finally:
+            profiler_busy.release()
+
+    name = profile_store.name_for(request.method, request.url.path)
+    profiler.start()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await finish()
+        raise
+    response.headers["X-Profile"] = name
+    body_iterator = response.body_iterator
+
+    async def profiled_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            await finish()
+
+    response.body_iterator = profiled_body()
+    return response
+
+if PROFILING_ENABLED:
+    app.middleware("http")(profile_request)
+
+if TRACING_ENABLED:
+    @app.middleware("http")
+    async def trace_request(request: Request, call_next):
+        """Collect stage spans for the request, return them as Server-Timing and log slow requests"""
+        trace, token = start_trace()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["Server-Timing"] = server_timing_header(trace, trace.elapsed())
+            return response
+        finally:
+            end_trace(token)
+            total_seconds = trace.elapsed()
+            if total_seconds * 1000 >= SLOW_REQUEST_THRESHOLD_MS:
+                route = request.scope.get("route")
+                entry = slow_request_entry(
+                    trace, total_seconds, request.method, request.url.path, getattr(route, "path", None), status,
+                )
+                logger.warning(json.dumps(entry))
+
+if METRICS_ENABLED:
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        """Time every request, labelled by route template so path parameters do not multiply series"""
+        started = time.perf_counter()
+
+        def observe(status: int):
+            route = request.scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=request.method,
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+        try:
+            response = await call_next(request)
+        except BaseException:
+            observe(500)
+            raise
+
+        # call_next returns once headers are ready; a streamed body is timed until its last chunk
+        body_iterator = response.body_iterator
+
+        async def observed_body():
+            try:
+                async for chunk in body_iterator:
+                    yield chunk
+            finally:
+                observe(response.status_code)
+
+        response.body_iterator = observed_body()
+        return response
+
+# Startup work that runs in the background; referenced so it is not garbage collected
+background_tasks = set()
+
+async def prepare_audit_rollup():
+    """Create the rollup table, backfilling it from audit_logs the first time"""
+    try:
+        await audit_rollup.ensure_table()
+    except Exception as e:
+        logger.error(f"Failed to prepare audit rollup {AUDIT_ROLLUP_TABLE}: {str(e)}")
+
+@app.on_event("startup")
+async def start_warehouse_pool():
+    """Start pool maintenance once credentials are known to be configured"""
+    if local_warehouse is not None:
+        seed_demo(local_warehouse, AUDIT_LOG_TABLE, rows_per_table=LOCAL_WAREHOUSE_DEMO_ROWS)
+    if warehouse_configured():
+        warehouse_pool.start()
+        stream_pool.start()
+        if audit_spool is not None:
+            try:
+                audit_spool.open()
+            except Exception as e:
+                logger.error(f"Audit spool unavailable, audit events are kept in memory only: {str(e)}")
+                audit_writer.spool = None
+        audit_writer.start()
+        if audit_rollup is not None:
+            task = asyncio.ensure_future(prepare_audit_rollup())
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+
+@app.on_event("shutdown")
+async def close_shared_clients():
+    """Close pooled warehouse and serving endpoint connections on shutdown"""
+    # Drain queued audit events while the pool and executor are still up
+    await audit_writer.drain(AUDIT_SHUTDOWN_DRAIN_SECONDS)
+    warehouse_executor.shutdown(wait=False)
+    stream_executor.shutdown(wait=False)
+    warehouse_pool.close()
+    stream_pool.close()
+    await llm_client.close()
+
 # Pydantic Models
 class SQLGenerationRequest(BaseModel):
     catalog: str
@@ -87,9 +498,18 @@ class MultiTableSQLGenerationRequest(BaseModel):
     business_logic: str
     model_id: str = "databricks-llama-4-maverick"
     join_conditions: Optional[str] = None  # Optional explicit JOIN conditions
+    # Groups the events of one query flow in audit_logs; a new id is issued when none is sent
+    session_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
 
 class SQLExecutionRequest(BaseModel):
     sql_query: str
+    # Groups the events of one query flow in audit_logs; a new id is issued when none is sent
+    session_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+
+class SQLStreamRequest(SQLExecutionRequest):
+    format: str = "ndjson"  # ndjson or arrow
+    # Lowers SQL_STREAM_MAX_ROWS for this request
+    max_rows: Optional[int] = Field(default=None, ge=1)
 
 class BusinessLogicSuggestionRequest(BaseModel):
     catalog: str
@@ -98,10 +518,22 @@ class BusinessLogicSuggestionRequest(BaseModel):
     columns: List[str]
     model_id: str = "databricks-llama-4-maverick"
     additional_tables: Optional[List[TableInfo]] = None  # For multi-table queries
+    # Groups the events of one query flow in audit_logs; a new id is issued when none is sent
+    session_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+
+class TableRef(BaseModel):
+    catalog: str
+    schema_name: str
+    table: str
+
+class BatchColumnsRequest(BaseModel):
+    tables: List[TableRef]
 
 class JoinConditionSuggestionRequest(BaseModel):
     tables: List[TableInfo]
     model_id: str = "databricks-llama-4-maverick"
+    # Groups the events of one query flow in audit_logs; a new id is issued when none is sent
+    session_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
 
 # LLM Cost calculation (approximate pricing per 1M tokens)
 LLM_PRICING = {
@@ -123,6 +555,114 @@ def calculate_llm_cost(model_id: str, prompt_tokens: int, completion_tokens: int
     output_cost = (completion_tokens / 1_000_000) * pricing["output"]
     return input_cost + output_cost
 
+# Audit log writer configuration
+AUDIT_LOG_TABLE = "arao.text_to_sql.audit_logs"
+AUDIT_LOG_COLUMNS = (
+    "log_id", "timestamp", "event_type", "user_id", "catalog", "schema_name", "table_name",
+    "columns", "business_logic", "generated_sql", "model_id", "execution_time_ms",
+    "row_count", "status", "error_message", "metadata", "prompt_tokens", "completion_tokens",
+    "total_tokens", "estimated_cost_usd", "business_logic_length", "generated_sql_length", "session_id",
+)
+# Write model-call time to audit_logs.llm_time_ms. Leave off until add_llm_time_column.sql has run,
+# since inserts naming a missing column fail; the local warehouse already has it
+AUDIT_LLM_TIME_ENABLED = os.getenv("AUDIT_LLM_TIME_ENABLED", str(local_warehouse is not None)).lower() == "true"
+if AUDIT_LLM_TIME_ENABLED:
+    AUDIT_LOG_COLUMNS += ("llm_time_ms",)
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "2"))
+AUDIT_QUEUE_MAX_SIZE = int(os.getenv("AUDIT_QUEUE_MAX_SIZE", "10000"))
+# What to drop when the queue is full: "drop_oldest" or "drop_newest"
+AUDIT_OVERFLOW_POLICY = os.getenv("AUDIT_OVERFLOW_POLICY", "drop_oldest")
+AUDIT_SHUTDOWN_DRAIN_SECONDS = float(os.getenv("AUDIT_SHUTDOWN_DRAIN_SECONDS", "10"))
+# Local spool so audit events survive warehouse outages and restarts
+AUDIT_SPOOL_ENABLED = os.getenv("AUDIT_SPOOL_ENABLED", "True").lower() == "true"
+AUDIT_SPOOL_DIR = os.getenv("AUDIT_SPOOL_DIR", str(Path(__file__).resolve().parent / ".audit_spool"))
+AUDIT_SPOOL_SEGMENT_MAX_BYTES = int(os.getenv("AUDIT_SPOOL_SEGMENT_MAX_BYTES", str(1024 * 1024)))
+AUDIT_SPOOL_SEGMENT_MAX_AGE_SECONDS = float(os.getenv("AUDIT_SPOOL_SEGMENT_MAX_AGE_SECONDS", "60"))
+# "always" (fsync every event), "interval" or "never" (leave it to the OS)
+AUDIT_SPOOL_FSYNC_POLICY = os.getenv("AUDIT_SPOOL_FSYNC_POLICY", "interval")
+AUDIT_SPOOL_FSYNC_INTERVAL_SECONDS = float(os.getenv("AUDIT_SPOOL_FSYNC_INTERVAL_SECONDS", "1"))
+# Hourly aggregates read by the analytics endpoints instead of scanning audit_logs
+# The local warehouse cannot run the rollup's MERGE, so it reads audit_logs directly by default
+AUDIT_ROLLUP_ENABLED = os.getenv("AUDIT_ROLLUP_ENABLED", str(local_warehouse is None)).lower() == "true"
+AUDIT_ROLLUP_TABLE = os.getenv("AUDIT_ROLLUP_TABLE", "arao.text_to_sql.audit_rollup_hourly")
+AUDIT_ROLLUP_SOURCE = AUDIT_ROLLUP_TABLE if AUDIT_ROLLUP_ENABLED else live_source(AUDIT_LOG_TABLE, AUDIT_LLM_TIME_ENABLED)
+AUDIT_RETRY_BACKOFF_SECONDS = float(os.getenv("AUDIT_RETRY_BACKOFF_SECONDS", "5"))
+AUDIT_MAX_RETRY_BACKOFF_SECONDS = float(os.getenv("AUDIT_MAX_RETRY_BACKOFF_SECONDS", "300"))
+
+def insert_audit_rows(rows):
+    """Write a batch of audit rows with one multi-row INSERT (blocking)"""
+    insert_sql, params = build_batch_insert(AUDIT_LOG_TABLE, AUDIT_LOG_COLUMNS, rows)
+    with warehouse_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(insert_sql, params)
+
+def merge_audit_rows(rows):
+    """Insert spooled audit rows that are not in the table yet, keyed on log_id (blocking)"""
+    # Rows spooled before a column was added are shorter; the new columns are NULL. Rows
+    # spooled while llm_time_ms was enabled are longer than the columns when it is not.
+    rows = [(list(row) + [None] * (len(AUDIT_LOG_COLUMNS) - len(row)))[:len(AUDIT_LOG_COLUMNS)] for row in rows]
+    merge_sql, params = build_merge(AUDIT_LOG_TABLE, AUDIT_LOG_COLUMNS, "log_id", rows)
+    with warehouse_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(merge_sql, params)
+
+def run_audit_statements(statements):
+    """Run (sql, params) statements on one connection, returning the last one's rows (blocking)"""
+    rows = []
+    with warehouse_pool.connection() as connection:
+        with connection.cursor() as cursor:
+            for statement, params in statements:
+                cursor.execute(statement, params)
+                rows = cursor.fetchall() if cursor.description else []
+    return rows
+
+async def execute_audit_statements(statements):
+    return await warehouse_executor.run(run_audit_statements, statements)
+
+async def write_audit_batch(rows):
+    started = time.perf_counter()
+    status = "error"
+    try:
+        await warehouse_executor.run(insert_audit_rows, rows)
+        status = "success"
+    finally:
+        if METRICS_ENABLED:
+            AUDIT_FLUSH_SECONDS.observe(time.perf_counter() - started, status=status)
+
+async def replay_audit_batch(rows):
+    await warehouse_executor.run(merge_audit_rows, rows)
+
+audit_spool = AuditSpool(
+    AUDIT_SPOOL_DIR,
+    segment_max_bytes=AUDIT_SPOOL_SEGMENT_MAX_BYTES,
+    segment_max_age_seconds=AUDIT_SPOOL_SEGMENT_MAX_AGE_SECONDS,
+    fsync_policy=AUDIT_SPOOL_FSYNC_POLICY,
+    fsync_interval_seconds=AUDIT_SPOOL_FSYNC_INTERVAL_SECONDS,
+) if AUDIT_SPOOL_ENABLED else None
+
+audit_rollup = AuditRollup(
+    AUDIT_ROLLUP_TABLE,
+    AUDIT_LOG_TABLE,
+    AUDIT_LOG_COLUMNS,
+    execute_audit_statements,
+) if AUDIT_ROLLUP_ENABLED else None
+
+audit_writer = AuditWriter(
+    write_audit_batch,
+    batch_size=AUDIT_BATCH_SIZE,
+    flush_interval_seconds=AUDIT_FLUSH_INTERVAL_SECONDS,
+    max_queue_size=AUDIT_QUEUE_MAX_SIZE,
+    overflow_policy=AUDIT_OVERFLOW_POLICY,
+    spool=audit_spool,
+    replay_batch=replay_audit_batch,
+    retry_backoff_seconds=AUDIT_RETRY_BACKOFF_SECONDS,
+    max_retry_backoff_seconds=AUDIT_MAX_RETRY_BACKOFF_SECONDS,
+    on_written=audit_rollup.apply if audit_rollup else None,
+    on_replayed=audit_rollup.replayed if audit_rollup else None,
+    before_write=audit_rollup.generation if audit_rollup else None,
+)
+
 # Audit logging helper function
 async def log_audit_event(
     event_type: str,
@@ -144,68 +684,65 @@ async def log_audit_event(
     estimated_cost_usd: float = None,
     session_id: str = None
 ):
-    """Log an audit event to the audit_logs table"""
+    """Queue an audit event for the audit_logs table; the background writer inserts it"""
+    audit_started = time.perf_counter()
     try:
         log_id = str(uuid.uuid4())
-        timestamp = datetime.now()
+        timestamp = utc_now()
+
+        # Model calls made while handling this request, reported as LLM latency instead of the request time
+        llm_seconds = llm_call_seconds.get()
+        llm_time_ms = int(llm_seconds * 1000) if llm_seconds else None
+        llm_call_seconds.set(0.0)
 
         # Calculate text lengths
         business_logic_length = len(business_logic) if business_logic else None
         generated_sql_length = len(generated_sql) if generated_sql else None
 
-        # Prepare the insert statement
-        insert_sql = """
-        INSERT INTO arao.text_to_sql.audit_logs
-        (log_id, timestamp, event_type, user_id, catalog, schema_name, table_name,
-         columns, business_logic, generated_sql, model_id, execution_time_ms,
-         row_count, status, error_message, metadata, prompt_tokens, completion_tokens,
-         total_tokens, estimated_cost_usd, business_logic_length, generated_sql_length, session_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-
         # Convert columns list to array format if present
         columns_array = columns if columns else None
 
         # Convert metadata dict to map format if present
         metadata_map = metadata if metadata else None
 
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(insert_sql, (
-                    log_id,
-                    timestamp,
-                    event_type,
-                    "default_user",  # TODO: Add actual user tracking
-                    catalog,
-                    schema_name,
-                    table_name,
-                    columns_array,
-                    business_logic,
-                    generated_sql,
-                    model_id,
-                    execution_time_ms,
-                    row_count,
-                    status,
-                    error_message,
-                    metadata_map,
-                    prompt_tokens,
-                    completion_tokens,
-                    total_tokens,
-                    estimated_cost_usd,
-                    business_logic_length,
-                    generated_sql_length,
-                    session_id
-                ))
-
-        logger.info(f"Logged audit event: {event_type} - {log_id}")
+        # Values in AUDIT_LOG_COLUMNS order; llm_time_ms is dropped when that column is disabled
+        row = (
+            log_id,
+            timestamp,
+            event_type,
+            "default_user",  # TODO: Add actual user tracking
+            catalog,
+            schema_name,
+            table_name,
+            columns_array,
+            business_logic,
+            generated_sql,
+            model_id,
+            execution_time_ms,
+            row_count,
+            status,
+            error_message,
+            metadata_map,
+            prompt_tokens,
+            completion_tokens,
+            total_tokens,
+            estimated_cost_usd,
+            business_logic_length,
+            generated_sql_length,
+            session_id,
+            llm_time_ms,
+        )[:len(AUDIT_LOG_COLUMNS)]
+
+        if audit_writer.enqueue(row):
+            logger.debug(f"Queued audit event: {event_type} - {log_id}")
+        else:
+            logger.warning(f"Audit queue full, dropped event: {event_type} - {log_id}")
     except Exception as e:
         # Don't fail the main operation if audit logging fails
         logger.error(f"Failed to log audit event: {str(e)}", exc_info=True)
         logger.error(f"Event details - Type: {event_type}, Catalog: {catalog}, Schema: {schema_name}, Table: {table_name}")
+    finally:
+        record_span("audit", time.perf_counter() - audit_started)
 
 @app.get("/api/health")
 async def health_check():
@@ -221,6 +758,8 @@ async def debug_config():
     """Debug endpoint to check configuration"""
     return {
         "env": ENV,
+        "warehouse_backend": WAREHOUSE_BACKEND,
+        "llm_base_url": LLM_BASE_URL,
         "databricks_host_configured": bool(DATABRICKS_HOST),
         "databricks_token_configured": bool(DATABRICKS_TOKEN),
         "databricks_token_length": len(DATABRICKS_TOKEN) if DATABRICKS_TOKEN else 0,
@@ -229,12 +768,99 @@ async def debug_config():
         "databricks_schema": DATABRICKS_SCHEMA,
     }
 
+@app.get("/api/debug/pool")
+async def debug_pool():
+    """Warehouse connection pool, executor, LLM client and audit writer metrics"""
+    return {
+        "warehouse_pool": warehouse_pool.stats(),
+        "stream_pool": stream_pool.stats(),
+        "executors": {
+            "warehouse": warehouse_executor.stats(),
+            "stream": stream_executor.stats(),
+        },
+        "llm_models": llm_client.stats(),
+        "audit_writer": audit_writer.stats(),
+        "audit_rollup": audit_rollup.stats() if audit_rollup else None,
+        "local_warehouse": local_warehouse.stats() if local_warehouse else None,
+    }
+
+@metrics.collector
+def collect_runtime_metrics():
+    """Pool, executor, audit queue, cache and LLM slot gauges read from their stats() at scrape time"""
+    pool = warehouse_pool.stats()
+    yield ("warehouse_pool_connections", "gauge", "Warehouse connections by state",
+           [({"state": "in_use"}, pool["in_use"]), ({"state": "idle"}, pool["idle"])])
+    yield ("warehouse_pool_checkout_timeouts_total", "counter", "Checkouts that timed out waiting for a connection",
+           [({}, pool["checkout_timeouts"])])
+    yield ("warehouse_pool_checkout_wait_seconds_total", "counter", "Total time spent waiting for a connection",
+           [({}, pool["checkout_wait_ms_total"] / 1000.0)])
+
+    executor = warehouse_executor.stats()
+    yield ("executor_jobs", "gauge", "Executor jobs by state",
+           [({"executor": "warehouse", "state": "queued"}, executor["queued"]),
+            ({"executor": "warehouse", "state": "running"}, executor["running"])])
+    yield ("executor_rejected_total", "counter", "Jobs rejected because the executor queue was full",
+           [({"executor": "warehouse"}, executor["rejected"])])
+
+    audit = audit_writer.stats()
+    yield ("audit_queue_depth", "gauge", "Audit events waiting to be written", [({}, audit["queued"])])
+    yield ("audit_events_total", "counter", "Audit events by outcome",
+           [({"outcome": outcome}, audit[outcome]) for outcome in ("enqueued", "written", "dropped", "failed", "replayed")])
+
+    lookups, ratios = [], []
+    for cache_name, cache in (("metadata", metadata_cache), ("analytics", analytics_cache)):
+        for level, counters in cache.stats()["levels"].items():
+            labels = {"cache": cache_name, "level": level}
+            for result in ("hits", "stale_hits", "misses"):
+                lookups.append(({**labels, "result": result}, counters[result]))
+            ratios.append((labels, counters["hit_ratio"]))
+    table_context = table_context_service.stats()
+    for result in ("hits", "misses"):
+        lookups.append(({"cache": "table_context", "level": "table", "result": result}, table_context[result]))
+    yield ("cache_lookups_total", "counter", "Cache lookups by cache, level and result", lookups)
+    yield ("cache_hit_ratio", "gauge", "Share of lookups served from cache, including stale hits", ratios)
+
+    slots = llm_client.stats().items()
+    yield ("llm_requests", "gauge", "Serving endpoint calls in flight or waiting for a slot, by model",
+           [({"model": model, "state": state}, slot[state]) for model, slot in slots for state in ("in_flight", "waiting")])
+
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime metrics in the Prometheus text format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_profiling_token(request: Request):
+    if not PROFILING_ENABLED or not PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not profiling_authorized(request):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Profile-Token")
+
+@app.get("/api/debug/profiles")
+async def list_profiles(request: Request):
+    """Names of stored request profiles, newest first"""
+    require_profiling_token(request)
+    return {"profiles": profile_store.list()}
+
+@app.get("/api/debug/profiles/{name}")
+async def get_profile(name: str, request: Request):
+    """One stored profile in the collapsed stack format (flamegraph.pl, speedscope)"""
+    require_profiling_token(request)
+    collapsed = profile_store.read(name)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail=f"Profile {name} not found")
+    return Response(content=collapsed, media_type="text/plain; charset=utf-8")
+
 @app.get("/api/warehouse-status")
 async def get_warehouse_status():
     """Get SQL warehouse status"""
     try:
         # Extract warehouse ID from HTTP path
         warehouse_id = DATABRICKS_HTTP_PATH.split("/")[-1] if DATABRICKS_HTTP_PATH else None
+        warehouse_name = "patrick-warehouse"  # Could be fetched via API
+        if local_warehouse is not None:
+            warehouse_id, warehouse_name = "local", f"Local warehouse ({LOCAL_WAREHOUSE_PATH})"
 
         if not warehouse_id:
             return {
@@ -244,25 +870,27 @@ async def get_warehouse_status():
                 "http_path": DATABRICKS_HTTP_PATH
             }
 
+        def ping_warehouse():
+            with warehouse_pool.connection() as connection:
+                # A pooled connection may be idle, so round-trip a query to prove the warehouse is up
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchall()
+
         # Try to connect to get warehouse info
         try:
-            with sql.connect(
-                server_hostname=DATABRICKS_HOST.replace("https://", ""),
-                http_path=DATABRICKS_HTTP_PATH,
-                access_token=DATABRICKS_TOKEN
-            ) as connection:
-                # Connection successful means warehouse is running
-                return {
-                    "warehouse_id": warehouse_id,
-                    "warehouse_name": "patrick-warehouse",  # Could be fetched via API
-                    "status": "RUNNING",
-                    "http_path": DATABRICKS_HTTP_PATH
-                }
+            await warehouse_executor.run(ping_warehouse)
+            return {
+                "warehouse_id": warehouse_id,
+                "warehouse_name": warehouse_name,
+                "status": "RUNNING",
+                "http_path": DATABRICKS_HTTP_PATH
+            }
         except Exception as conn_error:
             logger.error(f"Failed to connect to warehouse: {str(conn_error)}")
             return {
                 "warehouse_id": warehouse_id,
-                "warehouse_name": "patrick-warehouse",
+                "warehouse_name": warehouse_name,
                 "status": "STOPPED",
                 "http_path": DATABRICKS_HTTP_PATH,
                 "error": str(conn_error)
@@ -284,7 +912,7 @@ async def list_catalogs():
     """List available catalogs"""
     try:
         # Check if credentials are configured
-        if not DATABRICKS_HOST or not DATABRICKS_TOKEN or not DATABRICKS_HTTP_PATH:
+        if not warehouse_configured():
             logger.error("Missing credentials - Host: %s, Token: %s, HTTP Path: %s",
                         bool(DATABRICKS_HOST), bool(DATABRICKS_TOKEN), bool(DATABRICKS_HTTP_PATH))
             raise HTTPException(
@@ -292,24 +920,16 @@ async def list_catalogs():
                 detail="Databricks credentials not configured. Please set DATABRICKS_HOST, DATABRICKS_TOKEN, and DATABRICKS_HTTP_PATH environment variables."
             )
 
-        # Log connection attempt
-        hostname = DATABRICKS_HOST.replace("https://", "")
-        logger.info("Attempting to connect to Databricks: %s", hostname)
-        logger.info("HTTP Path: %s", DATABRICKS_HTTP_PATH)
-        logger.info("Token length: %d", len(DATABRICKS_TOKEN))
-
-        with sql.connect(
-            server_hostname=hostname,
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            logger.info("Connection established successfully")
-            with connection.cursor() as cursor:
-                logger.info("Executing SHOW CATALOGS")
-                cursor.execute("SHOW CATALOGS")
-                catalogs = [row[0] for row in cursor.fetchall()]
-                logger.info("Found %d catalogs: %s", len(catalogs), catalogs)
-                return {"catalogs": catalogs}
+        def fetch_catalogs():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    logger.info("Executing SHOW CATALOGS")
+                    cursor.execute("SHOW CATALOGS")
+                    catalogs = [row[0] for row in cursor.fetchall()]
+                    logger.info("Found %d catalogs: %s", len(catalogs), catalogs)
+                    return {"catalogs": catalogs}
+
+        return await metadata_cache.get_or_load(("catalogs",), lambda: warehouse_executor.run(fetch_catalogs))
     except HTTPException:
         raise
     except Exception as e:
@@ -320,15 +940,16 @@ async def list_catalogs():
 async def list_schemas(catalog_name: str):
     """List schemas in a catalog"""
     try:
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(f"SHOW SCHEMAS IN {catalog_name}")
-                schemas = [row[0] for row in cursor.fetchall()]
-                return {"schemas": schemas}
+        def fetch_schemas():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SHOW SCHEMAS IN {catalog_name}")
+                    schemas = [row[0] for row in cursor.fetchall()]
+                    return {"schemas": schemas}
+
+        return await metadata_cache.get_or_load(
+            ("schemas", catalog_name), lambda: warehouse_executor.run(fetch_schemas)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list schemas: {str(e)}")
 
@@ -336,130 +957,156 @@ async def list_schemas(catalog_name: str):
 async def list_tables(catalog_name: str, schema_name: str):
     """List tables in a schema"""
     try:
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(f"SHOW TABLES IN {catalog_name}.{schema_name}")
-                tables = [row[1] for row in cursor.fetchall()]  # row[1] is table name
-                return {"tables": tables}
+        def fetch_tables():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SHOW TABLES IN {catalog_name}.{schema_name}")
+                    tables = [row[1] for row in cursor.fetchall()]  # row[1] is table name
+                    return {"tables": tables}
+
+        return await metadata_cache.get_or_load(
+            ("tables", catalog_name, schema_name), lambda: warehouse_executor.run(fetch_tables)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list tables: {str(e)}")
 
+async def get_schema_metadata(catalog_name: str, schema_name: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Bulk load a schema's tables and columns once, populating the per-table column cache.
+
+    Returns None (cached like a result) when the catalog has no information_schema.
+    """
+    async def load():
+        def fetch():
+            with warehouse_pool.connection() as connection:
+                return load_schema_metadata(connection, catalog_name, schema_name)
+
+        try:
+            tables = await warehouse_executor.run(fetch)
+        except Exception as e:
+            logger.warning(f"Bulk metadata load failed for {catalog_name}.{schema_name}, using DESCRIBE: {str(e)}")
+            return None
+        for table_name, info in tables.items():
+            metadata_cache.put(("columns", catalog_name, schema_name, table_name), {"columns": info["columns"]})
+        return tables
+
+    return await metadata_cache.get_or_load(("schema_metadata", catalog_name, schema_name), load)
+
+async def get_table_columns(catalog_name: str, schema_name: str, table_name: str) -> Dict[str, Any]:
+    """Column listing for one table, served from the metadata cache when possible"""
+    async def load():
+        if METADATA_BULK_LOAD_ENABLED:
+            tables = await get_schema_metadata(catalog_name, schema_name)
+            if tables and table_name in tables:
+                return {"columns": tables[table_name]["columns"]}
+
+        def fetch():
+            with warehouse_pool.connection() as connection:
+                return describe_columns(connection, catalog_name, schema_name, table_name)
+
+        return {"columns": await warehouse_executor.run(fetch)}
+
+    return await metadata_cache.get_or_load(("columns", catalog_name, schema_name, table_name), load)
+
 @app.get("/api/catalogs/{catalog_name}/schemas/{schema_name}/tables/{table_name}/columns")
 async def list_columns(catalog_name: str, schema_name: str, table_name: str):
     """List columns in a table"""
     try:
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(f"DESCRIBE {catalog_name}.{schema_name}.{table_name}")
-                columns = [{"name": row[0], "type": row[1], "comment": row[2] if len(row) > 2 else None}
-                          for row in cursor.fetchall()]
-                return {"columns": columns}
+        return await get_table_columns(catalog_name, schema_name, table_name)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list columns: {str(e)}")
 
+@app.post("/api/columns/batch")
+async def list_columns_batch(request: BatchColumnsRequest):
+    """List columns for many tables in one call (one bulk query per schema)"""
+    if len(request.tables) > MAX_BATCH_COLUMNS_TABLES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_COLUMNS_TABLES} tables per request")
+
+    results = await asyncio.gather(
+        *[get_table_columns(t.catalog, t.schema_name, t.table) for t in request.tables],
+        return_exceptions=True
+    )
+
+    tables = []
+    for table_ref, result in zip(request.tables, results):
+        entry = {"catalog": table_ref.catalog, "schema_name": table_ref.schema_name, "table": table_ref.table}
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to list columns for {table_ref.table}: {str(result)}")
+            entry["columns"] = []
+            entry["error"] = str(result)
+        else:
+            entry["columns"] = result["columns"]
+        tables.append(entry)
+    return {"tables": tables}
+
+@app.get("/api/cache/metadata")
+async def get_metadata_cache_stats():
+    """Metadata cache occupancy and hit/miss counters per level, plus the table context cache"""
+    stats = metadata_cache.stats()
+    stats["table_context"] = table_context_service.stats()
+    return stats
+
+@app.delete("/api/cache/metadata")
+async def invalidate_metadata_cache(catalog: Optional[str] = None, schema: Optional[str] = None, table: Optional[str] = None):
+    """Invalidate cached metadata for a catalog, schema or table (everything if no scope is given)"""
+    if table and not (catalog and schema) or schema and not catalog:
+        raise HTTPException(status_code=400, detail="schema requires catalog, and table requires catalog and schema")
+    removed = metadata_cache.invalidate(catalog, schema, table)
+    removed += table_context_service.invalidate(catalog, schema, table)
+    logger.info(f"Invalidated {removed} metadata cache entries (catalog={catalog}, schema={schema}, table={table})")
+    return {"invalidated": removed}
+
+@app.get("/api/cache/analytics")
+async def get_analytics_cache_stats():
+    """Analytics response cache occupancy and hit/miss counters per endpoint"""
+    return analytics_cache.stats()
+
+@app.delete("/api/cache/analytics")
+async def invalidate_analytics_cache():
+    """Drop every cached analytics response so the next request reloads it"""
+    removed = analytics_cache.invalidate()
+    logger.info(f"Invalidated {removed} analytics cache entries")
+    return {"invalidated": removed}
+
+def table_context_placeholder(table_info: TableInfo, idx: int, reason: str) -> str:
+    """Context for a table whose metadata could not be fetched: name and selected columns only"""
+    full_table_name = f"{table_info.catalog}.{table_info.schema_name}.{table_info.table}"
+    return (
+        f"\nTable {idx}: {full_table_name}\n"
+        f"Columns: {', '.join(table_info.columns)}\n"
+        f"({reason})\n\n"
+    )
+
+async def gather_table_contexts(tables: List[TableInfo]) -> str:
+    """Build prompt context (metadata and sample rows) for all tables concurrently.
+
+    Each table gets its own timeout, and a table that times out or fails gets
+    a placeholder without affecting the others.
+    """
+    semaphore = asyncio.Semaphore(TABLE_CONTEXT_CONCURRENCY)
+
+    async def fetch_one(idx: int, table_info: TableInfo) -> str:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    warehouse_executor.run(table_context_service.build_context, table_info, idx),
+                    timeout=TABLE_CONTEXT_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Timeout fetching metadata for table {idx}: {table_info.table}")
+                return table_context_placeholder(table_info, idx, "Timeout fetching metadata")
+            except Exception as e:
+                logger.warning(f"Error fetching metadata for table {idx}: {table_info.table}: {str(e)}")
+                return table_context_placeholder(table_info, idx, "Error fetching metadata")
+
+    with span("metadata"):
+        contexts = await asyncio.gather(*[fetch_one(idx, t) for idx, t in enumerate(tables, 1)])
+    return "".join(contexts)
+
 @app.post("/api/suggest-business-logic")
 async def suggest_business_logic(request: BusinessLogicSuggestionRequest):
     """Generate business logic suggestions using Databricks Foundation Model"""
     start_time = time.time()
     try:
-        # Initialize OpenAI client with Databricks endpoint
-        client = openai.OpenAI(
-            api_key=DATABRICKS_TOKEN,
-            base_url=f"{DATABRICKS_HOST}/serving-endpoints"
-        )
-
-        # Build comprehensive context about all tables
-        def fetch_table_metadata(table_info, idx):
-            """Fetch metadata and sample data for a single table (runs in thread pool)"""
-            full_table_name = f"{table_info.catalog}.{table_info.schema_name}.{table_info.table}"
-            context = f"\nTable {idx}: {full_table_name}\n"
-
-            try:
-                conn = sql.connect(
-                    server_hostname=DATABRICKS_HOST.replace("https://", ""),
-                    http_path=DATABRICKS_HTTP_PATH,
-                    access_token=DATABRICKS_TOKEN
-                )
-                cursor = conn.cursor()
-
-                # Fetch table metadata and column descriptions
-                describe_query = f"DESCRIBE TABLE EXTENDED {full_table_name}"
-                cursor.execute(describe_query)
-                describe_results = cursor.fetchall()
-
-                # Parse column metadata
-                column_metadata = {}
-                table_comment = None
-                in_detailed_info = False
-
-                for row in describe_results:
-                    col_name = row[0]
-                    data_type = row[1]
-                    comment = row[2] if len(row) > 2 else None
-
-                    if col_name and '# Detailed Table Information' in col_name:
-                        in_detailed_info = True
-                        continue
-
-                    if in_detailed_info and col_name and 'Comment' in col_name and comment:
-                        table_comment = comment
-                        continue
-
-                    if not in_detailed_info and col_name and col_name.strip() and not col_name.startswith('#'):
-                        if col_name in table_info.columns:
-                            column_metadata[col_name] = {
-                                'type': data_type,
-                                'comment': comment if comment else ''
-                            }
-
-                # Add table comment if available
-                if table_comment:
-                    context += f"Table Description: {table_comment}\n"
-
-                # Add column information with metadata
-                context += "\nColumns:\n"
-                for col in table_info.columns:
-                    if col in column_metadata:
-                        meta = column_metadata[col]
-                        context += f"  - {col} ({meta['type']})"
-                        if meta['comment']:
-                            context += f": {meta['comment']}"
-                        context += "\n"
-                    else:
-                        context += f"  - {col}\n"
-
-                # Fetch sample data (first 5 rows)
-                columns_str = ', '.join(table_info.columns)
-                sample_query = f"SELECT {columns_str} FROM {full_table_name} LIMIT 5"
-                cursor.execute(sample_query)
-                rows = cursor.fetchall()
-
-                if rows:
-                    context += "\nSample Data (first 5 rows):\n"
-                    context += " | ".join(table_info.columns) + "\n"
-                    context += "-" * (len(" | ".join(table_info.columns))) + "\n"
-                    for row in rows:
-                        row_values = [str(val) if val is not None else 'NULL' for val in row]
-                        context += " | ".join(row_values) + "\n"
-                context += "\n"
-
-                cursor.close()
-                conn.close()
-                return context
-            except Exception as e:
-                logger.warning(f"Failed to fetch metadata/data for {table_info.table}: {str(e)}")
-                context += f"Columns: {', '.join(table_info.columns)}\n"
-                context += "(Could not fetch metadata or sample data)\n\n"
-                return context
-
         # Create a list of all tables to process
         all_tables = [TableInfo(
             catalog=request.catalog,
@@ -471,23 +1118,8 @@ async def suggest_business_logic(request: BusinessLogicSuggestionRequest):
         if request.additional_tables:
             all_tables.extend(request.additional_tables)
 
-        # Fetch metadata for all tables with timeout (run in thread pool)
-        import asyncio
-        tables_context = ""
-        try:
-            for idx, table_info in enumerate(all_tables, 1):
-                # Run each table fetch with timeout
-                table_context = await asyncio.wait_for(
-                    asyncio.to_thread(fetch_table_metadata, table_info, idx),
-                    timeout=10.0  # 10 second timeout per table
-                )
-                tables_context += table_context
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout fetching metadata for table {idx}")
-            tables_context += f"(Timeout fetching metadata)\n\n"
-        except Exception as e:
-            logger.warning(f"Error fetching table metadata: {str(e)}")
-            tables_context += f"(Error fetching metadata)\n\n"
+        # Fetch metadata for all tables concurrently, each with its own timeout
+        tables_context = await gather_table_contexts(all_tables)
 
         # Create prompt for business logic suggestions
         is_multi_table = len(all_tables) > 1
@@ -550,7 +1182,7 @@ Do NOT use bullet points, quotes, or JSON format. Just natural language numbered
         if "gpt-5" not in request.model_id.lower():
             completion_params["temperature"] = 0.7
 
-        response = client.chat.completions.create(**completion_params)
+        response = await llm_client.chat_completion(**completion_params)
 
         suggestions_text = response.choices[0].message.content.strip()
 
@@ -562,32 +1194,8 @@ Do NOT use bullet points, quotes, or JSON format. Just natural language numbered
         # Calculate cost
         estimated_cost = calculate_llm_cost(request.model_id, prompt_tokens, completion_tokens)
 
-        # Parse numbered list format (1. 2. 3. etc.)
-        import re
-        suggestions = []
-        lines = suggestions_text.split('\n')
-        for line in lines:
-            # Match lines that start with number and period (e.g., "1. ", "2. ")
-            match = re.match(r'^\d+\.\s*(.+)$', line.strip())
-            if match:
-                suggestion = match.group(1).strip()
-                # Remove any surrounding quotes
-                suggestion = suggestion.strip('"').strip("'")
-                if len(suggestion) > 15:  # Must be substantial
-                    suggestions.append(suggestion)
-
-        # Fallback if regex parsing fails: try JSON or simple cleanup
-        if not suggestions:
-            try:
-                import json
-                suggestions = json.loads(suggestions_text)
-            except:
-                # Simple fallback: split by newlines and clean up
-                suggestions = [s.strip('- ').strip().strip('"').strip("'") for s in suggestions_text.split('\n') if s.strip()]
-                suggestions = [s for s in suggestions if len(s) > 15][:5]
-
-        # Limit to 5 suggestions
-        suggestions = suggestions[:5]
+        # Parse numbered list format (1. 2. 3. etc.), at most 5 suggestions
+        suggestions = parse_suggestions(suggestions_text)
 
         # Calculate execution time
         execution_time_ms = int((time.time() - start_time) * 1000)
@@ -595,6 +1203,7 @@ Do NOT use bullet points, quotes, or JSON format. Just natural language numbered
         # Log audit event
         await log_audit_event(
             event_type="business_logic_suggestion",
+            session_id=request.session_id,
             catalog=request.catalog,
             schema_name=request.schema_name,
             table_name=request.table,
@@ -611,7 +1220,8 @@ Do NOT use bullet points, quotes, or JSON format. Just natural language numbered
 
         return {
             "suggestions": suggestions,
-            "model_used": request.model_id
+            "model_used": request.model_id,
+            "session_id": request.session_id
         }
     except Exception as e:
         # Calculate execution time for error case
@@ -620,6 +1230,7 @@ Do NOT use bullet points, quotes, or JSON format. Just natural language numbered
         # Log audit event for error
         await log_audit_event(
             event_type="business_logic_suggestion",
+            session_id=request.session_id,
             catalog=request.catalog,
             schema_name=request.schema_name,
             table_name=request.table,
@@ -641,119 +1252,8 @@ async def suggest_join_conditions(request: JoinConditionSuggestionRequest):
         if len(request.tables) < 2:
             raise HTTPException(status_code=400, detail="At least 2 tables required for join condition suggestions")
 
-        # Initialize OpenAI client with Databricks endpoint
-        client = openai.OpenAI(
-            api_key=DATABRICKS_TOKEN,
-            base_url=f"{DATABRICKS_HOST}/serving-endpoints"
-        )
-
-        # Build context about all tables including metadata and sample data
-        def fetch_table_context(table, idx):
-            """Fetch metadata and sample data for a single table (runs in thread pool)"""
-            full_table_name = f"{table.catalog}.{table.schema_name}.{table.table}"
-            context = f"\nTable {idx}: {full_table_name}\n"
-
-            try:
-                conn = sql.connect(
-                    server_hostname=DATABRICKS_HOST.replace("https://", ""),
-                    http_path=DATABRICKS_HTTP_PATH,
-                    access_token=DATABRICKS_TOKEN
-                )
-                cursor = conn.cursor()
-
-                # Fetch table metadata and column descriptions
-                describe_query = f"DESCRIBE TABLE EXTENDED {full_table_name}"
-                cursor.execute(describe_query)
-                describe_results = cursor.fetchall()
-
-                # Parse column metadata
-                column_metadata = {}
-                table_comment = None
-                in_detailed_info = False
-
-                for row in describe_results:
-                    col_name = row[0]
-                    data_type = row[1]
-                    comment = row[2] if len(row) > 2 else None
-
-                    # Check if we've reached the detailed table info section
-                    if col_name and '# Detailed Table Information' in col_name:
-                        in_detailed_info = True
-                        continue
-
-                    # Extract table comment from detailed info
-                    if in_detailed_info and col_name and 'Comment' in col_name and comment:
-                        table_comment = comment
-                        continue
-
-                    # Only process actual column metadata (before detailed info section)
-                    if not in_detailed_info and col_name and col_name.strip() and not col_name.startswith('#'):
-                        # Only include selected columns
-                        if col_name in table.columns:
-                            column_metadata[col_name] = {
-                                'type': data_type,
-                                'comment': comment if comment else ''
-                            }
-
-                # Add table comment if available
-                if table_comment:
-                    context += f"Table Description: {table_comment}\n"
-
-                # Add column information with metadata
-                context += "\nColumns:\n"
-                for col in table.columns:
-                    if col in column_metadata:
-                        meta = column_metadata[col]
-                        context += f"  - {col} ({meta['type']})"
-                        if meta['comment']:
-                            context += f": {meta['comment']}"
-                        context += "\n"
-                    else:
-                        context += f"  - {col}\n"
-
-                # Fetch sample data (first 5 rows)
-                columns_str = ', '.join(table.columns)
-                sample_query = f"SELECT {columns_str} FROM {full_table_name} LIMIT 5"
-                cursor.execute(sample_query)
-                rows = cursor.fetchall()
-
-                if rows:
-                    context += "\nSample Data (first 5 rows):\n"
-                    # Add header
-                    context += " | ".join(table.columns) + "\n"
-                    context += "-" * (len(" | ".join(table.columns))) + "\n"
-                    # Add rows
-                    for row in rows:
-                        row_values = [str(val) if val is not None else 'NULL' for val in row]
-                        context += " | ".join(row_values) + "\n"
-                context += "\n"
-
-                cursor.close()
-                conn.close()
-                return context
-            except Exception as e:
-                logger.warning(f"Failed to fetch metadata/data for {table.table}: {str(e)}")
-                context += f"Columns: {', '.join(table.columns)}\n"
-                context += "(Could not fetch metadata or sample data)\n\n"
-                return context
-
-        # Fetch metadata for all tables with timeout (run in thread pool)
-        import asyncio
-        tables_context = ""
-        try:
-            for idx, table in enumerate(request.tables, 1):
-                # Run each table fetch with timeout
-                table_context = await asyncio.wait_for(
-                    asyncio.to_thread(fetch_table_context, table, idx),
-                    timeout=10.0  # 10 second timeout per table
-                )
-                tables_context += table_context
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout fetching metadata for table {idx}")
-            tables_context += f"(Timeout fetching metadata)\n\n"
-        except Exception as e:
-            logger.warning(f"Error fetching table metadata: {str(e)}")
-            tables_context += f"(Error fetching metadata)\n\n"
+        # Fetch metadata for all tables concurrently, each with its own timeout
+        tables_context = await gather_table_contexts(request.tables)
 
         # Create prompt for join condition suggestions
         system_prompt = """You are a database expert specializing in SQL joins.
@@ -812,43 +1312,10 @@ JOIN CONDITION:"""
         if "gpt-5" not in request.model_id.lower():
             completion_params["temperature"] = 0.2  # Very low temperature for deterministic, data-driven decisions
 
-        response = client.chat.completions.create(**completion_params)
-
-        suggested_condition = response.choices[0].message.content.strip()
-
-        # Clean up the response - remove any surrounding quotes or extra formatting
-        suggested_condition = suggested_condition.strip('"').strip("'").strip('`')
-
-        # If LLM outputted analysis instead of just the join condition, extract the actual condition
-        # Look for lines that match the pattern: t1.column = t2.column
-        import re
-        lines = suggested_condition.split('\n')
-
-        # Try to find a line that looks like a join condition (contains t1. and t2. and =)
-        for line in lines:
-            line = line.strip()
-            # Check if line contains table aliases and equals sign (likely a join condition)
-            if re.search(r't\d+\.\w+\s*=\s*t\d+\.\w+', line, re.IGNORECASE):
-                suggested_condition = line
-                break
-
-        # If we still have a multi-line response, take only the first line that's not a heading
-        if '\n' in suggested_condition:
-            for line in lines:
-                line = line.strip()
-                # Skip empty lines and lines that look like headings/analysis
-                if line and not line.startswith('#') and not line.endswith(':') and '=' in line:
-                    suggested_condition = line
-                    break
-
-        # Remove common prefixes if present
-        prefixes_to_remove = ["ON ", "WHERE ", "JOIN ON ", "```sql", "```"]
-        for prefix in prefixes_to_remove:
-            if suggested_condition.startswith(prefix):
-                suggested_condition = suggested_condition[len(prefix):].strip()
+        response = await llm_client.chat_completion(**completion_params)
 
-        # Remove any trailing backticks or markdown
-        suggested_condition = suggested_condition.replace("```", "").strip()
+        # The model sometimes adds analysis or markdown around the t1.column = t2.column condition
+        suggested_condition = extract_join_condition(response.choices[0].message.content)
 
         # Extract token usage
         prompt_tokens = response.usage.prompt_tokens if response.usage else 0
@@ -865,6 +1332,7 @@ JOIN CONDITION:"""
         table_names = [f"{t.catalog}.{t.schema_name}.{t.table}" for t in request.tables]
         await log_audit_event(
             event_type="join_condition_suggestion",
+            session_id=request.session_id,
             catalog=request.tables[0].catalog,
             schema_name=request.tables[0].schema_name,
             table_name=f"[JOIN: {' + '.join([t.table for t in request.tables])}]",
@@ -881,7 +1349,8 @@ JOIN CONDITION:"""
 
         return {
             "join_condition": suggested_condition,
-            "model_used": request.model_id
+            "model_used": request.model_id,
+            "session_id": request.session_id
         }
     except HTTPException:
         raise
@@ -893,6 +1362,7 @@ JOIN CONDITION:"""
         if len(request.tables) > 0:
             await log_audit_event(
                 event_type="join_condition_suggestion",
+                session_id=request.session_id,
                 catalog=request.tables[0].catalog,
                 schema_name=request.tables[0].schema_name,
                 table_name=f"[JOIN: {' + '.join([t.table for t in request.tables])}]",
@@ -909,13 +1379,8 @@ JOIN CONDITION:"""
 async def generate_sql(request: MultiTableSQLGenerationRequest):
     """Generate SQL query using Databricks Foundation Model (supports multiple tables)"""
     start_time = time.time()
+    stage_started = time.perf_counter()
     try:
-        # Initialize OpenAI client with Databricks endpoint
-        client = openai.OpenAI(
-            api_key=DATABRICKS_TOKEN,
-            base_url=f"{DATABRICKS_HOST}/serving-endpoints"
-        )
-
         # Build context about the table(s)
         if len(request.tables) == 1:
             # Single table query
@@ -1031,9 +1496,11 @@ The response should contain ONLY the EXPLANATION line and the SQL query, nothing
         # Only set temperature for models that support it (not GPT-5)
         if "gpt-5" not in request.model_id.lower():
             completion_params["temperature"] = 0.3
+        record_span("prompt", time.perf_counter() - stage_started)
 
-        response = client.chat.completions.create(**completion_params)
+        response = await llm_client.chat_completion(**completion_params)
 
+        stage_started = time.perf_counter()
         llm_response = response.choices[0].message.content.strip()
 
         # Check if response was truncated due to max_tokens
@@ -1041,71 +1508,19 @@ The response should contain ONLY the EXPLANATION line and the SQL query, nothing
         if finish_reason == "length":
             logger.warning("LLM response was truncated due to max_tokens limit. Query may be incomplete.")
 
-        # Parse EXPLANATION and SQL from the response
-        explanation = ""
-        sql_query = ""
+        # Parse EXPLANATION and SQL from the response, dropping markdown and prose around the query
+        explanation, sql_query = parse_generated_sql(llm_response)
 
-        if "EXPLANATION:" in llm_response and "SQL:" in llm_response:
-            # Split by SQL: to get both parts
-            parts = llm_response.split("SQL:", 1)
-            explanation = parts[0].replace("EXPLANATION:", "").strip()
-            sql_query = parts[1].strip()
-        else:
-            # Fallback if LLM doesn't follow format
-            sql_query = llm_response
-            explanation = "No explanation provided."
-
-        # Remove markdown code blocks if present in SQL
-        sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
-
-        # Remove any English text that appears before the SELECT statement
-        # Look for the first SELECT and take everything from there
-        select_match = re.search(r'\b(SELECT|WITH)\b', sql_query, re.IGNORECASE)
-        if select_match:
-            sql_query = sql_query[select_match.start():]
-
-        # Remove any trailing English explanations after the SQL
-        # SQL should end with a semicolon or the last valid SQL token
-        # Remove anything that looks like prose after the query
-        lines = sql_query.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            stripped = line.strip()
-            # Skip lines that look like English prose (start with capital letter and have spaces but no SQL keywords)
-            if stripped and not stripped[0].isupper() or any(keyword in stripped.upper() for keyword in ['SELECT', 'FROM', 'WHERE', 'JOIN', 'GROUP', 'ORDER', 'LIMIT', 'HAVING', 'AND', 'OR', 'ON', 'AS', 'BY', 'WITH', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'UNION', 'DISTINCT', 'COUNT', 'SUM', 'AVG', 'MAX', 'MIN', 'INNER', 'LEFT', 'RIGHT', 'OUTER', 'CROSS']):
-                cleaned_lines.append(line)
-            elif not stripped:
-                # Keep empty lines for formatting
-                cleaned_lines.append(line)
-        sql_query = '\n'.join(cleaned_lines).strip()
-
-        # Validate that SQL query appears complete (basic sanity check)
-        # Check for common incomplete patterns
-        incomplete_patterns = [
-            r'\s+$',  # Ends with whitespace only
-            r'[,\s]+$',  # Ends with comma or whitespace
-            r'\s+(FROM|WHERE|AND|OR|JOIN|ON|GROUP|ORDER|HAVING)\s*$',  # Ends with SQL keyword
-        ]
-        import re
-        looks_incomplete = any(re.search(pattern, sql_query, re.IGNORECASE) for pattern in incomplete_patterns)
-
-        # Also check for unbalanced parentheses
-        open_parens = sql_query.count('(')
-        close_parens = sql_query.count(')')
-        unbalanced_parens = open_parens != close_parens
-
-        if looks_incomplete or unbalanced_parens or finish_reason == "length":
-            error_msg = "Generated SQL query appears incomplete or truncated."
-            if unbalanced_parens:
-                error_msg += f" Unbalanced parentheses: {open_parens} open, {close_parens} close."
-            if finish_reason == "length":
-                error_msg += " Response hit max_tokens limit."
-            logger.error(error_msg)
+        # Reject SQL that looks cut off (trailing keyword or comma, unbalanced parentheses, max_tokens hit)
+        incomplete_reason = incomplete_sql_reason(sql_query, finish_reason)
+        if incomplete_reason:
+            logger.error(incomplete_reason)
             logger.error(f"Incomplete query: {sql_query[:200]}...")
             raise HTTPException(
                 status_code=500,
-                detail=f"Failed to generate complete SQL query. {error_msg} Please try simplifying your request or selecting fewer columns."
+                detail=f"Failed to generate complete SQL query. {incomplete_reason} Please try simplifying your request or selecting fewer columns."
             )
+        record_span("sql_cleanup", time.perf_counter() - stage_started)
 
         # Extract token usage from response
         prompt_tokens = response.usage.prompt_tokens if response.usage else 0
@@ -1129,6 +1544,7 @@ The response should contain ONLY the EXPLANATION line and the SQL query, nothing
 
         await log_audit_event(
             event_type="sql_generation",
+            session_id=request.session_id,
             catalog=primary_table.catalog,
             schema_name=primary_table.schema_name,
             table_name=primary_table.table,
@@ -1147,7 +1563,8 @@ The response should contain ONLY the EXPLANATION line and the SQL query, nothing
         return {
             "sql_query": sql_query,
             "explanation": explanation,
-            "model_used": request.model_id
+            "model_used": request.model_id,
+            "session_id": request.session_id
         }
     except Exception as e:
         # Calculate execution time for error case
@@ -1158,6 +1575,7 @@ The response should contain ONLY the EXPLANATION line and the SQL query, nothing
         if primary_table:
             await log_audit_event(
                 event_type="sql_generation",
+                session_id=request.session_id,
                 catalog=primary_table.catalog,
                 schema_name=primary_table.schema_name,
                 table_name=primary_table.table,
@@ -1178,43 +1596,45 @@ async def execute_sql(request: SQLExecutionRequest):
     try:
         logger.info(f"Executing SQL query: {request.sql_query[:100]}...")
 
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(request.sql_query)
-
-                # Get column names
-                columns = [desc[0] for desc in cursor.description] if cursor.description else []
-                logger.info(f"Query returned {len(columns)} columns: {columns}")
-
-                # Fetch results
-                rows = cursor.fetchmany(100)  # Limit to 100 rows for safety
-                logger.info(f"Fetched {len(rows)} rows")
-
-                # Convert to list of dicts
-                results = [dict(zip(columns, row)) for row in rows]
-                logger.info(f"Converted {len(results)} results")
-
-                # Calculate execution time
-                execution_time_ms = int((time.time() - start_time) * 1000)
-
-                # Log audit event
-                await log_audit_event(
-                    event_type="sql_execution",
-                    generated_sql=request.sql_query,
-                    execution_time_ms=execution_time_ms,
-                    row_count=len(results),
-                    status="success"
-                )
+        def run_query():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(request.sql_query)
+
+                    # Get column names
+                    columns = column_names(cursor.description)
+                    logger.info(f"Query returned {len(columns)} columns: {columns}")
+
+                    # Fetch results
+                    rows = cursor.fetchmany(100)  # Limit to 100 rows for safety
+                    logger.info(f"Fetched {len(rows)} rows")
+
+                    # Convert to list of dicts
+                    results = rows_to_dicts(columns, rows)
+                    logger.info(f"Converted {len(results)} results")
+                    return columns, results
+
+        columns, results = await warehouse_executor.run(run_query)
+
+        # Calculate execution time
+        execution_time_ms = int((time.time() - start_time) * 1000)
+
+        # Log audit event
+        await log_audit_event(
+            event_type="sql_execution",
+            session_id=request.session_id,
+            generated_sql=request.sql_query,
+            execution_time_ms=execution_time_ms,
+            row_count=len(results),
+            status="success"
+        )
 
-                return {
-                    "columns": columns,
-                    "rows": results,
-                    "row_count": len(results)
-                }
+        return {
+            "columns": columns,
+            "rows": results,
+            "row_count": len(results),
+            "session_id": request.session_id
+        }
     except Exception as e:
         # Calculate execution time for error case
         execution_time_ms = int((time.time() - start_time) * 1000)
@@ -1222,6 +1642,7 @@ async def execute_sql(request: SQLExecutionRequest):
         # Log audit event for error
         await log_audit_event(
             event_type="sql_execution",
+            session_id=request.session_id,
             generated_sql=request.sql_query,
             execution_time_ms=execution_time_ms,
             status="error",
@@ -1231,334 +1652,495 @@ async def execute_sql(request: SQLExecutionRequest):
         logger.error(f"Error executing SQL: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to execute SQL: {str(e)}")
 
+@app.post("/api/execute-sql/stream")
+async def execute_sql_stream(request: SQLStreamRequest):
+    """Execute SQL and stream the result as NDJSON or Arrow IPC, one fetched batch at a time"""
+    if request.format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{request.format}', expected one of: {', '.join(STREAM_FORMATS)}")
+    if request.format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=400, detail="Arrow results are unavailable: pyarrow is not installed")
+    max_rows = min(request.max_rows or SQL_STREAM_MAX_ROWS, SQL_STREAM_MAX_ROWS)
+    if stream_slots.locked():
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many result streams in progress (limit {SQL_STREAM_MAX_CONCURRENT}), retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    # Not locked, so this returns without waiting; close_stream releases it
+    await stream_slots.acquire()
+    start_time = time.time()
+
+    def open_stream():
+        # The connection and cursor stay open until the response has been sent
+        with ExitStack() as stack:
+            connection = stack.enter_context(stream_pool.connection())
+            cursor = stack.enter_context(connection.cursor())
+            cursor.execute(request.sql_query)
+            stream = ResultStream(cursor, request.format, max_rows, SQL_STREAM_BATCH_ROWS,
+                                  header={"session_id": request.session_id})
+            return stream, stack.pop_all()
+
+    async def close_stream(stream, resources, error):
+        """Audit the stream, then release its cursor, connection and slot"""
+        try:
+            await log_audit_event(
+                event_type="sql_execution",
+                session_id=request.session_id,
+                generated_sql=request.sql_query,
+                execution_time_ms=int((time.time() - start_time) * 1000),
+                row_count=stream.row_count,
+                status="error" if error else "success",
+                error_message=str(error) if error else None,
+            )
+            # Fetch errors are passed on so the pool health-checks the connection
+            exc_info = (type(error), error, error.__traceback__) if isinstance(error, Exception) else (None, None, None)
+            await asyncio.to_thread(resources.__exit__, *exc_info)
+        finally:
+            stream_slots.release()
+
+    async def abandon(opening):
+        """Close a stream whose client left while its query ran"""
+        if opening.cancelled() or opening.exception() is not None:
+            stream_slots.release()
+            return
+        await close_stream(*opening.result(), "Client disconnected before the result was sent")
+
+    # Shielded so a disconnect during the query cannot lose the connection it holds
+    opening = asyncio.ensure_future(stream_executor.run(open_stream))
+    try:
+        logger.info(f"Streaming SQL query ({request.format}, max {max_rows} rows): {request.sql_query[:100]}...")
+        stream, resources = await asyncio.shield(opening)
+    except asyncio.CancelledError:
+        opening.add_done_callback(lambda done: asyncio.ensure_future(abandon(done)))
+        raise
+    except Exception as e:
+        stream_slots.release()
+        await log_audit_event(
+            event_type="sql_execution",
+            session_id=request.session_id,
+            generated_sql=request.sql_query,
+            execution_time_ms=int((time.time() - start_time) * 1000),
+            status="error",
+            error_message=str(e)
+        )
+        logger.error(f"Error executing SQL: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to execute SQL: {str(e)}")
+
+    error = None
+    fetch = None
+
+    async def body():
+        nonlocal error, fetch
+        try:
+            # The next batch is fetched only once the previous one has been sent
+            while True:
+                fetch = asyncio.ensure_future(stream_executor.run(stream.next_chunk))
+                chunk = await asyncio.shield(fetch)
+                if chunk is None:
+                    break
+                yield chunk
+        except Exception as e:
+            error = e
+            logger.error(f"Error streaming SQL results after {stream.row_count} rows: {str(e)}", exc_info=True)
+            if stream.format == "ndjson":
+                yield error_line(e)
+
+    async def on_close():
+        # A disconnect can interrupt us mid-fetch; the cursor is closed only after that fetch returns
+        if fetch is not None and not fetch.done():
+            await asyncio.wait([fetch])
+        failure = error
+        if failure is None and not stream.done:
+            failure = "Client disconnected or stopped reading before the result was sent"
+        await close_stream(stream, resources, failure)
+
+    return TimedStreamingResponse(
+        body(),
+        send_timeout=SQL_STREAM_SEND_TIMEOUT_SECONDS,
+        on_close=on_close,
+        media_type=stream.media_type,
+        headers={"X-Session-Id": request.session_id, "X-Max-Rows": str(max_rows)},
+    )
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match covers ``etag``"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+async def cached_analytics(request: Request, name: str, loader, *params):
+    """Serve an analytics payload from the shared cache, answering 304 when the client's ETag is current"""
+    async def load():
+        payload = jsonable_encoder(await loader())
+        return payload, analytics_etag(payload)
+
+    payload, etag = await analytics_cache.get_or_load((name,) + params, load)
+    return analytics_response(request, payload, etag)
+
+def analytics_etag(payload: Any) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+
+def analytics_response(request: Request, payload: Any, etag: str) -> Response:
+    # no-cache: browsers keep the copy but revalidate, which costs a 304 rather than a query
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+# Aggregates shared by the individual analytics endpoints and /api/analytics/bundle.
+# Explicit casts keep decimals out of the Arrow result.
+LLM_EVENT_TYPES_SQL = "('business_logic_suggestion', 'sql_generation')"
+
+DASHBOARD_STATISTICS_SQL = f"""
+                            CAST(COUNT_IF(event_type = 'sql_execution') AS BIGINT) AS total_executions,
+                            CAST(COUNT_IF(event_type IN {LLM_EVENT_TYPES_SQL}) AS BIGINT) AS total_llm_calls,
+                            CAST(AVG(CASE WHEN event_type = 'sql_execution' AND status = 'success'
+                                          THEN execution_time_ms END) AS DOUBLE) AS avg_execution_time_ms,
+                            CAST(COUNT(*) AS BIGINT) AS total_records,
+                            CAST(COUNT_IF(status = 'success') AS BIGINT) AS successful_records,
+                            CAST(COALESCE(SUM(CASE WHEN event_type = 'sql_execution' AND status = 'success'
+                                                   THEN row_count END), 0) AS BIGINT) AS total_rows,
+                            CAST(COUNT(DISTINCT table_name) AS BIGINT) AS unique_tables"""
+
+# Per-session metrics for top queries; only successful events count
+TOP_QUERY_METRICS_SQL = f"""
+                            MIN(CASE WHEN status = 'success' THEN timestamp END) as timestamp,
+                            MAX(CASE WHEN status = 'success' AND event_type IN {LLM_EVENT_TYPES_SQL} THEN catalog END) as catalog,
+                            MAX(CASE WHEN status = 'success' AND event_type IN {LLM_EVENT_TYPES_SQL} THEN schema_name END) as schema_name,
+                            MAX(CASE WHEN status = 'success' AND event_type IN {LLM_EVENT_TYPES_SQL} THEN table_name END) as table_name,
+                            MAX(CASE WHEN status = 'success' AND event_type = 'sql_generation' THEN LEFT(generated_sql, {PREVIEW_CHARS}) END) as generated_sql_preview,
+                            MAX(CASE WHEN status = 'success' AND event_type = 'sql_generation' THEN LEFT(business_logic, {PREVIEW_CHARS}) END) as business_logic_preview,
+                            SUM(CASE WHEN status = 'success' THEN estimated_cost_usd ELSE 0 END) as total_cost_usd,
+                            SUM(CASE WHEN status = 'success' THEN execution_time_ms ELSE 0 END) as total_time_ms,
+                            SUM(CASE WHEN status = 'success' THEN prompt_tokens + completion_tokens ELSE 0 END) as total_tokens,
+                            MAX(CASE WHEN status = 'success' AND event_type = 'sql_execution' THEN row_count END) as row_count,
+                            MAX(CASE WHEN status = 'success' AND event_type = 'sql_execution' THEN execution_time_ms END) as sql_execution_time_ms"""
+
+# The most recent sessions with a successful event, ranked the same way by
+# /api/analytics/top-queries and /api/analytics/bundle
+TOP_QUERIES_SQL = f"""
+                        SELECT *
+                        FROM (
+                            SELECT
+                                session_id,{TOP_QUERY_METRICS_SQL}
+                            FROM arao.text_to_sql.audit_logs
+                            WHERE status = 'success' AND session_id IS NOT NULL
+                            GROUP BY session_id
+                        ) AS query_metrics
+                        WHERE timestamp IS NOT NULL
+                        ORDER BY timestamp DESC
+                        LIMIT 100"""
+
+TOP_QUERY_COLUMNS = (
+    "session_id", "timestamp", "catalog", "schema_name", "table_name", "generated_sql_preview", "business_logic_preview",
+    "total_cost_usd", "total_time_ms", "total_tokens", "row_count", "sql_execution_time_ms",
+)
+
+
+# Overall LLM statistics over the hourly rollup. Distinct sessions are estimated by
+# merging the per-hour HLL sketches.
+ANALYTICS_SUMMARY_SQL = f"""
+                            COALESCE(hll_sketch_estimate(hll_union_agg(session_sketch)), 0) as total_queries,
+                            COUNT(DISTINCT CASE WHEN event_type IN {LLM_EVENT_TYPES_SQL} THEN model_id END) as unique_models_used,
+                            SUM(CASE WHEN status = 'success' THEN cost_usd END)
+                                / NULLIF(SUM(CASE WHEN status = 'success' THEN cost_count END), 0) as avg_cost_per_query,
+                            MAX(CASE WHEN status = 'success' THEN max_cost_usd END) as max_cost_query,
+                            MIN(CASE WHEN status = 'success' THEN min_positive_cost_usd END) as min_cost_query,
+                            SUM(CASE WHEN status = 'success' THEN latency_ms_sum END)
+                                / NULLIF(SUM(CASE WHEN status = 'success' THEN latency_count END), 0) as avg_time_per_event,
+                            MAX(CASE WHEN status = 'success' THEN latency_ms_max END) as max_time_event,
+                            SUM(CASE WHEN status = 'success' THEN prompt_tokens END) as total_prompt_tokens,
+                            SUM(CASE WHEN status = 'success' THEN completion_tokens END) as total_completion_tokens,
+                            SUM(CASE WHEN event_type = 'sql_execution' AND status = 'success' THEN row_count_sum END)
+                                / NULLIF(SUM(CASE WHEN event_type = 'sql_execution' AND status = 'success' THEN row_count_count END), 0) as avg_rows_returned,
+                            SUM(CASE WHEN status = 'success' THEN cost_usd END) as total_cost_usd"""
+
+
+def summarize_dashboard_statistics(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Dashboard payload from a DASHBOARD_STATISTICS_SQL row"""
+    total_executions = int(stats.get('total_executions') or 0)
+    total_llm_calls = int(stats.get('total_llm_calls') or 0)
+    avg_execution_time = int(stats.get('avg_execution_time_ms') or 0)
+
+    total_records = int(stats.get('total_records') or 0)
+    successful_records = int(stats.get('successful_records') or 0)
+    success_rate = round((successful_records * 100.0 / total_records), 2) if total_records > 0 else 0.0
+
+    total_rows = int(stats.get('total_rows') or 0)
+    unique_tables = int(stats.get('unique_tables') or 0)
+
+    logger.info(f"Dashboard stats - total_executions: {total_executions}, total_llm_calls: {total_llm_calls}")
+    logger.info(f"Dashboard stats - avg_time: {avg_execution_time}, success_rate: {success_rate}")
+    logger.info(f"Dashboard stats - total_rows: {total_rows}, unique_tables: {unique_tables}")
+
+    return {
+        "total_executions": total_executions,
+        "total_llm_calls": total_llm_calls,
+        "avg_execution_time_ms": avg_execution_time,
+        "success_rate": success_rate,
+        "total_rows_returned": total_rows,
+        "unique_tables_analyzed": unique_tables
+    }
+
+def summarize_llm_costs(models: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Costs payload from per-model rows ordered by cost"""
+    total_cost = 0
+    total_prompt_tokens = 0
+    total_completion_tokens = 0
+
+    for record in models:
+        total_cost += record['total_cost'] or 0
+        total_prompt_tokens += record['total_prompt_tokens'] or 0
+        total_completion_tokens += record['total_completion_tokens'] or 0
+
+    return {
+        "models": models,
+        "total_cost": total_cost,
+        "total_prompt_tokens": total_prompt_tokens,
+        "total_completion_tokens": total_completion_tokens
+    }
+
+def summarize_llm_usage(llm_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Usage rankings from per-model rows ordered by usage"""
+    # Sort by different metrics
+    most_used = sorted(llm_stats, key=lambda x: x['usage_count'], reverse=True)[:5]
+    most_costly = sorted(llm_stats, key=lambda x: x['total_cost'] or 0, reverse=True)[:5]
+    slowest = sorted(llm_stats, key=lambda x: x['avg_execution_time'] or 0, reverse=True)[:5]
+    fastest = sorted(llm_stats, key=lambda x: x['avg_execution_time'] or float('inf'))[:5]
+
+    return {
+        "most_used": most_used,
+        "most_costly": most_costly,
+        "slowest": slowest,
+        "fastest": fastest,
+        "all_models": llm_stats
+    }
+
+def summarize_top_queries(queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Top query rankings from per-session rows, newest first"""
+    # Sort by different metrics
+    most_costly = sorted(queries, key=lambda x: x['total_cost_usd'] or 0, reverse=True)[:10]
+    slowest_total = sorted(queries, key=lambda x: x['total_time_ms'] or 0, reverse=True)[:10]
+    slowest_execution = sorted(
+        [q for q in queries if q.get('sql_execution_time_ms')],
+        key=lambda x: x['sql_execution_time_ms'] or 0,
+        reverse=True
+    )[:10]
+    most_rows = sorted(
+        [q for q in queries if q.get('row_count')],
+        key=lambda x: x['row_count'] or 0,
+        reverse=True
+    )[:10]
+
+    return {
+        "most_costly": most_costly,
+        "slowest_total_time": slowest_total,
+        "slowest_execution": slowest_execution,
+        "most_rows_returned": most_rows,
+        "recent_queries": queries[:20]
+    }
+
+def summarize_analytics(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary payload from an ANALYTICS_SUMMARY_SQL row"""
+    # Cost efficiency (tokens per dollar)
+    total_tokens = (summary.get('total_prompt_tokens') or 0) + (summary.get('total_completion_tokens') or 0)
+    total_cost = summary.get('total_cost_usd') or 0
+    summary['tokens_per_dollar'] = total_tokens / total_cost if total_cost > 0 else 0
+    return summary
+
 @app.get("/api/dashboard-statistics")
-async def get_dashboard_statistics():
-    """Get dashboard statistics from audit logs - using SELECT * approach like query-history"""
+async def get_dashboard_statistics(request: Request):
+    """Get dashboard statistics from audit logs in one aggregate query"""
     try:
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                # Fetch ALL audit log records and aggregate in Python
-                # This avoids the pandas/Arrow conversion issues with SQL aggregates
-                cursor.execute("""
-                    SELECT
-                        event_type,
-                        execution_time_ms,
-                        row_count,
-                        status,
-                        table_name
-                    FROM arao.text_to_sql.audit_logs
-                """)
+        def fetch_statistics():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    # Aggregate in the warehouse so the response costs one row whatever the history size
+                    cursor.execute(f"""
+                        SELECT{DASHBOARD_STATISTICS_SQL}
+                        FROM arao.text_to_sql.audit_logs
+                    """)
 
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
-
-                # Convert to list of dicts
-                records = [dict(zip(columns, row)) for row in rows]
-
-                # Aggregate in Python
-                total_executions = sum(1 for r in records if r['event_type'] == 'sql_execution')
-                total_llm_calls = sum(1 for r in records if r['event_type'] in ('business_logic_suggestion', 'sql_generation'))
-
-                # Average execution time for SQL executions
-                sql_execution_times = [r['execution_time_ms'] for r in records
-                                      if r['event_type'] == 'sql_execution'
-                                      and r['status'] == 'success'
-                                      and r['execution_time_ms'] is not None]
-                avg_execution_time = int(sum(sql_execution_times) / len(sql_execution_times)) if sql_execution_times else 0
-
-                # Success rate
-                total_records = len(records)
-                successful_records = sum(1 for r in records if r['status'] == 'success')
-                success_rate = round((successful_records * 100.0 / total_records), 2) if total_records > 0 else 0.0
-
-                # Total rows returned
-                total_rows = sum(r['row_count'] for r in records
-                               if r['event_type'] == 'sql_execution'
-                               and r['status'] == 'success'
-                               and r['row_count'] is not None)
-
-                # Unique tables
-                unique_tables = len(set(r['table_name'] for r in records if r['table_name'] is not None))
-
-                logger.info(f"Dashboard stats - total_executions: {total_executions}, total_llm_calls: {total_llm_calls}")
-                logger.info(f"Dashboard stats - avg_time: {avg_execution_time}, success_rate: {success_rate}")
-                logger.info(f"Dashboard stats - total_rows: {total_rows}, unique_tables: {unique_tables}")
-
-                return {
-                    "total_executions": total_executions,
-                    "total_llm_calls": total_llm_calls,
-                    "avg_execution_time_ms": avg_execution_time,
-                    "success_rate": success_rate,
-                    "total_rows_returned": total_rows,
-                    "unique_tables_analyzed": unique_tables
-                }
+                    columns = [desc[0] for desc in cursor.description]
+                    row = cursor.fetchone()
+                    return summarize_dashboard_statistics(dict(zip(columns, row)) if row else {})
+
+        return await cached_analytics(request, "dashboard-statistics", lambda: warehouse_executor.run(fetch_statistics))
     except Exception as e:
         logger.error(f"Error fetching dashboard statistics: {str(e)}", exc_info=True)
         # Return default values instead of failing
-        return {
-            "total_executions": 0,
-            "total_llm_calls": 0,
-            "avg_execution_time_ms": 0,
-            "success_rate": 0.0,
-            "total_rows_returned": 0,
-            "unique_tables_analyzed": 0
-        }
+        return summarize_dashboard_statistics({})
 
 @app.get("/api/query-history")
-async def get_query_history():
-    """Get query history with grouped LLM calls and execution details"""
+async def get_query_history(
+    request: Request,
+    limit: int = Query(QUERY_HISTORY_PAGE_SIZE, ge=1, le=QUERY_HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    model_id: Optional[str] = None,
+    table: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """Get compact query history rows grouped by session, newest first; pass next_cursor back for the following page"""
+    if status is not None and status not in SESSION_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(SESSION_STATUSES)}")
     try:
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                # Get all events ordered by timestamp ASC for proper grouping
-                cursor.execute("""
-                    SELECT
-                        log_id,
-                        timestamp,
-                        event_type,
-                        catalog,
-                        schema_name,
-                        table_name,
-                        columns,
-                        business_logic,
-                        generated_sql,
-                        model_id,
-                        execution_time_ms,
-                        row_count,
-                        status,
-                        error_message,
-                        prompt_tokens,
-                        completion_tokens,
-                        total_tokens,
-                        estimated_cost_usd,
-                        business_logic_length,
-                        generated_sql_length
-                    FROM arao.text_to_sql.audit_logs
-                    ORDER BY timestamp ASC
-                    LIMIT 200
-                """)
-
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Compared with audit timestamps, which are naive UTC
+    start = to_utc(start) if start else None
+    end = to_utc(end) if end else None
 
-                # Group events by table and timestamp proximity (within 30 seconds)
-                # IMPORTANT: Now handles queries without business_logic_suggestion
-                query_sessions = []
-                current_session = None
-
-                for row in rows:
-                    record = dict(zip(columns, row))
-                    if record.get('timestamp'):
-                        record['timestamp'] = record['timestamp'].isoformat()
-
-                    event_type = record['event_type']
-
-                    # Start a new session if we encounter a business_logic_suggestion
-                    if event_type == 'business_logic_suggestion':
-                        if current_session:
-                            query_sessions.append(current_session)
-                        current_session = {
-                            'session_id': record['log_id'],
-                            'timestamp': record['timestamp'],
-                            'table_name': record['table_name'],
-                            'catalog': record['catalog'],
-                            'schema_name': record['schema_name'],
-                            'columns': record['columns'],
-                            'business_logic': record['business_logic'],
-                            'business_logic_suggestion': record,
-                            'sql_generation': None,
-                            'sql_execution': None,
-                            'total_cost_usd': record['estimated_cost_usd'] or 0,
-                            'total_tokens': record['total_tokens'] or 0,
-                            'total_time_ms': record['execution_time_ms'] or 0,
-                            'status': 'incomplete'
-                        }
-
-                    # Handle sql_generation - add to current session OR create new session if orphaned
-                    elif event_type == 'sql_generation':
-                        if current_session:
-                            # Add to existing session
-                            current_session['sql_generation'] = record
-                            current_session['generated_sql'] = record['generated_sql']
-                            current_session['total_cost_usd'] += record['estimated_cost_usd'] or 0
-                            current_session['total_tokens'] += record['total_tokens'] or 0
-                            current_session['total_time_ms'] += record['execution_time_ms'] or 0
-                        else:
-                            # Create new session starting with sql_generation (no suggestion)
-                            current_session = {
-                                'session_id': record['log_id'],
-                                'timestamp': record['timestamp'],
-                                'table_name': record['table_name'],
-                                'catalog': record['catalog'],
-                                'schema_name': record['schema_name'],
-                                'columns': record['columns'],
-                                'business_logic': record['business_logic'],
-                                'business_logic_suggestion': None,
-                                'sql_generation': record,
-                                'sql_execution': None,
-                                'generated_sql': record['generated_sql'],
-                                'total_cost_usd': record['estimated_cost_usd'] or 0,
-                                'total_tokens': record['total_tokens'] or 0,
-                                'total_time_ms': record['execution_time_ms'] or 0,
-                                'status': 'incomplete'
-                            }
-
-                    # Handle sql_execution - add to current session OR create standalone entry
-                    elif event_type == 'sql_execution':
-                        if current_session:
-                            # Add to existing session and complete it
-                            current_session['sql_execution'] = record
-                            current_session['row_count'] = record['row_count']
-                            current_session['total_time_ms'] += record['execution_time_ms'] or 0
-                            current_session['status'] = record['status']
-                            # Execution marks end of session
-                            query_sessions.append(current_session)
-                            current_session = None
-                        else:
-                            # Create standalone execution entry (orphaned execution)
-                            query_sessions.append({
-                                'session_id': record['log_id'],
-                                'timestamp': record['timestamp'],
-                                'table_name': record['table_name'],
-                                'catalog': record['catalog'],
-                                'schema_name': record['schema_name'],
-                                'columns': record['columns'],
-                                'business_logic': None,
-                                'business_logic_suggestion': None,
-                                'sql_generation': None,
-                                'sql_execution': record,
-                                'generated_sql': record['generated_sql'],
-                                'row_count': record['row_count'],
-                                'total_cost_usd': 0,
-                                'total_tokens': 0,
-                                'total_time_ms': record['execution_time_ms'] or 0,
-                                'status': record['status']
-                            })
-
-                # Add last session if exists (incomplete session)
-                if current_session:
-                    query_sessions.append(current_session)
-
-                # Reverse to show most recent first
-                query_sessions.reverse()
-
-                return {
-                    "query_sessions": query_sessions,
-                    "total_count": len(query_sessions)
-                }
+    try:
+        def fetch_history():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    # Scan a bounded slice of the log, widening it only while it holds less than a page
+                    for since in lookback_windows(utc_now(), position, start, end):
+                        # One extra row tells us whether another page exists
+                        sql, params = build_session_page(
+                            AUDIT_LOG_TABLE, limit + 1, position,
+                            model_id=model_id, table_name=table, status=status, start=since, end=end,
+                        )
+                        cursor.execute(sql, params)
+                        rows = cursor.fetchall()
+                        if len(rows) > limit:
+                            break
+                    return build_history_page(column_names(cursor.description), rows, limit)
+
+        return await cached_analytics(
+            request, "query-history", lambda: warehouse_executor.run(fetch_history),
+            limit, cursor, model_id, table, status, start, end,
+        )
     except Exception as e:
         logger.error(f"Error fetching query history: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to fetch query history: {str(e)}")
 
+@app.get("/api/query-history/{log_id}")
+async def get_query_history_detail(request: Request, log_id: str):
+    """Get the events and full text of one history session, by session id or the log_id of any of its events"""
+    try:
+        def fetch_detail():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    sql, params = build_session_events(AUDIT_LOG_TABLE, log_id)
+                    cursor.execute(sql, params)
+                    columns = [desc[0] for desc in cursor.description]
+                    events = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            if not events:
+                raise HTTPException(status_code=404, detail=f"No query history for {log_id}")
+            return assemble_session({"session_id": session_key(events)}, events)
+
+        return await cached_analytics(
+            request, "query-history/detail", lambda: warehouse_executor.run(fetch_detail), log_id,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching query history detail: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch query history detail: {str(e)}")
+
 @app.get("/api/llm-analytics")
-async def get_llm_analytics():
+async def get_llm_analytics(request: Request):
     """Get detailed LLM analytics per query"""
     try:
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                # Get per-query LLM costs and details
-                cursor.execute("""
-                    SELECT
-                        log_id,
-                        timestamp,
-                        event_type,
-                        table_name,
-                        business_logic,
-                        generated_sql,
-                        model_id,
-                        prompt_tokens,
-                        completion_tokens,
-                        total_tokens,
-                        estimated_cost_usd,
-                        business_logic_length,
-                        generated_sql_length,
-                        execution_time_ms,
-                        status
-                    FROM arao.text_to_sql.audit_logs
-                    WHERE event_type IN ('business_logic_suggestion', 'sql_generation')
-                    ORDER BY timestamp DESC
-                    LIMIT 100
-                """)
+        def fetch_llm_analytics():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    # Per-call LLM costs with text previews; full text via /api/query-history/{log_id}
+                    cursor.execute(f"""
+                        SELECT
+                            log_id,
+                            session_id,
+                            timestamp,
+                            event_type,
+                            table_name,
+                            LEFT(business_logic, {PREVIEW_CHARS}) as business_logic_preview,
+                            LEFT(generated_sql, {PREVIEW_CHARS}) as generated_sql_preview,
+                            model_id,
+                            prompt_tokens,
+                            completion_tokens,
+                            total_tokens,
+                            estimated_cost_usd,
+                            business_logic_length,
+                            generated_sql_length,
+                            execution_time_ms,
+                            status
+                        FROM arao.text_to_sql.audit_logs
+                        WHERE event_type IN ('business_logic_suggestion', 'sql_generation')
+                        ORDER BY timestamp DESC
+                        LIMIT 100
+                    """)
 
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                    rows = cursor.fetchall()
 
-                analytics = []
-                for row in rows:
-                    record = dict(zip(columns, row))
-                    # Convert timestamp to ISO format
-                    if record.get('timestamp'):
-                        record['timestamp'] = record['timestamp'].isoformat()
-                    analytics.append(record)
+                    analytics = []
+                    for row in rows:
+                        record = dict(zip(columns, row))
+                        # Convert timestamp to ISO format
+                        if record.get('timestamp'):
+                            record['timestamp'] = record['timestamp'].isoformat()
+                        analytics.append(record)
 
-                # Get aggregate LLM metrics
-                cursor.execute("""
-                    SELECT
-                        SUM(prompt_tokens) as total_prompt_tokens,
-                        SUM(completion_tokens) as total_completion_tokens,
-                        SUM(total_tokens) as total_tokens,
-                        SUM(estimated_cost_usd) as total_cost,
-                        AVG(estimated_cost_usd) as avg_cost_per_call,
-                        COUNT(*) as total_llm_calls
-                    FROM arao.text_to_sql.audit_logs
-                    WHERE event_type IN ('business_logic_suggestion', 'sql_generation')
-                    AND status = 'success'
-                """)
+                    # Get aggregate LLM metrics from the hourly rollup
+                    cursor.execute(f"""
+                        SELECT
+                            SUM(prompt_tokens) as total_prompt_tokens,
+                            SUM(completion_tokens) as total_completion_tokens,
+                            SUM(total_tokens) as total_tokens,
+                            SUM(cost_usd) as total_cost,
+                            SUM(cost_usd) / NULLIF(SUM(cost_count), 0) as avg_cost_per_call,
+                            SUM(event_count) as total_llm_calls
+                        FROM {AUDIT_ROLLUP_SOURCE}
+                        WHERE event_type IN ('business_logic_suggestion', 'sql_generation')
+                        AND status = 'success'
+                    """)
+
+                    agg_row = cursor.fetchone()
+                    aggregates = {
+                        "total_prompt_tokens": int(agg_row[0] or 0),
+                        "total_completion_tokens": int(agg_row[1] or 0),
+                        "total_tokens": int(agg_row[2] or 0),
+                        "total_cost_usd": round(float(agg_row[3] or 0), 4),
+                        "avg_cost_per_call_usd": round(float(agg_row[4] or 0), 6),
+                        "total_llm_calls": int(agg_row[5] or 0)
+                    }
 
-                agg_row = cursor.fetchone()
-                aggregates = {
-                    "total_prompt_tokens": int(agg_row[0] or 0),
-                    "total_completion_tokens": int(agg_row[1] or 0),
-                    "total_tokens": int(agg_row[2] or 0),
-                    "total_cost_usd": round(float(agg_row[3] or 0), 4),
-                    "avg_cost_per_call_usd": round(float(agg_row[4] or 0), 6),
-                    "total_llm_calls": int(agg_row[5] or 0)
-                }
-
-                return {
-                    "details": analytics,
-                    "aggregates": aggregates
-                }
+                    return {
+                        "details": analytics,
+                        "aggregates": aggregates
+                    }
+
+        return await cached_analytics(request, "llm-analytics", lambda: warehouse_executor.run(fetch_llm_analytics))
     except Exception as e:
         logger.error(f"Error fetching LLM analytics: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to fetch LLM analytics: {str(e)}")
 
 @app.get("/api/llm-costs-by-model")
-async def get_llm_costs_by_model():
+async def get_llm_costs_by_model(request: Request):
     """Get aggregated LLM costs grouped by model"""
 
     def fetch_costs():
         """Run blocking SQL query in thread pool"""
         try:
-            with sql.connect(
-                server_hostname=DATABRICKS_HOST.replace("https://", ""),
-                http_path=DATABRICKS_HTTP_PATH,
-                access_token=DATABRICKS_TOKEN,
-                _socket_timeout=3  # 3 second socket timeout
-            ) as connection:
+            with warehouse_pool.connection() as connection:
                 with connection.cursor() as cursor:
-                    # Get costs aggregated by model
-                    cursor.execute("""
+                    # Get costs aggregated by model from the hourly rollup
+                    cursor.execute(f"""
                         SELECT
                             model_id,
                             SUM(prompt_tokens) as total_prompt_tokens,
                             SUM(completion_tokens) as total_completion_tokens,
                             SUM(total_tokens) as total_tokens,
-                            SUM(estimated_cost_usd) as total_cost,
-                            COUNT(*) as call_count
-                        FROM arao.text_to_sql.audit_logs
+                            SUM(cost_usd) as total_cost,
+                            SUM(event_count) as call_count
+                        FROM {AUDIT_ROLLUP_SOURCE}
                         WHERE event_type IN ('business_logic_suggestion', 'sql_generation')
                         AND status = 'success'
                         AND model_id IS NOT NULL
@@ -1567,38 +2149,18 @@ async def get_llm_costs_by_model():
                     """)
 
                     columns = [desc[0] for desc in cursor.description]
-                    rows = cursor.fetchall()
-
-                    models = []
-                    total_cost = 0
-                    total_prompt_tokens = 0
-                    total_completion_tokens = 0
-
-                    for row in rows:
-                        record = dict(zip(columns, row))
-                        models.append(record)
-                        total_cost += record['total_cost'] or 0
-                        total_prompt_tokens += record['total_prompt_tokens'] or 0
-                        total_completion_tokens += record['total_completion_tokens'] or 0
-
-                    return {
-                        "models": models,
-                        "total_cost": total_cost,
-                        "total_prompt_tokens": total_prompt_tokens,
-                        "total_completion_tokens": total_completion_tokens
-                    }
+                    return summarize_llm_costs([dict(zip(columns, row)) for row in cursor.fetchall()])
         except Exception as e:
             logger.warning(f"Error fetching LLM costs: {str(e)}")
             raise
 
     try:
-        # Run blocking query in thread pool with timeout
-        import asyncio
-        result = await asyncio.wait_for(
-            asyncio.to_thread(fetch_costs),
+        # Run blocking query in thread pool with timeout; the timeout applies to the
+        # shared refresh, so a timed-out load is simply not cached
+        return await cached_analytics(request, "llm-costs-by-model", lambda: asyncio.wait_for(
+            warehouse_executor.run(fetch_costs),
             timeout=5.0  # 5 second total timeout
-        )
-        return result
+        ))
     except asyncio.TimeoutError:
         logger.warning("LLM costs query timed out after 5 seconds")
         return {
@@ -1618,166 +2180,225 @@ async def get_llm_costs_by_model():
         }
 
 @app.get("/api/analytics/llm-usage")
-async def get_llm_usage_analytics():
+async def get_llm_usage_analytics(request: Request):
     """Get detailed LLM usage analytics including most used, most costly, and slowest models"""
     try:
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                # Most used LLMs
-                cursor.execute("""
-                    SELECT
-                        model_id,
-                        COUNT(*) as usage_count,
-                        SUM(estimated_cost_usd) as total_cost,
-                        AVG(execution_time_ms) as avg_execution_time,
-                        SUM(prompt_tokens) as total_prompt_tokens,
-                        SUM(completion_tokens) as total_completion_tokens
-                    FROM arao.text_to_sql.audit_logs
-                    WHERE event_type IN ('business_logic_suggestion', 'sql_generation')
-                    AND status = 'success'
-                    AND model_id IS NOT NULL
-                    GROUP BY model_id
-                    ORDER BY usage_count DESC
-                """)
+        def fetch_usage():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    # Most used LLMs, from the hourly rollup
+                    cursor.execute(f"""
+                        SELECT
+                            model_id,
+                            SUM(event_count) as usage_count,
+                            SUM(cost_usd) as total_cost,
+                            SUM(latency_ms_sum) / NULLIF(SUM(latency_count), 0) as avg_execution_time,
+                            SUM(prompt_tokens) as total_prompt_tokens,
+                            SUM(completion_tokens) as total_completion_tokens
+                        FROM {AUDIT_ROLLUP_SOURCE}
+                        WHERE event_type IN ('business_logic_suggestion', 'sql_generation')
+                        AND status = 'success'
+                        AND model_id IS NOT NULL
+                        GROUP BY model_id
+                        ORDER BY usage_count DESC
+                    """)
 
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                    return summarize_llm_usage([dict(zip(columns, row)) for row in cursor.fetchall()])
 
-                llm_stats = []
-                for row in rows:
-                    record = dict(zip(columns, row))
-                    llm_stats.append(record)
-
-                # Sort by different metrics
-                most_used = sorted(llm_stats, key=lambda x: x['usage_count'], reverse=True)[:5]
-                most_costly = sorted(llm_stats, key=lambda x: x['total_cost'] or 0, reverse=True)[:5]
-                slowest = sorted(llm_stats, key=lambda x: x['avg_execution_time'] or 0, reverse=True)[:5]
-                fastest = sorted(llm_stats, key=lambda x: x['avg_execution_time'] or float('inf'))[:5]
-
-                return {
-                    "most_used": most_used,
-                    "most_costly": most_costly,
-                    "slowest": slowest,
-                    "fastest": fastest,
-                    "all_models": llm_stats
-                }
+        return await cached_analytics(request, "analytics/llm-usage", lambda: warehouse_executor.run(fetch_usage))
     except Exception as e:
         logger.error(f"Error fetching LLM usage analytics: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to fetch LLM usage analytics: {str(e)}")
 
 @app.get("/api/analytics/top-queries")
-async def get_top_queries_analytics():
+async def get_top_queries_analytics(request: Request):
     """Get analytics about top queries - most costly, slowest, longest execution"""
     try:
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
-            with connection.cursor() as cursor:
-                # Get query sessions with aggregated metrics
-                cursor.execute("""
-                    WITH query_metrics AS (
-                        SELECT
-                            session_id,
-                            MAX(CASE WHEN event_type = 'query_session_start' THEN timestamp END) as timestamp,
-                            MAX(CASE WHEN event_type = 'query_session_start' THEN catalog END) as catalog,
-                            MAX(CASE WHEN event_type = 'query_session_start' THEN schema_name END) as schema_name,
-                            MAX(CASE WHEN event_type = 'query_session_start' THEN table_name END) as table_name,
-                            MAX(CASE WHEN event_type = 'sql_generation' THEN generated_sql END) as generated_sql,
-                            MAX(CASE WHEN event_type = 'sql_generation' THEN business_logic END) as business_logic,
-                            SUM(CASE WHEN status = 'success' THEN estimated_cost_usd ELSE 0 END) as total_cost_usd,
-                            SUM(CASE WHEN status = 'success' THEN execution_time_ms ELSE 0 END) as total_time_ms,
-                            SUM(CASE WHEN status = 'success' THEN prompt_tokens + completion_tokens ELSE 0 END) as total_tokens,
-                            MAX(CASE WHEN event_type = 'sql_execution' THEN row_count END) as row_count,
-                            MAX(CASE WHEN event_type = 'sql_execution' THEN execution_time_ms END) as sql_execution_time_ms
-                        FROM arao.text_to_sql.audit_logs
-                        WHERE status = 'success'
-                        GROUP BY session_id
-                    )
-                    SELECT *
-                    FROM query_metrics
-                    WHERE timestamp IS NOT NULL
-                    ORDER BY timestamp DESC
-                    LIMIT 100
-                """)
+        def fetch_top_queries():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    # Get query sessions with aggregated metrics
+                    cursor.execute(TOP_QUERIES_SQL)
 
-                columns = [desc[0] for desc in cursor.description]
-                rows = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                    return summarize_top_queries([dict(zip(columns, row)) for row in cursor.fetchall()])
 
-                queries = []
-                for row in rows:
-                    record = dict(zip(columns, row))
-                    queries.append(record)
-
-                # Sort by different metrics
-                most_costly = sorted(queries, key=lambda x: x['total_cost_usd'] or 0, reverse=True)[:10]
-                slowest_total = sorted(queries, key=lambda x: x['total_time_ms'] or 0, reverse=True)[:10]
-                slowest_execution = sorted(
-                    [q for q in queries if q.get('sql_execution_time_ms')],
-                    key=lambda x: x['sql_execution_time_ms'] or 0,
-                    reverse=True
-                )[:10]
-                most_rows = sorted(
-                    [q for q in queries if q.get('row_count')],
-                    key=lambda x: x['row_count'] or 0,
-                    reverse=True
-                )[:10]
-
-                return {
-                    "most_costly": most_costly,
-                    "slowest_total_time": slowest_total,
-                    "slowest_execution": slowest_execution,
-                    "most_rows_returned": most_rows,
-                    "recent_queries": queries[:20]
-                }
+        return await cached_analytics(request, "analytics/top-queries", lambda: warehouse_executor.run(fetch_top_queries))
     except Exception as e:
         logger.error(f"Error fetching top queries analytics: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to fetch top queries analytics: {str(e)}")
 
 @app.get("/api/analytics/summary")
-async def get_analytics_summary():
+async def get_analytics_summary(request: Request):
     """Get comprehensive analytics summary with comparisons and trends"""
     try:
-        with sql.connect(
-            server_hostname=DATABRICKS_HOST.replace("https://", ""),
-            http_path=DATABRICKS_HTTP_PATH,
-            access_token=DATABRICKS_TOKEN
-        ) as connection:
+        def fetch_summary():
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    # Overall statistics with comparisons, from the hourly rollup
+                    cursor.execute(f"""
+                        SELECT{ANALYTICS_SUMMARY_SQL}
+                        FROM {AUDIT_ROLLUP_SOURCE}
+                    """)
+
+                    row = cursor.fetchone()
+                    columns = [desc[0] for desc in cursor.description]
+                    return summarize_analytics(dict(zip(columns, row)) if row else {})
+
+        return await cached_analytics(request, "analytics/summary", lambda: warehouse_executor.run(fetch_summary))
+    except Exception as e:
+        logger.error(f"Error fetching analytics summary: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch analytics summary: {str(e)}")
+
+@app.get("/api/analytics/latency")
+async def get_latency_analytics(request: Request, range_name: str = Query("24h", alias="range")):
+    """Get p50/p95/p99 latency of LLM calls and warehouse executions per model, event type and time bucket"""
+    if range_name not in RANGES:
+        raise HTTPException(status_code=400, detail=f"range must be one of {', '.join(RANGES)}")
+    try:
+        def fetch_latency():
+            since = range_start(range_name)
+            # Per-minute buckets are finer than the hourly rollup
+            if RANGES[range_name][1] == "MINUTE":
+                sql, params = build_raw_latency(AUDIT_LOG_TABLE, range_name, since, AUDIT_LLM_TIME_ENABLED)
+            else:
+                sql, params = build_rollup_latency(AUDIT_ROLLUP_SOURCE, range_name, since)
+            with warehouse_pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    columns = [desc[0] for desc in cursor.description]
+                    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return summarize_latency(rows, range_name, since)
+
+        return await cached_analytics(request, "analytics/latency", lambda: warehouse_executor.run(fetch_latency), range_name)
+    except Exception as e:
+        logger.error(f"Error fetching latency analytics: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to fetch latency analytics: {str(e)}")
+
+@app.get("/api/analytics/bundle")
+async def get_analytics_bundle(request: Request):
+    """Everything the Dashboard and Analytics pages show, from one statement on the rollup and one on audit_logs.
+
+    Each statement is cached and can fail on its own; a section whose
+    statement failed falls back to the default its standalone endpoint
+    returns (costs and statistics) or is null, so the pages still show the rest.
+    """
+    def fetch_rollup_sections():
+        with warehouse_pool.connection() as connection:
             with connection.cursor() as cursor:
-                # Overall statistics with comparisons
-                cursor.execute("""
+                # One pass over the small rollup: the grand total feeds the summary,
+                # the per-model grouping feeds both costs and usage rankings
+                llm_success = f"event_type IN {LLM_EVENT_TYPES_SQL} AND status = 'success'"
+                cursor.execute(f"""
                     SELECT
-                        COUNT(DISTINCT session_id) as total_queries,
-                        COUNT(DISTINCT CASE WHEN event_type IN ('business_logic_suggestion', 'sql_generation') THEN model_id END) as unique_models_used,
-                        AVG(CASE WHEN status = 'success' THEN estimated_cost_usd END) as avg_cost_per_query,
-                        MAX(CASE WHEN status = 'success' THEN estimated_cost_usd END) as max_cost_query,
-                        MIN(CASE WHEN status = 'success' AND estimated_cost_usd > 0 THEN estimated_cost_usd END) as min_cost_query,
-                        AVG(CASE WHEN status = 'success' THEN execution_time_ms END) as avg_time_per_event,
-                        MAX(CASE WHEN status = 'success' THEN execution_time_ms END) as max_time_event,
-                        SUM(CASE WHEN status = 'success' THEN prompt_tokens END) as total_prompt_tokens,
-                        SUM(CASE WHEN status = 'success' THEN completion_tokens END) as total_completion_tokens,
-                        AVG(CASE WHEN event_type = 'sql_execution' AND status = 'success' THEN row_count END) as avg_rows_returned
-                    FROM arao.text_to_sql.audit_logs
+                        GROUPING(model_id) as is_total,
+                        model_id,{ANALYTICS_SUMMARY_SQL},
+                        SUM(CASE WHEN {llm_success} THEN event_count END) as model_calls,
+                        SUM(CASE WHEN {llm_success} THEN prompt_tokens END) as model_prompt_tokens,
+                        SUM(CASE WHEN {llm_success} THEN completion_tokens END) as model_completion_tokens,
+                        SUM(CASE WHEN {llm_success} THEN total_tokens END) as model_total_tokens,
+                        SUM(CASE WHEN {llm_success} THEN cost_usd END) as model_cost,
+                        SUM(CASE WHEN {llm_success} THEN latency_ms_sum END)
+                            / NULLIF(SUM(CASE WHEN {llm_success} THEN latency_count END), 0) as model_avg_execution_time
+                    FROM {AUDIT_ROLLUP_SOURCE}
+                    GROUP BY GROUPING SETS ((), (model_id))
+                    HAVING GROUPING(model_id) = 1
+                        OR (model_id IS NOT NULL AND SUM(CASE WHEN {llm_success} THEN event_count END) > 0)
+                """)
+                columns = [desc[0] for desc in cursor.description]
+                rollup_rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        summary = {}
+        models = []
+        for record in rollup_rows:
+            if record['is_total']:
+                summary = {key: record[key] for key in columns
+                           if key not in ('is_total', 'model_id') and not key.startswith('model_')}
+            else:
+                models.append(record)
+
+        costs = summarize_llm_costs([{
+            "model_id": m['model_id'],
+            "total_prompt_tokens": m['model_prompt_tokens'],
+            "total_completion_tokens": m['model_completion_tokens'],
+            "total_tokens": m['model_total_tokens'],
+            "total_cost": m['model_cost'],
+            "call_count": m['model_calls'],
+        } for m in sorted(models, key=lambda m: m['model_cost'] or 0, reverse=True)])
+        usage = summarize_llm_usage([{
+            "model_id": m['model_id'],
+            "usage_count": m['model_calls'],
+            "total_cost": m['model_cost'],
+            "avg_execution_time": m['model_avg_execution_time'],
+            "total_prompt_tokens": m['model_prompt_tokens'],
+            "total_completion_tokens": m['model_completion_tokens'],
+        } for m in sorted(models, key=lambda m: m['model_calls'] or 0, reverse=True)])
+        return {"llm_costs": costs, "llm_usage": usage, "summary": summarize_analytics(summary)}
+
+    def fetch_audit_sections():
+        with warehouse_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                # One round trip to audit_logs: the dashboard totals are aggregated once
+                # and repeated on each of the top-query rows, which use the standalone
+                # endpoint's query so both return the same sessions
+                cursor.execute(f"""
+                    WITH totals AS (
+                        SELECT{DASHBOARD_STATISTICS_SQL}
+                        FROM arao.text_to_sql.audit_logs
+                    ),
+                    top_queries AS ({TOP_QUERIES_SQL}
+                    )
+                    SELECT totals.*, top_queries.*
+                    FROM totals
+                    LEFT JOIN top_queries ON TRUE
+                    ORDER BY top_queries.timestamp DESC
                 """)
-
-                row = cursor.fetchone()
                 columns = [desc[0] for desc in cursor.description]
-                summary = dict(zip(columns, row)) if row else {}
+                statistics = {}
+                queries = []
+                for row in cursor.fetchall():
+                    record = dict(zip(columns, row))
+                    statistics = record
+                    # No sessions yet leaves a single row of totals
+                    if record['session_id'] is not None:
+                        queries.append({key: record[key] for key in TOP_QUERY_COLUMNS})
 
-                # Cost efficiency (tokens per dollar)
-                total_tokens = (summary.get('total_prompt_tokens') or 0) + (summary.get('total_completion_tokens') or 0)
-                total_cost = summary.get('avg_cost_per_query', 0) * summary.get('total_queries', 1)
-                summary['tokens_per_dollar'] = total_tokens / total_cost if total_cost > 0 else 0
+        return {"statistics": summarize_dashboard_statistics(statistics), "top_queries": summarize_top_queries(queries)}
 
-                return summary
+    async def load_sections(part: str, loader, defaults: Dict[str, Any]) -> Dict[str, Any]:
+        # Failures are not cached, so the next request retries the statement
+        try:
+            return await analytics_cache.get_or_load(("analytics/bundle", part), loader)
+        except asyncio.TimeoutError:
+            logger.warning(f"Analytics bundle {part} query timed out after 5 seconds")
+        except Exception as e:
+            logger.error(f"Error fetching analytics bundle {part} sections: {str(e)}", exc_info=True)
+        return defaults
+
+    # Same 5 second budget as /api/llm-costs-by-model, whose section this statement feeds
+    rollup = await load_sections("rollup", lambda: asyncio.wait_for(
+        warehouse_executor.run(fetch_rollup_sections),
+        timeout=5.0
+    ), {"llm_costs": summarize_llm_costs([]), "llm_usage": None, "summary": None})
+    audit = await load_sections("audit", lambda: warehouse_executor.run(fetch_audit_sections), {
+        "statistics": summarize_dashboard_statistics({}), "top_queries": None,
+    })
+    payload = jsonable_encoder({**audit, **rollup})
+    return analytics_response(request, payload, analytics_etag(payload))
+
+@app.post("/api/analytics/rollup/rebuild")
+async def rebuild_audit_rollup():
+    """Recompute the hourly analytics rollup from audit_logs"""
+    if audit_rollup is None:
+        raise HTTPException(status_code=400, detail="Audit rollup is disabled (AUDIT_ROLLUP_ENABLED=False)")
+    try:
+        await audit_rollup.ensure_table(backfill_if_empty=False)
+        await audit_rollup.rebuild_all()
+        return {"status": "rebuilt", "rollup": audit_rollup.stats()}
     except Exception as e:
-        logger.error(f"Error fetching analytics summary: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to fetch analytics summary: {str(e)}")
+        logger.error(f"Error rebuilding audit rollup: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild audit rollup: {str(e)}")
 
 @app.get("/api/data")
 async def get_data():
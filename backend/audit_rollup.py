@@ -0,0 +1,424 @@
+"""
+Hourly rollup of audit events for the analytics endpoints.
+
+The analytics endpoints used to aggregate the whole audit_logs table on
+every request, so dashboard latency grew with history. The rollup keeps
+one row per (hour, model, event type, status) with counts, token and cost
+sums, latency sums and latency histogram buckets, plus an HLL sketch of
+session ids so distinct queries can still be estimated. Latency columns
+describe ``execution_time_ms``, the whole operation; a second set
+(``llm_latency_*``) describes ``llm_time_ms``, the time spent in model
+calls, and stays empty for rows logged before that column existed or when
+audit_logs does not have it yet.
+
+The rollup is maintained incrementally: every batch the audit writer
+inserts is aggregated and MERGEd into it. Hours whose rows arrive through
+spool replay, or whose MERGE failed, are recomputed from audit_logs
+instead, because a replayed row may or may not have been counted already.
+A failed MERGE is raised to the writer, which keeps the batch's spool
+segments and replays them, so the hours are still rebuilt if the process
+dies before its next maintenance pass.
+
+Audit timestamps are naive UTC and warehouse sessions run in UTC, so the
+hours Python derives with ``hour_of`` are the same ones ``date_trunc``
+produces in SQL, including for zones with sub-hour offsets. Incremental MERGEs, hour rebuilds
+and full rebuilds hold one lock, so an INSERT OVERWRITE never races a
+MERGE and overwrites the batch it was adding. A batch is only MERGEd if no
+rebuild has read audit_logs since it was inserted and none of its hours are
+dirty; otherwise its hours are recomputed (or, after a later full rebuild,
+it is skipped) so it is never counted twice.
+The same aggregate SELECT is used for incremental batches, hour rebuilds
+and full backfills, so all three produce identical rows.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; a final bucket catches everything slower
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# audit_logs columns the rollup is computed from, with the types they are cast to
+SOURCE_COLUMNS = (
+    ("timestamp", "TIMESTAMP"),
+    ("model_id", "STRING"),
+    ("event_type", "STRING"),
+    ("status", "STRING"),
+    ("prompt_tokens", "BIGINT"),
+    ("completion_tokens", "BIGINT"),
+    ("total_tokens", "BIGINT"),
+    ("estimated_cost_usd", "DOUBLE"),
+    ("execution_time_ms", "BIGINT"),
+    ("row_count", "BIGINT"),
+    ("session_id", "STRING"),
+    ("llm_time_ms", "BIGINT"),
+)
+
+KEY_COLUMNS = ("hour_start", "model_id", "event_type", "status")
+
+
+def bucket_columns(prefix: str = "latency") -> List[str]:
+    """Names of the latency histogram bucket columns, fastest first"""
+    return [f"{prefix}_le_{bound}" for bound in LATENCY_BUCKETS_MS] + [f"{prefix}_le_inf"]
+
+
+def histogram_quantile(counts: Sequence[int], q: float, max_ms: Optional[float] = None) -> Optional[float]:
+    """Approximate the ``q`` quantile (0-1) of latencies from bucket counts in ``bucket_columns()`` order.
+
+    Interpolates linearly inside the bucket holding the quantile. The open
+    last bucket ends at ``max_ms``, which also caps the estimate.
+    """
+    counts = [int(count or 0) for count in counts]
+    total = sum(counts)
+    if not total:
+        return None
+    last = float(max_ms) if max_ms is not None else float(LATENCY_BUCKETS_MS[-1])
+    bounds = [float(bound) for bound in LATENCY_BUCKETS_MS] + [max(last, float(LATENCY_BUCKETS_MS[-1]))]
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    estimate = bounds[-1]
+    for count, upper in zip(counts, bounds):
+        if count and cumulative + count >= rank:
+            estimate = lower + (upper - lower) * (rank - cumulative) / count
+            break
+        cumulative += count
+        lower = upper
+    return min(estimate, float(max_ms)) if max_ms is not None else estimate
+
+
+def _latency_stat_expressions(prefix: str, value: str) -> List[str]:
+    return [
+        f"COALESCE(SUM({value}), 0) AS {prefix}_ms_sum",
+        f"COUNT({value}) AS {prefix}_count",
+        f"MAX({value}) AS {prefix}_ms_max",
+    ]
+
+
+def _bucket_expressions(prefix: str, value: str) -> List[str]:
+    expressions = []
+    names = bucket_columns(prefix)
+    lower = None
+    for bound, name in zip(LATENCY_BUCKETS_MS, names):
+        condition = f"{value} <= {bound}" if lower is None else f"{value} > {lower} AND {value} <= {bound}"
+        expressions.append(f"COUNT_IF({condition}) AS {name}")
+        lower = bound
+    expressions.append(f"COUNT_IF({value} > {lower}) AS {names[-1]}")
+    return expressions
+
+
+def _latency_stat_columns(prefix: str) -> Tuple[Tuple[str, str, Optional[str]], ...]:
+    return (
+        (f"{prefix}_ms_sum", "BIGINT", "sum"),
+        (f"{prefix}_count", "BIGINT", "sum"),
+        (f"{prefix}_ms_max", "BIGINT", "max"),
+    )
+
+
+def _bucket_columns(prefix: str) -> Tuple[Tuple[str, str, Optional[str]], ...]:
+    return tuple((name, "BIGINT", "sum") for name in bucket_columns(prefix))
+
+
+# (column, type, how an incremental MERGE combines the existing value with a batch's).
+# New columns go at the end, where ALTER TABLE ADD COLUMNS puts them on existing tables.
+ROLLUP_COLUMNS: Tuple[Tuple[str, str, Optional[str]], ...] = (
+    ("hour_start", "TIMESTAMP", None),
+    ("model_id", "STRING", None),
+    ("event_type", "STRING", None),
+    ("status", "STRING", None),
+    ("event_count", "BIGINT", "sum"),
+    ("prompt_tokens", "BIGINT", "sum"),
+    ("completion_tokens", "BIGINT", "sum"),
+    ("total_tokens", "BIGINT", "sum"),
+    ("cost_usd", "DOUBLE", "sum"),
+    ("cost_count", "BIGINT", "sum"),
+    ("max_cost_usd", "DOUBLE", "max"),
+    ("min_positive_cost_usd", "DOUBLE", "min"),
+) + _latency_stat_columns("latency") + (
+    ("row_count_sum", "BIGINT", "sum"),
+    ("row_count_count", "BIGINT", "sum"),
+    ("session_sketch", "BINARY", "sketch"),
+) + _bucket_columns("latency") + _latency_stat_columns("llm_latency") + _bucket_columns("llm_latency")
+
+
+def create_table_sql(table: str) -> str:
+    """DDL for the rollup table"""
+    columns = ",\n".join(f"  {name} {data_type}" for name, data_type, _ in ROLLUP_COLUMNS)
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n{columns}\n)\nUSING DELTA"
+
+
+def add_columns_sql(table: str, columns: Sequence[Tuple[str, str]]) -> str:
+    """DDL adding rollup columns missing from a table created by an older version"""
+    return f"ALTER TABLE {table} ADD COLUMNS ({', '.join(f'{name} {data_type}' for name, data_type in columns)})"
+
+
+def aggregate_select(source: str, where: str = "", llm_time: bool = True) -> str:
+    """SELECT producing rollup rows (in table column order) from audit rows in ``source``
+
+    ``llm_time`` says whether ``source`` has the ``llm_time_ms`` column.
+    """
+    expressions = [
+        "date_trunc('HOUR', timestamp) AS hour_start",
+        "model_id",
+        "event_type",
+        "status",
+        "COUNT(*) AS event_count",
+        "COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens",
+        "COALESCE(SUM(completion_tokens), 0) AS completion_tokens",
+        "COALESCE(SUM(total_tokens), 0) AS total_tokens",
+        "COALESCE(SUM(estimated_cost_usd), 0) AS cost_usd",
+        "COUNT(estimated_cost_usd) AS cost_count",
+        "MAX(estimated_cost_usd) AS max_cost_usd",
+        "MIN(CASE WHEN estimated_cost_usd > 0 THEN estimated_cost_usd END) AS min_positive_cost_usd",
+    ] + _latency_stat_expressions("latency", "execution_time_ms") + [
+        "COALESCE(SUM(row_count), 0) AS row_count_sum",
+        "COUNT(row_count) AS row_count_count",
+        "hll_sketch_agg(session_id) AS session_sketch",
+    ] + _bucket_expressions("latency", "execution_time_ms")
+    llm_time_ms = "llm_time_ms" if llm_time else "CAST(NULL AS BIGINT)"
+    expressions += _latency_stat_expressions("llm_latency", llm_time_ms) + _bucket_expressions("llm_latency", llm_time_ms)
+    select_list = ",\n  ".join(expressions)
+    where_clause = f"\n{where}" if where else ""
+    return (
+        f"SELECT\n  {select_list}\nFROM {source}{where_clause}\n"
+        f"GROUP BY date_trunc('HOUR', timestamp), model_id, event_type, status"
+    )
+
+
+def live_source(source_table: str, llm_time: bool = True) -> str:
+    """Rollup rows computed on the fly from audit_logs, for when the rollup table is disabled"""
+    return f"({aggregate_select(source_table, llm_time=llm_time)}) AS audit_rollup"
+
+
+def _values_source(rows: Sequence[Sequence[Any]]) -> str:
+    names = [name for name, _ in SOURCE_COLUMNS]
+    placeholders = "(" + ", ".join("?" for _ in names) + ")"
+    casts = ", ".join(f"CAST({name} AS {data_type}) AS {name}" for name, data_type in SOURCE_COLUMNS)
+    return (
+        f"(SELECT {casts} FROM VALUES {', '.join(placeholders for _ in rows)} "
+        f"AS v({', '.join(names)})) AS batch"
+    )
+
+
+def _combine(name: str, how: str) -> str:
+    target, source = f"target.{name}", f"source.{name}"
+    if how == "sum":
+        return f"{name} = {target} + {source}"
+    if how == "max":
+        return f"{name} = GREATEST({target}, {source})"
+    if how == "min":
+        return f"{name} = LEAST({target}, {source})"
+    # Sketches of all-null session ids may be NULL
+    return (
+        f"{name} = CASE WHEN {target} IS NULL THEN {source} WHEN {source} IS NULL THEN {target} "
+        f"ELSE hll_union({target}, {source}) END"
+    )
+
+
+def _key_condition() -> str:
+    return " AND ".join(f"target.{name} <=> source.{name}" for name in KEY_COLUMNS)
+
+
+def build_incremental_merge(table: str, rows: Sequence[Sequence[Any]]) -> Tuple[str, List[Any]]:
+    """MERGE adding a batch of audit rows (SOURCE_COLUMNS order) into the rollup"""
+    updates = ",\n  ".join(_combine(name, how) for name, _, how in ROLLUP_COLUMNS if how)
+    sql = (
+        f"MERGE INTO {table} AS target\n"
+        f"USING ({aggregate_select(_values_source(rows))}) AS source\n"
+        f"ON {_key_condition()}\n"
+        f"WHEN MATCHED THEN UPDATE SET\n  {updates}\n"
+        f"WHEN NOT MATCHED THEN INSERT *"
+    )
+    params = [value for row in rows for value in row]
+    return sql, params
+
+
+def build_rebuild_hours(
+    table: str, source_table: str, hours: Sequence[datetime], llm_time: bool = True
+) -> Tuple[str, List[Any]]:
+    """MERGE replacing the given hours with rows recomputed from ``source_table``"""
+    placeholders = ", ".join("?" for _ in hours)
+    where = f"WHERE date_trunc('HOUR', timestamp) IN ({placeholders})"
+    sql = (
+        f"MERGE INTO {table} AS target\n"
+        f"USING ({aggregate_select(source_table, where, llm_time)}) AS source\n"
+        f"ON {_key_condition()}\n"
+        f"WHEN MATCHED THEN UPDATE SET *\n"
+        f"WHEN NOT MATCHED THEN INSERT *\n"
+        f"WHEN NOT MATCHED BY SOURCE AND target.hour_start IN ({placeholders}) THEN DELETE"
+    )
+    return sql, list(hours) + list(hours)
+
+
+def build_rebuild_all(table: str, source_table: str, llm_time: bool = True) -> str:
+    """Replace the whole rollup with one recomputed from ``source_table``"""
+    return f"INSERT OVERWRITE {table}\n{aggregate_select(source_table, llm_time=llm_time)}"
+
+
+def utc_now() -> datetime:
+    """The current time as a naive UTC datetime, the form audit timestamps are stored in"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_utc(timestamp: datetime) -> datetime:
+    """Naive UTC form of ``timestamp``; naive values are taken to be UTC already"""
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def hour_of(timestamp: Any) -> Optional[datetime]:
+    if isinstance(timestamp, datetime):
+        return to_utc(timestamp).replace(minute=0, second=0, microsecond=0)
+    return None
+
+
+class AuditRollup:
+    """Keeps the hourly rollup table in step with the rows the audit writer inserts"""
+
+    def __init__(
+        self,
+        table: str,
+        source_table: str,
+        audit_columns: Sequence[str],
+        execute: Callable[[List[Tuple[str, Optional[List[Any]]]]], Awaitable[Any]],
+        rebuild_chunk_hours: int = 24,
+    ):
+        self.table = table
+        self.source_table = source_table
+        self.execute = execute
+        self.rebuild_chunk_hours = max(1, rebuild_chunk_hours)
+        positions = {name: i for i, name in enumerate(audit_columns)}
+        # audit_logs may not have llm_time_ms yet; its value is then NULL
+        self.llm_time = "llm_time_ms" in positions
+        self._indexes = [positions.get(name) for name, _ in SOURCE_COLUMNS]
+        self._timestamp_index = positions["timestamp"]
+        self._dirty_hours: Set[datetime] = set()
+        self._lock: Optional[asyncio.Lock] = None
+        self._generation = 0
+        self._full_rebuild_started = 0
+        self._stats = {"batches": 0, "rows": 0, "errors": 0, "hours_rebuilt": 0, "full_rebuilds": 0}
+
+    async def ensure_table(self, backfill_if_empty: bool = True):
+        """Create the rollup table and backfill it from audit_logs if it is empty.
+
+        A table created by an older version gets the columns it is missing and
+        is rebuilt, since the MERGE cannot add to NULL sums.
+        """
+        await self.execute([(create_table_sql(self.table), None)])
+        existing = {row[0] for row in await self.execute([(f"DESCRIBE TABLE {self.table}", None)])}
+        missing = [(name, data_type) for name, data_type, _ in ROLLUP_COLUMNS if name not in existing]
+        if existing and missing:
+            await self.execute([(add_columns_sql(self.table, missing), None)])
+            await self.rebuild_all()
+            return
+        if backfill_if_empty:
+            rows = await self.execute([(f"SELECT 1 FROM {self.table} LIMIT 1", None)])
+            if not rows:
+                await self.rebuild_all()
+
+    def generation(self) -> int:
+        """Counter bumped when any rebuild starts or finishes; pass the value read before an INSERT to ``apply``"""
+        return self._generation
+
+    async def apply(self, rows: Sequence[Sequence[Any]], written_at: Optional[int] = None):
+        """Add rows the audit writer just inserted; failures mark their hours for a rebuild and are re-raised
+
+        ``written_at`` is ``generation()`` from before the rows were inserted. A
+        rebuild since then read audit_logs with (or maybe with) the batch in it,
+        so adding the batch on top would count it twice: after a full rebuild
+        that started once the insert was done the batch is skipped, otherwise
+        its hours are recomputed instead of MERGEd.
+        """
+        inserted = self._generation
+        if written_at is None:
+            written_at = inserted
+        async with self._maintenance_lock():
+            if self._full_rebuild_started > inserted:
+                return
+            batch = [[None if i is None else row[i] for i in self._indexes] for row in rows]
+            hours = {hour_of(row[self._timestamp_index]) for row in rows} - {None}
+            rebuild = self._generation != written_at or bool(hours & self._dirty_hours)
+            if rebuild:
+                self.mark_dirty(rows)
+            await self._rebuild_dirty()
+            if rebuild and hours & self._dirty_hours:
+                # Tells the writer to keep the batch's spool segments so a replay rebuilds the hours
+                raise RuntimeError(f"{len(self._dirty_hours)} audit rollup hours still need rebuilding")
+            if rebuild or not batch:
+                # Recomputed from audit_logs, which already holds the batch
+                return
+            try:
+                await self.execute([build_incremental_merge(self.table, batch)])
+            except Exception as e:
+                self._stats["errors"] += 1
+                self.mark_dirty(rows)
+                logger.warning(f"Audit rollup update failed, will rebuild {len(self._dirty_hours)} hours: {str(e)}")
+                raise
+            self._stats["batches"] += 1
+            self._stats["rows"] += len(batch)
+
+    def _maintenance_lock(self) -> asyncio.Lock:
+        # Shared by every statement that writes the rollup table
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def mark_dirty(self, rows: Iterable[Sequence[Any]]):
+        """Recompute the hours of these rows from audit_logs on the next maintenance pass"""
+        for row in rows:
+            hour = hour_of(row[self._timestamp_index])
+            if hour is not None:
+                self._dirty_hours.add(hour)
+
+    async def replayed(self, rows: Sequence[Sequence[Any]]):
+        """Rows replayed from the spool may already be counted, so rebuild their hours"""
+        self.mark_dirty(rows)
+        async with self._maintenance_lock():
+            await self._rebuild_dirty()
+        if self._dirty_hours:
+            # Tells the writer to keep the segment and replay it again
+            raise RuntimeError(f"{len(self._dirty_hours)} audit rollup hours still need rebuilding")
+
+    async def rebuild_dirty(self):
+        """Recompute hours marked dirty, oldest first"""
+        async with self._maintenance_lock():
+            await self._rebuild_dirty()
+
+    async def _rebuild_dirty(self):
+        while self._dirty_hours:
+            hours = sorted(self._dirty_hours)[:self.rebuild_chunk_hours]
+            self._generation += 1
+            try:
+                await self.execute([build_rebuild_hours(self.table, self.source_table, hours, self.llm_time)])
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.warning(f"Audit rollup rebuild of {len(hours)} hours failed: {str(e)}")
+                return
+            finally:
+                self._generation += 1
+            self._dirty_hours.difference_update(hours)
+            self._stats["hours_rebuilt"] += len(hours)
+
+    async def rebuild_all(self):
+        """Recompute the whole rollup from audit_logs"""
+        async with self._maintenance_lock():
+            self._generation += 1
+            started = self._generation
+            try:
+                await self.execute([(build_rebuild_all(self.table, self.source_table, self.llm_time), None)])
+            finally:
+                self._generation += 1
+            # Batches inserted before this point are in the new rollup
+            self._full_rebuild_started = started
+            self._dirty_hours.clear()
+        self._stats["full_rebuilds"] += 1
+        logger.info(f"Rebuilt audit rollup {self.table} from {self.source_table}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Incremental update and rebuild counters"""
+        snapshot = dict(self._stats)
+        snapshot.update({"table": self.table, "dirty_hours": len(self._dirty_hours)})
+        return snapshot
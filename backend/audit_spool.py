@@ -0,0 +1,268 @@
+"""
+Durable local spool for audit events.
+
+Audit events are appended to a local segment file before they are written
+to the warehouse, so an outage or a crash no longer loses cost tracking
+data. The audit writer appends everything queued since its last pass in
+one write (and at most one fsync) on a worker thread, so the disk never
+blocks the event loop. A segment is deleted once every row in it has been written by the
+audit writer. Segments with rows the writer gave up on (the warehouse was
+down, or the in-memory queue overflowed) and segments left over from a
+previous process are replayed later with a MERGE on ``log_id``, so rows
+that did reach the table are not inserted twice.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+SEGMENT_PREFIX = "audit-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+def build_merge(table: str, columns: Sequence[str], key: str, rows: Sequence[Sequence[Any]]) -> Tuple[str, List[Any]]:
+    """Build a MERGE that inserts ``rows`` whose ``key`` is not already in ``table``"""
+    placeholders = "(" + ", ".join("?" for _ in columns) + ")"
+    column_list = ", ".join(columns)
+    sql = (
+        f"MERGE INTO {table} AS target\n"
+        f"USING (SELECT * FROM VALUES {', '.join(placeholders for _ in rows)} AS source({column_list})) AS source\n"
+        f"ON target.{key} = source.{key}\n"
+        f"WHEN NOT MATCHED THEN INSERT ({column_list})\n"
+        f"VALUES ({', '.join(f'source.{column}' for column in columns)})"
+    )
+    params = [value for row in rows for value in row]
+    return sql, params
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"Cannot spool value of type {type(value).__name__}")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and "$datetime" in obj:
+        return datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+
+class _Segment:
+    __slots__ = ("seq", "path", "outstanding", "abandoned", "sealed", "created_at", "rows")
+
+    def __init__(self, seq: int, path: Path, sealed: bool = False, abandoned: bool = False):
+        self.seq = seq
+        self.path = path
+        self.outstanding = 0
+        self.abandoned = abandoned
+        self.sealed = sealed
+        self.created_at = time.monotonic()
+        self.rows = 0
+
+
+class AuditSpool:
+    """Segmented, append-only spool of audit rows (one JSON array per line)"""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_max_bytes: int = 1024 * 1024,
+        segment_max_age_seconds: float = 60.0,
+        fsync_policy: str = "interval",
+        fsync_interval_seconds: float = 1.0,
+    ):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}")
+        self.directory = Path(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age_seconds = segment_max_age_seconds
+        self.fsync_policy = fsync_policy
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self._lock = threading.Lock()
+        self._segments: Dict[int, _Segment] = {}
+        self._active: Optional[_Segment] = None
+        self._file = None
+        self._next_seq = 1
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        self._opened = False
+        self._stats = {"appended": 0, "append_errors": 0, "segments_written": 0, "segments_replayed": 0, "rows_replayed": 0}
+
+    def open(self):
+        """Create the spool directory and pick up segments left by a previous process"""
+        with self._lock:
+            if self._opened:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for path in sorted(self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")):
+                try:
+                    seq = int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                except ValueError:
+                    continue
+                # Nothing in memory refers to these rows any more; they all need replaying
+                self._segments[seq] = _Segment(seq, path, sealed=True, abandoned=True)
+                self._next_seq = max(self._next_seq, seq + 1)
+            if self._segments:
+                logger.info(f"Found {len(self._segments)} audit spool segments to replay in {self.directory}")
+            self._opened = True
+
+    def append(self, row: Sequence[Any]) -> int:
+        """Durably append ``row`` and return the sequence number of its segment"""
+        return self.append_many([row])[0]
+
+    def append_many(self, rows: Sequence[Sequence[Any]]) -> List[int]:
+        """Durably append ``rows`` with one flush and return each row's segment sequence number.
+
+        Blocks on disk I/O, so async callers run it on a worker thread.
+        """
+        if not self._opened:
+            self.open()
+        # Encode first so an unserializable row fails the batch before anything is written
+        lines = [json.dumps(list(row), default=_encode) + "\n" for row in rows]
+        seqs = []
+        with self._lock:
+            try:
+                for line in lines:
+                    if self._active is None:
+                        self._open_segment()
+                    self._file.write(line)
+                    self._dirty = True
+                    segment = self._active
+                    segment.outstanding += 1
+                    segment.rows += 1
+                    seqs.append(segment.seq)
+                    if self._file.tell() >= self.segment_max_bytes:
+                        self._seal_active()
+                if self._file is not None:
+                    self._file.flush()
+                if self.fsync_policy == "always":
+                    self._fsync()
+                elif self.fsync_policy == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval_seconds:
+                    self._fsync()
+            except Exception:
+                self._stats["append_errors"] += 1
+                raise
+            self._stats["appended"] += len(lines)
+            return seqs
+
+    def _open_segment(self):
+        seq = self._next_seq
+        self._next_seq += 1
+        path = self.directory / f"{SEGMENT_PREFIX}{seq:012d}{SEGMENT_SUFFIX}"
+        self._file = open(path, "a", encoding="utf-8")
+        self._active = self._segments[seq] = _Segment(seq, path)
+
+    def _fsync(self):
+        if self._file is not None and self._dirty:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def _seal_active(self):
+        if self._active is None:
+            return
+        self._fsync()
+        self._file.close()
+        segment = self._active
+        segment.sealed = True
+        self._file = None
+        self._active = None
+        self._stats["segments_written"] += 1
+        self._settle(segment)
+
+    def _settle(self, segment: _Segment):
+        # A sealed segment whose rows were all written is no longer needed
+        if segment.sealed and segment.outstanding == 0 and not segment.abandoned:
+            self._delete(segment)
+
+    def _delete(self, segment: _Segment):
+        self._segments.pop(segment.seq, None)
+        try:
+            segment.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def ack(self, seqs: Iterable[int]):
+        """Mark rows from these segments as written to the warehouse"""
+        self._release(seqs, abandoned=False)
+
+    def abandon(self, seqs: Iterable[int]):
+        """Mark rows from these segments as not written; their segments will be replayed"""
+        self._release(seqs, abandoned=True)
+
+    def _release(self, seqs: Iterable[int], abandoned: bool):
+        with self._lock:
+            for seq in seqs:
+                segment = self._segments.get(seq)
+                if segment is None:
+                    continue
+                segment.outstanding -= 1
+                segment.abandoned = segment.abandoned or abandoned
+                self._settle(segment)
+
+    def maintain(self):
+        """Apply the interval fsync policy and seal the active segment once it is old enough"""
+        with self._lock:
+            if self.fsync_policy == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval_seconds:
+                self._fsync()
+            if self._active is not None and time.monotonic() - self._active.created_at >= self.segment_max_age_seconds:
+                self._seal_active()
+
+    def ready_segments(self) -> List[int]:
+        """Sealed segments with abandoned rows and nothing still queued in memory, oldest first"""
+        with self._lock:
+            return sorted(
+                seq for seq, segment in self._segments.items()
+                if segment.sealed and segment.abandoned and segment.outstanding <= 0
+            )
+
+    def read_segment(self, seq: int) -> List[list]:
+        """Read a segment's rows, skipping a torn final line left by a crash"""
+        with self._lock:
+            segment = self._segments.get(seq)
+        if segment is None:
+            return []
+        rows = []
+        with open(segment.path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    rows.append(json.loads(line, object_hook=_decode))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable line {line_number} in {segment.path.name}")
+        return rows
+
+    def remove_segment(self, seq: int, rows: int = 0):
+        """Delete a segment after it has been replayed"""
+        with self._lock:
+            segment = self._segments.get(seq)
+            if segment is not None:
+                self._delete(segment)
+                self._stats["segments_replayed"] += 1
+                self._stats["rows_replayed"] += rows
+
+    def close(self):
+        """Seal the active segment; unwritten rows stay on disk for the next process"""
+        with self._lock:
+            self._seal_active()
+            self._opened = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Segment counts and append/replay counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "directory": str(self.directory),
+                "fsync_policy": self.fsync_policy,
+                "segments": len(self._segments),
+                "pending_replay": sum(1 for s in self._segments.values() if s.sealed and s.abandoned),
+                "outstanding_rows": sum(max(0, s.outstanding) for s in self._segments.values()),
+            })
+            return snapshot
@@ -0,0 +1,316 @@
+"""
+Batched, non-blocking writer for audit log events.
+
+Writing each audit event with its own INSERT added a full warehouse round
+trip to every user-facing response. Events are now queued in memory and a
+background task writes them as multi-row INSERTs once a batch fills up or
+the flush interval passes. The queue is bounded: when the warehouse cannot
+keep up, events are dropped according to the overflow policy rather than
+growing memory without limit. Remaining events are drained on shutdown.
+
+With an ``AuditSpool`` attached, the flusher also appends every queued
+event to local disk before writing it, group-committing everything queued
+since its last pass in one write on a worker thread so request handlers
+never wait on the disk. Rows the writer cannot deliver are then left to the
+spool instead of being retried from memory, and the writer replays them once
+the warehouse answers again, backing off while it does not.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+
+
+def build_batch_insert(table: str, columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> Tuple[str, List[Any]]:
+    """Build one multi-row ``INSERT ... VALUES (?, ...), (?, ...)`` and its flattened parameters"""
+    placeholders = "(" + ", ".join("?" for _ in columns) + ")"
+    sql = (
+        f"INSERT INTO {table}\n({', '.join(columns)})\n"
+        f"VALUES {', '.join(placeholders for _ in rows)}"
+    )
+    params = [value for row in rows for value in row]
+    return sql, params
+
+
+class AuditWriter:
+    """In-process audit queue flushed in batches by a background task"""
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[Sequence[Any]]], Awaitable[None]],
+        batch_size: int = 100,
+        flush_interval_seconds: float = 2.0,
+        max_queue_size: int = 10000,
+        overflow_policy: str = "drop_oldest",
+        max_attempts: int = 3,
+        spool=None,
+        replay_batch: Optional[Callable[[List[Sequence[Any]]], Awaitable[None]]] = None,
+        retry_backoff_seconds: float = 5.0,
+        max_retry_backoff_seconds: float = 300.0,
+        on_written: Optional[Callable[[List[Sequence[Any]]], Awaitable[None]]] = None,
+        on_replayed: Optional[Callable[[List[Sequence[Any]]], Awaitable[None]]] = None,
+        before_write: Optional[Callable[[], Any]] = None,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}")
+        self.write_batch = write_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_queue_size = max(self.batch_size, max_queue_size)
+        self.overflow_policy = overflow_policy
+        self.max_attempts = max(1, max_attempts)
+        self.spool = spool
+        self.replay_batch = replay_batch
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.max_retry_backoff_seconds = max_retry_backoff_seconds
+        # Called with every batch that reached the table, e.g. to maintain rollups
+        self.on_written = on_written
+        self.on_replayed = on_replayed
+        # Its value, read just before each batch is written, is passed to on_written after the rows
+        self.before_write = before_write
+        self._backoff = 0.0
+        self._backoff_until = 0.0
+        # Items are [attempts, row, spool segment, dropped] so failed rows can be retried a bounded number of times
+        self._queue: deque = deque()
+        # Items (queued or already dropped) the flusher has not appended to the spool yet
+        self._unspooled: List[list] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+        self._last_flush_at: Optional[float] = None
+        self._stats = {
+            "enqueued": 0, "written": 0, "batches": 0, "failed_batches": 0, "dropped": 0, "failed": 0,
+            "spooled": 0, "replayed": 0, "replay_errors": 0,
+        }
+
+    def enqueue(self, row: Sequence[Any]) -> bool:
+        """Queue one row without blocking. Returns False if it was dropped and there is no spool to keep it."""
+        self._stats["enqueued"] += 1
+        item = [0, row, None, False]
+        if self.spool is not None:
+            self._unspooled.append(item)
+        if len(self._queue) >= self.max_queue_size:
+            self._stats["dropped"] += 1
+            if self.overflow_policy == "drop_newest":
+                self._drop(item)
+                return self.spool is not None
+            self._drop(self._queue.popleft())
+        self._queue.append(item)
+        if len(self._queue) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _drop(self, item: list):
+        # A dropped row that is not spooled yet is abandoned once the flusher has spooled it
+        item[3] = True
+        self._release([item[2]], written=False)
+
+    async def _spool_queued(self):
+        """Append everything enqueued since the last pass to the spool in one write, off the event loop"""
+        while self._unspooled:
+            items, self._unspooled = self._unspooled, []
+            try:
+                segments = await asyncio.to_thread(self.spool.append_many, [item[1] for item in items])
+            except Exception as e:
+                logger.error(f"Failed to spool {len(items)} audit events, keeping them in memory only: {str(e)}")
+                continue
+            self._stats["spooled"] += len(items)
+            for item, segment in zip(items, segments):
+                item[2] = segment
+            self._release([item[2] for item in items if item[3]], written=False)
+
+    def start(self):
+        """Start the background flusher on the running event loop"""
+        if self._task is not None and not self._task.done():
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                if self.spool is not None:
+                    await asyncio.to_thread(self.spool.maintain)
+                await self.flush()
+                if self.spool is not None:
+                    await self.replay()
+            except Exception as e:
+                logger.error(f"Audit flusher error: {str(e)}", exc_info=True)
+
+    async def flush(self, force: bool = False) -> int:
+        """Write queued rows in batches until the queue is empty or a write fails"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        written = 0
+        async with self._flush_lock:
+            if self.spool is not None:
+                # Rows are spooled even while backing off, so the spool holds them through an outage
+                await self._spool_queued()
+            if not force and self._backing_off():
+                return 0
+            while self._queue:
+                if self.spool is not None:
+                    await self._spool_queued()
+                items = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                context = () if self.before_write is None else (self.before_write(),)
+                try:
+                    await self.write_batch([item[1] for item in items])
+                except Exception as e:
+                    self._stats["failed_batches"] += 1
+                    self._write_failed()
+                    self._requeue(items)
+                    logger.error(f"Failed to write {len(items)} audit events: {str(e)}")
+                    # Leave the rest for the next interval instead of hammering an unavailable warehouse
+                    break
+                self._write_succeeded()
+                self._stats["batches"] += 1
+                self._stats["written"] += len(items)
+                written += len(items)
+                # Segments are only released once on_written (the rollup) has the rows too; if it
+                # fails they are replayed, and the replay callback repairs what it missed
+                notified = await self._notify(self.on_written, [item[1] for item in items], *context)
+                self._release([item[2] for item in items], written=notified)
+            self._last_flush_at = time.time()
+        if written:
+            logger.info(f"Wrote {written} audit events")
+        return written
+
+    def _requeue(self, items: List[list]):
+        if self.spool is not None:
+            # The spool holds these rows durably; replay them later rather than retrying from memory
+            spooled = [item[2] for item in items if item[2] is not None]
+            self._stats["failed"] += len(items) - len(spooled)
+            self._release(spooled, written=False)
+            return
+        retry = []
+        for item in items:
+            item[0] += 1
+            if item[0] < self.max_attempts:
+                retry.append(item)
+            else:
+                self._stats["failed"] += 1
+        # Failed rows go back to the front; anything beyond capacity is dropped
+        room = self.max_queue_size - len(self._queue)
+        if len(retry) > room:
+            self._stats["dropped"] += len(retry) - room
+            retry = retry[:room]
+        self._queue.extendleft(reversed(retry))
+
+    def _release(self, segments: List[Optional[int]], written: bool):
+        if self.spool is None:
+            return
+        segments = [segment for segment in segments if segment is not None]
+        if written:
+            self.spool.ack(segments)
+        else:
+            self.spool.abandon(segments)
+
+    async def _notify(self, callback, rows: List[Sequence[Any]], *args) -> bool:
+        if callback is None:
+            return True
+        try:
+            await callback(rows, *args)
+        except Exception as e:
+            logger.error(f"Audit batch callback failed: {str(e)}", exc_info=True)
+            return False
+        return True
+
+    def _backing_off(self) -> bool:
+        return time.monotonic() < self._backoff_until
+
+    def _write_failed(self):
+        if self.spool is None:
+            return
+        self._backoff = min(self.max_retry_backoff_seconds, (self._backoff * 2) or self.retry_backoff_seconds)
+        self._backoff_until = time.monotonic() + self._backoff
+
+    def _write_succeeded(self):
+        self._backoff = 0.0
+        self._backoff_until = 0.0
+
+    async def replay(self) -> int:
+        """Load spooled segments the writer gave up on, oldest first. Idempotent on the replay side."""
+        if self.spool is None or self.replay_batch is None or self._backing_off():
+            return 0
+        replayed = 0
+        for segment in self.spool.ready_segments():
+            rows = await asyncio.to_thread(self.spool.read_segment, segment)
+            try:
+                for start in range(0, len(rows), self.batch_size):
+                    await self.replay_batch(rows[start:start + self.batch_size])
+            except Exception as e:
+                self._stats["replay_errors"] += 1
+                self._write_failed()
+                logger.error(f"Failed to replay audit spool segment {segment}: {str(e)}")
+                break
+            if not await self._notify(self.on_replayed, rows):
+                # The MERGE is idempotent, so the segment is simply replayed again later
+                self._stats["replay_errors"] += 1
+                self._write_failed()
+                break
+            self._write_succeeded()
+            self.spool.remove_segment(segment, rows=len(rows))
+            self._stats["replayed"] += len(rows)
+            replayed += len(rows)
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled audit events")
+        return replayed
+
+    async def drain(self, timeout_seconds: float = 10.0):
+        """Stop the background flusher and write whatever is still queued"""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout_seconds)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._task = None
+
+        deadline = time.monotonic() + timeout_seconds
+        while self._queue and time.monotonic() < deadline:
+            try:
+                remaining = max(0.0, deadline - time.monotonic())
+                if not await asyncio.wait_for(self.flush(force=True), timeout=remaining):
+                    break
+            except asyncio.TimeoutError:
+                break
+        if self._queue:
+            logger.warning(f"Audit writer shut down with {len(self._queue)} unwritten events")
+        if self.spool is not None:
+            # Unwritten rows stay in the spool and are replayed by the next process
+            await self._spool_queued()
+            await asyncio.to_thread(self.spool.close)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and write counters"""
+        snapshot = dict(self._stats)
+        snapshot.update({
+            "queued": len(self._queue),
+            "max_queue_size": self.max_queue_size,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval_seconds,
+            "overflow_policy": self.overflow_policy,
+            "running": self._task is not None and not self._task.done(),
+            "last_flush_at": self._last_flush_at,
+            "backoff_seconds": round(max(0.0, self._backoff_until - time.monotonic()), 3),
+        })
+        if self.spool is not None:
+            snapshot["spool"] = self.spool.stats()
+        return snapshot
@@ -0,0 +1,211 @@
+"""
+Micro-benchmarks for the pure-Python code on the request path.
+
+Each benchmark builds a large synthetic input once and times one call of
+the function under test, repeated ``--repeat`` times; the minimum is the
+number to compare between runs (the median is reported to show noise).
+Inputs are sized to expose per-line and per-row costs: 10k-line LLM
+replies, 100k audit/history rows and 1M result cells. ``--scale`` shrinks
+or grows every input, e.g. ``--scale 0.01`` for a quick smoke run.
+
+Results are written as JSON; pass an earlier result as ``--baseline`` to
+exit with status 1 when a benchmark's minimum got slower by more than
+``--threshold``::
+
+    python benchmark.py --output bench_before.json
+    python benchmark.py --baseline bench_before.json --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from llm_output import extract_join_condition, incomplete_sql_reason, parse_generated_sql, parse_suggestions
+from query_history import EVENT_COLUMNS, HISTORY_EVENT_TYPES, assemble_session, build_history_page
+from sql_results import rows_to_dicts
+
+# Changes smaller than this are timer noise, whatever the ratio
+MIN_DELTA_MS = 0.5
+
+# name -> builder(scale, rng) returning the zero-argument call to time
+BENCHMARKS: Dict[str, Callable[[float, random.Random], Callable[[], Any]]] = {}
+
+
+def benchmark(name: str):
+    def register(builder):
+        BENCHMARKS[name] = builder
+        return builder
+    return register
+
+
+def _scaled(count: int, scale: float) -> int:
+    return max(1, int(count * scale))
+
+
+_SQL_LINES = (
+    "    SUM(o.amount) AS revenue,",
+    "    COUNT(DISTINCT o.customer_id) AS customers,",
+    "    o.region,",
+    "LEFT JOIN main.sales.customers c ON c.customer_id = o.customer_id",
+    "WHERE o.status = 'shipped' AND o.order_date >= DATE '2025-01-01'",
+    "",
+)
+_PROSE_LINES = (
+    "This query totals revenue per region for shipped orders.",
+    "Note that returned orders are excluded.",
+)
+
+
+@benchmark("parse_generated_sql_10k_lines")
+def _parse_generated_sql(scale: float, rng: random.Random):
+    lines = ["EXPLANATION: Revenue per region for shipped orders.", "SQL: ```sql", "SELECT"]
+    for _ in range(_scaled(10_000, scale)):
+        lines.append(rng.choice(_PROSE_LINES) if rng.random() < 0.1 else rng.choice(_SQL_LINES))
+    lines += ["FROM main.sales.orders o", "GROUP BY o.region", "```", "Let me know if you need changes."]
+    text = "\n".join(lines)
+    return lambda: parse_generated_sql(text)
+
+
+@benchmark("incomplete_sql_check_10k_lines")
+def _incomplete_sql(scale: float, rng: random.Random):
+    sql = "SELECT\n" + "\n".join(rng.choice(_SQL_LINES) for _ in range(_scaled(10_000, scale))) + "\nFROM t"
+    return lambda: incomplete_sql_reason(sql, "stop")
+
+
+@benchmark("parse_suggestions_10k_lines")
+def _parse_suggestions(scale: float, rng: random.Random):
+    # No numbered lines until the end: the worst case scans every line before finding five
+    lines = [f"- idea {i}: compare order volume across regions" for i in range(_scaled(10_000, scale))]
+    lines += [f"{i}. Which regions grew their order volume fastest in quarter {i}?" for i in range(1, 6)]
+    text = "\n".join(lines)
+    return lambda: parse_suggestions(text)
+
+
+@benchmark("extract_join_condition_10k_lines")
+def _extract_join_condition(scale: float, rng: random.Random):
+    lines = [f"Step {i}: compare sample values of customer_id in both tables" for i in range(_scaled(10_000, scale))]
+    lines.append("t1.customer_id = t2.customer_id")
+    text = "\n".join(lines)
+    return lambda: extract_join_condition(text)
+
+
+def _history_rows(count: int, rng: random.Random) -> Tuple[List[str], List[tuple]]:
+    columns = ["session_id", "timestamp", "status", "models", "table_name", "business_logic_preview",
+               "generated_sql_preview", "total_cost_usd", "execution_time_ms", "row_count"]
+    start = datetime(2025, 1, 1)
+    rows = [
+        (str(uuid.UUID(int=rng.getrandbits(128))), start + timedelta(seconds=i), "success",
+         ["databricks-gpt-5", "databricks-llama-4-maverick"], "orders", "Revenue per region " * 5,
+         "SELECT region, SUM(amount) FROM main.sales.orders GROUP BY region", 0.0123, 840, 12)
+        for i in range(count)
+    ]
+    return columns, rows
+
+
+@benchmark("history_page_100k_rows")
+def _history_page(scale: float, rng: random.Random):
+    count = _scaled(100_000, scale)
+    columns, rows = _history_rows(count + 1, rng)
+    return lambda: build_history_page(columns, rows, count)
+
+
+@benchmark("assemble_session_100k_events")
+def _assemble_session(scale: float, rng: random.Random):
+    start = datetime(2025, 1, 1)
+    events = []
+    for i in range(_scaled(100_000, scale)):
+        event = dict.fromkeys(EVENT_COLUMNS)
+        event.update({
+            "log_id": str(i), "session_id": "s", "timestamp": start + timedelta(seconds=i),
+            "event_type": HISTORY_EVENT_TYPES[i % len(HISTORY_EVENT_TYPES)], "columns": ["region", "amount"],
+            "business_logic": "Revenue per region", "generated_sql": "SELECT 1", "status": "success",
+        })
+        events.append(event)
+    return lambda: assemble_session({"session_id": "s"}, events)
+
+
+@benchmark("rows_to_dicts_1m_cells")
+def _rows_to_dicts(scale: float, rng: random.Random):
+    columns = [f"column_{i}" for i in range(10)]
+    rows = [tuple(rng.random() for _ in columns) for _ in range(_scaled(100_000, scale))]
+    return lambda: rows_to_dicts(columns, rows)
+
+
+def run_benchmarks(names: Sequence[str], scale: float = 1.0, repeat: int = 5, seed: int = 1) -> Dict[str, Dict[str, float]]:
+    """Min/median/max milliseconds per benchmark"""
+    results = {}
+    for name in names:
+        call = BENCHMARKS[name](scale, random.Random(seed))
+        timings = []
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            "min_ms": round(min(timings), 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3),
+        }
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Benchmarks whose minimum got slower than the baseline's by more than ``threshold``"""
+    if baseline.get("scale") != current.get("scale"):
+        return [f"baseline scale {baseline.get('scale')} differs from this run's {current.get('scale')}"]
+    regressions = []
+    for name, before in baseline.get("benchmarks", {}).items():
+        after = current["benchmarks"].get(name)
+        if after is None:
+            continue
+        if after["min_ms"] > before["min_ms"] * (1 + threshold) and after["min_ms"] - before["min_ms"] >= MIN_DELTA_MS:
+            regressions.append(f"{name}: {before['min_ms']} ms -> {after['min_ms']} ms")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pure-Python request path")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default all: {', '.join(BENCHMARKS)})")
+    parser.add_argument("--scale", type=float, default=1.0, help="Input size multiplier")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed calls per benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier result JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative slowdown (default 0.2)")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    result = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "benchmarks": run_benchmarks(args.names or list(BENCHMARKS), args.scale, args.repeat, args.seed),
+    }
+    for name, stats in result["benchmarks"].items():
+        print(f"{name:<40} min {stats['min_ms']:>10.3f} ms   median {stats['median_ms']:>10.3f} ms")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            result["regressions"] = compare(result, json.load(handle), args.threshold)
+        for regression in result["regressions"]:
+            print(f"REGRESSION {regression}")
+            status = 1
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(result, handle, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
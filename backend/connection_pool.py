@@ -0,0 +1,310 @@
+"""
+Process-wide pool of Databricks SQL warehouse connections.
+
+Opening a connection costs a TLS handshake plus a Thrift session, which
+dominates the latency of cheap metadata queries. The pool keeps a bounded
+set of open connections that every endpoint checks out and returns.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class _PooledConnection:
+    """A raw connection plus the bookkeeping the pool needs to manage it"""
+
+    __slots__ = ("raw", "created_at", "last_used_at", "needs_check")
+
+    def __init__(self, raw: Any):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used_at = now
+        self.needs_check = False
+
+
+class ConnectionPool:
+    """Thread-safe connection pool with idle eviction and max lifetime.
+
+    Connections are validated with a cheap query on checkout when they have
+    been idle for longer than ``health_check_after_seconds`` or when the
+    previous borrower raised while using them.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 8,
+        max_idle_seconds: float = 300.0,
+        max_lifetime_seconds: float = 3600.0,
+        checkout_timeout_seconds: float = 30.0,
+        health_check_after_seconds: float = 30.0,
+        health_check_query: str = "SELECT 1",
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._connect = connect
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.max_lifetime_seconds = max_lifetime_seconds
+        self.checkout_timeout_seconds = checkout_timeout_seconds
+        self.health_check_after_seconds = health_check_after_seconds
+        self.health_check_query = health_check_query
+
+        self._lock = threading.Condition()
+        self._idle: List[_PooledConnection] = []
+        self._size = 0  # idle + checked out + being opened
+        self._in_use = 0
+        self._closed = False
+        self._reaper: Optional[threading.Thread] = None
+        self._stop_reaper = threading.Event()
+
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "connect_failures": 0,
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "checkout_wait_ms_total": 0.0,
+            "health_check_failures": 0,
+            "evicted_idle": 0,
+            "evicted_lifetime": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the background reaper and warm up ``min_size`` connections"""
+        if self._reaper is not None:
+            return
+        self._stop_reaper.clear()
+        self._reaper = threading.Thread(target=self._reap_loop, name="warehouse-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        self._stop_reaper.set()
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._lock.notify_all()
+        for conn in idle:
+            self._close_raw(conn)
+        if self._reaper is not None:
+            self._reaper.join(timeout=5)
+            self._reaper = None
+
+    # ------------------------------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block"""
+        conn = self._checkout()
+        failed = False
+        try:
+            yield conn.raw
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._checkin(conn, failed)
+
+    def _checkout(self) -> _PooledConnection:
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout_seconds
+        while True:
+            conn = None
+            should_open = False
+            with self._lock:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        self._in_use += 1
+                        should_open = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["checkout_timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.checkout_timeout_seconds}s waiting for a warehouse connection"
+                        )
+                    self._lock.wait(remaining)
+
+            if should_open:
+                conn = self._open()
+            elif self._is_expired(conn) or not self._is_healthy(conn):
+                self._discard(conn)
+                continue
+
+            with self._lock:
+                self._stats["checkouts"] += 1
+                self._stats["checkout_wait_ms_total"] += (time.monotonic() - started) * 1000
+            return conn
+
+    def _checkin(self, conn: _PooledConnection, failed: bool):
+        conn.last_used_at = time.monotonic()
+        conn.needs_check = conn.needs_check or failed
+        if self._is_expired(conn):
+            self._discard(conn)
+            return
+        with self._lock:
+            if self._closed:
+                self._in_use -= 1
+                self._size -= 1
+                close_now = True
+            else:
+                self._in_use -= 1
+                self._idle.append(conn)
+                close_now = False
+            self._lock.notify()
+        if close_now:
+            self._close_raw(conn)
+
+    # ------------------------------------------------------------------
+    # Connection helpers
+    # ------------------------------------------------------------------
+
+    def _open(self) -> _PooledConnection:
+        try:
+            raw = self._connect()
+        except BaseException:
+            with self._lock:
+                self._size -= 1
+                self._in_use -= 1
+                self._stats["connect_failures"] += 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._stats["connections_created"] += 1
+        return _PooledConnection(raw)
+
+    def _discard(self, conn: _PooledConnection):
+        """Close a checked-out connection and free its slot"""
+        with self._lock:
+            self._in_use -= 1
+            self._size -= 1
+            self._lock.notify()
+        self._close_raw(conn)
+
+    def _close_raw(self, conn: _PooledConnection):
+        try:
+            conn.raw.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled connection: {str(e)}")
+        with self._lock:
+            self._stats["connections_closed"] += 1
+
+    def _is_expired(self, conn: _PooledConnection) -> bool:
+        if self.max_lifetime_seconds and time.monotonic() - conn.created_at > self.max_lifetime_seconds:
+            with self._lock:
+                self._stats["evicted_lifetime"] += 1
+            return True
+        return False
+
+    def _is_healthy(self, conn: _PooledConnection) -> bool:
+        idle_for = time.monotonic() - conn.last_used_at
+        if not conn.needs_check and idle_for < self.health_check_after_seconds:
+            return True
+        try:
+            with conn.raw.cursor() as cursor:
+                cursor.execute(self.health_check_query)
+                cursor.fetchall()
+            conn.needs_check = False
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check, replacing it: {str(e)}")
+            with self._lock:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def evict_idle(self):
+        """Close idle connections past their idle or lifetime limit, keeping ``min_size`` open"""
+        now = time.monotonic()
+        to_close = []
+        with self._lock:
+            keep = []
+            # Oldest-used connections sit at the front of the idle list
+            for conn in self._idle:
+                too_old = self.max_lifetime_seconds and now - conn.created_at > self.max_lifetime_seconds
+                too_idle = self.max_idle_seconds and now - conn.last_used_at > self.max_idle_seconds
+                if too_old or (too_idle and self._size - len(to_close) > self.min_size):
+                    to_close.append(conn)
+                    self._stats["evicted_lifetime" if too_old else "evicted_idle"] += 1
+                else:
+                    keep.append(conn)
+            self._idle = keep
+            self._size -= len(to_close)
+            if to_close:
+                self._lock.notify_all()
+        for conn in to_close:
+            self._close_raw(conn)
+
+    def fill_to_min(self):
+        """Open connections until the pool holds at least ``min_size``"""
+        while True:
+            with self._lock:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+                self._in_use += 1
+            try:
+                conn = self._open()
+            except Exception as e:
+                logger.warning(f"Could not pre-open warehouse connection: {str(e)}")
+                return
+            self._checkin(conn, failed=False)
+
+    def _reap_loop(self):
+        interval = max(1.0, min(self.max_idle_seconds or 60.0, 60.0) / 2)
+        self.fill_to_min()
+        while not self._stop_reaper.wait(interval):
+            try:
+                self.evict_idle()
+                self.fill_to_min()
+            except Exception as e:
+                logger.error(f"Connection pool maintenance failed: {str(e)}", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool configuration, occupancy and lifetime counters"""
+        with self._lock:
+            checkouts = self._stats["checkouts"]
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "avg_checkout_wait_ms": round(snapshot["checkout_wait_ms_total"] / checkouts, 3) if checkouts else 0.0,
+            })
+        snapshot["checkout_wait_ms_total"] = round(snapshot["checkout_wait_ms_total"], 3)
+        return snapshot
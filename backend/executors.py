@@ -0,0 +1,88 @@
+"""
+Bounded thread pools for blocking I/O.
+
+The Databricks SQL connector is synchronous, so every warehouse call has to
+leave the asyncio event loop or it stalls every other request on the
+worker. Each kind of blocking work gets its own pool so a burst of slow
+queries cannot starve other work, and a cap on pending jobs turns overload
+into a fast failure instead of an ever-growing queue.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised when an executor already has its maximum number of pending jobs"""
+
+
+class BoundedExecutor:
+    """Thread pool with a fixed worker count and a cap on queued jobs"""
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-io")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the pool and await its result"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise ExecutorSaturatedError(
+                    f"{self.name} executor is saturated ({self._pending} pending jobs)"
+                )
+            self._pending += 1
+
+        # Jobs see the caller's context variables, e.g. the request trace
+        context = contextvars.copy_context()
+        try:
+            future = self._executor.submit(context.run, self._invoke, fn, args, kwargs)
+        except BaseException:
+            self._job_done(None)
+            raise
+        # Release the slot when the job finishes, even if the awaiting request
+        # was cancelled (e.g. by asyncio.wait_for) while the thread kept running
+        future.add_done_callback(self._job_done)
+        return await asyncio.wrap_future(future)
+
+    def _job_done(self, _future):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    def _invoke(self, fn, args, kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and optionally wait for running jobs"""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool occupancy and lifetime counters"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
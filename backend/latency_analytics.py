@@ -0,0 +1,175 @@
+"""
+Latency percentiles and trends for the analytics endpoints.
+
+Averages hide the slow calls users notice, so latency is reported as
+p50/p95/p99 for LLM calls and warehouse executions, per model, per event
+type and per time bucket. Ranges of a day or more read the hourly rollup
+and estimate percentiles from its latency histograms, which merge across
+hours and models by adding bucket counts. The last hour is broken down
+per minute, finer than the rollup, so it is computed from audit_logs
+with ``percentile_approx``. LLM latency is the time spent in model calls
+(``llm_time_ms``, the rollup's ``llm_latency_*`` columns), not the request's
+``execution_time_ms``; events logged before it was recorded are left out.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from audit_rollup import bucket_columns, histogram_quantile, utc_now
+
+# range parameter -> (how far back, bucket unit for the series)
+RANGES = {
+    "1h": (timedelta(hours=1), "MINUTE"),
+    "24h": (timedelta(hours=24), "HOUR"),
+    "7d": (timedelta(days=7), "DAY"),
+    "30d": (timedelta(days=30), "DAY"),
+}
+QUANTILES = (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99))
+
+# LLM calls and warehouse executions are reported separately
+KIND_SQL = "CASE WHEN event_type = 'sql_execution' THEN 'warehouse' ELSE 'llm' END"
+
+
+def _by_kind(warehouse: str, llm: str) -> str:
+    # Warehouse executions are timed as a whole, LLM events by their model calls
+    return f"CASE WHEN event_type = 'sql_execution' THEN {warehouse} ELSE {llm} END"
+
+_GROUPING = """GROUP BY GROUPING SETS ((kind), (kind, model_id), (kind, event_type), (kind, bucket_start))"""
+
+_DIMENSION = """CASE
+        WHEN GROUPING(bucket_start) = 0 THEN 'series'
+        WHEN GROUPING(model_id) = 0 THEN 'model'
+        WHEN GROUPING(event_type) = 0 THEN 'event_type'
+        ELSE 'kind'
+    END AS dimension"""
+
+
+def range_start(range_name: str, now: Optional[datetime] = None) -> datetime:
+    """Start of ``range_name`` ending at ``now``, aligned to the hour for rollup ranges"""
+    window, unit = RANGES[range_name]
+    start = (now or utc_now()) - window
+    if unit == "MINUTE":
+        return start.replace(second=0, microsecond=0)
+    return start.replace(minute=0, second=0, microsecond=0)
+
+
+def build_rollup_latency(source: str, range_name: str, since: datetime) -> Tuple[str, List[Any]]:
+    """Histogram sums from the hourly rollup for every breakdown at once"""
+    _, unit = RANGES[range_name]
+    buckets = bucket_columns()
+    bucket_sums = ",\n    ".join(f"CAST(SUM({name}) AS BIGINT) AS {name}" for name in buckets)
+    columns = ["latency_count", "latency_ms_sum", "latency_ms_max"] + buckets
+    chosen = ",\n        ".join(f"{_by_kind(name, 'llm_' + name)} AS {name}" for name in columns)
+    sql = f"""WITH latencies AS (
+    SELECT
+        date_trunc('{unit}', hour_start) AS bucket_start,
+        {KIND_SQL} AS kind,
+        model_id,
+        event_type,
+        {chosen}
+    FROM {source}
+    WHERE hour_start >= ? AND {_by_kind('latency_count', 'llm_latency_count')} > 0
+)
+SELECT
+    {_DIMENSION},
+    kind,
+    model_id,
+    event_type,
+    bucket_start,
+    CAST(SUM(latency_count) AS BIGINT) AS latency_count,
+    CAST(SUM(latency_ms_sum) AS BIGINT) AS latency_ms_sum,
+    CAST(MAX(latency_ms_max) AS BIGINT) AS latency_ms_max,
+    {bucket_sums}
+FROM latencies
+{_GROUPING}"""
+    return sql, [since]
+
+
+def build_raw_latency(table: str, range_name: str, since: datetime, llm_time: bool = True) -> Tuple[str, List[Any]]:
+    """Approximate percentiles straight from audit_logs for every breakdown at once.
+
+    ``llm_time`` says whether ``table`` has the ``llm_time_ms`` column.
+    """
+    _, unit = RANGES[range_name]
+    latency = _by_kind("execution_time_ms", "llm_time_ms" if llm_time else "NULL")
+    sql = f"""WITH latencies AS (
+    SELECT
+        date_trunc('{unit}', timestamp) AS bucket_start,
+        {KIND_SQL} AS kind,
+        model_id,
+        event_type,
+        {latency} AS latency_ms
+    FROM {table}
+    WHERE timestamp >= ? AND {latency} IS NOT NULL
+)
+SELECT
+    {_DIMENSION},
+    kind,
+    model_id,
+    event_type,
+    bucket_start,
+    CAST(COUNT(*) AS BIGINT) AS latency_count,
+    CAST(SUM(latency_ms) AS BIGINT) AS latency_ms_sum,
+    CAST(MAX(latency_ms) AS BIGINT) AS latency_ms_max,
+    percentile_approx(latency_ms, array({', '.join(str(q) for _, q in QUANTILES)})) AS percentiles
+FROM latencies
+{_GROUPING}"""
+    return sql, [since]
+
+
+def latency_stats(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Count, mean, max and percentiles of one result row from either query"""
+    count = int(row.get("latency_count") or 0)
+    max_ms = row.get("latency_ms_max")
+    stats = {
+        "count": count,
+        "avg_ms": round(row["latency_ms_sum"] / count, 1) if count and row.get("latency_ms_sum") is not None else None,
+        "max_ms": int(max_ms) if max_ms is not None else None,
+    }
+    if row.get("percentiles") is not None:
+        values = list(row["percentiles"])
+        for (name, _), value in zip(QUANTILES, values):
+            stats[name] = float(value) if value is not None else None
+    else:
+        counts = [row.get(name) for name in bucket_columns()]
+        for name, q in QUANTILES:
+            value = histogram_quantile(counts, q, max_ms)
+            stats[name] = round(value, 1) if value is not None else None
+    return stats
+
+
+def summarize_latency(rows: Sequence[Dict[str, Any]], range_name: str, since: datetime) -> Dict[str, Any]:
+    """Shape breakdown rows into overall, per-model, per-event-type and series sections"""
+    _, unit = RANGES[range_name]
+    kinds = {"llm": {"count": 0}, "warehouse": {"count": 0}}
+    by_model: List[Dict[str, Any]] = []
+    by_event_type: List[Dict[str, Any]] = []
+    series: Dict[str, List[Dict[str, Any]]] = {"llm": [], "warehouse": []}
+
+    for row in rows:
+        kind = row["kind"]
+        stats = latency_stats(row)
+        if row["dimension"] == "kind":
+            kinds[kind] = stats
+        elif row["dimension"] == "model":
+            if row.get("model_id"):
+                by_model.append({"model_id": row["model_id"], "kind": kind, **stats})
+        elif row["dimension"] == "event_type":
+            by_event_type.append({"event_type": row["event_type"], "kind": kind, **stats})
+        else:
+            series.setdefault(kind, []).append({"bucket_start": row["bucket_start"], **stats})
+
+    for points in series.values():
+        points.sort(key=lambda point: point["bucket_start"])
+    by_model.sort(key=lambda entry: entry.get("p95_ms") or 0, reverse=True)
+    by_event_type.sort(key=lambda entry: entry.get("p95_ms") or 0, reverse=True)
+
+    return {
+        "range": range_name,
+        "bucket": unit.lower(),
+        "since": since,
+        "llm": kinds["llm"],
+        "warehouse": kinds["warehouse"],
+        "by_model": by_model,
+        "by_event_type": by_event_type,
+        "series": series,
+    }
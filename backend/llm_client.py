@@ -0,0 +1,137 @@
+"""
+Shared async client for Databricks Foundation Model serving endpoints.
+
+One long-lived AsyncOpenAI client keeps its HTTP connections alive across
+requests, so TLS to the serving endpoint is negotiated once per connection
+rather than once per call. A semaphore per model bounds in-flight calls so
+one busy model cannot use up every connection and starve the others. Only
+configured models get their own semaphore; calls naming any other model
+share one, so arbitrary model ids in requests cannot add slots.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+# stats() key of the slot shared by models that were not configured
+OTHER_MODELS = "(other)"
+
+
+def parse_model_limits(spec: str) -> Dict[str, int]:
+    """Parse ``"model-a=2,model-b=8"`` into a per-model concurrency map"""
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        model_id, limit = item.split("=", 1)
+        if model_id.strip() and limit.strip().isdigit():
+            limits[model_id.strip()] = max(1, int(limit))
+    return limits
+
+
+class _ModelSlot:
+    """Concurrency limit and counters for one model"""
+
+    __slots__ = ("limit", "semaphore", "in_flight", "waiting", "calls", "errors")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.errors = 0
+
+
+class LLMClient:
+    """Process-wide chat completion client with per-model concurrency limits"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        model_ids: Iterable[str] = (),
+        default_concurrency: int = 4,
+        model_concurrency: Optional[Dict[str, int]] = None,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry_seconds: float = 60.0,
+        timeout_seconds: float = 120.0,
+        connect_timeout_seconds: float = 10.0,
+        max_retries: int = 2,
+        on_call: Optional[Callable[[str, float, Any, Optional[BaseException]], None]] = None,
+    ):
+        self.default_concurrency = max(1, default_concurrency)
+        # Called with (model, seconds, response, error) after every call, e.g. to record metrics
+        self.on_call = on_call
+        self._model_concurrency = dict(model_concurrency or {})
+        self._slots: Dict[str, _ModelSlot] = {
+            model_id: _ModelSlot(self._model_concurrency.get(model_id, self.default_concurrency))
+            for model_id in list(model_ids) + list(self._model_concurrency)
+        }
+        self._other = _ModelSlot(self.default_concurrency)
+
+        self._http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry_seconds,
+            ),
+        )
+        self._client = openai.AsyncOpenAI(
+            api_key=api_key or "unset",
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout_seconds, connect=connect_timeout_seconds),
+            max_retries=max_retries,
+            http_client=self._http_client,
+        )
+
+    def _slot(self, model_id: str) -> _ModelSlot:
+        return self._slots.get(model_id, self._other)
+
+    async def chat_completion(self, **params) -> Any:
+        """Create a chat completion, waiting for a free slot on the requested model"""
+        slot = self._slot(params["model"])
+        slot.waiting += 1
+        try:
+            await slot.semaphore.acquire()
+        finally:
+            slot.waiting -= 1
+        slot.in_flight += 1
+        slot.calls += 1
+        started = time.perf_counter()
+        response = error = None
+        try:
+            response = await self._client.chat.completions.create(**params)
+            return response
+        except Exception as e:
+            slot.errors += 1
+            error = e
+            raise
+        finally:
+            slot.in_flight -= 1
+            slot.semaphore.release()
+            if self.on_call is not None:
+                self.on_call(params["model"], time.perf_counter() - started, response, error)
+
+    async def close(self):
+        """Close pooled HTTP connections"""
+        await self._client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-model concurrency limits, occupancy and call counters"""
+        return {
+            model_id: {
+                "limit": slot.limit,
+                "in_flight": slot.in_flight,
+                "waiting": slot.waiting,
+                "calls": slot.calls,
+                "errors": slot.errors,
+            }
+            for model_id, slot in {**self._slots, OTHER_MODELS: self._other}.items()
+        }
@@ -0,0 +1,135 @@
+"""
+Parsing of LLM replies for the suggestion and SQL generation endpoints.
+
+The models do not always follow the requested output format, so each
+reply goes through a tolerant parser: numbered business logic
+suggestions, a single ``t1.col = t2.col`` join condition, and an
+``EXPLANATION:`` / ``SQL:`` pair whose SQL is stripped of markdown and
+trailing prose and checked for truncation. These run on every request and
+on replies of any length, so patterns are compiled once and line-level
+checks avoid repeated work per line; ``benchmark.py`` tracks their cost.
+"""
+import json
+import re
+from typing import List, Optional, Tuple
+
+MAX_SUGGESTIONS = 5
+# Suggestions shorter than this are list headings or fragments
+MIN_SUGGESTION_CHARS = 15
+
+_NUMBERED_RE = re.compile(r'^\d+\.\s*(.+)$')
+_JOIN_CONDITION_RE = re.compile(r't\d+\.\w+\s*=\s*t\d+\.\w+', re.IGNORECASE)
+_JOIN_PREFIXES = ("ON ", "WHERE ", "JOIN ON ", "```sql", "```")
+_SQL_START_RE = re.compile(r'\b(SELECT|WITH)\b', re.IGNORECASE)
+# A line containing any of these (as a substring of the upper-cased line) is kept as SQL
+_SQL_LINE_RE = re.compile(
+    "SELECT|FROM|WHERE|JOIN|GROUP|ORDER|LIMIT|HAVING|AND|OR|ON|AS|BY|WITH|CASE|WHEN|THEN|ELSE|END|UNION"
+    "|DISTINCT|COUNT|SUM|AVG|MAX|MIN|INNER|LEFT|RIGHT|OUTER|CROSS"
+)
+# Only the end of the query matters; the longest keyword plus its leading whitespace fits in the tail
+_TRAILING_KEYWORD_RE = re.compile(r'\s+(FROM|WHERE|AND|OR|JOIN|ON|GROUP|ORDER|HAVING)\s*$', re.IGNORECASE)
+_TAIL_CHARS = 64
+
+
+def parse_suggestions(text: str, limit: int = MAX_SUGGESTIONS) -> List[str]:
+    """Business logic suggestions from a numbered list, falling back to JSON or one per line"""
+    suggestions = []
+    for line in text.split('\n'):
+        match = _NUMBERED_RE.match(line.strip())
+        if match:
+            suggestion = match.group(1).strip().strip('"').strip("'")
+            if len(suggestion) > MIN_SUGGESTION_CHARS:
+                suggestions.append(suggestion)
+                if len(suggestions) == limit:
+                    return suggestions
+
+    if not suggestions:
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, list):
+            suggestions = parsed
+        else:
+            lines = (line.strip('- ').strip().strip('"').strip("'") for line in text.split('\n') if line.strip())
+            suggestions = [line for line in lines if len(line) > MIN_SUGGESTION_CHARS]
+    return suggestions[:limit]
+
+
+def extract_join_condition(text: str) -> str:
+    """The ``t1.col = t2.col`` condition from a reply that may include analysis or markdown"""
+    condition = text.strip().strip('"').strip("'").strip('`')
+    lines = condition.split('\n')
+
+    for line in lines:
+        line = line.strip()
+        if _JOIN_CONDITION_RE.search(line):
+            condition = line
+            break
+
+    # Still several lines: take the first one that is not a heading and has a comparison
+    if '\n' in condition:
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith('#') and not line.endswith(':') and '=' in line:
+                condition = line
+                break
+
+    for prefix in _JOIN_PREFIXES:
+        if condition.startswith(prefix):
+            condition = condition[len(prefix):].strip()
+    return condition.replace("```", "").strip()
+
+
+def _keep_sql_line(line: str) -> bool:
+    stripped = line.strip()
+    if not stripped:
+        # Keep empty lines for formatting
+        return True
+    # Prose starts with a capital letter and has no SQL keyword in it
+    return not stripped[0].isupper() or _SQL_LINE_RE.search(stripped.upper()) is not None
+
+
+def parse_generated_sql(text: str) -> Tuple[str, str]:
+    """(explanation, sql) from an ``EXPLANATION: ... SQL: ...`` reply, with surrounding prose removed"""
+    if "EXPLANATION:" in text and "SQL:" in text:
+        explanation, sql = text.split("SQL:", 1)
+        explanation = explanation.replace("EXPLANATION:", "").strip()
+        sql = sql.strip()
+    else:
+        # The model ignored the format
+        explanation, sql = "No explanation provided.", text
+
+    sql = sql.replace("```sql", "").replace("```", "").strip()
+
+    # Drop any English text before the first SELECT / WITH
+    start = _SQL_START_RE.search(sql)
+    if start:
+        sql = sql[start.start():]
+
+    sql = '\n'.join(line for line in sql.split('\n') if _keep_sql_line(line)).strip()
+    return explanation, sql
+
+
+def looks_truncated(sql: str) -> bool:
+    """True if ``sql`` ends in whitespace, a comma or a keyword that needs something after it"""
+    if not sql:
+        return False
+    if sql[-1].isspace() or sql[-1] == ",":
+        return True
+    return _TRAILING_KEYWORD_RE.search(sql[-_TAIL_CHARS:]) is not None
+
+
+def incomplete_sql_reason(sql: str, finish_reason: Optional[str] = None) -> Optional[str]:
+    """Why generated SQL looks incomplete, or None if it looks complete"""
+    open_parens = sql.count('(')
+    close_parens = sql.count(')')
+    unbalanced = open_parens != close_parens
+    if not (looks_truncated(sql) or unbalanced or finish_reason == "length"):
+        return None
+    reason = "Generated SQL query appears incomplete or truncated."
+    if unbalanced:
+        reason += f" Unbalanced parentheses: {open_parens} open, {close_parens} close."
+    if finish_reason == "length":
+        reason += " Response hit max_tokens limit."
+    return reason
@@ -0,0 +1,471 @@
+"""
+Load test for the QueryForge flow.
+
+Virtual users repeatedly run one of three flows, chosen by weight:
+
+* ``full``: browse to two tables, suggest business logic, suggest the join,
+  generate SQL, execute it and open the analytics page
+* ``browse``: catalogs, schemas, tables and columns only
+* ``analytics``: the Dashboard/Analytics bundle, query history and latency
+
+Every request is timed client-side and reported per endpoint (route
+template, so ``/api/catalogs/main/schemas`` and ``/api/catalogs/hive/schemas``
+are one entry) as throughput, p50/p95/p99 and error rate. A failed step
+ends its flow, so one slow dependency shows up as errors on the step that
+hit it rather than on every later one.
+
+``--spawn`` starts the app on the local warehouse backend and the local
+LLM stand-in (``local_llm.py``) with the given injected latencies, so runs
+are reproducible offline; it also samples the app process's CPU time and
+resident memory from ``/proc``. Results are written as JSON; pass a
+previous result as ``--baseline`` to fail the run (exit code 1) when p95
+or throughput regress by more than ``--threshold``::
+
+    python load_test.py --spawn --concurrency 20 --duration 60 \\
+        --warehouse-latency connect=300,execute=80,fetch=5,jitter=0.2 \\
+        --output load_results/after.json --baseline load_results/before.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent
+QUANTILES = (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99))
+FLOWS = ("full", "browse", "analytics")
+DEFAULT_MIX = "full=6,browse=3,analytics=1"
+# p95 changes smaller than this are noise, whatever the ratio
+MIN_P95_DELTA_MS = 5.0
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values), max(1, math.ceil(q * len(sorted_values))))
+    return sorted_values[index - 1]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse ``"full=6,browse=3,analytics=1"`` into flow weights"""
+    mix = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in FLOWS:
+            raise ValueError(f"Unknown flow {name!r}; expected one of {', '.join(FLOWS)}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("The flow mix needs at least one flow with a positive weight")
+    return mix
+
+
+class FlowError(Exception):
+    """A step failed; the rest of the flow is skipped"""
+
+
+class Recorder:
+    """Client-side latencies and errors per endpoint and outcomes per flow"""
+
+    def __init__(self):
+        self.recording = True
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.error_samples: Dict[str, str] = {}
+        self.flows: Dict[str, Dict[str, int]] = {}
+
+    def request(self, endpoint: str, seconds: float, error: Optional[str] = None):
+        if not self.recording:
+            return
+        self.latencies.setdefault(endpoint, []).append(seconds * 1000)
+        if error is not None:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            self.error_samples.setdefault(endpoint, error[:300])
+
+    def flow(self, name: str, ok: bool):
+        if not self.recording:
+            return
+        counts = self.flows.setdefault(name, {"completed": 0, "failed": 0})
+        counts["completed" if ok else "failed"] += 1
+
+    def summary(self, elapsed_seconds: float) -> Dict[str, Dict[str, Any]]:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            errors = self.errors.get(endpoint, 0)
+            stats = {
+                "count": len(values),
+                "rps": round(len(values) / elapsed_seconds, 2) if elapsed_seconds > 0 else 0.0,
+                "mean_ms": round(sum(values) / len(values), 1),
+                "max_ms": round(values[-1], 1),
+                "errors": errors,
+                "error_rate": round(errors / len(values), 4),
+            }
+            for name, q in QUANTILES:
+                stats[name] = round(percentile(values, q), 1)
+            if endpoint in self.error_samples:
+                stats["first_error"] = self.error_samples[endpoint]
+            endpoints[endpoint] = stats
+        return endpoints
+
+
+class User:
+    """One virtual user walking through the app"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, args, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.rng = rng
+
+    async def call(self, endpoint: str, method: str, path: str, **kwargs) -> Any:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.request(endpoint, time.perf_counter() - started, f"{type(e).__name__}: {e}")
+            raise FlowError(endpoint) from e
+        seconds = time.perf_counter() - started
+        if response.status_code >= 400:
+            self.recorder.request(endpoint, seconds, f"HTTP {response.status_code}: {response.text}")
+            raise FlowError(endpoint)
+        self.recorder.request(endpoint, seconds)
+        if self.args.think_time_ms:
+            await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_time_ms / 1000)
+        return response.json()
+
+    def pick(self, values: Sequence[str], preferred: Optional[str] = None) -> str:
+        if not values:
+            raise FlowError("nothing to pick")
+        return preferred if preferred in values else self.rng.choice(list(values))
+
+    async def browse(self) -> List[Dict[str, Any]]:
+        """Catalog browsing down to two tables; returns them as request TableInfo dicts"""
+        catalogs = (await self.call("GET /api/catalogs", "GET", "/api/catalogs"))["catalogs"]
+        catalog = self.pick(catalogs, self.args.catalog)
+        schemas = (await self.call("GET /api/catalogs/{catalog}/schemas", "GET", f"/api/catalogs/{catalog}/schemas"))["schemas"]
+        schema = self.pick(schemas, self.args.schema)
+        tables = (await self.call(
+            "GET /api/catalogs/{catalog}/schemas/{schema}/tables", "GET", f"/api/catalogs/{catalog}/schemas/{schema}/tables",
+        ))["tables"]
+        picked = self.rng.sample(tables, min(2, len(tables))) if tables else []
+        if not picked:
+            raise FlowError("no tables")
+        selected = []
+        for table in picked:
+            columns = (await self.call(
+                "GET /api/catalogs/{catalog}/schemas/{schema}/tables/{table}/columns",
+                "GET", f"/api/catalogs/{catalog}/schemas/{schema}/tables/{table}/columns",
+            ))["columns"]
+            names = [column["name"] for column in columns][:8]
+            selected.append({"catalog": catalog, "schema_name": schema, "table": table, "columns": names})
+        return selected
+
+    async def analytics(self):
+        await self.call("GET /api/analytics/bundle", "GET", "/api/analytics/bundle")
+        await self.call("GET /api/query-history", "GET", "/api/query-history")
+        await self.call("GET /api/analytics/latency", "GET", "/api/analytics/latency", params={"range": "24h"})
+
+    async def full(self):
+        tables = await self.browse()
+        session_id = f"load-{self.rng.getrandbits(64):016x}"
+        model_id = self.args.model
+        first = tables[0]
+        suggestions = (await self.call("POST /api/suggest-business-logic", "POST", "/api/suggest-business-logic", json={
+            **first, "additional_tables": tables[1:] or None, "model_id": model_id, "session_id": session_id,
+        }))["suggestions"]
+        join_conditions = None
+        if len(tables) > 1:
+            join_conditions = (await self.call("POST /api/suggest-join-conditions", "POST", "/api/suggest-join-conditions", json={
+                "tables": tables, "model_id": model_id, "session_id": session_id,
+            }))["join_condition"]
+        business_logic = suggestions[0] if suggestions else "Count the rows per day"
+        generated = await self.call("POST /api/generate-sql", "POST", "/api/generate-sql", json={
+            "tables": tables, "business_logic": business_logic, "model_id": model_id,
+            "join_conditions": join_conditions, "session_id": session_id,
+        })
+        await self.call("POST /api/execute-sql", "POST", "/api/execute-sql", json={
+            "sql_query": generated["sql_query"], "session_id": session_id,
+        })
+        await self.call("GET /api/analytics/bundle", "GET", "/api/analytics/bundle")
+
+    async def run(self, mix: Dict[str, float], deadline: float):
+        names, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(names, weights)[0]
+            try:
+                await getattr(self, name)()
+            except FlowError:
+                self.recorder.flow(name, ok=False)
+            else:
+                self.recorder.flow(name, ok=True)
+
+
+class ProcessSampler:
+    """Samples CPU time and resident memory of a Linux process from /proc"""
+
+    def __init__(self, pid: int, interval_seconds: float = 1.0):
+        self.pid = pid
+        self.interval_seconds = interval_seconds
+        self.rss_samples: List[int] = []
+        self._cpu_start: Optional[float] = None
+        self._cpu_end: Optional[float] = None
+        self._wall = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _cpu_seconds(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.pid}/stat") as handle:
+                fields = handle.read().rsplit(")", 1)[1].split()
+            # utime and stime, fields 14 and 15 of stat (11 and 12 after the command name)
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def _rss_bytes(self) -> Optional[int]:
+        try:
+            with open(f"/proc/{self.pid}/status") as handle:
+                for line in handle:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            return None
+        return None
+
+    async def _sample(self):
+        while True:
+            rss = self._rss_bytes()
+            if rss is not None:
+                self.rss_samples.append(rss)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        self._cpu_start = self._cpu_seconds()
+        self._wall = time.perf_counter()
+        self._task = asyncio.ensure_future(self._sample())
+
+    async def stop(self):
+        self._cpu_end = self._cpu_seconds()
+        self._wall = time.perf_counter() - self._wall
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def summary(self) -> Dict[str, Any]:
+        cpu = None
+        if self._cpu_start is not None and self._cpu_end is not None:
+            cpu = self._cpu_end - self._cpu_start
+        mb = [rss / (1024 * 1024) for rss in self.rss_samples]
+        return {
+            "pid": self.pid,
+            "cpu_seconds": round(cpu, 2) if cpu is not None else None,
+            "cpu_percent": round(100 * cpu / self._wall, 1) if cpu is not None and self._wall > 0 else None,
+            "rss_mb_max": round(max(mb), 1) if mb else None,
+            "rss_mb_mean": round(sum(mb) / len(mb), 1) if mb else None,
+        }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, max_error_rate_increase: float) -> List[str]:
+    """Regressions of ``current`` against ``baseline``, one message per endpoint and measure"""
+    regressions = []
+    for endpoint, before in baseline.get("endpoints", {}).items():
+        after = current["endpoints"].get(endpoint)
+        if after is None:
+            continue
+        if before.get("p95_ms") and after["p95_ms"] > before["p95_ms"] * (1 + threshold) \
+                and after["p95_ms"] - before["p95_ms"] >= MIN_P95_DELTA_MS:
+            regressions.append(f"{endpoint}: p95 {before['p95_ms']} ms -> {after['p95_ms']} ms")
+        if before.get("rps") and after["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{endpoint}: throughput {before['rps']} -> {after['rps']} req/s")
+        if after["error_rate"] > before.get("error_rate", 0) + max_error_rate_increase:
+            regressions.append(f"{endpoint}: error rate {before.get('error_rate', 0):.2%} -> {after['error_rate']:.2%}")
+    return regressions
+
+
+def print_report(result: Dict[str, Any]):
+    header = f"{'endpoint':<70} {'count':>7} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, stats in result["endpoints"].items():
+        print(f"{endpoint:<70} {stats['count']:>7} {stats['rps']:>7} {stats['p50_ms']:>8} "
+              f"{stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['error_rate']:>7.1%}")
+    print(f"\nflows: {json.dumps(result['flows'])}")
+    if result.get("server"):
+        print(f"server: {json.dumps(result['server'])}")
+
+
+def spawn_stack(args) -> List[subprocess.Popen]:
+    """Start the LLM stand-in and the app on the local warehouse backend"""
+    processes = []
+    log = open(args.server_log, "w", encoding="utf-8")
+    llm_command = [sys.executable, "local_llm.py", "--port", str(args.llm_port), "--seed", str(args.seed)]
+    if args.llm_script:
+        llm_command += ["--script", os.path.abspath(args.llm_script)]
+    processes.append(subprocess.Popen(llm_command, cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT))
+
+    env = dict(os.environ)
+    env.update({
+        "WAREHOUSE_BACKEND": "local",
+        "LOCAL_WAREHOUSE_LATENCY": args.warehouse_latency,
+        "LLM_BASE_URL": f"http://127.0.0.1:{args.llm_port}/serving-endpoints",
+        "AUDIT_SPOOL_DIR": tempfile.mkdtemp(prefix="queryforge-load-spool-"),
+    })
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    ))
+    return processes
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout_seconds: float = 30.0):
+    deadline = time.perf_counter() + timeout_seconds
+    while True:
+        try:
+            if (await client.get("/api/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.perf_counter() >= deadline:
+            raise RuntimeError(f"App did not become healthy within {timeout_seconds:.0f}s")
+        await asyncio.sleep(0.25)
+
+
+async def run_load(args, base_url: str, server_pid: Optional[int] = None, transport=None) -> Dict[str, Any]:
+    """Run the configured load and return the result document"""
+    mix = parse_mix(args.mix)
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits, transport=transport) as client:
+        await wait_ready(client)
+        started_at = datetime.now().isoformat(timespec="seconds")
+        sampler = ProcessSampler(server_pid) if server_pid else None
+        rng = random.Random(args.seed)
+        users = [User(client, recorder, args, random.Random(rng.getrandbits(32))) for _ in range(args.concurrency)]
+
+        if args.warmup > 0:
+            recorder.recording = False
+            await asyncio.gather(*(user.run(mix, time.perf_counter() + args.warmup) for user in users))
+            recorder.recording = True
+
+        if sampler:
+            sampler.start()
+        measured = time.perf_counter()
+        await asyncio.gather(*(user.run(mix, measured + args.duration) for user in users))
+        elapsed = time.perf_counter() - measured
+        if sampler:
+            await sampler.stop()
+
+        server: Dict[str, Any] = sampler.summary() if sampler else {}
+        try:
+            server["pool"] = (await client.get("/api/debug/pool")).json()
+        except (httpx.HTTPError, ValueError):
+            pass
+
+    return {
+        "started_at": started_at,
+        "base_url": base_url,
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "mix": mix,
+            "model": args.model,
+            "think_time_ms": args.think_time_ms,
+            "warehouse_latency": args.warehouse_latency if args.spawn else None,
+            "llm_script": args.llm_script if args.spawn else None,
+            "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "endpoints": recorder.summary(elapsed),
+        "flows": recorder.flows,
+        "server": server,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load test the QueryForge flow and report per-endpoint latency")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="App to test (ignored with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Start the app on local stand-ins for the run")
+    parser.add_argument("--port", type=int, default=8765, help="App port with --spawn")
+    parser.add_argument("--llm-port", type=int, default=8766, help="LLM stand-in port with --spawn")
+    parser.add_argument("--warehouse-latency", default="connect=300,execute=80,fetch=5,jitter=0.2",
+                        help="LOCAL_WAREHOUSE_LATENCY for the spawned app")
+    parser.add_argument("--llm-script", help="Rules file for the LLM stand-in (see local_llm.py)")
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "queryforge-load-test.log"),
+                        help="Output of the spawned app and LLM stand-in")
+    parser.add_argument("--server-pid", type=int, help="Sample CPU and memory of this process (automatic with --spawn)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=60.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before the run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Flow weights (default {DEFAULT_MIX})")
+    parser.add_argument("--catalog", default="main", help="Catalog to browse when present")
+    parser.add_argument("--schema", default="sales", help="Schema to browse when present")
+    parser.add_argument("--model", default="databricks-llama-4-maverick")
+    parser.add_argument("--think-time-ms", type=float, default=0.0, help="Mean pause between steps of a flow")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Result JSON path (default load_results/load_test_<time>.json)")
+    parser.add_argument("--baseline", help="Earlier result JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative p95 increase / throughput drop per endpoint (default 0.2)")
+    parser.add_argument("--max-error-rate-increase", type=float, default=0.01,
+                        help="Allowed absolute error rate increase per endpoint (default 0.01)")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    processes: List[subprocess.Popen] = []
+    base_url, server_pid = args.base_url, args.server_pid
+    if args.spawn:
+        processes = spawn_stack(args)
+        base_url, server_pid = f"http://127.0.0.1:{args.port}", processes[-1].pid
+    try:
+        result = asyncio.run(run_load(args, base_url, server_pid))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    output = Path(args.output or BACKEND_DIR / "load_results" / f"load_test_{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        result["baseline"] = {"path": args.baseline, "threshold": args.threshold}
+        result["regressions"] = compare(result, baseline, args.threshold, args.max_error_rate_increase)
+        if baseline.get("config", {}).get("concurrency") != args.concurrency:
+            print(f"Warning: baseline ran at concurrency {baseline.get('config', {}).get('concurrency')}, "
+                  f"this run at {args.concurrency}")
+    output.write_text(json.dumps(result, indent=2))
+
+    print_report(result)
+    print(f"\nResults written to {output}")
+    if args.spawn:
+        print(f"Server output in {args.server_log}")
+    for regression in result.get("regressions", []):
+        print(f"REGRESSION {regression}")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,352 @@
+"""
+OpenAI-compatible stand-in for the model serving endpoints.
+
+Business logic suggestions, join suggestions and SQL generation all call
+``/chat/completions`` through ``LLMClient``, so pointing ``LLM_BASE_URL``
+at this server runs the whole pipeline offline. Together with the local
+warehouse backend that makes latency experiments and load tests
+reproducible and free.
+
+Responses come from rules matched against the request's messages (and
+optionally the model), first match wins. Each rule sets the reply text,
+a latency distribution for the time to first token, a token rate for the
+rest of the reply, and the probability of an injected error, a hang (the
+client times out) or a truncated reply (``finish_reason="length"``).
+Replies longer than the request's ``max_tokens`` are truncated the same
+way. The built-in rules answer the app's three prompts in the formats its
+parsers expect; a JSON script replaces or extends them::
+
+    {
+      "seed": 7,
+      "latency": {"distribution": "lognormal", "median_ms": 800, "p95_ms": 2500},
+      "tokens_per_second": 80,
+      "rules": [
+        {"pattern": "JOIN CONDITION:", "content": "t1.customer_id = t2.customer_id",
+         "latency": {"distribution": "uniform", "min_ms": 100, "max_ms": 300}},
+        {"pattern": "Business Logic:", "model": "gpt-5", "error_rate": 0.05, "error_status": 429}
+      ]
+    }
+
+``{table}`` in a reply is replaced with the first table named in the
+prompt and ``{model}`` with the requested model. Token counts are
+estimated at four characters per token. Run it with::
+
+    python local_llm.py --port 8001 --script llm_script.json
+
+and start the app with ``LLM_BASE_URL=http://localhost:8001/serving-endpoints``.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHARS_PER_TOKEN = 4
+_TABLE_RE = re.compile(r"Table(?: \d+)?: (\w+\.\w+\.\w+)")
+# z-score of the 95th percentile, used to turn a median/p95 pair into a lognormal sigma
+_Z95 = 1.6448536269514722
+
+
+def count_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+
+class LatencyDistribution:
+    """Random delay in seconds: fixed, uniform, normal or lognormal, configured in milliseconds"""
+
+    def __init__(self, distribution: str = "fixed", **params: float):
+        if distribution not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution {distribution!r}")
+        self.distribution = distribution
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec: Any) -> "LatencyDistribution":
+        """Build from a number of milliseconds or a ``{"distribution": ..., ...}`` mapping"""
+        if spec is None:
+            return cls("fixed", ms=0)
+        if isinstance(spec, (int, float)):
+            return cls("fixed", ms=float(spec))
+        spec = dict(spec)
+        return cls(spec.pop("distribution", "fixed"), **{key: float(value) for key, value in spec.items()})
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.distribution == "fixed":
+            ms = p.get("ms", 0.0)
+        elif self.distribution == "uniform":
+            ms = rng.uniform(p.get("min_ms", 0.0), p["max_ms"])
+        elif self.distribution == "normal":
+            ms = rng.gauss(p["mean_ms"], p.get("stddev_ms", 0.0))
+        else:
+            median = p["median_ms"]
+            sigma = math.log(p["p95_ms"] / median) / _Z95 if p.get("p95_ms", 0) > median else 0.0
+            ms = rng.lognormvariate(math.log(median), sigma)
+        return max(0.0, ms) / 1000.0
+
+
+class Rule:
+    """One scripted response and its injected latency and failures"""
+
+    def __init__(
+        self,
+        pattern: str = "",
+        content: Any = "OK",
+        model: Optional[str] = None,
+        latency: Any = None,
+        tokens_per_second: Optional[float] = None,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        error_message: str = "The serving endpoint is temporarily unavailable",
+        timeout_rate: float = 0.0,
+        truncate_rate: float = 0.0,
+        name: Optional[str] = None,
+    ):
+        self.name = name or pattern or "default"
+        self.pattern = re.compile(pattern, re.IGNORECASE | re.DOTALL)
+        self.model = re.compile(model, re.IGNORECASE) if model else None
+        # A list of replies is served round-robin
+        self._contents = itertools.cycle([content] if isinstance(content, str) else list(content))
+        self.latency = LatencyDistribution.parse(latency) if latency is not None else None
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.error_message = error_message
+        self.timeout_rate = timeout_rate
+        self.truncate_rate = truncate_rate
+
+    def matches(self, model: str, prompt: str) -> bool:
+        if self.model is not None and not self.model.search(model):
+            return False
+        return bool(self.pattern.search(prompt))
+
+    def next_content(self) -> str:
+        return next(self._contents)
+
+
+DEFAULT_RULES = (
+    Rule(
+        name="join_conditions",
+        pattern=r"JOIN CONDITION:\s*$",
+        content="t1.customer_id = t2.customer_id",
+        latency={"distribution": "lognormal", "median_ms": 400, "p95_ms": 1200},
+    ),
+    Rule(
+        name="generate_sql",
+        pattern=r"Business Logic:",
+        content=(
+            "EXPLANATION: Returns a sample of rows from {table} so the result can be checked before refining the question.\n"
+            "SQL: SELECT *\nFROM {table}\nLIMIT 100"
+        ),
+        latency={"distribution": "lognormal", "median_ms": 1500, "p95_ms": 4000},
+    ),
+    Rule(
+        name="business_logic",
+        pattern=r"business logic examples",
+        content=(
+            "1. Which customers placed the most orders in the last quarter, and what was their total spend?\n"
+            "2. How does the average order amount compare across regions?\n"
+            "3. What share of orders were returned each month this year?\n"
+            "4. Which regions grew their order volume fastest compared with the previous quarter?\n"
+            "5. What are the ten largest open orders and who placed them?"
+        ),
+        latency={"distribution": "lognormal", "median_ms": 900, "p95_ms": 2500},
+    ),
+    Rule(name="default", content="OK"),
+)
+
+
+class LocalLLM:
+    """Matches chat completion requests to rules and plays back their responses"""
+
+    def __init__(
+        self,
+        rules: Sequence[Rule] = DEFAULT_RULES,
+        latency: Any = None,
+        tokens_per_second: Optional[float] = None,
+        hang_seconds: float = 600.0,
+        seed: Optional[int] = None,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self.rules = list(rules)
+        self.latency = LatencyDistribution.parse(latency)
+        self.tokens_per_second = tokens_per_second
+        self.hang_seconds = hang_seconds
+        self._random = random.Random(seed)
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_script(cls, script: Dict[str, Any], **kwargs) -> "LocalLLM":
+        """Build from a parsed JSON script; its rules are tried before the built-in ones"""
+        rules = [Rule(**rule) for rule in script.get("rules", ())]
+        if script.get("include_defaults", True):
+            rules += DEFAULT_RULES
+        kwargs.setdefault("seed", script.get("seed"))
+        kwargs.setdefault("hang_seconds", script.get("hang_seconds", 600.0))
+        return cls(rules, latency=script.get("latency"), tokens_per_second=script.get("tokens_per_second"), **kwargs)
+
+    def _count(self, rule: Rule, outcome: str):
+        with self._lock:
+            counts = self._stats.setdefault(rule.name, {"calls": 0, "errors": 0, "timeouts": 0, "truncated": 0})
+            counts[outcome] += 1
+
+    def _chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def _delay(self, distribution: LatencyDistribution) -> float:
+        with self._lock:
+            return distribution.sample(self._random)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def plan(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Decide the reply, delays and injected failure for one request"""
+        model = body.get("model", "")
+        messages = body.get("messages") or []
+        prompt = "\n".join(str(message.get("content") or "") for message in messages)
+        rule = next((rule for rule in self.rules if rule.matches(model, prompt)), None) or Rule()
+        self._count(rule, "calls")
+
+        tables = _TABLE_RE.findall(prompt)
+        content = rule.next_content().replace("{table}", tables[0] if tables else "main.default.table")
+        content = content.replace("{model}", model)
+        finish_reason = "stop"
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+        if max_tokens and count_tokens(content) > max_tokens:
+            content, finish_reason = content[:max_tokens * CHARS_PER_TOKEN], "length"
+        elif self._chance(rule.truncate_rate):
+            content, finish_reason = content[:max(1, len(content) // 2)], "length"
+        if finish_reason == "length":
+            self._count(rule, "truncated")
+
+        failure = None
+        if self._chance(rule.error_rate):
+            failure = "error"
+            self._count(rule, "errors")
+        elif self._chance(rule.timeout_rate):
+            failure = "timeout"
+            self._count(rule, "timeouts")
+
+        tokens_per_second = rule.tokens_per_second or self.tokens_per_second
+        completion_tokens = count_tokens(content)
+        return {
+            "rule": rule,
+            "model": model,
+            "content": content,
+            "finish_reason": finish_reason,
+            "failure": failure,
+            "first_token_seconds": self._delay(rule.latency or self.latency),
+            "seconds_per_token": 1.0 / tokens_per_second if tokens_per_second else 0.0,
+            "usage": {
+                "prompt_tokens": count_tokens(prompt),
+                "completion_tokens": completion_tokens,
+                "total_tokens": count_tokens(prompt) + completion_tokens,
+            },
+        }
+
+    async def complete(self, body: Dict[str, Any]):
+        """Response for one ``/chat/completions`` request"""
+        plan = self.plan(body)
+        await self._sleep(plan["first_token_seconds"])
+        if plan["failure"] == "timeout":
+            await self._sleep(self.hang_seconds)
+        if plan["failure"] is not None:
+            rule = plan["rule"]
+            return JSONResponse(
+                status_code=rule.error_status,
+                content={"error": {"message": rule.error_message, "type": "server_error", "code": rule.error_status}},
+            )
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(self._stream(plan, include_usage), media_type="text/event-stream")
+        await self._sleep(plan["usage"]["completion_tokens"] * plan["seconds_per_token"])
+        return JSONResponse(content={
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": plan["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": plan["content"]},
+                "finish_reason": plan["finish_reason"],
+            }],
+            "usage": plan["usage"],
+        })
+
+    async def _stream(self, plan: Dict[str, Any], include_usage: bool):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def chunk(choices: List[Dict[str, Any]], usage: Optional[Dict[str, int]] = None) -> str:
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                       "model": plan["model"], "choices": choices}
+            if usage is not None:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        yield chunk([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        content = plan["content"]
+        for start in range(0, len(content), CHARS_PER_TOKEN):
+            await self._sleep(plan["seconds_per_token"])
+            yield chunk([{"index": 0, "delta": {"content": content[start:start + CHARS_PER_TOKEN]}, "finish_reason": None}])
+        yield chunk([{"index": 0, "delta": {}, "finish_reason": plan["finish_reason"]}])
+        if include_usage:
+            yield chunk([], plan["usage"])
+        yield "data: [DONE]\n\n"
+
+
+def create_app(llm: LocalLLM) -> FastAPI:
+    """FastAPI app serving ``llm`` under ``/``, ``/v1`` and ``/serving-endpoints``"""
+    router = APIRouter()
+
+    @router.post("/chat/completions")
+    async def chat_completions(request: Request):
+        return await llm.complete(await request.json())
+
+    @router.get("/stats")
+    async def stats():
+        return llm.stats()
+
+    app = FastAPI(title="Local LLM stand-in")
+    for prefix in ("", "/v1", "/serving-endpoints"):
+        app.include_router(router, prefix=prefix)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in for the model serving endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--script", help="JSON file with rules, latency and failure injection")
+    parser.add_argument("--seed", type=int, help="Seed for latency and failure sampling")
+    args = parser.parse_args()
+
+    script: Dict[str, Any] = {}
+    if args.script:
+        with open(args.script, encoding="utf-8") as handle:
+            script = json.load(handle)
+    if args.seed is not None:
+        script["seed"] = args.seed
+
+    import uvicorn
+    uvicorn.run(create_app(LocalLLM.from_script(script)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,831 @@
+"""
+Embedded stand-in for the Databricks SQL warehouse.
+
+Everything the app does goes through a DB-API connection from
+``connect_warehouse``, so the warehouse backend is pluggable at that one
+seam: the Databricks SQL connector in production, or this module for
+tests, benchmarks and load tests that must not depend on a workspace.
+
+``LocalWarehouse`` keeps Unity Catalog style ``catalog.schema.table``
+tables in one SQLite database (in memory by default) and answers the
+statements the app issues:
+
+* ``SHOW CATALOGS``, ``SHOW SCHEMAS IN``, ``SHOW TABLES IN``,
+  ``DESCRIBE [TABLE] [EXTENDED]``, ``DESCRIBE HISTORY`` and the
+  ``information_schema`` queries of the bulk metadata loader
+* ``SELECT`` with the Databricks functions the app uses (``COUNT_IF``,
+  ``LEFT``, ``date_trunc``, ``COLLECT_SET``, ``array_contains``,
+  ``percentile_approx``, the HLL sketch functions) and ``GROUPING SETS``,
+  which are expanded into one ``UNION ALL`` branch per set
+* the batched audit ``INSERT`` and the spool replay ``MERGE``
+
+Statements that are not supported (e.g. the rollup's ``MERGE ... WHEN
+MATCHED``) raise ``LocalWarehouseError`` the way an unsupported statement
+fails on a real warehouse. Timestamps come back as ``datetime`` and
+arrays as lists, like the connector returns them.
+
+Latency is injected per connect, statement and fetch from a
+``LatencyProfile`` so load tests see warehouse-like timings while the SQL
+itself runs in microseconds. SQLite runs one statement at a time; the
+injected delays are slept outside its lock so concurrent requests still
+overlap the way they would on a warehouse.
+"""
+import json
+import math
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Prefix of values stored as JSON (arrays, maps, sketches), so they can be returned as Python objects
+_JSON_MARKER = "\x1ejson:"
+_TIMESTAMP_RE = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d{1,6})?$")
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_TOKEN_RE = re.compile(
+    r"(?P<string>'(?:[^']|'')*')"
+    r"|(?P<quoted>`(?:[^`]|``)*`|\"(?:[^\"]|\"\")*\")"
+    r"|(?P<comment>--[^\n]*)"
+    r"|(?P<word>[A-Za-z_][A-Za-z0-9_]*)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>.)",
+    re.DOTALL,
+)
+
+_AGGREGATES = {
+    "SUM", "COUNT", "MIN", "MAX", "AVG", "TOTAL", "GROUP_CONCAT", "COUNT_IF", "COLLECT_SET",
+    "PERCENTILE_APPROX", "HLL_SKETCH_AGG", "HLL_UNION_AGG",
+}
+
+# date_trunc unit -> how many leading datetime fields it keeps
+_TRUNC_FIELDS = {"YEAR": 1, "MONTH": 2, "DAY": 3, "HOUR": 4, "MINUTE": 5, "SECOND": 6}
+
+_SPOOL_MERGE_RE = re.compile(
+    r"^MERGE INTO (?P<table>\S+) AS target\s+"
+    r"USING \(SELECT \* FROM VALUES (?P<values>.*) AS source\((?P<columns>[^)]*)\)\) AS source\s+"
+    r"ON target\.(?P<key>\w+) = source\.\w+\s+"
+    r"WHEN NOT MATCHED THEN INSERT \([^)]*\)\s+VALUES \([^)]*\)$",
+    re.IGNORECASE | re.DOTALL,
+)
+_NAME = r"(`[^`]+`|[\w]+)"
+_FULL_NAME = rf"{_NAME}\.{_NAME}\.{_NAME}"
+
+
+class LocalWarehouseError(Exception):
+    """Raised for statements the local warehouse does not support"""
+
+
+class LatencyProfile:
+    """Injected delays, in milliseconds, for connect, each statement and each fetch"""
+
+    def __init__(
+        self,
+        connect_ms: float = 0.0,
+        execute_ms: float = 0.0,
+        fetch_ms: float = 0.0,
+        jitter: float = 0.0,
+        seed: Optional[int] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.delays_ms = {"connect": connect_ms, "execute": execute_ms, "fetch": fetch_ms}
+        self.jitter = max(0.0, min(1.0, jitter))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sleep = sleep
+
+    def delay(self, operation: str) -> float:
+        """Seconds to wait for ``operation``, base delay +/- jitter"""
+        base = self.delays_ms.get(operation, 0.0) / 1000.0
+        if base <= 0 or not self.jitter:
+            return max(0.0, base)
+        with self._lock:
+            factor = 1.0 + self._random.uniform(-self.jitter, self.jitter)
+        return base * factor
+
+    def wait(self, operation: str):
+        seconds = self.delay(operation)
+        if seconds > 0:
+            self._sleep(seconds)
+
+
+def parse_latency(spec: str) -> LatencyProfile:
+    """Parse ``"connect=200,execute=80,fetch=5,jitter=0.2,seed=7"`` into a LatencyProfile"""
+    values: Dict[str, float] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        key, _, value = item.partition("=")
+        key = key.strip().lower()
+        if key not in ("connect", "execute", "fetch", "jitter", "seed"):
+            raise ValueError(f"Unknown local warehouse latency setting {key!r}")
+        values[key] = float(value)
+    return LatencyProfile(
+        connect_ms=values.get("connect", 0.0),
+        execute_ms=values.get("execute", 0.0),
+        fetch_ms=values.get("fetch", 0.0),
+        jitter=values.get("jitter", 0.0),
+        seed=int(values["seed"]) if "seed" in values else None,
+    )
+
+
+# ----------------------------------------------------------------------
+# Value conversion
+# ----------------------------------------------------------------------
+
+def _format_timestamp(value: datetime) -> str:
+    return value.isoformat(sep=" ", timespec="microseconds")
+
+
+def _to_sqlite(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return _format_timestamp(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (list, tuple, dict, set)):
+        return _dump_json(list(value) if isinstance(value, (tuple, set)) else value)
+    return value
+
+
+def _from_sqlite(value: Any) -> Any:
+    if isinstance(value, str):
+        if value.startswith(_JSON_MARKER):
+            return json.loads(value[len(_JSON_MARKER):])
+        if _TIMESTAMP_RE.match(value):
+            return datetime.fromisoformat(value)
+        if _DATE_RE.match(value):
+            return date.fromisoformat(value)
+    return value
+
+
+def _dump_json(value: Any) -> str:
+    return _JSON_MARKER + json.dumps(value, default=str)
+
+
+def _load_json(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(_JSON_MARKER):
+        return json.loads(value[len(_JSON_MARKER):])
+    return value
+
+
+# ----------------------------------------------------------------------
+# Databricks functions
+# ----------------------------------------------------------------------
+
+def _left(value, length):
+    return None if value is None or length is None else str(value)[:int(length)]
+
+
+def _date_trunc(unit, value):
+    if value is None or unit is None:
+        return None
+    ts = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    unit = str(unit).upper()
+    if unit == "WEEK":
+        monday = ts.date() - timedelta(days=ts.weekday())
+        return _format_timestamp(datetime(monday.year, monday.month, monday.day))
+    if unit not in _TRUNC_FIELDS:
+        raise ValueError(f"Unsupported date_trunc unit {unit}")
+    parts = [ts.year, ts.month, ts.day, ts.hour, ts.minute, ts.second][:_TRUNC_FIELDS[unit]]
+    return _format_timestamp(datetime(*(parts + [1, 1, 1, 0, 0, 0][len(parts):])))
+
+
+def _array(*values):
+    return _dump_json(list(values))
+
+
+def _array_contains(array, value):
+    values = _load_json(array)
+    if values is None:
+        return None
+    return int(value in values)
+
+
+def _hll_sketch_estimate(sketch):
+    values = _load_json(sketch)
+    return None if values is None else len(values)
+
+
+class _CountIf:
+    def __init__(self):
+        self.count = 0
+
+    def step(self, condition):
+        if condition:
+            self.count += 1
+
+    def finalize(self):
+        return self.count
+
+
+class _CollectSet:
+    def __init__(self):
+        self.values: Dict[Any, None] = {}
+
+    def step(self, value):
+        if value is not None:
+            self.values[value] = None
+
+    def finalize(self):
+        return _dump_json(list(self.values))
+
+
+class _HllUnion(_CollectSet):
+    def step(self, sketch):
+        for value in _load_json(sketch) or ():
+            self.values[value] = None
+
+
+class _PercentileApprox:
+    def __init__(self):
+        self.values: List[float] = []
+        self.percentages = None
+
+    def step(self, value, percentage):
+        self.percentages = _load_json(percentage)
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        if not self.values:
+            return None
+        ordered = sorted(self.values)
+
+        def at(q):
+            # Nearest rank
+            return ordered[min(len(ordered) - 1, max(0, math.ceil(float(q) * len(ordered)) - 1))]
+
+        if isinstance(self.percentages, list):
+            return _dump_json([at(q) for q in self.percentages])
+        return at(float(self.percentages))
+
+
+def _register_functions(db: sqlite3.Connection):
+    db.create_function("qf_left", 2, _left, deterministic=True)
+    db.create_function("date_trunc", 2, _date_trunc, deterministic=True)
+    db.create_function("array", -1, _array, deterministic=True)
+    db.create_function("array_contains", 2, _array_contains, deterministic=True)
+    db.create_function("hll_sketch_estimate", 1, _hll_sketch_estimate, deterministic=True)
+    db.create_aggregate("count_if", 1, _CountIf)
+    db.create_aggregate("collect_set", 1, _CollectSet)
+    db.create_aggregate("hll_sketch_agg", 1, _CollectSet)
+    db.create_aggregate("hll_union_agg", 1, _HllUnion)
+    db.create_aggregate("percentile_approx", 2, _PercentileApprox)
+
+
+# ----------------------------------------------------------------------
+# SQL translation
+# ----------------------------------------------------------------------
+
+def _tokenize(sql: str) -> List[Tuple[str, str]]:
+    return [(match.lastgroup, match.group()) for match in _TOKEN_RE.finditer(sql)]
+
+
+def _identifier(token: Tuple[str, str]) -> Optional[str]:
+    kind, text = token
+    if kind == "word":
+        return text
+    if kind == "quoted":
+        return text[1:-1].replace(text[0] * 2, text[0])
+    return None
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _join(tokens: Iterable[Tuple[str, str]]) -> str:
+    return "".join(text for _, text in tokens)
+
+
+def _merge_names(tokens: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Turn ``catalog.schema.table`` into one quoted SQLite identifier and ``LEFT(`` into ``qf_left(``"""
+    merged: List[Tuple[str, str]] = []
+    i = 0
+    while i < len(tokens):
+        parts = tokens[i:i + 5]
+        if (len(parts) == 5 and all(_identifier(parts[j]) is not None for j in (0, 2, 4))
+                and parts[1][1] == "." and parts[3][1] == "."
+                and not (merged and merged[-1][1] == ".")
+                and not (i + 5 < len(tokens) and tokens[i + 5][1] == ".")):
+            name = ".".join(_identifier(parts[j]) for j in (0, 2, 4))
+            merged.append(("quoted", _quote(name)))
+            i += 5
+            continue
+        kind, text = tokens[i]
+        if kind == "word" and text.upper() == "LEFT" and _next_text(tokens, i) == "(":
+            merged.append(("word", "qf_left"))
+        else:
+            merged.append((kind, text))
+        i += 1
+    return merged
+
+
+def _next_index(tokens: List[Tuple[str, str]], i: int) -> int:
+    j = i + 1
+    while j < len(tokens) and tokens[j][0] in ("space", "comment"):
+        j += 1
+    return j
+
+
+def _next_text(tokens: List[Tuple[str, str]], i: int) -> Optional[str]:
+    j = _next_index(tokens, i)
+    return tokens[j][1] if j < len(tokens) else None
+
+
+def _prev_text(tokens: List[Tuple[str, str]], i: int) -> Optional[str]:
+    j = i - 1
+    while j >= 0 and tokens[j][0] in ("space", "comment"):
+        j -= 1
+    return tokens[j][1] if j >= 0 else None
+
+
+def _matching_paren(tokens: List[Tuple[str, str]], start: int) -> int:
+    depth = 0
+    for i in range(start, len(tokens)):
+        if tokens[i][1] == "(":
+            depth += 1
+        elif tokens[i][1] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise LocalWarehouseError("Unbalanced parentheses")
+
+
+def _split_top_level(tokens: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+    parts: List[List[Tuple[str, str]]] = [[]]
+    depth = 0
+    for token in tokens:
+        if token[1] == "(":
+            depth += 1
+        elif token[1] == ")":
+            depth -= 1
+        if token[1] == "," and depth == 0:
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    return parts
+
+
+def _top_level_words(tokens: List[Tuple[str, str]]) -> List[Tuple[int, str]]:
+    words = []
+    depth = 0
+    for i, (kind, text) in enumerate(tokens):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word":
+            words.append((i, text.upper()))
+    return words
+
+
+def _substitute(tokens: List[Tuple[str, str]], grouped: set, missing: set) -> str:
+    """Resolve GROUPING() and null out columns that are not grouped in this set, outside aggregates"""
+    out = []
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        upper = text.upper() if kind == "word" else None
+        nxt = _next_index(tokens, i)
+        if upper == "GROUPING" and nxt < len(tokens) and tokens[nxt][1] == "(":
+            end = _matching_paren(tokens, nxt)
+            column = _join(tokens[nxt + 1:end]).strip().strip('`"').lower()
+            out.append("0" if column in grouped else "1")
+            i = end + 1
+            continue
+        if upper in _AGGREGATES and nxt < len(tokens) and tokens[nxt][1] == "(":
+            end = _matching_paren(tokens, nxt)
+            out.append(_join(tokens[i:end + 1]))
+            i = end + 1
+            continue
+        name = _identifier(tokens[i])
+        if (name is not None and name.lower() in missing
+                and _prev_text(tokens, i) not in (".",) and (_prev_text(tokens, i) or "").upper() != "AS"
+                and _next_text(tokens, i) not in ("(", ".")):
+            out.append("NULL")
+        else:
+            out.append(text)
+        i += 1
+    return "".join(out)
+
+
+def _expand_grouping_sets(tokens: List[Tuple[str, str]]) -> Optional[str]:
+    """Rewrite ``GROUP BY GROUPING SETS`` as a UNION ALL of one GROUP BY per set, or None if absent"""
+    words = _top_level_words(tokens)
+    group_at = None
+    for n in range(len(words) - 3):
+        if [word for _, word in words[n:n + 4]] == ["GROUP", "BY", "GROUPING", "SETS"]:
+            group_at, sets_word = words[n][0], words[n + 3][0]
+            break
+    if group_at is None:
+        return None
+
+    selects = [i for i, word in words if word == "SELECT" and i < group_at]
+    froms = [i for i, word in words if word == "FROM" and selects and selects[-1] < i < group_at]
+    if not selects or not froms:
+        raise LocalWarehouseError("GROUPING SETS needs a SELECT ... FROM ... GROUP BY statement")
+    select_at, from_at = selects[-1], froms[0]
+
+    sets_open = _next_index(tokens, sets_word)
+    sets_close = _matching_paren(tokens, sets_open)
+    grouping_sets = []
+    for part in _split_top_level(tokens[sets_open + 1:sets_close]):
+        text = _join(part).strip()
+        if text.startswith("(") and text.endswith(")"):
+            text = text[1:-1]
+        grouping_sets.append([name.strip().strip('`"') for name in text.split(",") if name.strip()])
+    all_columns = {name.lower() for columns in grouping_sets for name in columns}
+
+    rest = tokens[sets_close + 1:]
+    rest_words = _top_level_words(rest)
+    having_at = next((i for i, word in rest_words if word == "HAVING"), None)
+    tail_at = next((i for i, word in rest_words if word in ("ORDER", "LIMIT")), len(rest))
+    having = rest[having_at + 1:tail_at] if having_at is not None else None
+    tail = _join(rest[tail_at:])
+
+    branches = []
+    for columns in grouping_sets:
+        grouped = {name.lower() for name in columns}
+        missing = all_columns - grouped
+        items = []
+        for item in _split_top_level(tokens[select_at + 1:from_at]):
+            name = _identifier(next((t for t in item if t[0] not in ("space", "comment")), ("other", "")))
+            significant = [t for t in item if t[0] not in ("space", "comment")]
+            if len(significant) == 1 and name is not None and name.lower() in missing:
+                items.append(f"NULL AS {name}")
+            else:
+                items.append(_substitute(item, grouped, missing).strip())
+        branch = f"SELECT {', '.join(items)} {_join(tokens[from_at:group_at]).strip()}"
+        if columns:
+            branch += f" GROUP BY {', '.join(columns)}"
+        if having is not None:
+            branch += f" HAVING {_substitute(having, grouped, missing).strip()}"
+        branches.append(branch)
+
+    prefix = _join(tokens[:select_at])
+    return f"{prefix}SELECT * FROM ({' UNION ALL '.join(branches)}) AS grouping_sets {tail}".strip()
+
+
+def translate(sql: str) -> str:
+    """Rewrite a Databricks SQL statement into SQLite"""
+    tokens = _merge_names(_tokenize(sql))
+    expanded = _expand_grouping_sets(tokens)
+    return expanded if expanded is not None else _join(tokens)
+
+
+def _translate_ddl(sql: str) -> str:
+    sql = translate(sql)
+    sql = re.sub(r"\b(ARRAY|MAP|STRUCT)\s*<(?:[^<>]|<[^<>]*>)*>", r"\1", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bCOMMENT\s+'(?:[^']|'')*'", "", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bUSING\s+DELTA\b", "", sql, flags=re.IGNORECASE)
+    return sql
+
+
+def _split_name(name: str) -> Tuple[str, str, str]:
+    parts = [part.strip("`") for part in re.findall(r"`[^`]+`|[^.]+", name)]
+    if len(parts) != 3:
+        raise LocalWarehouseError(f"Expected catalog.schema.table, got {name}")
+    return parts[0], parts[1], parts[2]
+
+
+# ----------------------------------------------------------------------
+# Warehouse, connections and cursors
+# ----------------------------------------------------------------------
+
+class LocalWarehouse:
+    """SQLite-backed warehouse shared by every connection opened from it"""
+
+    def __init__(self, path: str = ":memory:", latency: Optional[LatencyProfile] = None):
+        self.latency = latency or LatencyProfile()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        _register_functions(self._db)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS _qf_schemas (catalog TEXT, schema_name TEXT, PRIMARY KEY (catalog, schema_name));
+            CREATE TABLE IF NOT EXISTS _qf_tables (
+                full_name TEXT PRIMARY KEY, comment TEXT, version INTEGER NOT NULL DEFAULT 0, updated_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS _qf_columns (full_name TEXT, name TEXT, comment TEXT, PRIMARY KEY (full_name, name));
+        """)
+        self._stats = {"connections": 0, "statements": 0, "rows_returned": 0}
+
+    # -- setup helpers ---------------------------------------------------
+
+    def create_schema(self, catalog: str, schema: str):
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO _qf_schemas VALUES (?, ?)", (catalog, schema))
+
+    def create_table(
+        self,
+        full_name: str,
+        columns: Sequence[Sequence[str]],
+        comment: Optional[str] = None,
+        rows: Iterable[Sequence[Any]] = (),
+    ) -> bool:
+        """Create ``catalog.schema.table`` from ``(name, type[, comment])`` columns. Returns False if it exists."""
+        catalog, schema, _ = _split_name(full_name)
+        with self._lock:
+            exists = self._db.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (full_name,)).fetchone()
+            if exists:
+                return False
+            definitions = ", ".join(f"{_quote(column[0])} {column[1]}" for column in columns)
+            self._db.execute(_translate_ddl(f"CREATE TABLE {_quote(full_name)} ({definitions})"))
+            self._db.execute("INSERT OR IGNORE INTO _qf_schemas VALUES (?, ?)", (catalog, schema))
+            self._db.execute("INSERT OR REPLACE INTO _qf_tables VALUES (?, ?, 0, ?)",
+                             (full_name, comment, _format_timestamp(datetime.now())))
+            self._db.executemany("INSERT OR REPLACE INTO _qf_columns VALUES (?, ?, ?)",
+                                 [(full_name, column[0], column[2] if len(column) > 2 else None) for column in columns])
+        self.insert(full_name, rows)
+        return True
+
+    def insert(self, full_name: str, rows: Iterable[Sequence[Any]]):
+        rows = [[_to_sqlite(value) for value in row] for row in rows]
+        if not rows:
+            return
+        placeholders = ", ".join("?" for _ in rows[0])
+        with self._lock:
+            self._db.executemany(f"INSERT INTO {_quote(full_name)} VALUES ({placeholders})", rows)
+            self._bump_version(full_name)
+
+    # -- connections -----------------------------------------------------
+
+    def connect(self) -> "LocalConnection":
+        self.latency.wait("connect")
+        with self._lock:
+            self._stats["connections"] += 1
+        return LocalConnection(self)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        self._db.close()
+
+    # -- statements ------------------------------------------------------
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> Tuple[Optional[list], List[tuple]]:
+        """Run one statement and return its (description, rows)"""
+        statement = sql.strip().rstrip(";").strip()
+        params = [_to_sqlite(value) for value in (params or ())]
+        with self._lock:
+            self._stats["statements"] += 1
+            description, rows = self._dispatch(statement, params)
+            self._stats["rows_returned"] += len(rows)
+        return description, rows
+
+    def _dispatch(self, statement: str, params: List[Any]) -> Tuple[Optional[list], List[tuple]]:
+        upper = statement.upper()
+        if re.match(r"^SHOW\s+CATALOGS\b", upper):
+            return self._show_catalogs()
+        match = re.match(rf"^SHOW\s+SCHEMAS\s+IN\s+{_NAME}$", statement, re.IGNORECASE)
+        if match:
+            return self._show_schemas(match.group(1).strip("`"))
+        match = re.match(rf"^SHOW\s+TABLES\s+IN\s+{_NAME}\.{_NAME}$", statement, re.IGNORECASE)
+        if match:
+            return self._show_tables(match.group(1).strip("`"), match.group(2).strip("`"))
+        match = re.match(rf"^DESCRIBE\s+HISTORY\s+({_FULL_NAME})(?:\s+LIMIT\s+\d+)?$", statement, re.IGNORECASE)
+        if match:
+            return self._describe_history(".".join(_split_name(match.group(1))))
+        match = re.match(rf"^DESCRIBE\s+(?:TABLE\s+)?(EXTENDED\s+)?({_FULL_NAME})$", statement, re.IGNORECASE)
+        if match:
+            return self._describe(".".join(_split_name(match.group(2))), extended=bool(match.group(1)))
+        match = re.match(rf"^CREATE\s+SCHEMA\s+(?:IF\s+NOT\s+EXISTS\s+)?{_NAME}\.{_NAME}$", statement, re.IGNORECASE)
+        if match:
+            self._db.execute("INSERT OR IGNORE INTO _qf_schemas VALUES (?, ?)",
+                             (match.group(1).strip("`"), match.group(2).strip("`")))
+            return None, []
+        if upper.startswith("CREATE TABLE"):
+            return self._create_table(statement)
+        if upper.startswith("MERGE INTO"):
+            return self._merge(statement, params)
+        if "INFORMATION_SCHEMA" in upper:
+            return self._information_schema(statement, params)
+        if upper.startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "VALUES")):
+            return self._run(translate(statement), params)
+        raise LocalWarehouseError(f"Statement not supported by the local warehouse: {statement[:80]}")
+
+    def _run(self, sql: str, params: List[Any]) -> Tuple[Optional[list], List[tuple]]:
+        cursor = self._db.execute(sql, params)
+        rows = cursor.fetchall()
+        description = [(column[0], None, None, None, None, None, None) for column in cursor.description] if cursor.description else None
+        match = re.match(r'^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"([^"]+)"', sql, re.IGNORECASE)
+        if match:
+            self._bump_version(match.group(1))
+        return description, [tuple(_from_sqlite(value) for value in row) for row in rows]
+
+    def _bump_version(self, full_name: str):
+        self._db.execute("UPDATE _qf_tables SET version = version + 1, updated_at = ? WHERE full_name = ?",
+                         (_format_timestamp(datetime.now()), full_name))
+
+    @staticmethod
+    def _description(*names: str) -> list:
+        return [(name, "string", None, None, None, None, None) for name in names]
+
+    def _table_names(self) -> List[str]:
+        rows = self._db.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')").fetchall()
+        return sorted(name for (name,) in rows if name.count(".") == 2 and not name.startswith("_qf_"))
+
+    def _show_catalogs(self):
+        catalogs = {name.split(".")[0] for name in self._table_names()}
+        catalogs |= {catalog for (catalog,) in self._db.execute("SELECT catalog FROM _qf_schemas")}
+        return self._description("catalog"), [(catalog,) for catalog in sorted(catalogs)]
+
+    def _show_schemas(self, catalog: str):
+        schemas = {name.split(".")[1] for name in self._table_names() if name.split(".")[0] == catalog}
+        schemas |= {schema for (schema,) in self._db.execute("SELECT schema_name FROM _qf_schemas WHERE catalog = ?", (catalog,))}
+        return self._description("databaseName"), [(schema,) for schema in sorted(schemas)]
+
+    def _show_tables(self, catalog: str, schema: str):
+        tables = [name.split(".")[2] for name in self._table_names() if name.split(".")[:2] == [catalog, schema]]
+        return self._description("database", "tableName", "isTemporary"), [(schema, table, False) for table in tables]
+
+    def _columns(self, full_name: str) -> List[Tuple[str, str, Optional[str]]]:
+        info = self._db.execute(f"PRAGMA table_info({_quote(full_name)})").fetchall()
+        if not info:
+            raise LocalWarehouseError(f"[TABLE_OR_VIEW_NOT_FOUND] The table or view {full_name} cannot be found")
+        comments = dict(self._db.execute("SELECT name, comment FROM _qf_columns WHERE full_name = ?", (full_name,)).fetchall())
+        return [(row[1], (row[2] or "string").lower(), comments.get(row[1])) for row in info]
+
+    def _describe(self, full_name: str, extended: bool):
+        rows = list(self._columns(full_name))
+        if extended:
+            catalog, schema, table = full_name.split(".")
+            meta = self._db.execute("SELECT comment FROM _qf_tables WHERE full_name = ?", (full_name,)).fetchone()
+            rows += [("", "", ""), ("# Detailed Table Information", "", ""),
+                     ("Catalog", catalog, ""), ("Database", schema, ""), ("Table", table, ""),
+                     ("Type", "MANAGED", ""), ("Provider", "sqlite", "")]
+            if meta and meta[0]:
+                rows.append(("Comment", meta[0], ""))
+        return self._description("col_name", "data_type", "comment"), rows
+
+    def _describe_history(self, full_name: str):
+        self._columns(full_name)
+        meta = self._db.execute("SELECT version, updated_at FROM _qf_tables WHERE full_name = ?", (full_name,)).fetchone()
+        version, updated_at = meta if meta else (0, None)
+        return self._description("version", "timestamp", "operation"), [(version, _from_sqlite(updated_at), "WRITE")]
+
+    def _create_table(self, statement: str):
+        match = re.match(rf"^CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?({_FULL_NAME})", statement, re.IGNORECASE)
+        if not match:
+            raise LocalWarehouseError("CREATE TABLE needs a catalog.schema.table name")
+        full_name = ".".join(_split_name(match.group(1)))
+        self._db.execute(_translate_ddl(statement))
+        catalog, schema, _ = full_name.split(".")
+        self._db.execute("INSERT OR IGNORE INTO _qf_schemas VALUES (?, ?)", (catalog, schema))
+        self._db.execute("INSERT OR IGNORE INTO _qf_tables VALUES (?, NULL, 0, ?)",
+                         (full_name, _format_timestamp(datetime.now())))
+        return None, []
+
+    def _merge(self, statement: str, params: List[Any]):
+        match = _SPOOL_MERGE_RE.match(statement)
+        if not match:
+            raise LocalWarehouseError("Only MERGE ... WHEN NOT MATCHED THEN INSERT is supported by the local warehouse")
+        table = _join(_merge_names(_tokenize(match.group("table"))))
+        columns = [column.strip() for column in match.group("columns").split(",")]
+        key = match.group("key")
+        sql = (
+            f"WITH source({', '.join(columns)}) AS (VALUES {match.group('values')})\n"
+            f"INSERT INTO {table} ({', '.join(columns)})\n"
+            f"SELECT {', '.join(columns)} FROM source\n"
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} AS target WHERE target.{key} = source.{key})"
+        )
+        return self._run(sql, params)
+
+    def _information_schema(self, statement: str, params: List[Any]):
+        """Answer information_schema.tables / columns queries from a snapshot of the catalog"""
+        tokens = _merge_names(_tokenize(statement))
+        names = {text for kind, text in tokens if kind == "quoted" and ".information_schema." in text.lower()}
+        for quoted in names:
+            catalog, _, view = quoted.strip('"').split(".")
+            self._db.execute(f"DROP TABLE IF EXISTS temp.{quoted}")
+            if view.lower() == "tables":
+                self._db.execute(f"CREATE TEMP TABLE {quoted} (table_catalog, table_schema, table_name, comment)")
+                for name in self._table_names():
+                    if name.split(".")[0] == catalog:
+                        meta = self._db.execute("SELECT comment FROM _qf_tables WHERE full_name = ?", (name,)).fetchone()
+                        self._db.execute(f"INSERT INTO temp.{quoted} VALUES (?, ?, ?, ?)",
+                                         (*name.split("."), meta[0] if meta else None))
+            elif view.lower() == "columns":
+                self._db.execute(
+                    f"CREATE TEMP TABLE {quoted} "
+                    f"(table_catalog, table_schema, table_name, column_name, full_data_type, data_type, comment, ordinal_position)"
+                )
+                for name in self._table_names():
+                    if name.split(".")[0] == catalog:
+                        for position, (column, data_type, comment) in enumerate(self._columns(name), 1):
+                            self._db.execute(f"INSERT INTO temp.{quoted} VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                             (*name.split("."), column, data_type, data_type, comment, position))
+            else:
+                raise LocalWarehouseError(f"information_schema.{view} is not available in the local warehouse")
+        return self._run(translate(statement), params)
+
+
+class LocalCursor:
+    """DB-API cursor over a LocalWarehouse"""
+
+    def __init__(self, warehouse: LocalWarehouse):
+        self._warehouse = warehouse
+        self.description = None
+        self.rowcount = -1
+        self._rows: List[tuple] = []
+        self.arraysize = 1000
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def execute(self, operation: str, parameters: Optional[Sequence[Any]] = None):
+        self._warehouse.latency.wait("execute")
+        self.description, self._rows = self._warehouse.execute(operation, parameters)
+        self.rowcount = len(self._rows)
+        return self
+
+    def fetchall(self) -> List[tuple]:
+        self._warehouse.latency.wait("fetch")
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self) -> Optional[tuple]:
+        if not self._rows:
+            return None
+        self._warehouse.latency.wait("fetch")
+        return self._rows.pop(0)
+
+    def fetchmany(self, size: Optional[int] = None) -> List[tuple]:
+        self._warehouse.latency.wait("fetch")
+        size = size or self.arraysize
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        self._rows = []
+
+
+class LocalConnection:
+    """DB-API connection to a LocalWarehouse"""
+
+    def __init__(self, warehouse: LocalWarehouse):
+        self._warehouse = warehouse
+        self.open = True
+
+    def cursor(self) -> LocalCursor:
+        if not self.open:
+            raise LocalWarehouseError("Connection is closed")
+        return LocalCursor(self._warehouse)
+
+    def close(self):
+        self.open = False
+
+
+# ----------------------------------------------------------------------
+# Demo data
+# ----------------------------------------------------------------------
+
+AUDIT_LOG_SCHEMA = (
+    ("log_id", "STRING"), ("timestamp", "TIMESTAMP"), ("event_type", "STRING"), ("user_id", "STRING"),
+    ("catalog", "STRING"), ("schema_name", "STRING"), ("table_name", "STRING"), ("columns", "ARRAY<STRING>"),
+    ("business_logic", "STRING"), ("generated_sql", "STRING"), ("model_id", "STRING"),
+    ("execution_time_ms", "BIGINT"), ("row_count", "BIGINT"), ("status", "STRING"), ("error_message", "STRING"),
+    ("metadata", "MAP<STRING, STRING>"), ("prompt_tokens", "BIGINT"), ("completion_tokens", "BIGINT"),
+    ("total_tokens", "BIGINT"), ("estimated_cost_usd", "DOUBLE"), ("business_logic_length", "BIGINT"),
+    ("generated_sql_length", "BIGINT"), ("session_id", "STRING"), ("llm_time_ms", "BIGINT"),
+)
+
+
+def seed_demo(warehouse: LocalWarehouse, audit_table: str, rows_per_table: int = 200, seed: int = 42):
+    """Create the audit table and, unless ``rows_per_table`` is 0, a small deterministic sales schema"""
+    warehouse.create_table(audit_table, AUDIT_LOG_SCHEMA, comment="QueryForge audit events")
+    if rows_per_table <= 0:
+        return
+    rng = random.Random(seed)
+    regions = ["north", "south", "east", "west"]
+    warehouse.create_table(
+        "main.sales.customers",
+        [("customer_id", "BIGINT", "Customer key"), ("name", "STRING", "Customer name"),
+         ("region", "STRING", "Sales region"), ("signup_date", "DATE", "First purchase date")],
+        comment="Customers with their sales region",
+        rows=[(i, f"Customer {i}", regions[i % len(regions)], date(2024, 1 + i % 12, 1 + i % 28))
+              for i in range(1, rows_per_table // 4 + 1)],
+    )
+    warehouse.create_table(
+        "main.sales.orders",
+        [("order_id", "BIGINT", "Order key"), ("customer_id", "BIGINT", "Buyer"),
+         ("order_date", "DATE", "Date the order was placed"), ("status", "STRING", "open, shipped or returned"),
+         ("amount", "DOUBLE", "Order total in USD")],
+        comment="One row per customer order",
+        rows=[(i, rng.randint(1, rows_per_table // 4), date(2025, 1 + i % 12, 1 + i % 28),
+               rng.choice(["open", "shipped", "returned"]), round(rng.uniform(5, 500), 2))
+              for i in range(1, rows_per_table + 1)],
+    )
@@ -0,0 +1,177 @@
+"""
+In-process cache for catalog browser metadata.
+
+Catalog, schema, table and column listings change rarely but are requested
+on every click in the catalog browser. Entries are kept per level with their
+own TTL in a bounded LRU. Once an entry passes its TTL it is still served
+for a stale window while a single background refresh reloads it, so users
+only wait on the warehouse for keys nobody has looked at recently.
+
+The cache is not specific to metadata: the analytics endpoints use a
+second instance with their own levels.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("catalogs", "schemas", "tables", "columns")
+
+
+class _Entry:
+    __slots__ = ("value", "loaded_at")
+
+    def __init__(self, value: Any, loaded_at: float):
+        self.value = value
+        self.loaded_at = loaded_at
+
+
+class MetadataCache:
+    """TTL + LRU cache with stale-while-revalidate and single-flight loading.
+
+    Keys are tuples whose first element is the level, e.g.
+    ``("tables", catalog, schema)``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: Optional[Dict[str, float]] = None,
+        stale_seconds: float = 900.0,
+        levels: Sequence[str] = LEVELS,
+        default_ttl_seconds: float = 300.0,
+    ):
+        self.max_entries = max_entries
+        self.default_ttl_seconds = default_ttl_seconds
+        self.ttl_seconds = {level: default_ttl_seconds for level in levels}
+        self.ttl_seconds.update(ttl_seconds or {})
+        self.stale_seconds = stale_seconds
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self._refresh_tasks: Dict[Tuple, asyncio.Task] = {}
+        self._stats = {level: self._empty_stats() for level in self.ttl_seconds}
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, int]:
+        return {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "evictions": 0}
+
+    def _level_stats(self, key: Tuple) -> Dict[str, int]:
+        return self._stats.setdefault(key[0], self._empty_stats())
+
+    async def get_or_load(self, key: Tuple, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for ``key``, loading it with ``loader`` when needed"""
+        stats = self._level_stats(key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.loaded_at
+            ttl = self.ttl_seconds.get(key[0], self.default_ttl_seconds)
+            if age < ttl:
+                self._entries.move_to_end(key)
+                stats["hits"] += 1
+                return entry.value
+            if age < ttl + self.stale_seconds:
+                self._entries.move_to_end(key)
+                stats["stale_hits"] += 1
+                self._schedule_refresh(key, loader)
+                return entry.value
+
+        stats["misses"] += 1
+        return await self._load(key, loader)
+
+    async def _load(self, key: Tuple, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Load ``key`` once even if many requests miss on it concurrently.
+
+        The load runs in a task owned by the cache and every caller, the first
+        included, waits on it through a shield, so a caller that is cancelled
+        (e.g. its client disconnected) does not cancel the load for the rest.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_loader(key, loader))
+            # Mark a failure retrieved so it does not log a warning if every caller went away
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _run_loader(self, key: Tuple, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self.put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _schedule_refresh(self, key: Tuple, loader: Callable[[], Awaitable[Any]]):
+        if key in self._inflight or key in self._refresh_tasks:
+            return
+        stats = self._level_stats(key)
+        stats["refreshes"] += 1
+
+        async def refresh():
+            try:
+                await self._load(key, loader)
+            except Exception as e:
+                stats["refresh_errors"] += 1
+                logger.warning(f"Background refresh of {key} failed, serving stale value: {str(e)}")
+            finally:
+                self._refresh_tasks.pop(key, None)
+
+        # Keep a reference so the task is not garbage collected mid-refresh
+        self._refresh_tasks[key] = asyncio.ensure_future(refresh())
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Return a fresh cached value without loading, or None"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry.loaded_at >= self.ttl_seconds.get(key[0], self.default_ttl_seconds):
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key: Tuple, value: Any):
+        """Store ``value`` for ``key``, evicting least recently used entries if full"""
+        self._entries[key] = _Entry(value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._level_stats(evicted_key)["evictions"] += 1
+
+    def invalidate(self, catalog: Optional[str] = None, schema: Optional[str] = None, table: Optional[str] = None) -> int:
+        """Drop entries under the given catalog/schema/table, or everything when no scope is given.
+
+        Entries for the parent of the invalidated object (e.g. the table list
+        and bulk-loaded metadata of its schema) are dropped as well so
+        renames, drops and column changes show up.
+        """
+        scope = tuple(part for part in (catalog, schema, table) if part is not None)
+        if not scope:
+            removed = len(self._entries)
+            self._entries.clear()
+            return removed
+
+        def affected(key: Tuple) -> bool:
+            path = key[1:]
+            # Entries at or below the scope, plus the listing that contains it
+            return path[:len(scope)] == scope or path == scope[:-1]
+
+        doomed = [key for key in self._entries if affected(key)]
+        for key in doomed:
+            del self._entries[key]
+        return len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-level hit/miss counters plus occupancy"""
+        levels = {}
+        for level, counters in self._stats.items():
+            lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+            levels[level] = dict(counters)
+            levels[level]["hit_ratio"] = round((counters["hits"] + counters["stale_hits"]) / lookups, 4) if lookups else 0.0
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": dict(self.ttl_seconds),
+            "stale_seconds": self.stale_seconds,
+            "levels": levels,
+        }
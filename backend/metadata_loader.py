@@ -0,0 +1,64 @@
+"""
+Bulk loading of table and column metadata from information_schema.
+
+One query per schema replaces a DESCRIBE per table: for a schema with
+hundreds of tables the catalog browser and the join builder need a single
+warehouse round trip instead of hundreds.
+"""
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+def quote_identifier(name: str) -> str:
+    """Backtick-quote a catalog/schema/table identifier"""
+    return "`" + name.replace("`", "``") + "`"
+
+
+def load_schema_metadata(connection, catalog: str, schema: str) -> Dict[str, Dict[str, Any]]:
+    """Load every table's comment and columns in ``catalog.schema``.
+
+    Returns ``{table_name: {"comment": str|None, "columns": [{"name", "type", "comment"}]}}``
+    with columns in ordinal order. Raises if the catalog has no
+    information_schema (e.g. ``hive_metastore``) so callers can fall back to
+    per-table DESCRIBE.
+    """
+    info_schema = f"{quote_identifier(catalog)}.information_schema"
+    tables: Dict[str, Dict[str, Any]] = {}
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT table_name, comment
+            FROM {info_schema}.tables
+            WHERE table_schema = ?
+            """,
+            (schema,),
+        )
+        for table_name, comment in cursor.fetchall():
+            tables[table_name] = {"comment": comment, "columns": []}
+
+        cursor.execute(
+            f"""
+            SELECT table_name, column_name, full_data_type, comment
+            FROM {info_schema}.columns
+            WHERE table_schema = ?
+            ORDER BY table_name, ordinal_position
+            """,
+            (schema,),
+        )
+        for table_name, column_name, data_type, comment in cursor.fetchall():
+            table = tables.setdefault(table_name, {"comment": None, "columns": []})
+            table["columns"].append({"name": column_name, "type": data_type, "comment": comment})
+
+    logger.info(f"Bulk loaded metadata for {len(tables)} tables in {catalog}.{schema}")
+    return tables
+
+
+def describe_columns(connection, catalog: str, schema: str, table: str) -> List[Dict[str, Any]]:
+    """Per-table fallback for catalogs without information_schema"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DESCRIBE {catalog}.{schema}.{table}")
+        return [{"name": row[0], "type": row[1], "comment": row[2] if len(row) > 2 else None}
+                for row in cursor.fetchall()]
@@ -0,0 +1,270 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are plain dictionaries behind one lock per metric,
+so recording an observation costs a lock, a bisect and a dict update and
+can stay on in production. Values that the pools, caches and queues
+already track in their ``stats()`` snapshots are not duplicated on the hot
+path; collectors read them when ``/metrics`` is scraped. Nothing here
+needs a Prometheus client library or a running collector: ``render()``
+returns the exposition text and tests can read values back directly.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers fast metadata queries through slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+# A collector returns (name, type, help, [(labels, value), ...]) for each metric it reports
+Sample = Tuple[Dict[str, Any], float]
+Collected = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing total per label set"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self._header()
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observations per label set"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a ``with`` block, including when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, [list(value[0]), value[1], value[2]]) for key, value in self._series.items())
+        lines = self._header()
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Owns the recorded metrics and the scrape-time collectors"""
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Collected]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(self.prefix + name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(self.prefix + name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], Iterable[Collected]]):
+        """Register a function that reports metrics from existing stats at scrape time"""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        """The whole registry in the Prometheus text format"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                collected = list(collect())
+            except Exception as e:
+                lines.append(f"# collector {getattr(collect, '__name__', 'collector')} failed: {_escape(e)}")
+                continue
+            for name, type_name, help_text, samples in collected:
+                name = self.prefix + name
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {type_name}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    names = tuple(labels)
+                    lines.append(f"{name}{_format_labels(names, [labels[n] for n in names])} {_format_value(float(value))}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def _timed(operation: str, histogram: Optional[Histogram], on_timing: Optional[Callable[[str, float], None]]):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        if histogram is not None:
+            histogram.observe(seconds, operation=operation)
+        if on_timing is not None:
+            on_timing(operation, seconds)
+
+
+class TimedCursor:
+    """DB-API cursor proxy that records execute and fetch durations"""
+
+    def __init__(self, cursor, histogram: Optional[Histogram], on_timing: Optional[Callable[[str, float], None]] = None):
+        self._cursor = cursor
+        self._histogram = histogram
+        self._on_timing = on_timing
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, *args, **kwargs):
+        with _timed("execute", self._histogram, self._on_timing):
+            return self._cursor.execute(*args, **kwargs)
+
+    def fetchall(self):
+        with _timed("fetch", self._histogram, self._on_timing):
+            return self._cursor.fetchall()
+
+    def fetchone(self):
+        with _timed("fetch", self._histogram, self._on_timing):
+            return self._cursor.fetchone()
+
+    def fetchmany(self, *args, **kwargs):
+        with _timed("fetch", self._histogram, self._on_timing):
+            return self._cursor.fetchmany(*args, **kwargs)
+
+
+class TimedConnection:
+    """DB-API connection proxy whose cursors record execute and fetch durations"""
+
+    def __init__(self, connection, histogram: Optional[Histogram], on_timing: Optional[Callable[[str, float], None]] = None):
+        self._connection = connection
+        self._histogram = histogram
+        self._on_timing = on_timing
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._connection.cursor(*args, **kwargs), self._histogram, self._on_timing)
+
+    def close(self):
+        self._connection.close()
+
+
+def timed_connect(
+    connect: Callable[[], Any],
+    histogram: Optional[Histogram],
+    on_timing: Optional[Callable[[str, float], None]] = None,
+) -> Callable[[], Any]:
+    """Wrap a connection factory so connecting, executing and fetching are all timed.
+
+    Durations go to ``histogram`` (labelled by operation) and/or to
+    ``on_timing(operation, seconds)``; either may be None.
+    """
+    def connect_timed():
+        with _timed("connect", histogram, on_timing):
+            connection = connect()
+        return TimedConnection(connection, histogram, on_timing)
+    return connect_timed
+
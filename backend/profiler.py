@@ -0,0 +1,161 @@
+"""
+Sampling profiler for single requests.
+
+CPU hot spots that only show up with production data (SQL cleanup of long
+LLM answers, Python-side aggregation of analytics rows) are hard to find
+from timings alone. When profiling is enabled, a request carrying the
+profiling token is run with a sampler thread that records the stack of the
+thread handling it, plus busy warehouse worker threads, every few
+milliseconds. Samples are written in the collapsed stack format
+(``frame;frame;frame count`` per line) read by flamegraph.pl, speedscope
+and similar tools.
+
+The sampler uses ``sys._current_frames`` and pure Python, so it needs no
+extra dependency and costs nothing for requests that are not profiled. The
+event loop thread is shared by every in-flight request, so samples taken
+while the profiled request is awaiting may belong to other requests.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+# Leaf functions of a thread that is parked waiting for work or I/O
+_IDLE_LEAVES = {("concurrent.futures.thread", "_worker")}
+_IDLE_MODULES = {"threading", "queue", "selectors"}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _is_idle(frame) -> bool:
+    module = frame.f_globals.get("__name__", "")
+    return (module, frame.f_code.co_name) in _IDLE_LEAVES or module in _IDLE_MODULES
+
+
+def _stack(frame) -> List[str]:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class SamplingProfiler:
+    """Samples the stacks of one thread and of other busy threads with matching names"""
+
+    def __init__(self, interval_seconds: float = 0.005, max_seconds: float = 60.0, thread_prefixes: Sequence[str] = ()):
+        self.interval_seconds = interval_seconds
+        self.max_seconds = max_seconds
+        self.thread_prefixes = tuple(thread_prefixes)
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.idle_samples = 0
+        self._target_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self.duration_seconds = 0.0
+
+    def start(self, target_thread_id: Optional[int] = None):
+        """Start sampling ``target_thread_id``, by default the calling thread"""
+        self._target_id = target_thread_id or threading.get_ident()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration_seconds = time.perf_counter() - self._started
+
+    def _threads(self) -> Dict[int, str]:
+        names = {self._target_id: "request"}
+        if self.thread_prefixes:
+            for thread in threading.enumerate():
+                if thread.name.startswith(self.thread_prefixes):
+                    names[thread.ident] = thread.name
+        return names
+
+    def _run(self):
+        deadline = self._started + self.max_seconds
+        while not self._stop.wait(self.interval_seconds):
+            if time.perf_counter() >= deadline:
+                break
+            self.sample()
+
+    def sample(self):
+        """Record one sample of every watched thread"""
+        frames = sys._current_frames()
+        self.sample_count += 1
+        for ident, name in self._threads().items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            if _is_idle(frame):
+                self.idle_samples += 1
+                continue
+            self.samples[tuple([name] + _stack(frame))] += 1
+
+    def collapsed(self) -> str:
+        """Samples in the collapsed stack format, most frequent stacks first"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileStore:
+    """Directory of collapsed stack files, keeping only the most recent ones"""
+
+    def __init__(self, directory: str, max_files: int = 50):
+        self.directory = directory
+        self.max_files = max(1, max_files)
+
+    @staticmethod
+    def name_for(method: str, path: str) -> str:
+        """File name for a profile of ``method path`` started now"""
+        slug = "".join(ch if ch.isalnum() else "-" for ch in path.strip("/"))[:80] or "root"
+        return f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{method.lower()}-{slug}.collapsed"
+
+    def save(self, method: str, path: str, collapsed: str, name: Optional[str] = None) -> str:
+        """Write a profile and return its file name; ``name`` comes from ``name_for`` when given"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = name or self.name_for(method, path)
+        with open(os.path.join(self.directory, name), "w", encoding="utf-8") as handle:
+            handle.write(collapsed)
+        self._prune()
+        return name
+
+    def _prune(self):
+        for name in self.list()[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def list(self) -> List[str]:
+        """Stored profile names, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((name for name in os.listdir(self.directory) if name.endswith(".collapsed")), reverse=True)
+
+    def read(self, name: str) -> Optional[str]:
+        """Contents of profile ``name``, or None if there is no such profile"""
+        if os.path.basename(name) != name or name not in self.list():
+            return None
+        with open(os.path.join(self.directory, name), encoding="utf-8") as handle:
+            return handle.read()
+
+
+def summarize(profiler: SamplingProfiler) -> Dict[str, float]:
+    """Sample counts and duration for response headers and logs"""
+    return {
+        "samples": profiler.sample_count,
+        "idle_samples": profiler.idle_samples,
+        "duration_ms": round(profiler.duration_seconds * 1000, 1),
+    }
@@ -0,0 +1,244 @@
+"""
+Keyset-paginated query history grouped by session.
+
+The history endpoint used to read the oldest 200 audit events and stitch
+them into sessions with a heuristic in Python, so recent queries were
+unreachable once the table grew past that. Events now carry the
+``session_id`` of the query flow that produced them (suggest business
+logic -> generate SQL -> execute) and sessions are aggregated and
+filtered in SQL. Pages are ordered newest first and addressed by a cursor
+holding the last session's start time and id, so fetching a page never
+depends on how many pages came before it. Events logged before session
+ids existed form single-event sessions keyed by their ``log_id``.
+
+Every page scans a bounded slice of audit_logs rather than aggregating
+the whole table: events are filtered on their own timestamp before
+``GROUP BY``, using the cursor, the time filters and a lookback window
+below them. A session's events all fall within ``MAX_SESSION_SPAN`` of its
+first event, which is what lets a raw-event bound stand in for a bound on
+session start times. The window is widened (``lookback_windows``) only when
+it holds less than a page of sessions.
+
+Pages only carry session metrics and short previews of the business logic
+and SQL; the full text and the individual events of a session are loaded
+on demand when it is opened.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+HISTORY_EVENT_TYPES = ("business_logic_suggestion", "join_condition_suggestion", "sql_generation", "sql_execution")
+SESSION_STATUSES = ("success", "error", "incomplete")
+
+# Events without a session id are sessions of their own
+SESSION_KEY_SQL = "COALESCE(session_id, log_id)"
+
+# Longest time between the first and last event of one query flow; events
+# further from a session's start are left out of its page row
+MAX_SESSION_SPAN = timedelta(hours=24)
+
+# Lookback below the newest session a page can hold, tried in turn until the page is full
+LOOKBACK_WINDOWS = (timedelta(days=1), timedelta(days=7), timedelta(days=30), timedelta(days=365))
+
+# Characters of business logic and SQL text included in list rows
+PREVIEW_CHARS = 200
+
+EVENT_COLUMNS = (
+    "log_id", "session_id", "timestamp", "event_type", "catalog", "schema_name", "table_name", "columns",
+    "business_logic", "generated_sql", "model_id", "execution_time_ms", "row_count", "status",
+    "error_message", "prompt_tokens", "completion_tokens", "total_tokens", "estimated_cost_usd",
+    "business_logic_length", "generated_sql_length",
+)
+
+
+def _event_types_sql() -> str:
+    return "(" + ", ".join(f"'{event_type}'" for event_type in HISTORY_EVENT_TYPES) + ")"
+
+
+def encode_cursor(timestamp: datetime, session_id: str) -> str:
+    """Opaque cursor pointing just past the session started at ``timestamp``"""
+    raw = json.dumps([timestamp.isoformat(), session_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of ``encode_cursor``. Raises ValueError for a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, session_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(timestamp), str(session_id)
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {cursor!r}") from e
+
+
+def lookback_windows(
+    now: datetime,
+    cursor: Optional[Tuple[datetime, str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[Optional[datetime]]:
+    """Earliest session start to scan for each attempt at a page, ending with ``start`` (None: unbounded)"""
+    newest = min(bound for bound in (now, cursor[0] if cursor else None, end) if bound is not None)
+    windows: List[Optional[datetime]] = []
+    for lookback in LOOKBACK_WINDOWS:
+        since = newest - lookback
+        if start is not None and since <= start:
+            break
+        windows.append(since)
+    return windows + [start]
+
+
+def build_session_page(
+    table: str,
+    limit: int,
+    cursor: Optional[Tuple[datetime, str]] = None,
+    model_id: Optional[str] = None,
+    table_name: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Tuple[str, List[Any]]:
+    """Query for one page of session summaries, newest first, and its parameters.
+
+    Filters apply to whole sessions: ``model_id`` matches sessions that used
+    the model in any event, ``start``/``end`` bound the session start time.
+    A session's status is ``error`` if any event failed, ``success`` once
+    its SQL ran, and ``incomplete`` before that. Only events within
+    ``MAX_SESSION_SPAN`` of the cursor and time bounds are aggregated; pass
+    one of ``lookback_windows`` as ``start`` to bound the scan of the first
+    page too.
+    """
+    # Raw-event bounds for the scan below GROUP BY: events of a session that
+    # starts before the cursor or ``end`` come at most one span later, and
+    # those of a session that starts after ``start`` no earlier than that
+    scan_conditions = []
+    scan_params: List[Any] = []
+    newest = [bound for bound in (cursor[0] if cursor else None, end) if bound is not None]
+    if newest:
+        scan_conditions.append("timestamp <= ?")
+        scan_params.append(min(newest) + MAX_SESSION_SPAN)
+    if start is not None:
+        scan_conditions.append("timestamp >= ?")
+        scan_params.append(start - MAX_SESSION_SPAN)
+    scan = "".join(f"\n      AND {condition}" for condition in scan_conditions)
+
+    conditions = []
+    params: List[Any] = list(scan_params)
+    if cursor is not None:
+        conditions.append("(timestamp < ? OR (timestamp = ? AND session_id < ?))")
+        params.extend([cursor[0], cursor[0], cursor[1]])
+    if model_id:
+        conditions.append("array_contains(models, ?)")
+        params.append(model_id)
+    if table_name:
+        conditions.append("table_name = ?")
+        params.append(table_name)
+    if status:
+        conditions.append("status = ?")
+        params.append(status)
+    if start is not None:
+        conditions.append("timestamp >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("timestamp < ?")
+        params.append(end)
+    where = f"\nWHERE {' AND '.join(conditions)}" if conditions else ""
+    params.append(limit)
+
+    sql = f"""WITH sessions AS (
+    SELECT
+        {SESSION_KEY_SQL} AS session_id,
+        MIN(timestamp) AS timestamp,
+        MAX(catalog) AS catalog,
+        MAX(schema_name) AS schema_name,
+        MAX(CASE WHEN event_type <> 'join_condition_suggestion' THEN table_name END) AS table_name,
+        COLLECT_SET(model_id) AS models,
+        CAST(COUNT(*) AS BIGINT) AS event_count,
+        CAST(COALESCE(SUM(estimated_cost_usd), 0) AS DOUBLE) AS total_cost_usd,
+        CAST(COALESCE(SUM(total_tokens), 0) AS BIGINT) AS total_tokens,
+        CAST(COALESCE(SUM(execution_time_ms), 0) AS BIGINT) AS total_time_ms,
+        CAST(MAX(CASE WHEN event_type = 'sql_execution' THEN row_count END) AS BIGINT) AS row_count,
+        COALESCE(
+            MAX(CASE WHEN event_type = 'business_logic_suggestion' THEN LEFT(business_logic, {PREVIEW_CHARS}) END),
+            MAX(CASE WHEN event_type = 'sql_generation' THEN LEFT(business_logic, {PREVIEW_CHARS}) END)
+        ) AS business_logic_preview,
+        MAX(CASE WHEN event_type IN ('sql_generation', 'sql_execution') THEN LEFT(generated_sql, {PREVIEW_CHARS}) END) AS generated_sql_preview,
+        CAST(MAX(CASE WHEN event_type = 'sql_generation' THEN generated_sql_length END) AS BIGINT) AS generated_sql_length,
+        CASE
+            WHEN COUNT_IF(status = 'error') > 0 THEN 'error'
+            WHEN COUNT_IF(event_type = 'sql_execution') > 0 THEN 'success'
+            ELSE 'incomplete'
+        END AS status
+    FROM {table}
+    WHERE event_type IN {_event_types_sql()}{scan}
+    GROUP BY {SESSION_KEY_SQL}
+)
+SELECT *
+FROM sessions{where}
+ORDER BY timestamp DESC, session_id DESC
+LIMIT ?"""
+    return sql, params
+
+
+def build_session_events(table: str, history_id: str) -> Tuple[str, List[Any]]:
+    """Query for every history event of one session, oldest first.
+
+    ``history_id`` is a session id from a history page, or the ``log_id`` of
+    any event, which resolves to the whole session that event belongs to.
+    """
+    sql = (
+        f"SELECT {', '.join(EVENT_COLUMNS)}\n"
+        f"FROM {table}\n"
+        f"WHERE event_type IN {_event_types_sql()}\n"
+        f"  AND (session_id = ? OR log_id = ? OR session_id = (SELECT MAX(session_id) FROM {table} WHERE log_id = ?))\n"
+        f"ORDER BY timestamp ASC"
+    )
+    return sql, [history_id, history_id, history_id]
+
+
+def session_key(events: Sequence[Dict[str, Any]]) -> Optional[str]:
+    """Id of the session ``events`` belong to, as it appears in history pages"""
+    if not events:
+        return None
+    return events[0]["session_id"] or events[0]["log_id"]
+
+
+def assemble_session(summary: Dict[str, Any], events: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Attach a session's events and full text to ``summary``, keeping the latest event of each type"""
+    session = dict(summary)
+    for event_type in HISTORY_EVENT_TYPES:
+        session[event_type] = None
+    session["columns"] = None
+    session["business_logic"] = None
+    session["generated_sql"] = None
+
+    for event in events:
+        session[event["event_type"]] = event
+        if session["columns"] is None and event.get("columns") is not None:
+            session["columns"] = list(event["columns"])
+        if event["event_type"] == "business_logic_suggestion":
+            session["business_logic"] = event["business_logic"]
+        elif event["event_type"] == "sql_generation" and session["business_logic"] is None:
+            session["business_logic"] = event["business_logic"]
+        if event["event_type"] in ("sql_generation", "sql_execution") and event.get("generated_sql"):
+            session["generated_sql"] = event["generated_sql"]
+    return session
+
+
+def build_history_page(columns: Sequence[str], rows: Sequence[Sequence[Any]], limit: int) -> Dict[str, Any]:
+    """History page payload from ``build_session_page`` rows fetched with ``limit + 1``"""
+    # One extra row tells us whether another page exists
+    has_more = len(rows) > limit
+    sessions = [dict(zip(columns, row)) for row in rows[:limit]]
+    for session in sessions:
+        # Array columns can arrive as numpy arrays
+        session["models"] = list(session["models"]) if session.get("models") is not None else []
+
+    last = sessions[-1] if has_more else None
+    return {
+        "query_sessions": sessions,
+        "total_count": len(sessions),
+        "has_more": has_more,
+        "next_cursor": encode_cursor(last["timestamp"], last["session_id"]) if last else None,
+    }
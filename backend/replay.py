@@ -0,0 +1,303 @@
+"""
+Replay of recorded traffic from an audit_logs export.
+
+Every suggestion, generation and execution the app serves is recorded in
+audit_logs with its inputs, model, table, duration and row count, which
+is enough to re-issue it. This tool reads an exported slice of audit
+events (JSON lines, a JSON array or CSV with the audit_logs columns),
+sends each event's request to an app instance at its original offset from
+the first event, divided by ``--speed``, and compares the replayed
+latency, status and row count with the recorded ones. That gives
+production-shaped load, bursts and think time included, for capacity
+planning. Export a slice with e.g.::
+
+    SELECT * FROM arao.text_to_sql.audit_logs
+    WHERE timestamp BETWEEN '2025-06-02 09:00' AND '2025-06-02 10:00'
+    ORDER BY timestamp
+
+and replay it ten times faster with::
+
+    python replay.py events.jsonl --base-url http://localhost:8000 --speed 10 --output replay.json
+
+Requests are rebuilt from what the audit row holds: join suggestions and
+join generations name their tables (``[JOIN: a + b]``) but not which
+table each column came from, so every joined table is sent the full
+column list, and tables are assumed to share the first table's catalog
+and schema. Recorded durations are measured inside the app and replayed
+ones at the client, so the replayed figures include the network. Replayed
+events carry ``replay-<original session id>`` as their session id, so
+they stay grouped, and separable, in the history.
+"""
+import argparse
+import ast
+import asyncio
+import csv
+import json
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+from load_test import percentile
+
+REPLAYABLE_EVENT_TYPES = ("business_logic_suggestion", "join_condition_suggestion", "sql_generation", "sql_execution")
+_JOIN_PREFIX_RE = re.compile(r"^\[JOIN: ([^\]]+)\]\s*")
+
+
+def _parse_timestamp(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).strip().replace("Z", "+00:00").replace("T", " "))
+
+
+def _parse_columns(value: Any) -> List[str]:
+    """Column arrays as exported to JSON (a list) or CSV (a JSON or Python list literal, or comma separated)"""
+    if value is None or value == "":
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(column) for column in value]
+    text = str(value).strip()
+    if text.startswith("["):
+        try:
+            return [str(column) for column in json.loads(text)]
+        except ValueError:
+            return [str(column) for column in ast.literal_eval(text)]
+    return [column.strip() for column in text.split(",") if column.strip()]
+
+
+def _parse_int(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    return int(float(value))
+
+
+def load_events(path: str) -> List[Dict[str, Any]]:
+    """Replayable audit events from an export, oldest first"""
+    with open(path, encoding="utf-8", newline="") as handle:
+        if path.endswith(".csv"):
+            raw: Iterable[Dict[str, Any]] = list(csv.DictReader(handle))
+        else:
+            text = handle.read()
+            if text.lstrip().startswith("["):
+                raw = json.loads(text)
+            else:
+                raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    events = []
+    for row in raw:
+        if row.get("event_type") not in REPLAYABLE_EVENT_TYPES:
+            continue
+        events.append({
+            **row,
+            "timestamp": _parse_timestamp(row["timestamp"]),
+            "columns": _parse_columns(row.get("columns")),
+            "execution_time_ms": _parse_int(row.get("execution_time_ms")),
+            "row_count": _parse_int(row.get("row_count")),
+        })
+    events.sort(key=lambda event: event["timestamp"])
+    return events
+
+
+def _tables(event: Dict[str, Any], names: Sequence[str]) -> List[Dict[str, Any]]:
+    return [
+        {"catalog": event["catalog"], "schema_name": event["schema_name"], "table": name, "columns": event["columns"]}
+        for name in names
+    ]
+
+
+def build_request(event: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(path, JSON body) re-issuing ``event``, or None if the row lacks the inputs"""
+    event_type = event["event_type"]
+    session_id = f"replay-{event.get('session_id') or event.get('log_id')}"
+    model_id = event.get("model_id") or None
+    model = {"model_id": model_id} if model_id else {}
+
+    if event_type == "sql_execution":
+        if not event.get("generated_sql"):
+            return None
+        return "/api/execute-sql", {"sql_query": event["generated_sql"], "session_id": session_id}
+
+    if not (event.get("catalog") and event.get("schema_name") and event.get("table_name")):
+        return None
+    if event_type == "business_logic_suggestion":
+        return "/api/suggest-business-logic", {
+            "catalog": event["catalog"], "schema_name": event["schema_name"], "table": event["table_name"],
+            "columns": event["columns"], "session_id": session_id, **model,
+        }
+    if event_type == "join_condition_suggestion":
+        match = _JOIN_PREFIX_RE.match(event["table_name"])
+        if not match:
+            return None
+        names = [name.strip() for name in match.group(1).split("+")]
+        return "/api/suggest-join-conditions", {"tables": _tables(event, names), "session_id": session_id, **model}
+
+    # sql_generation: joins are recorded as "[JOIN: a + b] business logic"
+    business_logic = event.get("business_logic") or ""
+    names = [event["table_name"]]
+    match = _JOIN_PREFIX_RE.match(business_logic)
+    if match:
+        names = [name.strip() for name in match.group(1).split("+")]
+        business_logic = business_logic[match.end():]
+    if not business_logic:
+        return None
+    return "/api/generate-sql", {
+        "tables": _tables(event, names), "business_logic": business_logic, "session_id": session_id, **model,
+    }
+
+
+async def replay_event(client: httpx.AsyncClient, event: Dict[str, Any], request: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Send one event's request and compare the outcome with the recorded one"""
+    path, body = request
+    started = time.perf_counter()
+    row_count = None
+    try:
+        response = await client.post(path, json=body)
+        status = "success" if response.status_code < 400 else "error"
+        error = None if status == "success" else f"HTTP {response.status_code}: {response.text[:300]}"
+        if status == "success" and event["event_type"] == "sql_execution":
+            row_count = response.json().get("row_count")
+    except httpx.HTTPError as e:
+        status, error = "error", f"{type(e).__name__}: {e}"
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "log_id": event.get("log_id"),
+        "event_type": event["event_type"],
+        "recorded_status": event.get("status"),
+        "status": status,
+        "error": error,
+        "recorded_ms": event["execution_time_ms"],
+        "latency_ms": round(latency_ms, 1),
+        "recorded_row_count": event["row_count"],
+        "row_count": row_count,
+    }
+
+
+async def replay(
+    events: Sequence[Dict[str, Any]],
+    client: httpx.AsyncClient,
+    speed: float = 1.0,
+    max_in_flight: int = 100,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Replay ``events`` at their recorded offsets divided by ``speed`` (0 sends them as fast as possible)"""
+    in_flight = asyncio.Semaphore(max(1, max_in_flight))
+    skipped = 0
+    lags: List[float] = []
+    tasks = []
+    first = events[0]["timestamp"] if events else None
+    started = time.perf_counter()
+
+    async def send(event, request):
+        async with in_flight:
+            return await replay_event(client, event, request)
+
+    for event in events:
+        request = build_request(event)
+        if request is None:
+            skipped += 1
+            continue
+        if speed > 0:
+            due = (event["timestamp"] - first).total_seconds() / speed
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # How late the request left compared with its scheduled time
+            lags.append(max(0.0, (time.perf_counter() - started) - due) * 1000)
+        tasks.append(asyncio.ensure_future(send(event, request)))
+
+    results = list(await asyncio.gather(*tasks))
+    lags.sort()
+    return results, {
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+        "skipped": skipped,
+        "schedule_lag_p95_ms": round(percentile(lags, 0.95), 1) if lags else None,
+    }
+
+
+def summarize(results: Sequence[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Recorded vs replayed latency, errors and row counts per event type"""
+    summary = {}
+    for event_type in REPLAYABLE_EVENT_TYPES:
+        rows = [result for result in results if result["event_type"] == event_type]
+        if not rows:
+            continue
+        replayed = sorted(result["latency_ms"] for result in rows)
+        recorded = sorted(result["recorded_ms"] for result in rows if result["recorded_ms"] is not None)
+        stats: Dict[str, Any] = {
+            "count": len(rows),
+            "errors": sum(result["status"] == "error" for result in rows),
+            "recorded_errors": sum(result["recorded_status"] == "error" for result in rows),
+            # Succeeded when recorded but failed now
+            "new_errors": sum(result["status"] == "error" and result["recorded_status"] != "error" for result in rows),
+        }
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            stats[f"recorded_{name}_ms"] = percentile(recorded, q)
+            stats[f"replayed_{name}_ms"] = percentile(replayed, q)
+        if recorded and stats["recorded_p95_ms"]:
+            stats["p95_ratio"] = round(stats["replayed_p95_ms"] / stats["recorded_p95_ms"], 2)
+        if event_type == "sql_execution":
+            compared = [result for result in rows if result["status"] == "success" and result["recorded_row_count"] is not None]
+            stats["row_count_mismatches"] = sum(result["row_count"] != result["recorded_row_count"] for result in compared)
+        summary[event_type] = stats
+    return summary
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay audit_logs events against an app instance")
+    parser.add_argument("events", help="Exported audit events (.jsonl, .json or .csv)")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Time compression: 10 replays an hour in 6 minutes, 0 sends everything at once")
+    parser.add_argument("--max-in-flight", type=int, default=100, help="Cap on concurrent requests")
+    parser.add_argument("--event-types", default=",".join(REPLAYABLE_EVENT_TYPES), help="Event types to replay")
+    parser.add_argument("--limit", type=int, help="Replay only the first N events")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Write the summary (and per-event results with --details) as JSON")
+    parser.add_argument("--details", action="store_true", help="Include every replayed event in the output")
+    args = parser.parse_args(argv)
+
+    event_types = {name.strip() for name in args.event_types.split(",") if name.strip()}
+    events = [event for event in load_events(args.events) if event["event_type"] in event_types]
+    if args.limit:
+        events = events[:args.limit]
+    if not events:
+        print("No replayable events found")
+        return 1
+    span = (events[-1]["timestamp"] - events[0]["timestamp"]).total_seconds()
+    print(f"Replaying {len(events)} events recorded over {span:.0f}s at speed {args.speed}")
+
+    async def run():
+        limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+            return await replay(events, client, speed=args.speed, max_in_flight=args.max_in_flight)
+
+    results, run_stats = asyncio.run(run())
+    report: Dict[str, Any] = {
+        "events_file": args.events,
+        "base_url": args.base_url,
+        "speed": args.speed,
+        "recorded_span_seconds": span,
+        **run_stats,
+        "event_types": summarize(results),
+    }
+    if args.details:
+        report["events"] = results
+
+    for event_type, stats in report["event_types"].items():
+        print(f"{event_type:<28} n={stats['count']:<6} errors={stats['errors']} (new {stats['new_errors']})  "
+              f"p50 {stats['recorded_p50_ms']} -> {stats['replayed_p50_ms']} ms  "
+              f"p95 {stats['recorded_p95_ms']} -> {stats['replayed_p95_ms']} ms"
+              + (f"  row count mismatches={stats['row_count_mismatches']}" if "row_count_mismatches" in stats else ""))
+    print(f"elapsed {run_stats['elapsed_seconds']}s, skipped {run_stats['skipped']}, "
+          f"schedule lag p95 {run_stats['schedule_lag_p95_ms']} ms")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Streaming of warehouse results as NDJSON or Arrow IPC.
+
+/api/execute-sql returns at most 100 rows as one JSON body. The streaming
+variant sends results up to a much larger row cap with flat memory: rows
+are pulled from the cursor one batch at a time, and each encoded batch is
+handed to the response before the next is fetched, so a slow client slows
+the fetches down instead of the result piling up in the app, and the first
+rows reach the client while the rest are still in the warehouse.
+
+Every NDJSON line is an object tagged with its ``type``: a
+``{"type": "header", "columns": [...]}`` line, one
+``{"type": "row", "values": [...]}`` line per row (values in column
+order) and a closing ``{"type": "end", "row_count": n, "truncated": bool}``
+line, or ``{"type": "error", "error": ...}`` if the fetch fails part way.
+Rows never share a key set with the control lines, so column names the
+query picks (``error``, ``row_count``) cannot be mistaken for them.
+
+An Arrow stream is the IPC stream format, read with ``pyarrow.ipc.open_stream`` or apache-arrow's
+``RecordBatchReader``; its batches come straight from ``fetchmany_arrow``
+on cursors that have it (the Databricks connector) and are built from rows
+on those that do not.
+
+Backpressure means a stalled client would hold the stream's warehouse
+connection for as long as its socket stays open, so
+``TimedStreamingResponse`` gives up on a client that takes longer than a
+timeout to accept a chunk, and always runs the stream's cleanup.
+"""
+import asyncio
+import json
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import anyio
+from starlette.responses import StreamingResponse
+
+from sql_results import column_names
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def arrow_available() -> bool:
+    return pyarrow is not None
+
+
+def _json_default(value: Any) -> Any:
+    # Same representations as the JSON endpoint's encoder
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _json_line(payload: Any) -> bytes:
+    return (json.dumps(payload, default=_json_default) + "\n").encode("utf-8")
+
+
+def error_line(error: BaseException) -> bytes:
+    """Closing NDJSON line for a stream whose fetch failed after the response started"""
+    return _json_line({"type": "error", "error": str(error)})
+
+
+class _ChunkSink:
+    """File-like target for the Arrow IPC writer that hands back what was written since the last drain"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+class ResultStream:
+    """Batch-at-a-time encoder for an executed cursor.
+
+    ``next_chunk`` fetches and blocks, so callers run it on the warehouse
+    executor and send each chunk before asking for the next.
+    """
+
+    def __init__(self, cursor, fmt: str, max_rows: int, batch_rows: int, header: Optional[Dict[str, Any]] = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown result format {fmt!r}, expected one of {', '.join(FORMATS)}")
+        if fmt == "arrow" and pyarrow is None:
+            raise ValueError("Arrow results need pyarrow installed")
+        self.cursor = cursor
+        self.format = fmt
+        self.max_rows = max_rows
+        self.batch_rows = max(1, batch_rows)
+        self.columns = column_names(cursor.description)
+        self.row_count = 0
+        self.truncated = False
+        self.done = False
+        self._header = header or {}
+        self._started = False
+        self._sink = _ChunkSink()
+        self._writer = None
+        self._schema = None
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.format]
+
+    def next_chunk(self) -> Optional[bytes]:
+        """The next encoded batch; None once the result or the row cap is exhausted"""
+        if self.done:
+            return None
+        if not self._started:
+            self._started = True
+            if self.format == "ndjson":
+                return _json_line({**self._header, "type": "header", "columns": self.columns})
+        if not self.columns:
+            # Statements without a result set
+            return self._finish()
+
+        remaining = self.max_rows - self.row_count
+        if remaining <= 0:
+            # One more row tells a capped result from one that ended exactly at the cap
+            self.truncated = self._count(self._fetch(1)) > 0
+            return self._finish()
+
+        batch = self._fetch(min(self.batch_rows, remaining))
+        count = self._count(batch)
+        if count == 0:
+            # An empty Arrow result still carries its schema
+            schema = self._encode(batch) if self.format == "arrow" and self._writer is None else b""
+            return schema + self._finish()
+        self.row_count += count
+        return self._encode(batch)
+
+    def _fetch(self, size: int):
+        if self.format == "arrow" and hasattr(self.cursor, "fetchmany_arrow"):
+            return self.cursor.fetchmany_arrow(size)
+        return self.cursor.fetchmany(size)
+
+    @staticmethod
+    def _count(batch) -> int:
+        return batch.num_rows if hasattr(batch, "num_rows") else len(batch)
+
+    def _encode(self, batch) -> bytes:
+        if self.format == "ndjson":
+            return b"".join(_json_line({"type": "row", "values": list(row)}) for row in batch)
+
+        if not hasattr(batch, "num_rows"):
+            batch = self._rows_to_arrow(batch)
+        if self._writer is None:
+            self._writer = pyarrow.ipc.new_stream(self._sink, batch.schema)
+        self._writer.write(batch)
+        return self._sink.drain()
+
+    def _rows_to_arrow(self, rows: Sequence[Sequence[Any]]):
+        """A record batch from row tuples, typed by the first batch (all-null columns become strings)"""
+        values = list(zip(*rows)) if rows else [()] * len(self.columns)
+        if self._schema is None:
+            arrays = [pyarrow.array(column) for column in values]
+            self._schema = pyarrow.schema([
+                (name, pyarrow.string() if array.type == pyarrow.null() else array.type)
+                for name, array in zip(self.columns, arrays)
+            ])
+        arrays = [pyarrow.array(column, type=field.type) for column, field in zip(values, self._schema)]
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=self._schema)
+
+    def _finish(self) -> bytes:
+        self.done = True
+        if self.format == "ndjson":
+            return _json_line({"type": "end", "row_count": self.row_count, "truncated": self.truncated})
+        if self._writer is None:
+            self._writer = pyarrow.ipc.new_stream(self._sink, pyarrow.schema([]))
+        # Writes the end-of-stream marker
+        self._writer.close()
+        return self._sink.drain()
+
+
+class TimedStreamingResponse(StreamingResponse):
+    """Streaming response with a per-chunk send timeout and a cleanup hook.
+
+    ``on_close`` runs once the response ends, whether the body was sent in
+    full, the client disconnected or timed out, or the body never started.
+    """
+
+    def __init__(self, content, send_timeout: float, on_close: Optional[Callable[[], Awaitable[None]]] = None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.send_timeout = send_timeout
+        self.on_close = on_close
+
+    async def stream_response(self, send) -> None:
+        async def send_with_timeout(message):
+            with anyio.fail_after(self.send_timeout):
+                await send(message)
+
+        try:
+            await super().stream_response(send_with_timeout)
+        except TimeoutError:
+            # Returning without the final message makes the server drop the connection
+            logger.warning(f"Client took over {self.send_timeout}s to accept a chunk, closing the stream")
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                # Shielded so cleanup completes even when a disconnect cancels the response
+                await asyncio.shield(self.on_close())
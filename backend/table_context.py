@@ -0,0 +1,283 @@
+"""
+Table context for LLM prompts: parsed schema, table comment and sample rows.
+
+The usual flow (suggest business logic, suggest joins, generate SQL) used
+to describe the same tables two or three times. Snapshots are cached per
+table, independent of which columns the user selected, and rendered for
+the current selection on demand. Sample rows are only fetched for columns
+a prompt has asked for, so wide tables do not ship every column of their
+sample; selecting a column that is not sampled yet re-samples the union.
+Cached snapshots expire after a TTL and are re-validated against the
+table's Delta version in between, so a write to the table is picked up
+without waiting for the TTL.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from metadata_loader import quote_identifier
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_ROW_COUNT = 5
+
+
+def parse_describe_extended(rows: Sequence[Sequence[Any]]) -> Tuple[Dict[str, Dict[str, str]], Optional[str]]:
+    """Split ``DESCRIBE TABLE EXTENDED`` output into column metadata and the table comment"""
+    columns: Dict[str, Dict[str, str]] = {}
+    table_comment = None
+    in_detailed_info = False
+
+    for row in rows:
+        col_name = row[0]
+        data_type = row[1] if len(row) > 1 else None
+        comment = row[2] if len(row) > 2 else None
+
+        if col_name and '# Detailed Table Information' in col_name:
+            in_detailed_info = True
+            continue
+
+        if in_detailed_info:
+            # Detailed info rows are (key, value, ''), so the comment is in the data_type slot
+            if col_name and col_name.strip() == 'Comment':
+                table_comment = data_type or comment or None
+            continue
+
+        if col_name and col_name.strip() and not col_name.startswith('#') and col_name not in columns:
+            columns[col_name] = {'type': data_type, 'comment': comment if comment else ''}
+
+    return columns, table_comment
+
+
+class TableSnapshot:
+    """Everything the prompts need to know about one table"""
+
+    __slots__ = ("columns", "table_comment", "sample_columns", "sample_rows", "version", "loaded_at", "validated_at")
+
+    def __init__(self, columns, table_comment, sample_columns, sample_rows, version):
+        now = time.monotonic()
+        self.columns: Dict[str, Dict[str, str]] = columns
+        self.table_comment: Optional[str] = table_comment
+        self.sample_columns: List[str] = sample_columns
+        self.sample_rows: List[Sequence[Any]] = sample_rows
+        self.version: Optional[int] = version
+        self.loaded_at = now
+        self.validated_at = now
+
+
+def render_table_context(snapshot: TableSnapshot, full_table_name: str, selected_columns: List[str], idx: int) -> str:
+    """Render a snapshot as prompt text for the selected columns"""
+    context = f"\nTable {idx}: {full_table_name}\n"
+
+    if snapshot.table_comment:
+        context += f"Table Description: {snapshot.table_comment}\n"
+
+    context += "\nColumns:\n"
+    for col in selected_columns:
+        meta = snapshot.columns.get(col)
+        if meta:
+            context += f"  - {col} ({meta['type']})"
+            if meta['comment']:
+                context += f": {meta['comment']}"
+            context += "\n"
+        else:
+            context += f"  - {col}\n"
+
+    if snapshot.sample_rows:
+        # Sample rows hold every column; project them onto the current selection
+        positions = {name.lower(): i for i, name in enumerate(snapshot.sample_columns)}
+        indexes = [positions.get(col.lower()) for col in selected_columns]
+        header = " | ".join(selected_columns)
+        context += f"\nSample Data (first {SAMPLE_ROW_COUNT} rows):\n"
+        context += header + "\n"
+        context += "-" * len(header) + "\n"
+        for row in snapshot.sample_rows:
+            values = [row[i] if i is not None else None for i in indexes]
+            context += " | ".join(str(val) if val is not None else 'NULL' for val in values) + "\n"
+    context += "\n"
+    return context
+
+
+def _existing(columns: Dict[str, Dict[str, str]], selected: Sequence[str]) -> List[str]:
+    """The table's own names for the selected columns, in table order; unknown columns are skipped"""
+    wanted = {name.lower() for name in selected}
+    return [name for name in columns if name.lower() in wanted]
+
+
+class TableContextService:
+    """Thread-safe cache of table snapshots backed by the warehouse connection pool"""
+
+    def __init__(
+        self,
+        pool,
+        ttl_seconds: float = 600.0,
+        version_check_seconds: float = 60.0,
+        max_entries: int = 512,
+    ):
+        self.pool = pool
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[Tuple[str, str, str], TableSnapshot]" = OrderedDict()
+        # Per-table loader locks with the number of threads holding or waiting for each
+        self._key_locks: Dict[Tuple[str, str, str], list] = {}
+        self._stats = {
+            "hits": 0, "misses": 0, "sample_loads": 0, "version_checks": 0, "version_changes": 0, "evictions": 0,
+        }
+
+    def build_context(self, table_info, idx: int) -> str:
+        """Prompt context for ``table_info`` (catalog, schema_name, table, columns). Blocking."""
+        snapshot = self.get_snapshot(table_info.catalog, table_info.schema_name, table_info.table, table_info.columns)
+        full_table_name = f"{table_info.catalog}.{table_info.schema_name}.{table_info.table}"
+        return render_table_context(snapshot, full_table_name, table_info.columns, idx)
+
+    def get_snapshot(self, catalog: str, schema: str, table: str, columns: Sequence[str] = ()) -> TableSnapshot:
+        """Return a cached snapshot with sample values for ``columns``, re-validating or reloading it as needed. Blocking."""
+        key = (catalog, schema, table)
+        with self._lock:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        try:
+            # One loader per table; concurrent requests for it wait and reuse the result
+            with entry[0]:
+                snapshot = self._validated(key)
+                if snapshot is None:
+                    self._count("misses")
+                    snapshot = self._load(catalog, schema, table, columns)
+                    self._store(key, snapshot)
+                elif self._unsampled(snapshot, columns):
+                    snapshot = self._resample(snapshot, f"{catalog}.{schema}.{table}", columns)
+                    self._store(key, snapshot)
+                return snapshot
+        finally:
+            with self._lock:
+                # The last thread out drops the lock, so the dict only holds tables being loaded
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def _validated(self, key) -> Optional[TableSnapshot]:
+        snapshot = self._cached(key)
+        if snapshot is None:
+            return None
+        now = time.monotonic()
+        # Views and non-Delta tables have no version and live until the TTL
+        if snapshot.version is None or now - snapshot.validated_at < self.version_check_seconds:
+            self._count("hits")
+            return snapshot
+        current = self._check_version(*key)
+        # An unknown version (check failed) keeps serving the cached snapshot
+        if current is None or current == snapshot.version:
+            snapshot.validated_at = now
+            self._count("hits")
+            return snapshot
+        self._count("version_changes")
+        return None
+
+    def _cached(self, key) -> Optional[TableSnapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None:
+                return None
+            if time.monotonic() - snapshot.loaded_at >= self.ttl_seconds:
+                del self._snapshots[key]
+                return None
+            self._snapshots.move_to_end(key)
+            return snapshot
+
+    def _store(self, key, snapshot: TableSnapshot):
+        with self._lock:
+            self._snapshots[key] = snapshot
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_entries:
+                self._snapshots.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _load(self, catalog: str, schema: str, table: str, selected: Sequence[str]) -> TableSnapshot:
+        full_table_name = f"{catalog}.{schema}.{table}"
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DESCRIBE TABLE EXTENDED {full_table_name}")
+                columns, table_comment = parse_describe_extended(cursor.fetchall())
+                sample_columns, sample_rows = self._sample(cursor, full_table_name, _existing(columns, selected))
+                version = self._read_version(cursor, full_table_name)
+
+        return TableSnapshot(columns, table_comment, sample_columns, sample_rows, version)
+
+    def _unsampled(self, snapshot: TableSnapshot, selected: Sequence[str]) -> List[str]:
+        sampled = {name.lower() for name in snapshot.sample_columns}
+        return [name for name in _existing(snapshot.columns, selected) if name.lower() not in sampled]
+
+    def _resample(self, snapshot: TableSnapshot, full_table_name: str, selected: Sequence[str]) -> TableSnapshot:
+        """A copy of ``snapshot`` sampling the columns it already had plus the newly selected ones"""
+        wanted = {name.lower() for name in snapshot.sample_columns} | {name.lower() for name in selected}
+        names = [name for name in snapshot.columns if name.lower() in wanted]
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                sample_columns, sample_rows = self._sample(cursor, full_table_name, names)
+        # A new object rather than an update, so concurrent renders never mix old and new samples
+        resampled = TableSnapshot(snapshot.columns, snapshot.table_comment, sample_columns, sample_rows, snapshot.version)
+        resampled.loaded_at = snapshot.loaded_at
+        resampled.validated_at = snapshot.validated_at
+        return resampled
+
+    def _sample(self, cursor, full_table_name: str, names: Sequence[str]) -> Tuple[List[str], List[Sequence[Any]]]:
+        if not names:
+            return [], []
+        self._count("sample_loads")
+        select_list = ", ".join(quote_identifier(name) for name in names)
+        cursor.execute(f"SELECT {select_list} FROM {full_table_name} LIMIT {SAMPLE_ROW_COUNT}")
+        sample_columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        return sample_columns, [tuple(row) for row in cursor.fetchall()]
+
+    def _check_version(self, catalog: str, schema: str, table: str) -> Optional[int]:
+        self._count("version_checks")
+        try:
+            with self.pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    return self._read_version(cursor, f"{catalog}.{schema}.{table}")
+        except Exception as e:
+            logger.warning(f"Delta version check failed for {catalog}.{schema}.{table}: {str(e)}")
+            return None
+
+    @staticmethod
+    def _read_version(cursor, full_table_name: str) -> Optional[int]:
+        """Latest Delta version, or None for views and non-Delta tables"""
+        try:
+            cursor.execute(f"DESCRIBE HISTORY {full_table_name} LIMIT 1")
+            row = cursor.fetchone()
+            return int(row[0]) if row and row[0] is not None else None
+        except Exception:
+            return None
+
+    def invalidate(self, catalog: Optional[str] = None, schema: Optional[str] = None, table: Optional[str] = None) -> int:
+        """Drop snapshots under the given scope, or all of them when no scope is given"""
+        scope = tuple(part for part in (catalog, schema, table) if part is not None)
+        with self._lock:
+            doomed = [key for key in self._snapshots if key[:len(scope)] == scope]
+            for key in doomed:
+                del self._snapshots[key]
+            return len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot cache occupancy and counters"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "entries": len(self._snapshots),
+                "loading": len(self._key_locks),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "version_check_seconds": self.version_check_seconds,
+            })
+            return snapshot
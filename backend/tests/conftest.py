@@ -0,0 +1,158 @@
+"""
+Shared pytest configuration and fixtures for backend tests
+"""
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules are imported flat (as uvicorn does with `app:app`)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class FakeCursor:
+    """DB-API cursor that answers queries from a FakeWarehouse's scripted responses"""
+
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+        self.description = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.warehouse.queries.append((query, params))
+        for pattern, columns, rows in self.warehouse.responses:
+            if re.search(pattern, query, re.IGNORECASE | re.DOTALL):
+                if isinstance(rows, Exception):
+                    raise rows
+                self.description = [(name, "string") for name in columns] if columns else None
+                self._rows = list(rows(query, params) if callable(rows) else rows)
+                return
+        self.description = None
+        self._rows = []
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, warehouse):
+        self.warehouse = warehouse
+
+    def cursor(self):
+        return FakeCursor(self.warehouse)
+
+    def close(self):
+        pass
+
+
+class FakeWarehouse:
+    """Scripted stand-in for a Databricks SQL warehouse"""
+
+    def __init__(self):
+        self.responses = []
+        self.queries = []
+        self.connections = 0
+
+    def respond(self, pattern, columns=None, rows=()):
+        """Answer queries matching ``pattern`` with ``rows`` (a list, callable or exception).
+
+        Later registrations take precedence over earlier ones.
+        """
+        self.responses.insert(0, (pattern, columns, rows))
+
+    def connect(self):
+        self.connections += 1
+        return FakeConnection(self)
+
+    def executed(self, pattern):
+        return [q for q, _ in self.queries if re.search(pattern, q, re.IGNORECASE | re.DOTALL)]
+
+
+@pytest.fixture
+def fake_warehouse(monkeypatch):
+    """Point the app's warehouse pool at a FakeWarehouse"""
+    import app as app_module
+    from connection_pool import ConnectionPool
+    from metadata_cache import MetadataCache
+    from table_context import TableContextService
+    from audit_writer import AuditWriter
+
+    warehouse = FakeWarehouse()
+    pool = ConnectionPool(warehouse.connect, min_size=0, max_size=4)
+    monkeypatch.setattr(app_module, "warehouse_pool", pool)
+    monkeypatch.setattr(app_module, "stream_pool", ConnectionPool(warehouse.connect, min_size=0, max_size=2))
+    monkeypatch.setattr(app_module, "metadata_cache", MetadataCache())
+    monkeypatch.setattr(app_module, "analytics_cache", MetadataCache(levels=app_module.ANALYTICS_ENDPOINTS, default_ttl_seconds=30))
+    monkeypatch.setattr(app_module, "table_context_service", TableContextService(pool))
+    monkeypatch.setattr(app_module, "audit_writer", AuditWriter(app_module.write_audit_batch))
+    return warehouse
+
+
+@pytest.fixture
+def client(fake_warehouse):
+    from fastapi.testclient import TestClient
+    import app as app_module
+
+    return TestClient(app_module.app)
+
+
+class FakeLLM:
+    """Stand-in for the shared LLMClient returning scripted completions"""
+
+    def __init__(self, on_call=None, call_seconds=0.25):
+        self.replies = []
+        self.calls = []
+        # Reported to on_call as each call's duration, like LLMClient does
+        self.on_call = on_call
+        self.call_seconds = call_seconds
+
+    def reply(self, content, finish_reason="stop", prompt_tokens=100, completion_tokens=50):
+        self.replies.append((content, finish_reason, prompt_tokens, completion_tokens))
+
+    async def chat_completion(self, **params):
+        from types import SimpleNamespace
+
+        self.calls.append(params)
+        content, finish_reason, prompt_tokens, completion_tokens = self.replies.pop(0)
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+        if self.on_call is not None:
+            self.on_call(params["model"], self.call_seconds, response, None)
+        return response
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replace the app's shared LLM client with a FakeLLM"""
+    import app as app_module
+
+    llm = FakeLLM(on_call=app_module.record_llm_call)
+    monkeypatch.setattr(app_module, "llm_client", llm)
+    return llm
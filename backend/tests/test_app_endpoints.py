@@ -0,0 +1,849 @@
+"""
+Offline endpoint tests against a scripted fake warehouse
+"""
+import json
+from datetime import datetime, timedelta
+
+from audit_rollup import utc_now
+from query_history import LOOKBACK_WINDOWS, MAX_SESSION_SPAN
+
+
+class TestCatalogEndpoints:
+    """Test catalog browser endpoints"""
+
+    def test_list_schemas(self, client, fake_warehouse):
+        """Schemas are listed through the shared connection pool"""
+        fake_warehouse.respond(r"SHOW SCHEMAS IN main", ["databaseName"], [("default",), ("sales",)])
+        response = client.get("/api/catalogs/main/schemas")
+        assert response.status_code == 200
+        assert response.json() == {"schemas": ["default", "sales"]}
+
+    def test_connections_are_reused(self, client, fake_warehouse):
+        """Repeated requests reuse one pooled warehouse connection"""
+        fake_warehouse.respond(r"SHOW TABLES", ["database", "tableName", "isTemporary"], [("sales", "orders", False)])
+        for _ in range(3):
+            assert client.get("/api/catalogs/main/schemas/sales/tables").json() == {"tables": ["orders"]}
+        assert fake_warehouse.connections == 1
+
+
+class TestExecuteSQL:
+    """Test SQL execution endpoint"""
+
+    def test_execute_sql(self, client, fake_warehouse):
+        """Results are returned as a list of dicts and audited"""
+        import asyncio
+        import app as app_module
+
+        fake_warehouse.respond(r"^SELECT id", ["id", "name"], [(1, "a"), (2, "b")])
+        response = client.post("/api/execute-sql", json={"sql_query": "SELECT id, name FROM t"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["row_count"] == 2
+        assert data["rows"][0] == {"id": 1, "name": "a"}
+        # Auditing is queued, not written while the request waits
+        assert not fake_warehouse.executed(r"INSERT INTO .*audit_logs")
+        assert app_module.audit_writer.stats()["queued"] == 1
+        asyncio.run(app_module.audit_writer.flush())
+        assert fake_warehouse.executed(r"INSERT INTO .*audit_logs")
+
+    def test_execute_sql_error(self, client, fake_warehouse):
+        """Warehouse errors surface as 500s"""
+        fake_warehouse.respond(r"^SELECT", rows=RuntimeError("TABLE_OR_VIEW_NOT_FOUND"))
+        response = client.post("/api/execute-sql", json={"sql_query": "SELECT * FROM missing"})
+        assert response.status_code == 500
+        assert "TABLE_OR_VIEW_NOT_FOUND" in response.json()["detail"]
+
+
+class TestExecuteSQLStream:
+    """Test streaming SQL execution endpoint"""
+
+    def stream(self, client, **body):
+        response = client.post("/api/execute-sql/stream", json={"sql_query": "SELECT id, name FROM t", **body})
+        lines = [json.loads(line) for line in response.text.splitlines()] if response.status_code == 200 else []
+        return response, lines
+
+    def test_ndjson_stream(self, client, fake_warehouse, monkeypatch):
+        """Rows are streamed in fetched batches between a header and a footer, then audited"""
+        import app as app_module
+
+        monkeypatch.setattr(app_module, "SQL_STREAM_BATCH_ROWS", 2)
+        fake_warehouse.respond(r"^SELECT id", ["id", "name"], [(i, f"n{i}") for i in range(5)])
+        response, lines = self.stream(client, session_id="flow-1")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert lines[0] == {"session_id": "flow-1", "type": "header", "columns": ["id", "name"]}
+        assert lines[1:6] == [{"type": "row", "values": [i, f"n{i}"]} for i in range(5)]
+        assert lines[6] == {"type": "end", "row_count": 5, "truncated": False}
+        row = app_module.audit_writer._queue[0][1]
+        assert row[app_module.AUDIT_LOG_COLUMNS.index("row_count")] == 5
+        assert row[app_module.AUDIT_LOG_COLUMNS.index("status")] == "success"
+        # The connection and stream slot are released once the stream ends, and the shared pool was not used
+        assert app_module.stream_pool.stats()["in_use"] == 0
+        assert not app_module.stream_slots.locked()
+        assert app_module.warehouse_pool.stats()["checkouts"] == 0
+
+    def test_arrow_stream(self, client, fake_warehouse):
+        """Arrow output is one IPC stream of record batches"""
+        import pyarrow
+
+        fake_warehouse.respond(r"^SELECT id", ["id", "name"], [(i, f"n{i}") for i in range(5)])
+        response = client.post("/api/execute-sql/stream", json={"sql_query": "SELECT id, name FROM t", "format": "arrow"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        assert table.column_names == ["id", "name"]
+        assert table.column("name").to_pylist() == [f"n{i}" for i in range(5)]
+
+    def test_row_cap(self, client, fake_warehouse, monkeypatch):
+        """Results stop at the requested cap, which cannot exceed SQL_STREAM_MAX_ROWS"""
+        import app as app_module
+
+        fake_warehouse.respond(r"^SELECT id", ["id", "name"], [(i, "n") for i in range(10)])
+        _, lines = self.stream(client, max_rows=3)
+        assert len(lines) == 5
+        assert lines[-1] == {"type": "end", "row_count": 3, "truncated": True}
+
+        _, lines = self.stream(client, max_rows=10)
+        assert lines[-1] == {"type": "end", "row_count": 10, "truncated": False}
+
+        monkeypatch.setattr(app_module, "SQL_STREAM_MAX_ROWS", 4)
+        response, lines = self.stream(client, max_rows=10)
+        assert response.headers["x-max-rows"] == "4"
+        assert lines[-1] == {"type": "end", "row_count": 4, "truncated": True}
+
+    def test_fetch_error_mid_stream(self, client, fake_warehouse, monkeypatch):
+        """A failed fetch ends the stream with an error line and an error audit event"""
+        import app as app_module
+        from sql_stream import ResultStream
+
+        fetch = ResultStream._fetch
+        calls = []
+
+        def failing_fetch(stream, size):
+            calls.append(size)
+            if len(calls) > 1:
+                raise RuntimeError("connection reset")
+            return fetch(stream, size)
+
+        monkeypatch.setattr(app_module, "SQL_STREAM_BATCH_ROWS", 2)
+        monkeypatch.setattr(ResultStream, "_fetch", failing_fetch)
+        fake_warehouse.respond(r"^SELECT id", ["id", "name"], [(i, "n") for i in range(5)])
+        response, lines = self.stream(client)
+        assert response.status_code == 200
+        assert len(lines) == 4
+        assert lines[-1] == {"type": "error", "error": "connection reset"}
+        row = app_module.audit_writer._queue[0][1]
+        assert row[app_module.AUDIT_LOG_COLUMNS.index("status")] == "error"
+        assert row[app_module.AUDIT_LOG_COLUMNS.index("row_count")] == 2
+        assert app_module.stream_pool.stats()["in_use"] == 0
+
+    def test_concurrent_stream_limit(self, client, fake_warehouse, monkeypatch):
+        """Streams past SQL_STREAM_MAX_CONCURRENT are turned away instead of queued"""
+        import asyncio
+        import app as app_module
+
+        monkeypatch.setattr(app_module, "stream_slots", asyncio.Semaphore(0))
+        response, _ = self.stream(client)
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "1"
+        assert not fake_warehouse.queries
+
+    def test_errors_before_streaming(self, client, fake_warehouse, monkeypatch):
+        """Bad formats are 400s and failed queries 500s, before any row is sent"""
+        import app as app_module
+
+        response, _ = self.stream(client, format="csv")
+        assert response.status_code == 400
+        monkeypatch.setattr(app_module, "arrow_available", lambda: False)
+        response, _ = self.stream(client, format="arrow")
+        assert response.status_code == 400
+        assert "pyarrow" in response.json()["detail"]
+
+        fake_warehouse.respond(r"^SELECT", rows=RuntimeError("TABLE_OR_VIEW_NOT_FOUND"))
+        response, _ = self.stream(client)
+        assert response.status_code == 500
+        assert "TABLE_OR_VIEW_NOT_FOUND" in response.json()["detail"]
+        assert app_module.stream_pool.stats()["in_use"] == 0
+        assert not app_module.stream_slots.locked()
+
+
+class TestGenerateSQL:
+    """Test SQL generation endpoint"""
+
+    def test_generate_sql(self, client, fake_warehouse, fake_llm):
+        """The LLM response is split into explanation and SQL"""
+        fake_llm.reply("EXPLANATION: Counts orders per region.\nSQL: SELECT region, COUNT(*) AS n\nFROM main.sales.orders\nGROUP BY region")
+        response = client.post("/api/generate-sql", json={
+            "tables": [{"catalog": "main", "schema_name": "sales", "table": "orders", "columns": ["region"]}],
+            "business_logic": "Orders per region",
+            "model_id": "databricks-llama-4-maverick",
+        })
+        assert response.status_code == 200
+        data = response.json()
+        assert data["explanation"] == "Counts orders per region."
+        assert data["sql_query"].startswith("SELECT region")
+        assert fake_llm.calls[0]["model"] == "databricks-llama-4-maverick"
+
+    def test_model_call_time_is_audited(self, client, fake_warehouse, fake_llm, monkeypatch):
+        """The audit event carries the model-call time separately from the request time"""
+        import app as app_module
+
+        # Off by default against Databricks, where audit_logs may not have the column yet
+        assert not app_module.AUDIT_LLM_TIME_ENABLED
+        assert "llm_time_ms" not in app_module.AUDIT_LOG_COLUMNS
+        monkeypatch.setattr(app_module, "AUDIT_LOG_COLUMNS", app_module.AUDIT_LOG_COLUMNS + ("llm_time_ms",))
+        fake_llm.reply("EXPLANATION: x\nSQL: SELECT a FROM t")
+        client.post("/api/generate-sql", json={
+            "tables": [{"catalog": "main", "schema_name": "sales", "table": "orders", "columns": ["a"]}],
+            "business_logic": "anything",
+        })
+        fake_warehouse.respond(r"^SELECT id", ["id"], [(1,)])
+        client.post("/api/execute-sql", json={"sql_query": "SELECT id FROM t"})
+        llm_row, sql_row = [item[1] for item in app_module.audit_writer._queue]
+        column = app_module.AUDIT_LOG_COLUMNS.index("llm_time_ms")
+        assert llm_row[column] == 250
+        assert sql_row[column] is None
+
+    def test_model_call_time_column_disabled(self, client, fake_warehouse, fake_llm):
+        """Without the column the INSERT does not name it, and longer spooled rows are trimmed on replay"""
+        import app as app_module
+
+        fake_llm.reply("EXPLANATION: x\nSQL: SELECT a FROM t")
+        client.post("/api/generate-sql", json={
+            "tables": [{"catalog": "main", "schema_name": "sales", "table": "orders", "columns": ["a"]}],
+            "business_logic": "anything",
+        })
+        row = app_module.audit_writer._queue[0][1]
+        assert len(row) == len(app_module.AUDIT_LOG_COLUMNS)
+        app_module.merge_audit_rows([list(row) + [250]])
+        merge_sql, = fake_warehouse.executed(r"^MERGE INTO")
+        assert "llm_time_ms" not in merge_sql
+
+    def test_generate_sql_truncated(self, client, fake_warehouse, fake_llm):
+        """Truncated LLM output is rejected"""
+        fake_llm.reply("EXPLANATION: x\nSQL: SELECT a FROM t WHERE", finish_reason="length")
+        response = client.post("/api/generate-sql", json={
+            "tables": [{"catalog": "main", "schema_name": "sales", "table": "orders", "columns": ["a"]}],
+            "business_logic": "anything",
+        })
+        assert response.status_code == 500
+
+
+class TestMetadataCaching:
+    """Test caching of catalog browser endpoints"""
+
+    def test_columns_cached(self, client, fake_warehouse):
+        """Repeat column listings are served without touching the warehouse"""
+        fake_warehouse.respond(r"^DESCRIBE main.sales.orders", ["col_name", "data_type", "comment"], [("id", "bigint", "Order id")])
+        for _ in range(3):
+            response = client.get("/api/catalogs/main/schemas/sales/tables/orders/columns")
+            assert response.json() == {"columns": [{"name": "id", "type": "bigint", "comment": "Order id"}]}
+        assert len(fake_warehouse.executed(r"^DESCRIBE")) == 1
+        stats = client.get("/api/cache/metadata").json()
+        assert stats["levels"]["columns"]["hits"] == 2
+
+    def test_invalidate(self, client, fake_warehouse):
+        """Invalidation forces the next request back to the warehouse"""
+        fake_warehouse.respond(r"SHOW SCHEMAS", ["databaseName"], [("sales",)])
+        client.get("/api/catalogs/main/schemas")
+        assert client.delete("/api/cache/metadata", params={"catalog": "main"}).json() == {"invalidated": 1}
+        client.get("/api/catalogs/main/schemas")
+        assert len(fake_warehouse.executed(r"SHOW SCHEMAS")) == 2
+
+    def test_invalidate_requires_parent_scope(self, client):
+        assert client.delete("/api/cache/metadata", params={"table": "orders"}).status_code == 400
+
+
+INFO_SCHEMA_TABLES = [("orders", "Customer orders"), ("customers", None)]
+INFO_SCHEMA_COLUMNS = [
+    ("customers", "id", "bigint", None),
+    ("orders", "id", "bigint", "Order id"),
+    ("orders", "customer_id", "bigint", None),
+]
+
+
+class TestBulkMetadata:
+    """Test information_schema bulk loading and the batch columns endpoint"""
+
+    def test_schema_loaded_once(self, client, fake_warehouse):
+        """Columns for every table in a schema come from one bulk load"""
+        fake_warehouse.respond(r"information_schema`?\.tables", ["table_name", "comment"], INFO_SCHEMA_TABLES)
+        fake_warehouse.respond(r"information_schema`?\.columns", ["table_name", "column_name", "full_data_type", "comment"], INFO_SCHEMA_COLUMNS)
+        orders = client.get("/api/catalogs/main/schemas/sales/tables/orders/columns").json()
+        customers = client.get("/api/catalogs/main/schemas/sales/tables/customers/columns").json()
+        assert [c["name"] for c in orders["columns"]] == ["id", "customer_id"]
+        assert orders["columns"][0]["comment"] == "Order id"
+        assert customers["columns"] == [{"name": "id", "type": "bigint", "comment": None}]
+        assert len(fake_warehouse.executed(r"information_schema`?\.columns")) == 1
+        assert not fake_warehouse.executed(r"^DESCRIBE")
+
+    def test_falls_back_to_describe(self, client, fake_warehouse):
+        """Catalogs without information_schema fall back to per-table DESCRIBE"""
+        fake_warehouse.respond(r"information_schema", rows=RuntimeError("SCHEMA_NOT_FOUND"))
+        fake_warehouse.respond(r"^DESCRIBE hive_metastore.default.t", ["col_name", "data_type", "comment"], [("a", "int", None)])
+        response = client.get("/api/catalogs/hive_metastore/schemas/default/tables/t/columns")
+        assert response.json() == {"columns": [{"name": "a", "type": "int", "comment": None}]}
+
+    def test_batch_columns(self, client, fake_warehouse):
+        """The batch endpoint answers many tables with one bulk query per schema"""
+        fake_warehouse.respond(r"information_schema`?\.tables", ["table_name", "comment"], INFO_SCHEMA_TABLES)
+        fake_warehouse.respond(r"information_schema`?\.columns", ["table_name", "column_name", "full_data_type", "comment"], INFO_SCHEMA_COLUMNS)
+        fake_warehouse.respond(r"^DESCRIBE main.sales.missing", rows=RuntimeError("TABLE_OR_VIEW_NOT_FOUND"))
+        response = client.post("/api/columns/batch", json={"tables": [
+            {"catalog": "main", "schema_name": "sales", "table": "orders"},
+            {"catalog": "main", "schema_name": "sales", "table": "customers"},
+            {"catalog": "main", "schema_name": "sales", "table": "missing"},
+        ]})
+        assert response.status_code == 200
+        tables = response.json()["tables"]
+        assert [len(t["columns"]) for t in tables] == [2, 1, 0]
+        assert "TABLE_OR_VIEW_NOT_FOUND" in tables[2]["error"]
+        assert len(fake_warehouse.executed(r"information_schema`?\.columns")) == 1
+
+
+def slow_rows(delay, rows):
+    def respond(query, params):
+        import time
+        time.sleep(delay)
+        return rows
+    return respond
+
+
+class TestTableContextFetching:
+    """Test concurrent per-table context fetching for suggestions"""
+
+    def test_partial_timeout_keeps_other_tables(self, client, fake_warehouse, fake_llm, monkeypatch):
+        """A slow table gets a placeholder; later tables are still described"""
+        import app as app_module
+
+        monkeypatch.setattr(app_module, "TABLE_CONTEXT_TIMEOUT_SECONDS", 0.2)
+        fake_warehouse.respond(r"DESCRIBE TABLE EXTENDED", ["col_name", "data_type", "comment"], [("id", "bigint", "Primary key")])
+        fake_warehouse.respond(r"DESCRIBE TABLE EXTENDED main.s.slow", ["col_name", "data_type", "comment"], slow_rows(0.5, []))
+        fake_warehouse.respond(r"LIMIT 5", ["id"], [(1,)])
+        fake_llm.reply("1. Which customers placed the most orders last month?")
+
+        response = client.post("/api/suggest-business-logic", json={
+            "catalog": "main", "schema_name": "s", "table": "slow", "columns": ["id"],
+            "additional_tables": [
+                {"catalog": "main", "schema_name": "s", "table": "fast1", "columns": ["id"]},
+                {"catalog": "main", "schema_name": "s", "table": "fast2", "columns": ["id"]},
+            ],
+        })
+        assert response.status_code == 200
+        prompt = fake_llm.calls[0]["messages"][1]["content"]
+        assert "Table 1: main.s.slow" in prompt
+        assert "Timeout fetching metadata" in prompt
+        assert "Table 3: main.s.fast2" in prompt
+        assert prompt.count("Primary key") == 2
+
+    def test_tables_fetched_concurrently(self, client, fake_warehouse, fake_llm):
+        """Total latency is bounded by the slowest table, not the sum"""
+        import time
+
+        fake_warehouse.respond(r"DESCRIBE TABLE EXTENDED", ["col_name", "data_type", "comment"], slow_rows(0.2, [("id", "bigint", None)]))
+        fake_llm.reply("t1.id = t2.id")
+        tables = [{"catalog": "main", "schema_name": "s", "table": f"t{i}", "columns": ["id"]} for i in range(4)]
+
+        started = time.monotonic()
+        response = client.post("/api/suggest-join-conditions", json={"tables": tables})
+        elapsed = time.monotonic() - started
+        assert response.status_code == 200
+        assert response.json()["join_condition"] == "t1.id = t2.id"
+        assert elapsed < 0.6
+
+
+class TestDashboardStatistics:
+    """Test dashboard statistics aggregation"""
+
+    def test_single_aggregate_row(self, client, fake_warehouse):
+        """Statistics come from one aggregate row, not the raw audit log"""
+        fake_warehouse.respond(
+            r"COUNT_IF.*FROM arao\.text_to_sql\.audit_logs",
+            ["total_executions", "total_llm_calls", "avg_execution_time_ms", "total_records",
+             "successful_records", "total_rows", "unique_tables"],
+            [(4, 6, 123.7, 10, 9, 250, 3)],
+        )
+        response = client.get("/api/dashboard-statistics")
+        assert response.json() == {
+            "total_executions": 4,
+            "total_llm_calls": 6,
+            "avg_execution_time_ms": 123,
+            "success_rate": 90.0,
+            "total_rows_returned": 250,
+            "unique_tables_analyzed": 3,
+        }
+        assert len(fake_warehouse.queries) == 1
+
+    def test_empty_audit_log(self, client, fake_warehouse):
+        fake_warehouse.respond(
+            r"COUNT_IF",
+            ["total_executions", "total_llm_calls", "avg_execution_time_ms", "total_records",
+             "successful_records", "total_rows", "unique_tables"],
+            [(0, 0, None, 0, 0, 0, 0)],
+        )
+        data = client.get("/api/dashboard-statistics").json()
+        assert data["avg_execution_time_ms"] == 0
+        assert data["success_rate"] == 0.0
+
+
+class TestAnalyticsRollup:
+    """Test that analytics aggregates read the hourly rollup"""
+
+    def test_costs_by_model_reads_rollup(self, client, fake_warehouse):
+        fake_warehouse.respond(
+            r"FROM arao\.text_to_sql\.audit_rollup_hourly",
+            ["model_id", "total_prompt_tokens", "total_completion_tokens", "total_tokens", "total_cost", "call_count"],
+            [("m1", 100, 50, 150, 0.5, 3), ("m2", 10, 5, 15, 0.25, 1)],
+        )
+        data = client.get("/api/llm-costs-by-model").json()
+        assert [model["model_id"] for model in data["models"]] == ["m1", "m2"]
+        assert data["total_cost"] == 0.75
+        assert not fake_warehouse.executed(r"FROM arao\.text_to_sql\.audit_logs")
+
+    def test_summary_uses_exact_total_cost(self, client, fake_warehouse):
+        columns = ["total_queries", "unique_models_used", "avg_cost_per_query", "max_cost_query", "min_cost_query",
+                   "avg_time_per_event", "max_time_event", "total_prompt_tokens", "total_completion_tokens",
+                   "avg_rows_returned", "total_cost_usd"]
+        fake_warehouse.respond(r"hll_union_agg\(session_sketch\)", columns,
+                               [(4, 2, 0.1, 0.3, 0.01, 200.0, 900, 1500, 500, 12.0, 0.5)])
+        summary = client.get("/api/analytics/summary").json()
+        assert summary["tokens_per_dollar"] == 4000
+
+
+class TestAnalyticsCache:
+    """Test the shared analytics response cache"""
+
+    STATS_COLUMNS = ["total_executions", "total_llm_calls", "avg_execution_time_ms", "total_records",
+                     "successful_records", "total_rows", "unique_tables"]
+
+    def test_viewers_share_one_query(self, client, fake_warehouse):
+        fake_warehouse.respond(r"COUNT_IF", self.STATS_COLUMNS, [(1, 2, 3.0, 4, 4, 5, 6)])
+        first = client.get("/api/dashboard-statistics")
+        second = client.get("/api/dashboard-statistics")
+        assert first.json() == second.json()
+        assert len(fake_warehouse.executed(r"COUNT_IF")) == 1
+
+    def test_etag_not_modified(self, client, fake_warehouse):
+        fake_warehouse.respond(r"COUNT_IF", self.STATS_COLUMNS, [(1, 2, 3.0, 4, 4, 5, 6)])
+        etag = client.get("/api/dashboard-statistics").headers["etag"]
+        response = client.get("/api/dashboard-statistics", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert client.get("/api/dashboard-statistics", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+    def test_fallbacks_are_not_cached(self, client, fake_warehouse):
+        """A failed load returns the default payload but the next request retries"""
+        fake_warehouse.respond(r"COUNT_IF", rows=RuntimeError("warehouse stopped"))
+        assert client.get("/api/dashboard-statistics").json()["total_executions"] == 0
+        fake_warehouse.respond(r"COUNT_IF", self.STATS_COLUMNS, [(7, 0, None, 7, 7, 0, 1)])
+        assert client.get("/api/dashboard-statistics").json()["total_executions"] == 7
+
+
+class TestAnalyticsBundle:
+    """Test the single-payload analytics bundle"""
+
+    def test_bundle_from_two_queries(self, client, fake_warehouse):
+        summary_columns = ["total_queries", "unique_models_used", "avg_cost_per_query", "max_cost_query",
+                           "min_cost_query", "avg_time_per_event", "max_time_event", "total_prompt_tokens",
+                           "total_completion_tokens", "avg_rows_returned", "total_cost_usd"]
+        model_columns = ["model_calls", "model_prompt_tokens", "model_completion_tokens", "model_total_tokens",
+                         "model_cost", "model_avg_execution_time"]
+        fake_warehouse.respond(
+            r"GROUPING SETS \(\(\), \(model_id\)\)",
+            ["is_total", "model_id"] + summary_columns + model_columns,
+            [
+                (1, None, 3, 2, 0.1, 0.2, 0.01, 300.0, 900, 1000, 500, 10.0, 0.3) + (None,) * 6,
+                (0, "cheap", None, None, None, None, None, None, None, None, None, None, None, 5, 500, 250, 750, 0.1, 100.0),
+                (0, "pricey", None, None, None, None, None, None, None, None, None, None, None, 1, 500, 250, 750, 0.2, 900.0),
+            ],
+        )
+        stats_columns = ["total_executions", "total_llm_calls", "avg_execution_time_ms", "total_records",
+                         "successful_records", "total_rows", "unique_tables"]
+        query_columns = ["timestamp", "catalog", "schema_name", "table_name", "generated_sql_preview", "business_logic_preview",
+                         "total_cost_usd", "total_time_ms", "total_tokens", "row_count", "sql_execution_time_ms"]
+        fake_warehouse.respond(
+            r"WITH totals AS",
+            stats_columns + ["session_id"] + query_columns,
+            [
+                (2, 6, 150.0, 8, 8, 40, 2, "s1", "2025-01-01T00:00:00", "main", "sales", "orders",
+                 "SELECT 1", "count", 0.2, 800, 300, 10, 120),
+            ],
+        )
+
+        data = client.get("/api/analytics/bundle").json()
+        assert data["statistics"]["total_executions"] == 2
+        assert data["statistics"]["success_rate"] == 100.0
+        assert [m["model_id"] for m in data["llm_costs"]["models"]] == ["pricey", "cheap"]
+        assert data["llm_costs"]["total_cost"] == 0.30000000000000004
+        assert data["llm_usage"]["most_used"][0]["model_id"] == "cheap"
+        assert data["llm_usage"]["slowest"][0]["model_id"] == "pricey"
+        assert data["top_queries"]["recent_queries"][0]["session_id"] == "s1"
+        assert "total_executions" not in data["top_queries"]["recent_queries"][0]
+        assert data["summary"]["total_queries"] == 3
+        assert data["summary"]["tokens_per_dollar"] == 5000
+        assert len(fake_warehouse.queries) == 2
+        assert fake_warehouse.connections == 1
+
+    def test_bundle_ranks_top_queries_like_the_endpoint(self, client, fake_warehouse):
+        """The bundle embeds the standalone query and aggregates the totals once, not per session"""
+        import app as app_module
+
+        fake_warehouse.respond(r"GROUPING SETS", ["is_total", "model_id"], [])
+        fake_warehouse.respond(r"query_metrics", list(app_module.TOP_QUERY_COLUMNS), [])
+        fake_warehouse.respond(r"WITH totals AS", ["total_executions", "session_id"], [])
+        assert client.get("/api/analytics/top-queries").status_code == 200
+        assert client.get("/api/analytics/bundle").status_code == 200
+        top_sql, = fake_warehouse.executed(r"^\s*SELECT \*")
+        bundle_sql, = fake_warehouse.executed(r"WITH totals AS")
+        assert top_sql == app_module.TOP_QUERIES_SQL
+        assert app_module.TOP_QUERIES_SQL in bundle_sql
+        assert "GROUPING" not in bundle_sql
+        assert bundle_sql.count("COUNT(DISTINCT table_name)") == 1
+
+    def test_bundle_without_sessions(self, client, fake_warehouse):
+        fake_warehouse.respond(r"GROUPING SETS", ["is_total", "model_id"], [])
+        fake_warehouse.respond(
+            r"WITH totals AS",
+            ["total_executions", "total_llm_calls", "avg_execution_time_ms", "total_records",
+             "successful_records", "total_rows", "unique_tables", "session_id"],
+            [(0, 0, None, 0, 0, 0, 0, None)],
+        )
+        data = client.get("/api/analytics/bundle").json()
+        assert data["statistics"]["total_executions"] == 0
+        assert data["top_queries"]["recent_queries"] == []
+
+
+    def test_failed_statement_degrades_its_sections(self, client, fake_warehouse):
+        """A failed rollup statement falls back for its sections; the audit_logs ones still load"""
+        fake_warehouse.respond(r"GROUPING SETS", rows=RuntimeError("rollup missing"))
+        fake_warehouse.respond(
+            r"WITH totals AS",
+            ["total_executions", "total_llm_calls", "avg_execution_time_ms", "total_records",
+             "successful_records", "total_rows", "unique_tables", "session_id"],
+            [(3, 0, None, 3, 3, 0, 1, None)],
+        )
+        response = client.get("/api/analytics/bundle")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["statistics"]["total_executions"] == 3
+        assert data["top_queries"]["recent_queries"] == []
+        assert data["llm_costs"] == {"models": [], "total_cost": 0, "total_prompt_tokens": 0, "total_completion_tokens": 0}
+        assert data["llm_usage"] is None and data["summary"] is None
+
+        # The fallback is not cached and the other way round works too
+        fake_warehouse.respond(r"GROUPING SETS", ["is_total", "model_id"], [])
+        fake_warehouse.respond(r"WITH totals AS", rows=RuntimeError("warehouse stopped"))
+        data = client.get("/api/analytics/bundle").json()
+        assert data["llm_usage"]["all_models"] == []
+        assert data["statistics"]["total_executions"] == 3
+
+
+class TestQueryHistory:
+    """Test session-grouped, paginated query history"""
+
+    SUMMARY_COLUMNS = ["session_id", "timestamp", "catalog", "schema_name", "table_name", "models", "event_count",
+                       "total_cost_usd", "total_tokens", "total_time_ms", "row_count", "business_logic_preview",
+                       "generated_sql_preview", "generated_sql_length", "status"]
+
+    def summary(self, session_id, minute):
+        return (session_id, datetime(2025, 3, 1, 10, minute), "main", "sales", "orders", ["m1"], 2, 0.01, 30, 900, 5,
+                "Orders per region", "SELECT region FROM t", 20, "success")
+
+    def test_pages_by_cursor(self, client, fake_warehouse):
+        """Compact sessions come newest first with a cursor for the next page"""
+        fake_warehouse.respond(r"WITH sessions AS", self.SUMMARY_COLUMNS,
+                               [self.summary("s3", 30), self.summary("s2", 20), self.summary("s1", 10)])
+
+        response = client.get("/api/query-history?limit=2&status=success")
+        assert response.status_code == 200
+        data = response.json()
+        assert [s["session_id"] for s in data["query_sessions"]] == ["s3", "s2"]
+        assert data["has_more"] is True
+        assert data["query_sessions"][0]["generated_sql_preview"] == "SELECT region FROM t"
+        assert "sql_generation" not in data["query_sessions"][0]
+        # Events are not loaded for list pages
+        assert len(fake_warehouse.queries) == 1
+        # The first window covers the last day, scanning one session span further back
+        scan_from, status, since, limit = fake_warehouse.queries[0][1]
+        assert (status, limit) == ("success", 3)
+        assert since - scan_from == MAX_SESSION_SPAN
+        assert utc_now() - since < timedelta(days=1, minutes=1)
+
+        fake_warehouse.queries.clear()
+        client.get(f"/api/query-history?limit=2&cursor={data['next_cursor']}")
+        last = datetime(2025, 3, 1, 10, 20)
+        since = last - timedelta(days=1)
+        assert fake_warehouse.queries[0][1] == [
+            last + MAX_SESSION_SPAN, since - MAX_SESSION_SPAN, last, last, "s2", since, 3,
+        ]
+
+    def test_widens_lookback_until_page_is_full(self, client, fake_warehouse):
+        """Short pages retry over longer windows, ending with an unbounded scan"""
+        fake_warehouse.respond(r"WITH sessions AS", self.SUMMARY_COLUMNS, [self.summary("s1", 10)])
+        data = client.get("/api/query-history?limit=2").json()
+        assert [s["session_id"] for s in data["query_sessions"]] == ["s1"]
+        assert data["has_more"] is False
+        assert len(fake_warehouse.queries) == len(LOOKBACK_WINDOWS) + 1
+        assert fake_warehouse.queries[-1][1] == [3]
+
+    def test_detail_loads_full_session(self, client, fake_warehouse):
+        """Opening a session loads its events and full text"""
+        fake_warehouse.respond(r"^SELECT log_id", ["log_id", "session_id", "event_type", "columns", "business_logic", "generated_sql"], [
+            ("e1", "s3", "sql_generation", ["region"], "Orders per region", "SELECT region FROM t"),
+            ("e2", "s3", "sql_execution", None, None, "SELECT region FROM t"),
+        ])
+        response = client.get("/api/query-history/e2")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["session_id"] == "s3"
+        assert data["generated_sql"] == "SELECT region FROM t"
+        assert data["sql_generation"]["log_id"] == "e1"
+        assert data["business_logic_suggestion"] is None
+        assert fake_warehouse.queries[0][1] == ["e2", "e2", "e2"]
+
+    def test_detail_not_found(self, client, fake_warehouse):
+        fake_warehouse.respond(r"^SELECT log_id", ["log_id", "session_id", "event_type"], [])
+        assert client.get("/api/query-history/missing").status_code == 404
+
+    def test_rejects_bad_filters(self, client, fake_warehouse):
+        assert client.get("/api/query-history?status=pending").status_code == 400
+        assert client.get("/api/query-history?cursor=garbage").status_code == 400
+        assert not fake_warehouse.queries
+
+    def test_session_id_reaches_audit_log(self, client, fake_warehouse):
+        """A session id sent with a request is recorded on its audit event and echoed back"""
+        import app as app_module
+
+        fake_warehouse.respond(r"^SELECT id", ["id"], [(1,)])
+        response = client.post("/api/execute-sql", json={"sql_query": "SELECT id FROM t", "session_id": "flow-1"})
+        assert response.json()["session_id"] == "flow-1"
+        row = app_module.audit_writer._queue[0][1]
+        assert row[app_module.AUDIT_LOG_COLUMNS.index("session_id")] == "flow-1"
+
+        # Without one, the server starts a new session
+        response = client.post("/api/execute-sql", json={"sql_query": "SELECT id FROM t"})
+        assert response.json()["session_id"] not in (None, "flow-1")
+
+
+class TestLatencyAnalytics:
+    """Test latency percentile endpoint"""
+
+    def test_day_ranges_read_rollup(self, client, fake_warehouse):
+        fake_warehouse.respond(r"FROM arao\.text_to_sql\.audit_rollup_hourly", ["dimension", "kind", "latency_count"], [])
+        response = client.get("/api/analytics/latency?range=7d")
+        assert response.status_code == 200
+        assert response.json()["bucket"] == "day"
+        assert fake_warehouse.executed(r"audit_rollup_hourly")
+
+    def test_last_hour_reads_audit_logs(self, client, fake_warehouse):
+        fake_warehouse.respond(r"percentile_approx", ["dimension", "kind", "latency_count"], [])
+        response = client.get("/api/analytics/latency?range=1h")
+        assert response.status_code == 200
+        assert response.json()["bucket"] == "minute"
+        assert fake_warehouse.executed(r"FROM arao\.text_to_sql\.audit_logs")
+
+    def test_rejects_unknown_range(self, client, fake_warehouse):
+        assert client.get("/api/analytics/latency?range=2w").status_code == 400
+
+
+class TestMetrics:
+    """Test the Prometheus metrics endpoint"""
+
+    def test_exposes_request_and_runtime_metrics(self, client, fake_warehouse):
+        fake_warehouse.respond(r"FROM arao\.text_to_sql\.audit_rollup_hourly", ["dimension", "kind", "latency_count"], [])
+        client.get("/api/analytics/latency?range=7d")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        text = response.text
+        assert 'queryforge_http_request_duration_seconds_count{method="GET",route="/api/analytics/latency",status="200"}' in text
+        assert 'queryforge_warehouse_pool_connections{state="in_use"} 0' in text
+        assert "queryforge_audit_queue_depth" in text
+        assert 'queryforge_cache_lookups_total{cache="analytics",level="analytics/latency",result="misses"} 1' in text
+
+    def test_streamed_requests_are_timed_to_the_last_chunk(self, client, fake_warehouse, monkeypatch):
+        """The duration of a streamed response covers its body, not just its headers"""
+        import time
+
+        import app as app_module
+        import sql_stream
+
+        observed = []
+        monkeypatch.setattr(app_module.HTTP_REQUEST_SECONDS, "observe",
+                            lambda seconds, **labels: observed.append((seconds, labels["route"])))
+        next_chunk = sql_stream.ResultStream.next_chunk
+
+        def slow_next_chunk(stream):
+            time.sleep(0.05)
+            return next_chunk(stream)
+
+        monkeypatch.setattr(sql_stream.ResultStream, "next_chunk", slow_next_chunk)
+        monkeypatch.setattr(app_module, "SQL_STREAM_BATCH_ROWS", 1)
+        fake_warehouse.respond(r"^SELECT id", ["id"], [(i,) for i in range(3)])
+        response = client.post("/api/execute-sql/stream", json={"sql_query": "SELECT id FROM t"})
+        assert response.status_code == 200
+        (seconds, route), = observed
+        assert route == "/api/execute-sql/stream"
+        # Header, three rows and the footer are each fetched after the headers went out
+        assert seconds >= 0.25
+
+    def test_llm_calls_record_latency_and_tokens(self):
+        import app as app_module
+        from types import SimpleNamespace
+
+        usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30)
+        before = app_module.LLM_TOKENS.value(model="test-model", kind="prompt")
+        app_module.record_llm_call("test-model", 0.2, SimpleNamespace(usage=usage), None)
+        app_module.record_llm_call("test-model", 0.1, None, None)
+        assert app_module.LLM_TOKENS.value(model="test-model", kind="prompt") == before + 120
+        assert app_module.LLM_REQUEST_SECONDS.count(model="test-model", status="cancelled") >= 1
+
+
+class TestRequestTracing:
+    """Test Server-Timing headers and the slow request log"""
+
+    def test_generate_sql_reports_stage_timings(self, client, fake_warehouse, fake_llm):
+        fake_llm.reply("EXPLANATION: Counts orders.\nSQL: SELECT COUNT(*) AS n FROM main.sales.orders")
+        response = client.post("/api/generate-sql", json={
+            "tables": [{"catalog": "main", "schema_name": "sales", "table": "orders", "columns": ["id"]}],
+            "business_logic": "Count orders",
+        })
+        assert response.status_code == 200
+        names = [entry.split(";")[0].strip() for entry in response.headers["server-timing"].split(",")]
+        for name in ("prompt", "sql_cleanup", "audit", "serialize", "total"):
+            assert name in names
+
+    def test_slow_requests_are_logged(self, client, fake_warehouse, monkeypatch, caplog):
+        import app as app_module
+
+        monkeypatch.setattr(app_module, "SLOW_REQUEST_THRESHOLD_MS", 0)
+        with caplog.at_level("WARNING", logger="app"):
+            client.get("/api/models")
+        entries = [json.loads(record.getMessage()) for record in caplog.records if "slow_request" in record.getMessage()]
+        assert entries and entries[0]["route"] == "/api/models"
+        assert "serialize" in entries[0]["spans"]
+
+
+class TestRequestProfiling:
+    """Test the token-guarded request profiler"""
+
+    def enable(self, monkeypatch, tmp_path):
+        import app as app_module
+        from profiler import ProfileStore
+
+        monkeypatch.setattr(app_module, "PROFILING_ENABLED", True)
+        monkeypatch.setattr(app_module, "PROFILING_TOKEN", "s3cret")
+        monkeypatch.setattr(app_module, "profile_store", ProfileStore(str(tmp_path)))
+        return app_module
+
+    def test_profile_endpoints_hidden_when_disabled(self, client):
+        assert client.get("/api/debug/profiles").status_code == 404
+
+    def test_profile_endpoints_require_token(self, client, monkeypatch, tmp_path):
+        self.enable(monkeypatch, tmp_path)
+        assert client.get("/api/debug/profiles").status_code == 403
+        assert client.get("/api/debug/profiles", headers={"X-Profile-Token": "wrong"}).status_code == 403
+        assert client.get("/api/debug/profiles", headers={"X-Profile-Token": "s3cret"}).json() == {"profiles": []}
+
+    def test_profiles_requests_with_token(self, monkeypatch, tmp_path):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        app_module = self.enable(monkeypatch, tmp_path)
+        profiled = FastAPI()
+        profiled.middleware("http")(app_module.profile_request)
+
+        @profiled.get("/work")
+        def work():
+            return {"ok": True}
+
+        with TestClient(profiled) as test_client:
+            assert "X-Profile" not in test_client.get("/work").headers
+            response = test_client.get("/work", headers={"X-Profile-Token": "s3cret"})
+        name = response.headers["X-Profile"]
+        assert name.endswith("-get-work.collapsed")
+        assert name in app_module.profile_store.list()
+
+
+    def test_streamed_body_is_profiled(self, monkeypatch, tmp_path):
+        """The sampler keeps running until a streamed body has been sent"""
+        import asyncio
+        import time
+
+        from fastapi import FastAPI
+        from fastapi.responses import StreamingResponse
+        from fastapi.testclient import TestClient
+
+        app_module = self.enable(monkeypatch, tmp_path)
+        monkeypatch.setattr(app_module, "PROFILING_INTERVAL_MS", 1)
+        profiled = FastAPI()
+        profiled.middleware("http")(app_module.profile_request)
+
+        def produce_last_chunk():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+            return b"chunk\n"
+
+        async def body():
+            yield b"chunk\n"
+            # Long after the headers went out
+            await asyncio.sleep(0.05)
+            yield produce_last_chunk()
+
+        @profiled.get("/stream")
+        def stream():
+            return StreamingResponse(body())
+
+        with TestClient(profiled) as test_client:
+            response = test_client.get("/stream", headers={"X-Profile-Token": "s3cret"})
+        assert response.text == "chunk\nchunk\n"
+        name = response.headers["X-Profile"]
+        assert "produce_last_chunk" in app_module.profile_store.read(name)
+        assert not app_module.profiler_busy.locked()
+
+
+class TestLocalWarehouseBackend:
+    """Test the endpoints against the embedded local warehouse instead of scripted responses"""
+
+    def use_local_warehouse(self, monkeypatch):
+        import app as app_module
+        from connection_pool import ConnectionPool
+        from local_warehouse import LocalWarehouse, seed_demo
+        from table_context import TableContextService
+
+        warehouse = LocalWarehouse()
+        seed_demo(warehouse, app_module.AUDIT_LOG_TABLE, rows_per_table=40)
+        pool = ConnectionPool(app_module.connect_warehouse, min_size=0, max_size=4)
+        monkeypatch.setattr(app_module, "local_warehouse", warehouse)
+        monkeypatch.setattr(app_module, "warehouse_pool", pool)
+        monkeypatch.setattr(app_module, "table_context_service", TableContextService(pool))
+        monkeypatch.setattr(app_module, "AUDIT_ROLLUP_SOURCE", app_module.live_source(app_module.AUDIT_LOG_TABLE))
+
+    def test_browse_catalog(self, client, monkeypatch):
+        self.use_local_warehouse(monkeypatch)
+        assert client.get("/api/catalogs").json() == {"catalogs": ["arao", "main"]}
+        assert client.get("/api/catalogs/main/schemas/sales/tables").json() == {"tables": ["customers", "orders"]}
+        columns = client.get("/api/catalogs/main/schemas/sales/tables/orders/columns").json()
+        assert columns["columns"][0]["name"] == "order_id"
+
+    def test_executions_show_up_in_analytics(self, client, monkeypatch):
+        import asyncio
+        import app as app_module
+
+        self.use_local_warehouse(monkeypatch)
+
+        response = client.post("/api/execute-sql", json={
+            "sql_query": "SELECT status, COUNT(*) AS orders FROM main.sales.orders GROUP BY status ORDER BY status",
+        })
+        assert response.status_code == 200
+        assert sum(row["orders"] for row in response.json()["rows"]) == 40
+        asyncio.run(app_module.audit_writer.flush())
+
+        bundle = client.get("/api/analytics/bundle").json()
+        assert bundle["statistics"]["total_executions"] == 1
+        top_queries = client.get("/api/analytics/top-queries").json()
+        assert len(bundle["top_queries"]["recent_queries"]) == 1
+        assert bundle["top_queries"] == top_queries
+        history = client.get("/api/query-history").json()
+        assert history["total_count"] == 1
@@ -0,0 +1,262 @@
+"""
+Unit tests for the hourly audit rollup
+"""
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from audit_rollup import (
+    ROLLUP_COLUMNS,
+    SOURCE_COLUMNS,
+    AuditRollup,
+    aggregate_select,
+    build_incremental_merge,
+    build_rebuild_hours,
+    create_table_sql,
+    histogram_quantile,
+    hour_of,
+    utc_now,
+)
+from audit_spool import AuditSpool
+from audit_writer import AuditWriter
+
+AUDIT_COLUMNS = (
+    "log_id", "timestamp", "event_type", "model_id", "status", "prompt_tokens", "completion_tokens",
+    "total_tokens", "estimated_cost_usd", "execution_time_ms", "row_count", "session_id", "llm_time_ms",
+)
+
+
+def audit_row(minute, model="m1", status="success", log_id="x"):
+    return (log_id, datetime(2025, 3, 1, 10, minute, 7), "sql_generation", model, status, 10, 5, 15, 0.01, 420, None, "s1", 380)
+
+
+class RecordingExecutor:
+    """Stand-in for the warehouse that records statements and can be told to fail"""
+
+    def __init__(self, failures=0):
+        self.statements = []
+        self.failures = failures
+
+    async def __call__(self, statements):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("warehouse unavailable")
+        self.statements.extend(statements)
+        return []
+
+
+def make_rollup(executor):
+    return AuditRollup("r", "logs", AUDIT_COLUMNS, executor)
+
+
+class TestRollupSQL:
+    """Test that generated statements agree with the table definition"""
+
+    def test_select_matches_table_columns(self):
+        """INSERT * and INSERT OVERWRITE rely on the SELECT producing table columns in order"""
+        aliases = re.findall(r"(?:AS (\w+)|^  (\w+)),?$", aggregate_select("logs"), re.MULTILINE)
+        names = [alias or bare for alias, bare in aliases]
+        assert names == [name for name, _, _ in ROLLUP_COLUMNS]
+        ddl = create_table_sql("r")
+        assert ddl.startswith("CREATE TABLE IF NOT EXISTS r (")
+        assert "session_sketch BINARY" in ddl
+
+    def test_incremental_merge(self):
+        sql, params = build_incremental_merge("r", [[1] * len(SOURCE_COLUMNS), [2] * len(SOURCE_COLUMNS)])
+        assert sql.startswith("MERGE INTO r AS target")
+        assert "event_count = target.event_count + source.event_count" in sql
+        assert "latency_ms_max = GREATEST(target.latency_ms_max, source.latency_ms_max)" in sql
+        assert "hll_union(target.session_sketch, source.session_sketch)" in sql
+        assert sql.count("?") == 2 * len(SOURCE_COLUMNS)
+        assert params == [1] * len(SOURCE_COLUMNS) + [2] * len(SOURCE_COLUMNS)
+
+    def test_rebuild_hours(self):
+        hours = [datetime(2025, 3, 1, 10), datetime(2025, 3, 1, 11)]
+        sql, params = build_rebuild_hours("r", "logs", hours)
+        assert "FROM logs\nWHERE date_trunc('HOUR', timestamp) IN (?, ?)" in sql
+        assert "WHEN NOT MATCHED BY SOURCE AND target.hour_start IN (?, ?) THEN DELETE" in sql
+        assert params == hours + hours
+
+
+class TestHistogramQuantile:
+    """Test percentile estimates from latency buckets"""
+
+    def test_interpolates_within_bucket(self):
+        # 10 calls in (100, 250], 10 in (250, 500]
+        counts = [0, 10, 10] + [0] * 7
+        assert histogram_quantile(counts, 0.5) == 250.0
+        assert histogram_quantile(counts, 0.75) == 375.0
+
+    def test_open_bucket_ends_at_max(self):
+        counts = [0] * 9 + [4]
+        assert histogram_quantile(counts, 0.5, max_ms=100000) == 80000.0
+        # The estimate never exceeds the slowest call seen
+        assert histogram_quantile([4] + [0] * 9, 0.99, max_ms=40) == 40.0
+
+    def test_empty(self):
+        assert histogram_quantile([0] * 10, 0.5) is None
+
+
+class TestAuditRollup:
+    """Test incremental maintenance and rebuilds"""
+
+    def test_apply_merges_batch(self):
+        executor = RecordingExecutor()
+        rollup = make_rollup(executor)
+        asyncio.run(rollup.apply([audit_row(1), audit_row(2)]))
+        (sql, params), = executor.statements
+        assert sql.startswith("MERGE INTO r")
+        # Projected onto SOURCE_COLUMNS order
+        assert params[:len(SOURCE_COLUMNS)] == [
+            datetime(2025, 3, 1, 10, 1, 7), "m1", "sql_generation", "success", 10, 5, 15, 0.01, 420, None, "s1", 380
+        ]
+        assert rollup.stats()["rows"] == 2
+
+    def test_failed_merge_rebuilds_hours(self):
+        """A later batch in a dirty hour is already in the rebuilt hour, so it is not MERGEd on top"""
+        executor = RecordingExecutor(failures=1)
+        rollup = make_rollup(executor)
+        with pytest.raises(RuntimeError):
+            asyncio.run(rollup.apply([audit_row(1)]))
+        assert rollup.stats()["dirty_hours"] == 1
+        asyncio.run(rollup.apply([audit_row(2)]))
+        (sql, params), = executor.statements
+        assert "NOT MATCHED BY SOURCE" in sql
+        assert params == [datetime(2025, 3, 1, 10)] * 2
+        assert rollup.stats()["dirty_hours"] == 0
+        assert rollup.stats()["batches"] == 0
+
+    def test_rebuild_between_insert_and_apply_counts_once(self):
+        """A full rebuild that reads the batch before its apply runs must not be added to"""
+        logs, counted = [], []
+
+        async def execute(statements):
+            sql = statements[0][0]
+            if sql.startswith("INSERT OVERWRITE") or "NOT MATCHED BY SOURCE" in sql:
+                counted[:] = list(logs)
+            elif sql.startswith("MERGE"):
+                counted.extend([None] * (len(statements[0][1]) // len(SOURCE_COLUMNS)))
+            return []
+
+        rollup = make_rollup(execute)
+
+        async def write(rows):
+            logs.extend(rows)
+            # e.g. the startup backfill or POST /api/analytics/rollup/rebuild
+            await rollup.rebuild_all()
+
+        writer = AuditWriter(write, on_written=rollup.apply, before_write=rollup.generation)
+        writer.enqueue(audit_row(1))
+        assert asyncio.run(writer.flush()) == 1
+        assert len(counted) == 1
+        assert rollup.stats()["batches"] == 0
+
+    def test_replayed_rows_rebuild_their_hours(self):
+        executor = RecordingExecutor()
+        rollup = make_rollup(executor)
+        asyncio.run(rollup.replayed([list(audit_row(1)), list(audit_row(3))]))
+        (sql, params), = executor.statements
+        assert "NOT MATCHED BY SOURCE" in sql
+        assert params == [datetime(2025, 3, 1, 10)] * 2
+        assert rollup.stats()["hours_rebuilt"] == 1
+
+    def test_writer_feeds_rollup(self):
+        executor = RecordingExecutor()
+        rollup = make_rollup(executor)
+        written = []
+
+        async def write(rows):
+            written.extend(rows)
+
+        writer = AuditWriter(write, on_written=rollup.apply)
+        writer.enqueue(audit_row(1))
+        asyncio.run(writer.flush())
+        assert len(written) == 1
+        assert executor.statements[0][0].startswith("MERGE INTO r")
+
+    def test_old_table_gets_new_columns_and_is_rebuilt(self):
+        """A rollup table from before llm_latency_* existed is altered and recomputed"""
+        statements = []
+
+        async def execute(batch):
+            statements.extend(sql for sql, _ in batch)
+            if batch[0][0].startswith("DESCRIBE"):
+                return [(name, data_type, None) for name, data_type, _ in ROLLUP_COLUMNS if not name.startswith("llm_")]
+            return [(1,)]
+
+        asyncio.run(make_rollup(execute).ensure_table())
+        create, describe, alter, rebuild = statements
+        assert alter.startswith("ALTER TABLE r ADD COLUMNS (llm_latency_ms_sum BIGINT, llm_latency_count BIGINT")
+        assert rebuild.startswith("INSERT OVERWRITE r")
+
+    def test_llm_latency_without_the_column(self):
+        """Until audit_logs has llm_time_ms, rebuilds leave the LLM latency columns empty"""
+        executor = RecordingExecutor()
+        columns = tuple(name for name in AUDIT_COLUMNS if name != "llm_time_ms")
+        rollup = AuditRollup("r", "logs", columns, executor)
+        asyncio.run(rollup.rebuild_all())
+        sql = executor.statements[0][0]
+        assert "llm_time_ms" not in sql
+        assert "COUNT(CAST(NULL AS BIGINT)) AS llm_latency_count" in sql
+        assert "COUNT(execution_time_ms) AS latency_count" in sql
+
+    def test_hours_are_utc(self):
+        """Aware timestamps map to the UTC hour date_trunc sees, even with a half-hour offset"""
+        ist = timezone(timedelta(hours=5, minutes=30))
+        assert hour_of(datetime(2025, 3, 1, 16, 10, tzinfo=ist)) == datetime(2025, 3, 1, 10)
+        assert hour_of(datetime(2025, 3, 1, 10, 40)) == datetime(2025, 3, 1, 10)
+        assert utc_now().tzinfo is None
+
+    def test_rebuild_all_and_merge_do_not_overlap(self):
+        running, order = [], []
+
+        async def execute(statements):
+            sql = statements[0][0]
+            running.append(sql)
+            assert len(running) == 1, "rollup statements overlapped"
+            await asyncio.sleep(0.01)
+            order.append(sql.split()[0])
+            running.remove(sql)
+            return []
+
+        rollup = make_rollup(execute)
+
+        async def main():
+            await asyncio.gather(rollup.rebuild_all(), rollup.apply([audit_row(1)]), rollup.rebuild_all())
+
+        asyncio.run(main())
+        assert order == ["INSERT", "MERGE", "INSERT"]
+
+    def test_spool_kept_until_rollup_has_rows(self, tmp_path):
+        """A failed rollup update leaves the batch spooled; replaying it rebuilds the hour"""
+        executor = RecordingExecutor(failures=1)
+        rollup = make_rollup(executor)
+        spool = AuditSpool(str(tmp_path), segment_max_age_seconds=0)
+        replays = []
+
+        async def write(rows):
+            pass
+
+        async def replay(rows):
+            replays.extend(rows)
+
+        writer = AuditWriter(
+            write, spool=spool, replay_batch=replay, retry_backoff_seconds=0,
+            on_written=rollup.apply, on_replayed=rollup.replayed,
+        )
+
+        async def main():
+            writer.enqueue(audit_row(1))
+            assert await writer.flush() == 1
+            spool.maintain()
+            assert spool.ready_segments() == [1]
+            # A new rollup instance, as after a restart, still learns the hour is dirty
+            writer.on_replayed = make_rollup(executor).replayed
+            return await writer.replay()
+
+        assert asyncio.run(main()) == 1
+        assert len(replays) == 1
+        assert "NOT MATCHED BY SOURCE" in executor.statements[-1][0]
+        assert spool.ready_segments() == []
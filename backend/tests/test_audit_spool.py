@@ -0,0 +1,164 @@
+"""
+Unit tests for the durable audit spool and its replay through the writer
+"""
+import asyncio
+from datetime import datetime
+
+from audit_spool import AuditSpool, build_merge
+from audit_writer import AuditWriter
+
+ROW = ("log-1", datetime(2025, 1, 2, 3, 4, 5), "sql_execution", ["a", "b"], {"k": "v"}, None, 12)
+
+
+class RecordingSink:
+    """Batch writer that records batches and can be told to fail"""
+
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    async def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("warehouse unavailable")
+        self.batches.append(list(rows))
+
+
+def segment_files(tmp_path):
+    return sorted(path.name for path in tmp_path.glob("audit-*.jsonl"))
+
+
+class TestBuildMerge:
+    """Test the idempotent replay statement"""
+
+    def test_merge_on_key(self):
+        sql, params = build_merge("t", ("id", "v"), "id", [(1, "a"), (2, "b")])
+        assert "MERGE INTO t AS target" in sql
+        assert "VALUES (?, ?), (?, ?) AS source(id, v)" in sql
+        assert "ON target.id = source.id" in sql
+        assert sql.endswith("WHEN NOT MATCHED THEN INSERT (id, v)\nVALUES (source.id, source.v)")
+        assert params == [1, "a", 2, "b"]
+
+
+class TestAuditSpool:
+    """Test segment lifecycle, recovery and encoding"""
+
+    def test_written_segments_are_deleted(self, tmp_path):
+        spool = AuditSpool(str(tmp_path), segment_max_bytes=1)
+        seq = spool.append(ROW)
+        assert segment_files(tmp_path) == ["audit-000000000001.jsonl"]
+        spool.ack([seq])
+        assert segment_files(tmp_path) == []
+        assert spool.ready_segments() == []
+
+    def test_abandoned_segments_are_ready_once_sealed(self, tmp_path):
+        spool = AuditSpool(str(tmp_path), segment_max_age_seconds=0)
+        seq = spool.append(ROW)
+        spool.append(ROW)
+        spool.abandon([seq])
+        assert spool.ready_segments() == []
+        spool.maintain()
+        # Still one row queued in memory
+        assert spool.ready_segments() == []
+        spool.ack([seq])
+        assert spool.ready_segments() == [seq]
+        assert spool.read_segment(seq) == [list(ROW), list(ROW)]
+
+    def test_recovers_segments_after_restart(self, tmp_path):
+        spool = AuditSpool(str(tmp_path), fsync_policy="always")
+        spool.append(ROW)
+        spool.close()
+        with open(tmp_path / "audit-000000000001.jsonl", "a") as f:
+            f.write('["torn')
+
+        recovered = AuditSpool(str(tmp_path))
+        recovered.open()
+        assert recovered.ready_segments() == [1]
+        rows = recovered.read_segment(1)
+        assert rows == [list(ROW)]
+        assert isinstance(rows[0][1], datetime)
+        assert recovered.append(ROW) == 2
+
+
+class TestSpooledAuditWriter:
+    """Test that undeliverable events are replayed from the spool"""
+
+    def test_outage_is_replayed(self, tmp_path):
+        spool = AuditSpool(str(tmp_path), segment_max_age_seconds=0)
+        sink, replays = RecordingSink(failures=1), RecordingSink()
+        writer = AuditWriter(sink, spool=spool, replay_batch=replays, retry_backoff_seconds=0.05)
+
+        async def main():
+            writer.enqueue(ROW)
+            assert await writer.flush() == 0
+            # Nothing is retried from memory; the spool owns the row now
+            assert writer.stats()["queued"] == 0
+            writer.enqueue(ROW)
+            assert await writer.flush() == 0  # backing off
+            spool.maintain()
+            assert await writer.replay() == 0  # still backing off
+            await asyncio.sleep(0.06)
+            assert await writer.flush() == 1
+            spool.maintain()
+            return await writer.replay()
+
+        # Both rows share the sealed segment and are merged together
+        assert asyncio.run(main()) == 2
+        assert replays.batches == [[list(ROW), list(ROW)]]
+        assert segment_files(tmp_path) == []
+
+    def test_enqueue_leaves_disk_to_the_flusher(self, tmp_path):
+        spool = AuditSpool(str(tmp_path))
+        calls = []
+        append_many = spool.append_many
+        spool.append_many = lambda rows: calls.append(len(rows)) or append_many(rows)
+        sink = RecordingSink()
+        writer = AuditWriter(sink, batch_size=2, spool=spool)
+
+        async def main():
+            for _ in range(5):
+                writer.enqueue(ROW)
+            # Nothing touches the disk on the request path
+            assert segment_files(tmp_path) == []
+            return await writer.flush()
+
+        assert asyncio.run(main()) == 5
+        # Group-committed in one write before the first INSERT
+        assert calls == [5]
+        assert writer.stats()["spooled"] == 5
+        assert [len(batch) for batch in sink.batches] == [2, 2, 1]
+
+    def test_dropped_rows_are_spooled_for_replay(self, tmp_path):
+        spool = AuditSpool(str(tmp_path), segment_max_age_seconds=0)
+        replays = RecordingSink()
+        writer = AuditWriter(RecordingSink(), batch_size=1, max_queue_size=1, spool=spool, replay_batch=replays)
+
+        async def main():
+            writer.enqueue(("log-1",) + ROW[1:])
+            writer.enqueue(("log-2",) + ROW[1:])
+            assert await writer.flush() == 1
+            spool.maintain()
+            return await writer.replay()
+
+        # The overflowed row was never written but its segment is merged back through the spool
+        assert asyncio.run(main()) == 2
+        assert [batch[0][0] for batch in replays.batches] == ["log-1", "log-2"]
+        assert segment_files(tmp_path) == []
+
+    def test_drain_leaves_unwritten_rows_for_next_process(self, tmp_path):
+        spool = AuditSpool(str(tmp_path))
+        writer = AuditWriter(RecordingSink(failures=5), spool=spool)
+
+        async def main():
+            writer.start()
+            writer.enqueue(ROW)
+            await writer.drain()
+
+        asyncio.run(main())
+        assert segment_files(tmp_path) == ["audit-000000000001.jsonl"]
+
+        replays = RecordingSink()
+        restarted = AuditWriter(RecordingSink(), spool=AuditSpool(str(tmp_path)), replay_batch=replays)
+        restarted.spool.open()
+        assert asyncio.run(restarted.replay()) == 1
+        assert segment_files(tmp_path) == []
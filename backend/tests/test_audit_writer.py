@@ -0,0 +1,115 @@
+"""
+Unit tests for the batched audit log writer
+"""
+import asyncio
+
+import pytest
+
+from audit_writer import AuditWriter, build_batch_insert
+
+
+class RecordingSink:
+    """Batch writer that records batches and can be told to fail"""
+
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    async def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("warehouse unavailable")
+        self.batches.append(list(rows))
+
+
+class TestBuildBatchInsert:
+    """Test multi-row INSERT construction"""
+
+    def test_multi_row_values(self):
+        sql, params = build_batch_insert("t", ("a", "b"), [(1, 2), (3, 4), (5, 6)])
+        assert sql == "INSERT INTO t\n(a, b)\nVALUES (?, ?), (?, ?), (?, ?)"
+        assert params == [1, 2, 3, 4, 5, 6]
+
+
+class TestAuditWriter:
+    """Test queueing, batching, overflow and draining"""
+
+    def test_flush_writes_in_batches(self):
+        sink = RecordingSink()
+        writer = AuditWriter(sink, batch_size=2)
+        for i in range(5):
+            writer.enqueue((i,))
+        assert asyncio.run(writer.flush()) == 5
+        assert [len(batch) for batch in sink.batches] == [2, 2, 1]
+        assert writer.stats()["queued"] == 0
+
+    def test_size_threshold_wakes_flusher(self):
+        """A full batch is written without waiting for the flush interval"""
+        sink = RecordingSink()
+        writer = AuditWriter(sink, batch_size=3, flush_interval_seconds=60)
+
+        async def main():
+            writer.start()
+            for i in range(3):
+                writer.enqueue((i,))
+            await asyncio.sleep(0.05)
+            await writer.drain()
+
+        asyncio.run(main())
+        assert sink.batches == [[(0,), (1,), (2,)]]
+
+    def test_interval_flushes_partial_batch(self):
+        sink = RecordingSink()
+        writer = AuditWriter(sink, batch_size=100, flush_interval_seconds=0.02)
+
+        async def main():
+            writer.start()
+            writer.enqueue(("a",))
+            await asyncio.sleep(0.1)
+            batches = list(sink.batches)
+            await writer.drain()
+            return batches
+
+        assert asyncio.run(main()) == [[("a",)]]
+
+    def test_drain_writes_remaining(self):
+        sink = RecordingSink()
+        writer = AuditWriter(sink, batch_size=100, flush_interval_seconds=60)
+
+        async def main():
+            writer.start()
+            writer.enqueue(("a",))
+            writer.enqueue(("b",))
+            await writer.drain()
+
+        asyncio.run(main())
+        assert sink.batches == [[("a",), ("b",)]]
+        assert writer.stats()["running"] is False
+
+    @pytest.mark.parametrize("policy,expected", [("drop_oldest", [(2,), (3,)]), ("drop_newest", [(0,), (1,)])])
+    def test_overflow_policy(self, policy, expected):
+        sink = RecordingSink()
+        writer = AuditWriter(sink, batch_size=1, max_queue_size=2, overflow_policy=policy)
+        results = [writer.enqueue((i,)) for i in range(4)]
+        asyncio.run(writer.flush())
+        assert [row for batch in sink.batches for row in batch] == expected
+        assert writer.stats()["dropped"] == 2
+        assert results == ([True] * 4 if policy == "drop_oldest" else [True, True, False, False])
+
+    def test_failed_batch_is_retried_then_dropped(self):
+        sink = RecordingSink(failures=1)
+        writer = AuditWriter(sink, batch_size=10, max_attempts=2)
+        writer.enqueue(("a",))
+        assert asyncio.run(writer.flush()) == 0
+        assert writer.stats()["queued"] == 1
+        assert asyncio.run(writer.flush()) == 1
+        assert sink.batches == [[("a",)]]
+
+        sink.failures = 2
+        writer.enqueue(("b",))
+        asyncio.run(writer.flush())
+        asyncio.run(writer.flush())
+        stats = writer.stats()
+        assert stats["queued"] == 0
+        assert stats["failed"] == 1
+        assert stats["failed_batches"] == 3
@@ -0,0 +1,24 @@
+"""
+Unit tests for the hot path benchmark runner
+"""
+from benchmark import BENCHMARKS, compare, run_benchmarks
+
+
+class TestBenchmarks:
+    """Test running and comparing benchmarks"""
+
+    def test_all_benchmarks_run_at_small_scale(self):
+        results = run_benchmarks(list(BENCHMARKS), scale=0.001, repeat=1)
+        assert set(results) == set(BENCHMARKS)
+        assert all(stats["min_ms"] >= 0 for stats in results.values())
+
+    def test_compare(self):
+        baseline = {"scale": 1.0, "benchmarks": {"a": {"min_ms": 10.0}, "b": {"min_ms": 0.1}}}
+        current = {"scale": 1.0, "benchmarks": {"a": {"min_ms": 13.0}, "b": {"min_ms": 0.3}}}
+        # b tripled but by less than the noise floor
+        assert compare(current, baseline, threshold=0.2) == ["a: 10.0 ms -> 13.0 ms"]
+        assert compare(current, baseline, threshold=0.5) == []
+
+    def test_compare_requires_same_scale(self):
+        regressions = compare({"scale": 1.0, "benchmarks": {}}, {"scale": 0.1, "benchmarks": {}}, threshold=0.2)
+        assert regressions == ["baseline scale 0.1 differs from this run's 1.0"]
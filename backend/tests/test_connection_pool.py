@@ -0,0 +1,182 @@
+"""
+Unit tests for the warehouse connection pool
+"""
+import threading
+import time
+
+import pytest
+
+from connection_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        if self.conn.broken:
+            raise RuntimeError("connection reset")
+        self.conn.queries.append(query)
+
+    def fetchall(self):
+        return [(1,)]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnector:
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+
+class TestCheckout:
+    """Test borrowing and returning connections"""
+
+    def test_reuses_connection(self):
+        """Sequential checkouts share one underlying connection"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, min_size=0, max_size=2)
+        for _ in range(5):
+            with pool.connection() as conn:
+                assert isinstance(conn, FakeConnection)
+        assert len(connector.opened) == 1
+        stats = pool.stats()
+        assert stats["checkouts"] == 5
+        assert stats["connections_created"] == 1
+        assert stats["idle"] == 1
+        assert stats["in_use"] == 0
+
+    def test_max_size_enforced(self):
+        """Checkout blocks and times out once max_size connections are in use"""
+        pool = ConnectionPool(FakeConnector(), min_size=0, max_size=1, checkout_timeout_seconds=0.05)
+        with pool.connection():
+            with pytest.raises(PoolTimeoutError):
+                with pool.connection():
+                    pass
+        assert pool.stats()["checkout_timeouts"] == 1
+
+    def test_waiter_gets_returned_connection(self):
+        """A blocked checkout proceeds when another borrower returns its connection"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, min_size=0, max_size=1, checkout_timeout_seconds=2)
+        acquired = []
+
+        def borrower():
+            with pool.connection() as conn:
+                acquired.append(conn)
+
+        with pool.connection():
+            thread = threading.Thread(target=borrower)
+            thread.start()
+            time.sleep(0.05)
+            assert acquired == []
+        thread.join(timeout=2)
+        assert len(acquired) == 1
+        assert len(connector.opened) == 1
+
+    def test_connect_failure_frees_slot(self):
+        """A failed connect does not leak pool capacity"""
+        calls = []
+
+        def flaky_connect():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError("warehouse starting")
+            return FakeConnection()
+
+        pool = ConnectionPool(flaky_connect, min_size=0, max_size=1)
+        with pytest.raises(RuntimeError):
+            with pool.connection():
+                pass
+        with pool.connection() as conn:
+            assert isinstance(conn, FakeConnection)
+        assert pool.stats()["connect_failures"] == 1
+
+
+class TestHealthAndEviction:
+    """Test health checks, lifetime limits and idle eviction"""
+
+    def test_failed_borrower_triggers_health_check(self):
+        """A connection whose borrower raised is validated and replaced if broken"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, min_size=0, max_size=1, health_check_after_seconds=3600)
+        with pytest.raises(ValueError):
+            with pool.connection() as conn:
+                conn.broken = True
+                raise ValueError("query failed")
+        with pool.connection() as conn:
+            assert conn is connector.opened[1]
+        assert connector.opened[0].closed
+        assert pool.stats()["health_check_failures"] == 1
+
+    def test_healthy_connection_kept_after_error(self):
+        """SQL errors alone do not discard a working connection"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, min_size=0, max_size=1, health_check_after_seconds=3600)
+        with pytest.raises(ValueError):
+            with pool.connection():
+                raise ValueError("syntax error")
+        with pool.connection() as conn:
+            assert conn is connector.opened[0]
+        assert connector.opened[0].queries == ["SELECT 1"]
+
+    def test_max_lifetime(self):
+        """Connections older than max_lifetime_seconds are replaced on checkout"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, min_size=0, max_size=1, max_lifetime_seconds=0.01)
+        with pool.connection():
+            pass
+        time.sleep(0.02)
+        with pool.connection():
+            pass
+        assert len(connector.opened) == 2
+        assert connector.opened[0].closed
+        assert pool.stats()["evicted_lifetime"] >= 1
+
+    def test_evict_idle_keeps_min_size(self):
+        """Idle eviction closes surplus connections but keeps min_size open"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, min_size=1, max_size=3, max_idle_seconds=0.01)
+        with pool.connection(), pool.connection(), pool.connection():
+            pass
+        assert pool.stats()["idle"] == 3
+        time.sleep(0.02)
+        pool.evict_idle()
+        stats = pool.stats()
+        assert stats["idle"] == 1
+        assert stats["size"] == 1
+        assert stats["evicted_idle"] == 2
+
+    def test_close_closes_idle_connections(self):
+        """Closing the pool closes idle connections and rejects checkouts"""
+        connector = FakeConnector()
+        pool = ConnectionPool(connector, min_size=0, max_size=1)
+        with pool.connection():
+            pass
+        pool.close()
+        assert connector.opened[0].closed
+        with pytest.raises(RuntimeError):
+            with pool.connection():
+                pass
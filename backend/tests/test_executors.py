@@ -0,0 +1,84 @@
+"""
+Unit tests for the bounded blocking-I/O executors
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from executors import BoundedExecutor, ExecutorSaturatedError
+
+
+class TestBoundedExecutor:
+    """Test running blocking work off the event loop"""
+
+    def test_runs_off_event_loop(self):
+        """Work runs on a pool thread and its result is returned"""
+        executor = BoundedExecutor("test", max_workers=2, max_pending=4)
+
+        async def main():
+            return await executor.run(lambda x: (x * 2, threading.current_thread().name), 21)
+
+        value, thread_name = asyncio.run(main())
+        assert value == 42
+        assert thread_name.startswith("test-io")
+        executor.shutdown()
+
+    def test_event_loop_stays_responsive(self):
+        """Blocking jobs do not delay other coroutines"""
+        executor = BoundedExecutor("test", max_workers=2, max_pending=4)
+
+        async def main():
+            ticks = []
+
+            async def ticker():
+                for _ in range(5):
+                    ticks.append(time.monotonic())
+                    await asyncio.sleep(0.01)
+
+            await asyncio.gather(executor.run(time.sleep, 0.2), ticker())
+            return ticks
+
+        ticks = asyncio.run(main())
+        assert ticks[-1] - ticks[0] < 0.15
+        executor.shutdown()
+
+    def test_rejects_when_saturated(self):
+        """Jobs beyond max_pending fail fast instead of queueing forever"""
+        executor = BoundedExecutor("test", max_workers=1, max_pending=2)
+        release = threading.Event()
+
+        async def main():
+            first = asyncio.ensure_future(executor.run(release.wait))
+            second = asyncio.ensure_future(executor.run(release.wait))
+            await asyncio.sleep(0.01)
+            with pytest.raises(ExecutorSaturatedError):
+                await executor.run(release.wait)
+            stats = executor.stats()
+            release.set()
+            await asyncio.gather(first, second)
+            return stats
+
+        stats = asyncio.run(main())
+        assert stats["pending"] == 2
+        assert stats["running"] == 1
+        assert stats["queued"] == 1
+        assert executor.stats()["rejected"] == 1
+        assert executor.stats()["pending"] == 0
+        executor.shutdown()
+
+    def test_exceptions_propagate(self):
+        """Exceptions raised by the job reach the awaiting coroutine"""
+        executor = BoundedExecutor("test", max_workers=1, max_pending=1)
+
+        def fail():
+            raise ValueError("boom")
+
+        async def main():
+            with pytest.raises(ValueError):
+                await executor.run(fail)
+
+        asyncio.run(main())
+        assert executor.stats()["pending"] == 0
+        executor.shutdown()
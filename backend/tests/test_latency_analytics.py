@@ -0,0 +1,73 @@
+"""
+Unit tests for latency percentile analytics
+"""
+from datetime import datetime
+
+from audit_rollup import bucket_columns
+from latency_analytics import build_raw_latency, build_rollup_latency, range_start, summarize_latency
+
+
+class TestLatencySQL:
+    """Test the breakdown queries"""
+
+    def test_rollup_query_sums_histograms(self):
+        since = datetime(2025, 3, 1)
+        sql, params = build_rollup_latency("rollup", "7d", since)
+        assert "date_trunc('DAY', hour_start) AS bucket_start" in sql
+        assert "CAST(SUM(latency_le_inf) AS BIGINT) AS latency_le_inf" in sql
+        assert "GROUPING SETS ((kind), (kind, model_id), (kind, event_type), (kind, bucket_start))" in sql
+        # LLM events read the model-call histograms, warehouse executions the request ones
+        assert "CASE WHEN event_type = 'sql_execution' THEN latency_le_100 ELSE llm_latency_le_100 END AS latency_le_100" in sql
+        assert params == [since]
+
+    def test_raw_query_uses_percentile_approx(self):
+        sql, _ = build_raw_latency("audit_logs", "1h", datetime(2025, 3, 1))
+        assert "date_trunc('MINUTE', timestamp)" in sql
+        assert "percentile_approx(latency_ms, array(0.5, 0.95, 0.99))" in sql
+        # LLM events report their model-call time rather than the whole request
+        assert "CASE WHEN event_type = 'sql_execution' THEN execution_time_ms ELSE llm_time_ms END AS latency_ms" in sql
+        # Before audit_logs has the column there is no LLM latency to report
+        sql, _ = build_raw_latency("audit_logs", "1h", datetime(2025, 3, 1), llm_time=False)
+        assert "llm_time_ms" not in sql
+
+    def test_range_start_alignment(self):
+        now = datetime(2025, 3, 1, 10, 42, 17)
+        assert range_start("1h", now) == datetime(2025, 3, 1, 9, 42)
+        assert range_start("24h", now) == datetime(2025, 2, 28, 10, 0)
+
+
+class TestSummarizeLatency:
+    """Test shaping breakdown rows"""
+
+    def row(self, dimension, kind, counts, **keys):
+        row = {"dimension": dimension, "kind": kind, "model_id": None, "event_type": None, "bucket_start": None,
+               "latency_count": sum(counts), "latency_ms_sum": 300 * sum(counts), "latency_ms_max": 480}
+        row.update(dict(zip(bucket_columns(), counts)))
+        row.update(keys)
+        return row
+
+    def test_sections(self):
+        counts = [0, 10, 10] + [0] * 7
+        rows = [
+            self.row("kind", "llm", counts),
+            self.row("model", "llm", counts, model_id="m1"),
+            self.row("model", "warehouse", counts),
+            self.row("event_type", "warehouse", counts, event_type="sql_execution"),
+            self.row("series", "llm", counts, bucket_start=datetime(2025, 3, 1, 11)),
+            self.row("series", "llm", counts, bucket_start=datetime(2025, 3, 1, 10)),
+        ]
+        data = summarize_latency(rows, "24h", datetime(2025, 3, 1))
+        assert data["llm"]["p50_ms"] == 250.0
+        assert data["llm"]["p99_ms"] == 480.0
+        assert data["llm"]["avg_ms"] == 300.0
+        assert data["warehouse"] == {"count": 0}
+        assert [m["model_id"] for m in data["by_model"]] == ["m1"]
+        assert data["by_event_type"][0]["kind"] == "warehouse"
+        assert [p["bucket_start"].hour for p in data["series"]["llm"]] == [10, 11]
+        assert data["bucket"] == "hour"
+
+    def test_raw_percentiles(self):
+        rows = [{"dimension": "kind", "kind": "warehouse", "latency_count": 3, "latency_ms_sum": 900,
+                 "latency_ms_max": 700, "percentiles": [200, 650, 700]}]
+        data = summarize_latency(rows, "1h", datetime(2025, 3, 1))
+        assert data["warehouse"]["p95_ms"] == 650.0
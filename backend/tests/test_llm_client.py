@@ -0,0 +1,112 @@
+"""
+Unit tests for the shared LLM client
+"""
+import asyncio
+
+from llm_client import OTHER_MODELS, LLMClient, parse_model_limits
+
+
+class FakeCompletions:
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.active = {}
+        self.peak = {}
+        self.peak_total = 0
+
+    async def create(self, **params):
+        model = params["model"]
+        self.active[model] = self.active.get(model, 0) + 1
+        self.peak[model] = max(self.peak.get(model, 0), self.active[model])
+        self.peak_total = max(self.peak_total, sum(self.active.values()))
+        await asyncio.sleep(self.delay)
+        self.active[model] -= 1
+        if params.get("fail"):
+            raise RuntimeError("endpoint error")
+        return {"model": model}
+
+
+class FakeAsyncOpenAI:
+    def __init__(self):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions()
+
+    async def close(self):
+        pass
+
+
+def make_client(**kwargs):
+    client = LLMClient(api_key="token", base_url="http://localhost/serving-endpoints", **kwargs)
+    client._client = FakeAsyncOpenAI()
+    return client
+
+
+class TestParseModelLimits:
+    """Test per-model concurrency override parsing"""
+
+    def test_parse(self):
+        assert parse_model_limits("a=2, b=8,bad,c=x,d=0") == {"a": 2, "b": 8, "d": 1}
+
+    def test_empty(self):
+        assert parse_model_limits("") == {}
+
+
+class TestLLMClient:
+    """Test per-model concurrency limits"""
+
+    def test_per_model_limit(self):
+        """Calls to one model never exceed its limit"""
+        client = make_client(model_ids=["m1"], default_concurrency=2)
+
+        async def main():
+            await asyncio.gather(*[client.chat_completion(model="m1") for _ in range(6)])
+
+        asyncio.run(main())
+        assert client._client.chat.completions.peak["m1"] == 2
+        assert client.stats()["m1"]["calls"] == 6
+
+    def test_hot_model_does_not_starve_others(self):
+        """A saturated model does not delay calls to another model"""
+        client = make_client(model_ids=["hot", "cold"], default_concurrency=1)
+
+        async def main():
+            hot = [asyncio.ensure_future(client.chat_completion(model="hot")) for _ in range(5)]
+            await asyncio.sleep(0)
+            started = asyncio.get_running_loop().time()
+            await client.chat_completion(model="cold")
+            elapsed = asyncio.get_running_loop().time() - started
+            await asyncio.gather(*hot)
+            return elapsed
+
+        assert asyncio.run(main()) < 0.05
+
+    def test_overrides_and_unknown_models(self):
+        """Overrides apply per model and unknown models share one slot with the default limit"""
+        client = make_client(model_ids=["a"], default_concurrency=2, model_concurrency={"a": 1})
+
+        async def main():
+            await asyncio.gather(*[client.chat_completion(model=f"made-up-{i}") for i in range(6)])
+
+        asyncio.run(main())
+        stats = client.stats()
+        assert stats["a"]["limit"] == 1
+        assert set(stats) == {"a", OTHER_MODELS}
+        assert stats[OTHER_MODELS]["calls"] == 6
+        # Six different ids still share the default limit
+        assert client._client.chat.completions.peak_total == 2
+
+    def test_errors_counted_and_slot_released(self):
+        """Failures are counted and free their slot"""
+        client = make_client(model_ids=["m"], default_concurrency=1)
+
+        async def main():
+            for _ in range(2):
+                try:
+                    await client.chat_completion(model="m", fail=True)
+                except RuntimeError:
+                    pass
+            return await client.chat_completion(model="m")
+
+        assert asyncio.run(main()) == {"model": "m"}
+        stats = client.stats()["m"]
+        assert stats["errors"] == 2
+        assert stats["in_flight"] == 0
@@ -0,0 +1,73 @@
+"""
+Unit tests for parsing LLM replies
+"""
+from llm_output import extract_join_condition, incomplete_sql_reason, parse_generated_sql, parse_suggestions
+
+
+class TestParseSuggestions:
+    """Test business logic suggestion parsing"""
+
+    def test_numbered_list(self):
+        text = "Here are some ideas:\n1. \"Which regions had the most orders?\"\n2. Short\n3. What is the average order amount per month?"
+        assert parse_suggestions(text) == ["Which regions had the most orders?", "What is the average order amount per month?"]
+
+    def test_at_most_five(self):
+        text = "\n".join(f"{i}. Suggestion number {i} about order volume" for i in range(1, 9))
+        assert len(parse_suggestions(text)) == 5
+
+    def test_json_fallback(self):
+        assert parse_suggestions('["Total revenue per region", "Orders per day"]') == ["Total revenue per region", "Orders per day"]
+
+    def test_line_fallback(self):
+        text = '- Which customers spend the most?\n{"not": "a list"}\n- ok'
+        assert parse_suggestions(text) == ["Which customers spend the most?", '{"not": "a list"}']
+
+
+class TestExtractJoinCondition:
+    """Test join condition extraction"""
+
+    def test_plain_condition(self):
+        assert extract_join_condition("`t1.id = t2.order_id`\n") == "t1.id = t2.order_id"
+
+    def test_condition_inside_analysis(self):
+        text = "To determine the join:\n## Analysis\nBoth tables have customer_id.\nT1.customer_id = T2.customer_id"
+        assert extract_join_condition(text) == "T1.customer_id = T2.customer_id"
+
+    def test_prefix_and_markdown_removed(self):
+        assert extract_join_condition("```sql\nON t1.a = t2.b\n```") == "t1.a = t2.b"
+
+
+class TestParseGeneratedSQL:
+    """Test splitting and cleaning generated SQL"""
+
+    def test_explanation_and_sql(self):
+        text = "EXPLANATION: Orders per region.\nSQL: ```sql\nSELECT region, COUNT(*) AS n\nFROM orders\nGROUP BY region\n```"
+        assert parse_generated_sql(text) == ("Orders per region.", "SELECT region, COUNT(*) AS n\nFROM orders\nGROUP BY region")
+
+    def test_prose_around_sql_removed(self):
+        text = "Sure! Here is the query:\nSELECT a\nFROM t\n\nThis returns every value of a."
+        explanation, sql = parse_generated_sql(text)
+        assert explanation == "No explanation provided."
+        assert sql == "SELECT a\nFROM t"
+
+    def test_lowercase_sql_lines_kept(self):
+        assert parse_generated_sql("SQL: with x as (select 1 as a)\nselect a from x")[1] == "with x as (select 1 as a)\nselect a from x"
+
+
+class TestIncompleteSQL:
+    """Test truncation detection"""
+
+    def test_complete(self):
+        assert incomplete_sql_reason("SELECT a FROM t WHERE b IN (1, 2)") is None
+
+    def test_trailing_keyword_or_comma(self):
+        assert incomplete_sql_reason("SELECT a FROM t WHERE") is not None
+        assert incomplete_sql_reason("SELECT a, b,") is not None
+        assert incomplete_sql_reason("SELECT a FROM t GROUP BY a ORDER") is not None
+        # Keywords only count as whole trailing words
+        assert incomplete_sql_reason("SELECT a AS platform") is None
+
+    def test_reasons(self):
+        reason = incomplete_sql_reason("SELECT COUNT(a FROM t", finish_reason="length")
+        assert "Unbalanced parentheses: 1 open, 0 close." in reason
+        assert reason.endswith("Response hit max_tokens limit.")
@@ -0,0 +1,128 @@
+"""
+Unit tests for the load test harness
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from load_test import Recorder, build_parser, compare, parse_mix, percentile, run_load
+
+
+def stub_app(failing_path=None):
+    """Just enough of the app for the browse and analytics flows"""
+    app = FastAPI()
+
+    @app.get("/api/health")
+    def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/catalogs")
+    def catalogs():
+        return {"catalogs": ["hive", "main"]}
+
+    @app.get("/api/catalogs/{catalog}/schemas")
+    def schemas(catalog: str):
+        return {"schemas": ["sales"]}
+
+    @app.get("/api/catalogs/{catalog}/schemas/{schema}/tables")
+    def tables(catalog: str, schema: str):
+        return {"tables": ["orders", "customers"]}
+
+    @app.get("/api/catalogs/{catalog}/schemas/{schema}/tables/{table}/columns")
+    def columns(catalog: str, schema: str, table: str):
+        if failing_path == "columns":
+            raise HTTPException(status_code=500, detail="warehouse unavailable")
+        return {"columns": [{"name": "id", "type": "bigint"}]}
+
+    @app.get("/api/analytics/bundle")
+    @app.get("/api/query-history")
+    @app.get("/api/analytics/latency")
+    def analytics():
+        return {}
+
+    return app
+
+
+def load(app, mix, duration=0.2):
+    args = build_parser().parse_args(["--concurrency", "3", "--duration", str(duration), "--warmup", "0", "--mix", mix])
+    transport = httpx.ASGITransport(app=app)
+    return asyncio.run(run_load(args, "http://app", transport=transport))
+
+
+class TestStatistics:
+    """Test percentiles, flow mixes and per-endpoint summaries"""
+
+    def test_percentile_nearest_rank(self):
+        values = [float(v) for v in range(1, 101)]
+        assert percentile(values, 0.5) == 50
+        assert percentile(values, 0.95) == 95
+        assert percentile(values, 0.99) == 99
+        assert percentile([7.0], 0.99) == 7
+        assert percentile([], 0.5) is None
+
+    def test_parse_mix(self):
+        assert parse_mix("full=6, browse=3,analytics") == {"full": 6, "browse": 3, "analytics": 1}
+        with pytest.raises(ValueError, match="checkout"):
+            parse_mix("checkout=1")
+        with pytest.raises(ValueError):
+            parse_mix("full=0")
+
+    def test_summary(self):
+        recorder = Recorder()
+        for ms in (10, 20, 30, 40):
+            recorder.request("GET /api/catalogs", ms / 1000)
+        recorder.request("GET /api/catalogs", 0.5, error="HTTP 500: boom")
+        stats = recorder.summary(elapsed_seconds=2.0)["GET /api/catalogs"]
+        assert stats["count"] == 5
+        assert stats["rps"] == 2.5
+        assert stats["p50_ms"] == 30
+        assert stats["p99_ms"] == 500
+        assert stats["error_rate"] == 0.2
+        assert stats["first_error"] == "HTTP 500: boom"
+
+
+class TestCompare:
+    """Test the regression check against a baseline run"""
+
+    def result(self, p95, rps=10.0, error_rate=0.0):
+        return {"endpoints": {"POST /api/generate-sql": {"p95_ms": p95, "rps": rps, "error_rate": error_rate}}}
+
+    def test_within_threshold(self):
+        assert compare(self.result(110), self.result(100), 0.2, 0.01) == []
+
+    def test_p95_regression(self):
+        regressions = compare(self.result(150), self.result(100), 0.2, 0.01)
+        assert regressions == ["POST /api/generate-sql: p95 100 ms -> 150 ms"]
+
+    def test_small_absolute_change_is_noise(self):
+        assert compare(self.result(4), self.result(2), 0.2, 0.01) == []
+
+    def test_throughput_and_error_regressions(self):
+        regressions = compare(self.result(100, rps=5, error_rate=0.05), self.result(100), 0.2, 0.01)
+        assert len(regressions) == 2
+        assert "throughput 10.0 -> 5 req/s" in regressions[0]
+        assert "error rate 0.00% -> 5.00%" in regressions[1]
+
+
+class TestRunLoad:
+    """Test driving flows against an in-process app"""
+
+    def test_browse_and_analytics_flows(self):
+        result = load(stub_app(), "browse=1,analytics=1")
+        endpoints = result["endpoints"]
+        assert endpoints["GET /api/catalogs"]["count"] > 0
+        # Two tables are opened per browse, reported under one templated endpoint
+        assert endpoints["GET /api/catalogs/{catalog}/schemas/{schema}/tables/{table}/columns"]["count"] == \
+            2 * endpoints["GET /api/catalogs"]["count"]
+        assert "GET /api/analytics/latency" in endpoints
+        assert result["flows"]["browse"]["failed"] == 0
+        assert result["config"]["concurrency"] == 3
+
+    def test_failed_step_ends_flow(self):
+        result = load(stub_app(failing_path="columns"), "browse=1")
+        columns = result["endpoints"]["GET /api/catalogs/{catalog}/schemas/{schema}/tables/{table}/columns"]
+        assert columns["error_rate"] == 1.0
+        assert columns["count"] == result["endpoints"]["GET /api/catalogs"]["count"]
+        assert result["flows"]["browse"]["completed"] == 0
@@ -0,0 +1,137 @@
+"""
+Unit tests for the OpenAI-compatible local LLM stand-in
+"""
+import asyncio
+import random
+
+import httpx
+import openai
+import pytest
+
+from local_llm import LatencyDistribution, LocalLLM, Rule, create_app
+
+
+class RecordingSleep:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, seconds):
+        self.calls.append(seconds)
+
+
+def complete(llm, stream=False, **params):
+    """Run one chat completion against ``llm`` through the OpenAI SDK"""
+    async def call():
+        transport = httpx.ASGITransport(app=create_app(llm))
+        async with httpx.AsyncClient(transport=transport) as http_client:
+            client = openai.AsyncOpenAI(
+                api_key="unset", base_url="http://local-llm/serving-endpoints", max_retries=0, http_client=http_client,
+            )
+            params.setdefault("model", "databricks-gpt-5")
+            params.setdefault("messages", [{"role": "user", "content": "hello"}])
+            if not stream:
+                return await client.chat.completions.create(**params)
+            chunks = await client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **params)
+            return [chunk async for chunk in chunks]
+
+    return asyncio.run(call())
+
+
+class TestChatCompletions:
+    """Test scripted replies through the OpenAI SDK"""
+
+    def test_default_rules_answer_app_prompts(self):
+        llm = LocalLLM(sleep=RecordingSleep())
+        response = complete(llm, messages=[
+            {"role": "system", "content": "You are a SQL expert"},
+            {"role": "user", "content": "Table: main.sales.orders\n\nBusiness Logic:\nrevenue by region"},
+        ], max_tokens=2000)
+
+        content = response.choices[0].message.content
+        assert content.startswith("EXPLANATION:")
+        assert "FROM main.sales.orders" in content
+        assert response.choices[0].finish_reason == "stop"
+        assert response.usage.total_tokens == response.usage.prompt_tokens + response.usage.completion_tokens
+
+        join = complete(llm, messages=[{"role": "user", "content": "Determine the JOIN condition.\n\nJOIN CONDITION:"}])
+        assert join.choices[0].message.content == "t1.customer_id = t2.customer_id"
+        assert llm.stats()["generate_sql"]["calls"] == 1
+
+    def test_script_rules_match_pattern_and_model(self):
+        llm = LocalLLM.from_script({"rules": [
+            {"pattern": "hello", "model": "llama", "content": ["first", "second"]},
+        ]}, sleep=RecordingSleep())
+
+        assert complete(llm, model="databricks-llama-4-maverick").choices[0].message.content == "first"
+        assert complete(llm, model="databricks-llama-4-maverick").choices[0].message.content == "second"
+        assert complete(llm, model="databricks-gpt-5").choices[0].message.content == "OK"
+
+    def test_max_tokens_truncates(self):
+        llm = LocalLLM([Rule(content="x" * 400)], sleep=RecordingSleep())
+        response = complete(llm, max_tokens=10)
+        assert response.choices[0].finish_reason == "length"
+        assert response.choices[0].message.content == "x" * 40
+        assert response.usage.completion_tokens == 10
+
+    def test_injected_truncation(self):
+        llm = LocalLLM([Rule(content="SELECT region, SUM(amount) FROM t GROUP BY region", truncate_rate=1.0)],
+                       sleep=RecordingSleep())
+        response = complete(llm)
+        assert response.choices[0].finish_reason == "length"
+        assert response.choices[0].message.content == "SELECT region, SUM(amount) FROM"[:24]
+        assert llm.stats()["default"]["truncated"] == 1
+
+    def test_injected_error(self):
+        llm = LocalLLM([Rule(error_rate=1.0, error_status=429, error_message="rate limited")], sleep=RecordingSleep())
+        with pytest.raises(openai.RateLimitError, match="rate limited"):
+            complete(llm)
+        assert llm.stats()["default"]["errors"] == 1
+
+    def test_injected_timeout_hangs(self):
+        sleep = RecordingSleep()
+        llm = LocalLLM([Rule(timeout_rate=1.0, latency=5)], hang_seconds=90, sleep=sleep)
+        with pytest.raises(openai.InternalServerError):
+            complete(llm)
+        assert sleep.calls == [0.005, 90]
+        assert llm.stats()["default"]["timeouts"] == 1
+
+    def test_streaming(self):
+        sleep = RecordingSleep()
+        llm = LocalLLM([Rule(content="SELECT 1 AS one", latency=200, tokens_per_second=100)], sleep=sleep)
+        chunks = complete(llm, stream=True)
+
+        text = "".join(chunk.choices[0].delta.content or "" for chunk in chunks if chunk.choices)
+        assert text == "SELECT 1 AS one"
+        finish = [chunk.choices[0].finish_reason for chunk in chunks if chunk.choices and chunk.choices[0].finish_reason]
+        assert finish == ["stop"]
+        assert chunks[-1].usage.completion_tokens == 4
+        # Time to first token, then one delay per streamed token
+        assert sleep.calls == [0.2] + [0.01] * 4
+
+
+class TestLatencyDistribution:
+    """Test latency sampling"""
+
+    def test_fixed_and_uniform(self):
+        rng = random.Random(1)
+        assert LatencyDistribution.parse(250).sample(rng) == 0.25
+        uniform = LatencyDistribution.parse({"distribution": "uniform", "min_ms": 100, "max_ms": 200})
+        assert all(0.1 <= uniform.sample(rng) <= 0.2 for _ in range(100))
+
+    def test_lognormal_matches_median_and_p95(self):
+        rng = random.Random(7)
+        lognormal = LatencyDistribution.parse({"distribution": "lognormal", "median_ms": 800, "p95_ms": 2500})
+        samples = sorted(lognormal.sample(rng) for _ in range(4000))
+        assert samples[2000] == pytest.approx(0.8, rel=0.1)
+        assert samples[3800] == pytest.approx(2.5, rel=0.15)
+
+    def test_seeded_runs_repeat(self):
+        first = LocalLLM(latency={"distribution": "normal", "mean_ms": 500, "stddev_ms": 100}, seed=3)
+        second = LocalLLM(latency={"distribution": "normal", "mean_ms": 500, "stddev_ms": 100}, seed=3)
+        body = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+        assert [first.plan(body)["first_token_seconds"] for _ in range(5)] == \
+            [second.plan(body)["first_token_seconds"] for _ in range(5)]
+
+    def test_unknown_distribution(self):
+        with pytest.raises(ValueError, match="pareto"):
+            LatencyDistribution.parse({"distribution": "pareto"})
@@ -0,0 +1,180 @@
+"""
+Unit tests for the embedded local warehouse backend
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from audit_rollup import live_source
+from audit_spool import build_merge
+from audit_writer import build_batch_insert
+from latency_analytics import build_raw_latency
+from local_warehouse import (
+    AUDIT_LOG_SCHEMA, LatencyProfile, LocalWarehouse, LocalWarehouseError, parse_latency, seed_demo, translate,
+)
+from query_history import build_session_page
+
+AUDIT_TABLE = "main.queryforge.audit_logs"
+AUDIT_COLUMNS = tuple(name for name, _ in AUDIT_LOG_SCHEMA)
+
+
+def audit_row(event_type, execution_time_ms, session_id, model_id="model-a", minutes_ago=0, timestamp=None, llm_time_ms=None):
+    return (
+        str(uuid.uuid4()), timestamp or datetime.now() - timedelta(minutes=minutes_ago), event_type, "user",
+        "main", "sales", "orders", ["order_id", "amount"], "total per region", "SELECT 1", model_id,
+        execution_time_ms, 5, "success", None, None, 100, 20, 120, 0.01, 17, 8, session_id, llm_time_ms,
+    )
+
+
+@pytest.fixture
+def warehouse():
+    warehouse = LocalWarehouse()
+    seed_demo(warehouse, AUDIT_TABLE, rows_per_table=40)
+    yield warehouse
+    warehouse.close()
+
+
+def run(warehouse, sql, params=None):
+    with warehouse.connect().cursor() as cursor:
+        cursor.execute(sql, params)
+        columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+class TestMetadataStatements:
+    """Test the SHOW / DESCRIBE / information_schema statements the catalog browser issues"""
+
+    def test_show_catalogs_schemas_and_tables(self, warehouse):
+        assert [row["catalog"] for row in run(warehouse, "SHOW CATALOGS")] == ["main"]
+        assert [row["databaseName"] for row in run(warehouse, "SHOW SCHEMAS IN main")] == ["queryforge", "sales"]
+        tables = run(warehouse, "SHOW TABLES IN main.sales")
+        assert [row["tableName"] for row in tables] == ["customers", "orders"]
+
+    def test_describe_extended_includes_comments(self, warehouse):
+        rows = run(warehouse, "DESCRIBE TABLE EXTENDED main.sales.orders")
+        assert rows[0] == {"col_name": "order_id", "data_type": "bigint", "comment": "Order key"}
+        assert {"col_name": "Comment", "data_type": "One row per customer order", "comment": ""} in rows
+
+    def test_describe_missing_table(self, warehouse):
+        with pytest.raises(LocalWarehouseError, match="TABLE_OR_VIEW_NOT_FOUND"):
+            run(warehouse, "DESCRIBE TABLE main.sales.missing")
+
+    def test_history_version_changes_on_write(self, warehouse):
+        before = run(warehouse, "DESCRIBE HISTORY main.sales.orders LIMIT 1")[0]["version"]
+        run(warehouse, "DELETE FROM main.sales.orders WHERE order_id = 1")
+        assert run(warehouse, "DESCRIBE HISTORY main.sales.orders LIMIT 1")[0]["version"] == before + 1
+
+    def test_information_schema_columns(self, warehouse):
+        rows = run(warehouse, """
+            SELECT table_name, column_name, ordinal_position FROM main.information_schema.columns
+            WHERE table_schema = ? ORDER BY table_name, ordinal_position
+        """, ["sales"])
+        assert rows[0] == {"table_name": "customers", "column_name": "customer_id", "ordinal_position": 1}
+        assert len(rows) == 9
+
+
+class TestQueries:
+    """Test the Databricks SQL the app sends through the audit and analytics paths"""
+
+    def test_batch_insert_and_spool_merge(self, warehouse):
+        session_id = str(uuid.uuid4())
+        rows = [audit_row("sql_generation", 900, session_id), audit_row("sql_execution", 120, session_id)]
+        sql, params = build_batch_insert(AUDIT_TABLE, AUDIT_COLUMNS, rows)
+        run(warehouse, sql, params)
+        # Replaying an already written row must not duplicate it
+        sql, params = build_merge(AUDIT_TABLE, AUDIT_COLUMNS, "log_id", rows[:1] + [audit_row("sql_execution", 80, session_id)])
+        run(warehouse, sql, params)
+
+        stored = run(warehouse, f"SELECT timestamp, columns, execution_time_ms FROM {AUDIT_TABLE} ORDER BY execution_time_ms")
+        assert [row["execution_time_ms"] for row in stored] == [80, 120, 900]
+        assert isinstance(stored[0]["timestamp"], datetime)
+        assert stored[0]["columns"] == ["order_id", "amount"]
+
+    def test_session_page(self, warehouse):
+        rows = []
+        for i in range(3):
+            session_id = str(uuid.uuid4())
+            rows += [audit_row("sql_generation", 900, session_id, minutes_ago=i),
+                     audit_row("sql_execution", 100, session_id, minutes_ago=i)]
+        run(warehouse, *build_batch_insert(AUDIT_TABLE, AUDIT_COLUMNS, rows))
+
+        page = run(warehouse, *build_session_page(AUDIT_TABLE, 2))
+        assert len({row["session_id"] for row in page}) == 2
+
+    def test_grouping_sets(self, warehouse):
+        rows = run(warehouse, """
+            SELECT GROUPING(status) AS is_total, status, COUNT(*) AS orders
+            FROM main.sales.orders
+            GROUP BY GROUPING SETS ((), (status))
+            ORDER BY is_total DESC, status
+        """)
+        assert rows[0]["is_total"] == 1 and rows[0]["status"] is None
+        assert rows[0]["orders"] == sum(row["orders"] for row in rows[1:]) == 40
+
+    def test_grouping_sets_over_live_source(self, warehouse):
+        session_id = str(uuid.uuid4())
+        rows = [audit_row("sql_generation", 900, session_id, model_id="model-a"),
+                audit_row("sql_generation", 300, session_id, model_id="model-b")]
+        run(warehouse, *build_batch_insert(AUDIT_TABLE, AUDIT_COLUMNS, rows))
+
+        result = run(warehouse, f"""
+            SELECT GROUPING(model_id) AS is_total, model_id, SUM(event_count) AS calls
+            FROM {live_source(AUDIT_TABLE)}
+            GROUP BY GROUPING SETS ((), (model_id))
+        """)
+        by_model = {row["model_id"]: row["calls"] for row in result}
+        assert by_model == {None: 2, "model-a": 1, "model-b": 1}
+
+    def test_llm_latency_is_model_call_time(self, warehouse):
+        now = datetime.now()
+        rows = [audit_row("sql_generation", 5000, "s", timestamp=now, llm_time_ms=ms) for ms in (100, 200)]
+        rows.append(audit_row("sql_generation", 900, "s", timestamp=now))
+        run(warehouse, *build_batch_insert(AUDIT_TABLE, AUDIT_COLUMNS, rows))
+
+        result = run(warehouse, *build_raw_latency(AUDIT_TABLE, "1h", now - timedelta(hours=1)))
+        llm = next(row for row in result if row["dimension"] == "kind" and row["kind"] == "llm")
+        # Rows without a model-call time are left out rather than mixed in with request times
+        assert (llm["latency_count"], llm["latency_ms_sum"], llm["latency_ms_max"]) == (2, 300, 200)
+
+    def test_percentile_approx(self, warehouse):
+        now = datetime.now()
+        rows = [audit_row("sql_execution", ms, "s", timestamp=now) for ms in range(10, 110, 10)]
+        run(warehouse, *build_batch_insert(AUDIT_TABLE, AUDIT_COLUMNS, rows))
+
+        result = run(warehouse, *build_raw_latency(AUDIT_TABLE, "1h", now - timedelta(hours=1)))
+        overall = next(row for row in result if row["dimension"] == "kind")
+        assert overall["latency_count"] == 10
+        assert overall["percentiles"] == [50, 100, 100]
+
+    def test_left_is_translated(self):
+        assert 'qf_left(' in translate("SELECT LEFT(business_logic, 200) FROM main.queryforge.audit_logs")
+        assert '"main.queryforge.audit_logs"' in translate("SELECT 1 FROM main.queryforge.audit_logs")
+
+    def test_unsupported_merge(self, warehouse):
+        with pytest.raises(LocalWarehouseError):
+            run(warehouse, f"MERGE INTO {AUDIT_TABLE} AS t USING x AS s ON t.log_id = s.log_id WHEN MATCHED THEN DELETE")
+
+
+class TestLatencyProfile:
+    """Test injected warehouse latency"""
+
+    def test_parse_latency(self):
+        profile = parse_latency("connect=500, execute=150,fetch=10,jitter=0.2,seed=7")
+        assert profile.delays_ms == {"connect": 500, "execute": 150, "fetch": 10}
+        assert 0.12 <= profile.delay("execute") <= 0.18
+        assert parse_latency("").delay("connect") == 0
+
+    def test_parse_latency_rejects_unknown_keys(self):
+        with pytest.raises(ValueError, match="queue"):
+            parse_latency("queue=10")
+
+    def test_delays_applied_per_operation(self):
+        slept = []
+        warehouse = LocalWarehouse(latency=LatencyProfile(connect_ms=200, execute_ms=50, fetch_ms=5, sleep=slept.append))
+        seed_demo(warehouse, AUDIT_TABLE, rows_per_table=0)
+        with warehouse.connect().cursor() as cursor:
+            cursor.execute("SHOW CATALOGS")
+            cursor.fetchall()
+        assert slept == [0.2, 0.05, 0.005]
+        assert warehouse.stats() == {"connections": 1, "statements": 1, "rows_returned": 1}
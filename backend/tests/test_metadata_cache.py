@@ -0,0 +1,148 @@
+"""
+Unit tests for the catalog metadata cache
+"""
+import asyncio
+
+import pytest
+
+from metadata_cache import MetadataCache
+
+
+class Loader:
+    def __init__(self, values=None, delay=0.0, error=None):
+        self.calls = 0
+        self.values = values
+        self.delay = delay
+        self.error = error
+
+    async def __call__(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.values if self.values is not None else self.calls
+
+
+class TestMetadataCache:
+    """Test TTL, LRU, stale-while-revalidate and invalidation"""
+
+    def test_hit_after_miss(self):
+        cache = MetadataCache()
+        loader = Loader()
+
+        async def main():
+            return [await cache.get_or_load(("schemas", "main"), loader) for _ in range(3)]
+
+        assert asyncio.run(main()) == [1, 1, 1]
+        assert loader.calls == 1
+        levels = cache.stats()["levels"]
+        assert levels["schemas"]["misses"] == 1
+        assert levels["schemas"]["hits"] == 2
+
+    def test_concurrent_misses_load_once(self):
+        """Concurrent misses on one key share a single warehouse load"""
+        cache = MetadataCache()
+        loader = Loader(delay=0.02)
+
+        async def main():
+            return await asyncio.gather(*[cache.get_or_load(("catalogs",), loader) for _ in range(5)])
+
+        assert asyncio.run(main()) == [1] * 5
+        assert loader.calls == 1
+
+    def test_cancelled_caller_does_not_cancel_shared_load(self):
+        """A request that goes away mid-load leaves the load running for the others"""
+        cache = MetadataCache()
+        loader = Loader(delay=0.02)
+
+        async def main():
+            first = asyncio.ensure_future(cache.get_or_load(("catalogs",), loader))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(cache.get_or_load(("catalogs",), loader))
+            await asyncio.sleep(0)
+            first.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await first
+            return await second
+
+        assert asyncio.run(main()) == 1
+        assert loader.calls == 1
+
+    def test_stale_while_revalidate(self):
+        """Entries past their TTL are served stale while one refresh runs"""
+        cache = MetadataCache(ttl_seconds={"tables": 0.1}, stale_seconds=60)
+        loader = Loader()
+
+        async def main():
+            first = await cache.get_or_load(("tables", "c", "s"), loader)
+            await asyncio.sleep(0.11)
+            stale = await asyncio.gather(*[cache.get_or_load(("tables", "c", "s"), loader) for _ in range(3)])
+            await asyncio.sleep(0.01)
+            fresh = await cache.get_or_load(("tables", "c", "s"), loader)
+            return first, stale, fresh
+
+        first, stale, fresh = asyncio.run(main())
+        assert first == 1
+        assert stale == [1, 1, 1]
+        assert fresh == 2
+        assert loader.calls == 2
+        assert cache.stats()["levels"]["tables"]["refreshes"] == 1
+
+    def test_expired_beyond_stale_window_reloads(self):
+        cache = MetadataCache(ttl_seconds={"tables": 0.01}, stale_seconds=0)
+        loader = Loader()
+
+        async def main():
+            await cache.get_or_load(("tables", "c", "s"), loader)
+            await asyncio.sleep(0.02)
+            return await cache.get_or_load(("tables", "c", "s"), loader)
+
+        assert asyncio.run(main()) == 2
+
+    def test_failed_refresh_keeps_stale_value(self):
+        cache = MetadataCache(ttl_seconds={"catalogs": 0.01}, stale_seconds=60)
+
+        async def main():
+            await cache.get_or_load(("catalogs",), Loader(values=["main"]))
+            await asyncio.sleep(0.02)
+            value = await cache.get_or_load(("catalogs",), Loader(error=RuntimeError("warehouse down")))
+            await asyncio.sleep(0.01)
+            return value
+
+        assert asyncio.run(main()) == ["main"]
+        assert cache.stats()["levels"]["catalogs"]["refresh_errors"] == 1
+
+    def test_miss_errors_propagate(self):
+        cache = MetadataCache()
+
+        async def main():
+            with pytest.raises(RuntimeError):
+                await cache.get_or_load(("catalogs",), Loader(error=RuntimeError("warehouse down")))
+
+        asyncio.run(main())
+        assert cache.stats()["entries"] == 0
+
+    def test_lru_eviction(self):
+        cache = MetadataCache(max_entries=2)
+        cache.put(("columns", "c", "s", "a"), 1)
+        cache.put(("columns", "c", "s", "b"), 2)
+        assert cache.get(("columns", "c", "s", "a")) == 1
+        cache.put(("columns", "c", "s", "c"), 3)
+        assert cache.get(("columns", "c", "s", "b")) is None
+        assert cache.get(("columns", "c", "s", "a")) == 1
+        assert cache.stats()["levels"]["columns"]["evictions"] == 1
+
+    def test_invalidate_scope(self):
+        """Invalidating a schema drops its entries and the listing that contains it"""
+        cache = MetadataCache()
+        cache.put(("catalogs",), ["c"])
+        cache.put(("schemas", "c"), ["s", "t"])
+        cache.put(("tables", "c", "s"), ["a"])
+        cache.put(("columns", "c", "s", "a"), [])
+        cache.put(("tables", "c", "t"), ["b"])
+        assert cache.invalidate("c", "s") == 3
+        assert cache.get(("catalogs",)) == ["c"]
+        assert cache.get(("tables", "c", "t")) == ["b"]
+        assert cache.get(("schemas", "c")) is None
+        assert cache.invalidate() == 2
@@ -0,0 +1,134 @@
+"""
+Unit tests for the in-process Prometheus metrics
+"""
+import pytest
+
+from metrics import Counter, Histogram, MetricsRegistry, timed_connect
+
+
+class FakeCursor:
+    def __init__(self):
+        self.executed = []
+        self.closed = False
+        self.description = [("n",)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+        return False
+
+    def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+
+    def fetchall(self):
+        return [(1,)]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor()
+
+    def close(self):
+        self.closed = True
+
+
+class TestCounter:
+    """Test counter totals and rendering"""
+
+    def test_inc_per_label_set(self):
+        counter = Counter("tokens_total", "Tokens", ("model",))
+        counter.inc(5, model="a")
+        counter.inc(model="a")
+        counter.inc(2, model="b")
+        assert counter.value(model="a") == 6
+        assert counter.value(model="b") == 2
+        assert counter.value(model="c") == 0
+
+    def test_rejects_wrong_labels(self):
+        counter = Counter("tokens_total", "Tokens", ("model",))
+        with pytest.raises(ValueError):
+            counter.inc(kind="prompt")
+
+    def test_render_escapes_label_values(self):
+        counter = Counter("tokens_total", "Tokens", ("model",))
+        counter.inc(model='a"b')
+        lines = counter.render()
+        assert lines[:2] == ["# HELP tokens_total Tokens", "# TYPE tokens_total counter"]
+        assert lines[2] == 'tokens_total{model="a\\"b"} 1'
+
+
+class TestHistogram:
+    """Test histogram buckets and rendering"""
+
+    def test_render_is_cumulative(self):
+        histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, route="/x")
+        lines = histogram.render()
+        assert 'latency_seconds_bucket{route="/x",le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{route="/x",le="1"} 3' in lines
+        assert 'latency_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+        assert 'latency_seconds_sum{route="/x"} 6.05' in lines
+        assert 'latency_seconds_count{route="/x"} 4' in lines
+
+    def test_time_observes_when_block_raises(self):
+        histogram = Histogram("latency_seconds", "Latency", ("status",))
+        with pytest.raises(RuntimeError):
+            with histogram.time(status="error"):
+                raise RuntimeError("boom")
+        assert histogram.count(status="error") == 1
+
+
+class TestMetricsRegistry:
+    """Test registry rendering and collectors"""
+
+    def test_prefix_and_collectors(self):
+        registry = MetricsRegistry(prefix="app_")
+        registry.counter("requests_total", "Requests").inc()
+
+        @registry.collector
+        def collect():
+            yield ("queue_depth", "gauge", "Queued items", [({"queue": "audit"}, 3), ({"queue": "other"}, None)])
+
+        text = registry.render()
+        assert "app_requests_total 1\n" in text
+        assert "# TYPE app_queue_depth gauge" in text
+        assert 'app_queue_depth{queue="audit"} 3' in text
+        assert 'queue="other"' not in text
+        assert text.endswith("\n")
+
+    def test_failing_collector_does_not_break_scrape(self):
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests").inc()
+
+        @registry.collector
+        def broken():
+            raise RuntimeError("stats unavailable")
+
+        text = registry.render()
+        assert "requests_total 1" in text
+        assert "# collector broken failed: stats unavailable" in text
+
+
+class TestTimedConnect:
+    """Test timing of warehouse connections and cursors"""
+
+    def test_times_connect_execute_and_fetch(self):
+        histogram = Histogram("warehouse_seconds", "Warehouse", ("operation",))
+        raw = FakeConnection()
+        connection = timed_connect(lambda: raw, histogram)()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1", [])
+            assert cursor.fetchall() == [(1,)]
+            assert cursor.description == [("n",)]
+        connection.close()
+
+        assert raw.closed
+        assert histogram.count(operation="connect") == 1
+        assert histogram.count(operation="execute") == 1
+        assert histogram.count(operation="fetch") == 1
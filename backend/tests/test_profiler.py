@@ -0,0 +1,79 @@
+"""
+Unit tests for the request sampling profiler
+"""
+import threading
+import time
+
+from profiler import ProfileStore, SamplingProfiler
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+class TestSamplingProfiler:
+    """Test sampling the stacks of the profiled thread"""
+
+    def test_samples_busy_thread_as_collapsed_stacks(self):
+        profiler = SamplingProfiler(interval_seconds=0.001)
+        profiler.start()
+        busy_loop(0.1)
+        profiler.stop()
+
+        assert profiler.sample_count > 0
+        lines = profiler.collapsed().splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) > 0
+        frames = stack.split(";")
+        assert frames[0] == "request"
+        assert any(frame.startswith("busy_loop (test_profiler.py:") for frame in frames)
+
+    def test_idle_worker_threads_are_not_sampled(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=stop.wait, name="profiler-test-io_0")
+        worker.start()
+        try:
+            profiler = SamplingProfiler(thread_prefixes=("profiler-test-io",))
+            profiler._target_id = threading.get_ident()
+            profiler.sample()
+        finally:
+            stop.set()
+            worker.join()
+        assert profiler.idle_samples == 1
+        assert all(stack[0] == "request" for stack in profiler.samples)
+
+    def test_stops_at_max_seconds(self):
+        profiler = SamplingProfiler(interval_seconds=0.001, max_seconds=0.02)
+        profiler.start()
+        time.sleep(0.1)
+        count = profiler.sample_count
+        time.sleep(0.02)
+        assert profiler.sample_count == count
+        profiler.stop()
+
+
+class TestProfileStore:
+    """Test storing and reading collapsed profiles"""
+
+    def test_save_list_read(self, tmp_path):
+        store = ProfileStore(str(tmp_path))
+        name = store.save("POST", "/api/generate-sql", "request;main 3\n")
+        assert name.endswith("-post-api-generate-sql.collapsed")
+        assert store.list() == [name]
+        assert store.read(name) == "request;main 3\n"
+
+    def test_keeps_most_recent_files(self, tmp_path):
+        store = ProfileStore(str(tmp_path), max_files=2)
+        names = [store.save("GET", f"/api/{i}", "x 1\n") for i in range(3)]
+        assert store.list() == [names[2], names[1]]
+
+    def test_rejects_paths_outside_store(self, tmp_path):
+        (tmp_path / "secret.collapsed").write_text("x 1\n")
+        store = ProfileStore(str(tmp_path / "profiles"))
+        assert store.read("../secret.collapsed") is None
+        assert store.read("missing.collapsed") is None
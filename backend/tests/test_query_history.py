@@ -0,0 +1,124 @@
+"""
+Unit tests for session-grouped, keyset-paginated query history
+"""
+from datetime import datetime
+
+import pytest
+
+from query_history import (
+    LOOKBACK_WINDOWS, MAX_SESSION_SPAN, assemble_session, build_history_page, build_session_events, build_session_page,
+    decode_cursor, encode_cursor, lookback_windows, session_key,
+)
+
+
+class TestCursor:
+    """Test history cursors"""
+
+    def test_round_trip(self):
+        position = (datetime(2025, 3, 1, 10, 5, 7, 123000), "3f2a")
+        assert decode_cursor(encode_cursor(*position)) == position
+
+    def test_malformed_cursor(self):
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
+
+
+class TestHistorySQL:
+    """Test the page and event queries"""
+
+    def test_first_page_is_newest_sessions(self):
+        sql, params = build_session_page("audit_logs", 51)
+        assert "GROUP BY COALESCE(session_id, log_id)" in sql
+        assert "ORDER BY timestamp DESC, session_id DESC" in sql
+        assert "WHERE timestamp <" not in sql
+        assert params == [51]
+
+    def test_cursor_and_filters_are_parameters(self):
+        position = (datetime(2025, 3, 1, 10, 0), "s9")
+        start = datetime(2025, 2, 1)
+        sql, params = build_session_page(
+            "audit_logs", 11, position, model_id="m1", table_name="orders", status="error", start=start,
+        )
+        assert "(timestamp < ? OR (timestamp = ? AND session_id < ?))" in sql
+        assert "array_contains(models, ?)" in sql
+        assert sql.count("?") == len(params)
+        span = MAX_SESSION_SPAN
+        assert params == [position[0] + span, start - span, position[0], position[0], "s9", "m1", "orders", "error", start, 11]
+
+    def test_inner_scan_is_bounded(self):
+        """Cursor and time bounds filter raw events before they are grouped"""
+        position = (datetime(2025, 3, 1, 10, 0), "s9")
+        sql, params = build_session_page("audit_logs", 11, position, start=datetime(2025, 2, 28), end=datetime(2025, 3, 2))
+        scan = sql.split("FROM audit_logs")[1].split("GROUP BY")[0]
+        assert "AND timestamp <= ?" in scan
+        assert "AND timestamp >= ?" in scan
+        # The earlier of the cursor and end bounds the scan from above
+        assert params[:2] == [datetime(2025, 3, 2, 10, 0), datetime(2025, 2, 27)]
+
+        sql, _ = build_session_page("audit_logs", 11)
+        assert "timestamp" not in sql.split("FROM audit_logs")[1].split("GROUP BY")[0]
+
+    def test_lookback_windows(self):
+        now = datetime(2025, 3, 10)
+        assert lookback_windows(now) == [now - window for window in LOOKBACK_WINDOWS] + [None]
+        # Windows count back from the cursor and stop at an explicit start
+        cursor = (datetime(2025, 3, 1), "s1")
+        assert lookback_windows(now, cursor, start=datetime(2025, 2, 1)) == [
+            datetime(2025, 2, 28), datetime(2025, 2, 22), datetime(2025, 2, 1),
+        ]
+
+    def test_list_rows_carry_previews_not_full_text(self):
+        sql, _ = build_session_page("audit_logs", 51)
+        select = sql.split("FROM audit_logs")[0]
+        assert "LEFT(generated_sql, 200)" in select
+        assert "LEFT(business_logic, 200)" in select
+        assert "MAX(generated_sql)" not in select
+
+    def test_events_resolve_session_or_log_id(self):
+        sql, params = build_session_events("audit_logs", "e1")
+        assert "session_id = ? OR log_id = ? OR session_id = (SELECT MAX(session_id) FROM audit_logs WHERE log_id = ?)" in sql
+        assert params == ["e1", "e1", "e1"]
+
+    def test_session_key_falls_back_to_log_id(self):
+        assert session_key([{"session_id": None, "log_id": "e1"}]) == "e1"
+        assert session_key([{"session_id": "s1", "log_id": "e1"}]) == "s1"
+        assert session_key([]) is None
+
+
+class TestAssembleSession:
+    """Test attaching events to session summaries"""
+
+    def test_events_fill_session_details(self):
+        summary = {"session_id": "s1"}
+        events = [
+            {"event_type": "business_logic_suggestion", "columns": ["a", "b"], "business_logic": "['x']", "generated_sql": None},
+            {"event_type": "sql_generation", "columns": ["a"], "business_logic": "x", "generated_sql": "SELECT a"},
+            {"event_type": "sql_execution", "columns": None, "business_logic": None, "generated_sql": "SELECT a"},
+        ]
+        session = assemble_session(summary, events)
+        assert session["columns"] == ["a", "b"]
+        assert session["business_logic"] == "['x']"
+        assert session["generated_sql"] == "SELECT a"
+        assert session["sql_execution"] is events[2]
+        assert session["join_condition_suggestion"] is None
+
+
+class TestHistoryPage:
+    """Test shaping fetched session rows into a history page"""
+
+    columns = ["session_id", "timestamp", "models"]
+
+    def test_extra_row_means_more_pages(self):
+        rows = [(f"s{i}", datetime(2025, 1, 1, 12, 0, i), ("m1",)) for i in range(3)]
+        page = build_history_page(self.columns, rows, limit=2)
+        assert [session["session_id"] for session in page["query_sessions"]] == ["s0", "s1"]
+        assert page["query_sessions"][0]["models"] == ["m1"]
+        assert page["has_more"] is True
+        assert decode_cursor(page["next_cursor"]) == (datetime(2025, 1, 1, 12, 0, 1), "s1")
+
+    def test_last_page(self):
+        page = build_history_page(self.columns, [("s0", datetime(2025, 1, 1), None)], limit=2)
+        assert page["query_sessions"][0]["models"] == []
+        assert page["total_count"] == 1
+        assert page["has_more"] is False
+        assert page["next_cursor"] is None
@@ -0,0 +1,187 @@
+"""
+Unit tests for the audit_logs traffic replay tool
+"""
+import asyncio
+import csv
+import json
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+
+from replay import build_request, load_events, replay, summarize
+
+START = datetime(2025, 6, 2, 9, 0, 0)
+
+
+def audit_event(event_type, seconds=0, **fields):
+    event = {
+        "log_id": f"log-{event_type}-{seconds}", "session_id": "s1", "timestamp": (START + timedelta(seconds=seconds)).isoformat(),
+        "event_type": event_type, "catalog": "main", "schema_name": "sales", "table_name": "orders",
+        "columns": ["region", "amount"], "business_logic": None, "generated_sql": None, "model_id": "databricks-gpt-5",
+        "status": "success", "execution_time_ms": 100, "row_count": None,
+    }
+    event.update(fields)
+    return event
+
+
+def stub_app(row_count=3, failing_path=None):
+    """Records request bodies and answers like the real endpoints"""
+    app = FastAPI()
+    app.state.requests = []
+
+    async def record(path, request):
+        app.state.requests.append((path, await request.json()))
+        if path == failing_path:
+            raise HTTPException(status_code=500, detail="warehouse unavailable")
+
+    @app.post("/api/suggest-business-logic")
+    async def suggest(request: Request):
+        await record("suggest", request)
+        return {"suggestions": []}
+
+    @app.post("/api/suggest-join-conditions")
+    async def join(request: Request):
+        await record("join", request)
+        return {"join_condition": "t1.id = t2.id"}
+
+    @app.post("/api/generate-sql")
+    async def generate(request: Request):
+        await record("generate", request)
+        return {"sql": "SELECT 1"}
+
+    @app.post("/api/execute-sql")
+    async def execute(request: Request):
+        await record("execute", request)
+        return {"row_count": row_count}
+
+    return app
+
+
+def run_replay(app, events, speed=0.0):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app") as client:
+            return await replay(events, client, speed=speed)
+    return asyncio.run(run())
+
+
+def parsed(events, tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(json.dumps(event) for event in events))
+    return load_events(str(path))
+
+
+class TestLoadEvents:
+    """Test reading audit exports"""
+
+    def test_jsonl_sorted_and_filtered(self, tmp_path):
+        events = parsed([
+            audit_event("sql_execution", 5, generated_sql="SELECT 1", row_count="12"),
+            audit_event("query_suggestion", 1),
+            audit_event("sql_generation", 2, business_logic="Revenue per region"),
+        ], tmp_path)
+        assert [event["event_type"] for event in events] == ["sql_generation", "sql_execution"]
+        assert events[0]["timestamp"] == START + timedelta(seconds=2)
+        assert events[1]["row_count"] == 12
+
+    def test_json_array(self, tmp_path):
+        path = tmp_path / "events.json"
+        path.write_text(json.dumps([audit_event("sql_generation", business_logic="x")]))
+        assert len(load_events(str(path))) == 1
+
+    def test_csv_column_formats(self, tmp_path):
+        path = tmp_path / "events.csv"
+        rows = [
+            audit_event("business_logic_suggestion", 0, columns='["region", "amount"]'),
+            audit_event("business_logic_suggestion", 1, columns="['region', 'amount']"),
+            audit_event("business_logic_suggestion", 2, columns="region, amount", execution_time_ms=""),
+        ]
+        with open(path, "w", newline="") as handle:
+            writer = csv.DictWriter(handle, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        events = load_events(str(path))
+        assert [event["columns"] for event in events] == [["region", "amount"]] * 3
+        assert events[0]["execution_time_ms"] == 100
+        assert events[2]["execution_time_ms"] is None
+
+
+class TestBuildRequest:
+    """Test rebuilding API requests from audit rows"""
+
+    def test_business_logic_suggestion(self, tmp_path):
+        event, = parsed([audit_event("business_logic_suggestion")], tmp_path)
+        path, body = build_request(event)
+        assert path == "/api/suggest-business-logic"
+        assert body == {"catalog": "main", "schema_name": "sales", "table": "orders", "columns": ["region", "amount"],
+                        "session_id": "replay-s1", "model_id": "databricks-gpt-5"}
+
+    def test_join_suggestion(self, tmp_path):
+        event, = parsed([audit_event("join_condition_suggestion", table_name="[JOIN: orders + customers]")], tmp_path)
+        path, body = build_request(event)
+        assert path == "/api/suggest-join-conditions"
+        assert [table["table"] for table in body["tables"]] == ["orders", "customers"]
+        assert all(table["catalog"] == "main" for table in body["tables"])
+
+    def test_join_generation_strips_prefix(self, tmp_path):
+        event, = parsed([audit_event("sql_generation", table_name="orders",
+                                     business_logic="[JOIN: orders + customers] Revenue per customer")], tmp_path)
+        path, body = build_request(event)
+        assert path == "/api/generate-sql"
+        assert body["business_logic"] == "Revenue per customer"
+        assert [table["table"] for table in body["tables"]] == ["orders", "customers"]
+
+    def test_execution(self, tmp_path):
+        event, = parsed([audit_event("sql_execution", generated_sql="SELECT 1", model_id=None)], tmp_path)
+        assert build_request(event) == ("/api/execute-sql", {"sql_query": "SELECT 1", "session_id": "replay-s1"})
+
+    def test_missing_inputs_skipped(self, tmp_path):
+        events = parsed([
+            audit_event("sql_execution"),
+            audit_event("sql_generation", business_logic=""),
+            audit_event("join_condition_suggestion", table_name="orders"),
+        ], tmp_path)
+        assert [build_request(event) for event in events] == [None, None, None]
+
+
+class TestReplay:
+    """Test replaying against an in-process app"""
+
+    def test_replays_in_order_and_compares(self, tmp_path):
+        app = stub_app(row_count=3)
+        events = parsed([
+            audit_event("sql_generation", 0, business_logic="Revenue per region"),
+            audit_event("sql_execution", 1, generated_sql="SELECT 1", row_count=3),
+            audit_event("sql_execution", 2, generated_sql="SELECT 2", row_count=5),
+            audit_event("sql_execution", 3),
+        ], tmp_path)
+        results, stats = run_replay(app, events)
+        assert [path for path, _ in app.state.requests] == ["generate", "execute", "execute"]
+        assert stats["skipped"] == 1
+        summary = summarize(results)
+        assert summary["sql_execution"]["count"] == 2
+        assert summary["sql_execution"]["row_count_mismatches"] == 1
+        assert summary["sql_generation"]["recorded_p95_ms"] == 100
+        assert "row_count_mismatches" not in summary["sql_generation"]
+
+    def test_new_errors(self, tmp_path):
+        events = parsed([
+            audit_event("sql_execution", 0, generated_sql="SELECT 1"),
+            audit_event("sql_execution", 1, generated_sql="SELECT 1", status="error"),
+        ], tmp_path)
+        results, _ = run_replay(stub_app(failing_path="execute"), events)
+        stats = summarize(results)["sql_execution"]
+        assert stats["errors"] == 2
+        assert stats["recorded_errors"] == 1
+        assert stats["new_errors"] == 1
+        assert results[0]["error"].startswith("HTTP 500")
+
+    def test_time_compression(self, tmp_path):
+        # Two seconds of recorded traffic at speed 20 take about a tenth of a second
+        events = parsed([
+            audit_event("sql_execution", 0, generated_sql="SELECT 1"),
+            audit_event("sql_execution", 2, generated_sql="SELECT 1"),
+        ], tmp_path)
+        _, stats = run_replay(stub_app(), events, speed=20)
+        assert 0.09 <= stats["elapsed_seconds"] < 1.0
+        assert stats["schedule_lag_p95_ms"] is not None
@@ -0,0 +1,161 @@
+"""
+Unit tests for streaming result encoding
+"""
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pyarrow
+import pytest
+
+from sql_stream import ResultStream
+
+
+class ListCursor:
+    """Cursor over fixed rows that counts fetches"""
+
+    def __init__(self, columns, rows):
+        self.description = [(name, "string") for name in columns] if columns else None
+        self.rows = list(rows)
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+def chunks(stream):
+    result = []
+    while (chunk := stream.next_chunk()) is not None:
+        result.append(chunk)
+    return result
+
+
+def ndjson(cursor, max_rows=100, batch_rows=2):
+    return [json.loads(line) for chunk in chunks(ResultStream(cursor, "ndjson", max_rows, batch_rows))
+            for line in chunk.decode().splitlines()]
+
+
+class TestNDJSON:
+    """Test NDJSON encoding"""
+
+    def test_one_chunk_per_batch(self):
+        cursor = ListCursor(["id"], [(i,) for i in range(5)])
+        stream = ResultStream(cursor, "ndjson", 100, 2, header={"session_id": "s"})
+        parts = chunks(stream)
+        # Header, three batches, footer
+        assert len(parts) == 5
+        assert json.loads(parts[0]) == {"session_id": "s", "type": "header", "columns": ["id"]}
+        assert parts[1] == b'{"type": "row", "values": [0]}\n{"type": "row", "values": [1]}\n'
+        assert json.loads(parts[-1]) == {"type": "end", "row_count": 5, "truncated": False}
+        assert stream.done and stream.next_chunk() is None
+
+    def test_values_encoded_like_json_endpoint(self):
+        rows = [(datetime(2025, 1, 2, 3, 4, 5), Decimal("1.5"), None)]
+        lines = ndjson(ListCursor(["at", "amount", "note"], rows))
+        assert lines[1] == {"type": "row", "values": ["2025-01-02T03:04:05", 1.5, None]}
+
+    def test_cap_and_truncation(self):
+        capped = ndjson(ListCursor(["id"], [(i,) for i in range(4)]), max_rows=3)
+        assert capped[-1] == {"type": "end", "row_count": 3, "truncated": True}
+        exact = ndjson(ListCursor(["id"], [(i,) for i in range(3)]), max_rows=3)
+        assert exact[-1] == {"type": "end", "row_count": 3, "truncated": False}
+
+    def test_columns_named_like_control_fields(self):
+        """Rows whose columns are called error, row_count or truncated are still rows"""
+        assert ndjson(ListCursor(["error"], [("x",)]))[1] == {"type": "row", "values": ["x"]}
+        lines = ndjson(ListCursor(["row_count", "truncated"], [(7, True), (8, False)]))
+        assert [line["type"] for line in lines] == ["header", "row", "row", "end"]
+        assert lines[2]["values"] == [8, False]
+        assert lines[-1] == {"type": "end", "row_count": 2, "truncated": False}
+
+    def test_fetches_are_bounded_by_batch_size(self):
+        cursor = ListCursor(["id"], [(i,) for i in range(10)])
+        stream = ResultStream(cursor, "ndjson", 100, 4)
+        stream.next_chunk()
+        assert cursor.fetches == 0
+        stream.next_chunk()
+        assert cursor.fetches == 1 and len(cursor.rows) == 6
+
+    def test_statement_without_result_set(self):
+        assert ndjson(ListCursor(None, [])) == [
+            {"type": "header", "columns": []}, {"type": "end", "row_count": 0, "truncated": False}
+        ]
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError, match="csv"):
+            ResultStream(ListCursor(["id"], []), "csv", 10, 10)
+
+
+class TestArrow:
+    """Test Arrow IPC encoding"""
+
+    def read(self, cursor, max_rows=100, batch_rows=2):
+        stream = ResultStream(cursor, "arrow", max_rows, batch_rows)
+        return pyarrow.ipc.open_stream(b"".join(chunks(stream))).read_all(), stream
+
+    def test_rows_to_record_batches(self):
+        rows = [(i, None if i < 2 else f"n{i}") for i in range(5)]
+        table, stream = self.read(ListCursor(["id", "name"], rows))
+        assert table.to_pylist() == [{"id": i, "name": name} for i, name in rows]
+        # Typed by the first batch, where every name is null
+        assert str(table.schema.field("name").type) == "string"
+        assert stream.row_count == 5
+
+    def test_arrow_batches_from_cursor(self):
+        class ArrowCursor(ListCursor):
+            def fetchmany_arrow(self, size):
+                rows = self.fetchmany(size)
+                return pyarrow.table({"id": pyarrow.array([row[0] for row in rows], type=pyarrow.int32())})
+
+        table, stream = self.read(ArrowCursor(["id"], [(i,) for i in range(5)]), max_rows=3)
+        assert table.column("id").to_pylist() == [0, 1, 2]
+        assert str(table.schema.field("id").type) == "int32"
+        assert stream.truncated
+
+    def test_empty_result_keeps_columns(self):
+        table, _ = self.read(ListCursor(["id", "name"], []))
+        assert table.num_rows == 0
+        assert table.column_names == ["id", "name"]
+
+
+class TestTimedStreamingResponse:
+    """Test the send timeout and cleanup hook"""
+
+    def respond(self, content, send_delay):
+        import asyncio
+
+        from sql_stream import TimedStreamingResponse
+
+        closed, sent = [], []
+
+        async def on_close():
+            closed.append(True)
+
+        async def receive():
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message.get("body"):
+                await asyncio.sleep(send_delay)
+            sent.append(message)
+
+        response = TimedStreamingResponse(content, send_timeout=0.05, on_close=on_close)
+        asyncio.run(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send))
+        return sent, closed
+
+    async def body(self):
+        yield b"one\n"
+        yield b"two\n"
+
+    def test_complete_stream_closes(self):
+        sent, closed = self.respond(self.body(), send_delay=0)
+        assert [message.get("body") for message in sent[1:]] == [b"one\n", b"two\n", b""]
+        assert closed == [True]
+
+    def test_stalled_client_is_dropped(self):
+        sent, closed = self.respond(self.body(), send_delay=1)
+        # Headers went out, the first chunk timed out and nothing followed it
+        assert [message["type"] for message in sent] == ["http.response.start"]
+        assert closed == [True]
@@ -0,0 +1,130 @@
+"""
+Unit tests for the table context service
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+from connection_pool import ConnectionPool
+from table_context import TableContextService, parse_describe_extended
+
+DESCRIBE_ROWS = [
+    ("id", "bigint", "Order id"),
+    ("customer_id", "bigint", None),
+    ("amount", "decimal(10,2)", ""),
+    ("", "", ""),
+    ("# Partition Information", "", ""),
+    ("# col_name", "data_type", "comment"),
+    ("customer_id", "bigint", None),
+    ("", "", ""),
+    ("# Detailed Table Information", "", ""),
+    ("Catalog", "main", ""),
+    ("Comment", "Customer orders", ""),
+    ("Type", "MANAGED", ""),
+]
+
+
+def make_service(fake_warehouse, version=1, **kwargs):
+    state = {"version": version}
+    fake_warehouse.respond(r"^DESCRIBE TABLE EXTENDED", ["col_name", "data_type", "comment"], DESCRIBE_ROWS)
+    fake_warehouse.respond(r"^SELECT `id` FROM", ["id"], [(1,), (2,)])
+    fake_warehouse.respond(r"^SELECT `id`, `customer_id` FROM", ["id", "customer_id"], [(1, 10), (2, None)])
+    fake_warehouse.respond(r"^SELECT `id`, `amount` FROM", ["id", "amount"], [(1, 9.5), (2, 3.0)])
+    fake_warehouse.respond(r"^DESCRIBE HISTORY", ["version"], lambda q, p: [(state["version"],)])
+    pool = ConnectionPool(fake_warehouse.connect, min_size=0, max_size=2)
+    return TableContextService(pool, **kwargs), state
+
+
+def table(*columns):
+    return SimpleNamespace(catalog="main", schema_name="sales", table="orders", columns=list(columns))
+
+
+class TestParseDescribeExtended:
+    """Test parsing of DESCRIBE TABLE EXTENDED output"""
+
+    def test_columns_and_comment(self):
+        columns, comment = parse_describe_extended(DESCRIBE_ROWS)
+        assert list(columns) == ["id", "customer_id", "amount"]
+        assert columns["id"] == {"type": "bigint", "comment": "Order id"}
+        assert columns["customer_id"]["comment"] == ""
+        assert comment == "Customer orders"
+
+
+class TestTableContextService:
+    """Test snapshot caching, rendering and invalidation"""
+
+    def test_render_projects_selected_columns(self, fake_warehouse):
+        service, _ = make_service(fake_warehouse)
+        context = service.build_context(table("amount", "id"), 2)
+        assert context.startswith("\nTable 2: main.sales.orders\nTable Description: Customer orders\n")
+        assert "  - id (bigint): Order id\n" in context
+        assert "amount | id\n" in context
+        assert "9.5 | 1\n" in context
+        # Only the selected columns are sampled
+        assert fake_warehouse.executed(r"^SELECT") == ["SELECT `id`, `amount` FROM main.sales.orders LIMIT 5"]
+
+    def test_cache_shared_across_column_selections(self, fake_warehouse):
+        """Changing the selected columns reuses the cached snapshot, widening its sample when needed"""
+        service, _ = make_service(fake_warehouse)
+        service.build_context(table("id"), 1)
+        context = service.build_context(table("customer_id", "missing"), 1)
+        assert "None | NULL" not in context
+        assert "NULL | NULL\n" in context
+        service.build_context(table("ID"), 1)
+        assert len(fake_warehouse.executed(r"^DESCRIBE TABLE EXTENDED")) == 1
+        assert fake_warehouse.executed(r"^SELECT") == [
+            "SELECT `id` FROM main.sales.orders LIMIT 5",
+            "SELECT `id`, `customer_id` FROM main.sales.orders LIMIT 5",
+        ]
+        assert service.stats()["hits"] == 2
+
+    def test_version_change_reloads(self, fake_warehouse):
+        """A new Delta version invalidates the snapshot before its TTL"""
+        service, state = make_service(fake_warehouse, version_check_seconds=0)
+        service.get_snapshot("main", "sales", "orders")
+        service.get_snapshot("main", "sales", "orders")
+        assert len(fake_warehouse.executed(r"^DESCRIBE TABLE EXTENDED")) == 1
+        state["version"] = 2
+        snapshot = service.get_snapshot("main", "sales", "orders")
+        assert snapshot.version == 2
+        assert len(fake_warehouse.executed(r"^DESCRIBE TABLE EXTENDED")) == 2
+        assert service.stats()["version_changes"] == 1
+
+    def test_ttl_expiry(self, fake_warehouse):
+        service, _ = make_service(fake_warehouse, ttl_seconds=0.01)
+        service.get_snapshot("main", "sales", "orders")
+        time.sleep(0.02)
+        service.get_snapshot("main", "sales", "orders")
+        assert len(fake_warehouse.executed(r"^DESCRIBE TABLE EXTENDED")) == 2
+
+    def test_invalidate(self, fake_warehouse):
+        service, _ = make_service(fake_warehouse)
+        service.get_snapshot("main", "sales", "orders")
+        assert service.invalidate("main", "other") == 0
+        assert service.invalidate("main", "sales") == 1
+        service.get_snapshot("main", "sales", "orders")
+        assert len(fake_warehouse.executed(r"^DESCRIBE TABLE EXTENDED")) == 2
+
+    def test_loader_locks_are_released(self, fake_warehouse):
+        """Concurrent loads share one query and leave no per-table lock behind"""
+        service, _ = make_service(fake_warehouse)
+        started = threading.Event()
+
+        def slow_describe(query, params):
+            started.set()
+            time.sleep(0.05)
+            return DESCRIBE_ROWS
+
+        fake_warehouse.respond(r"^DESCRIBE TABLE EXTENDED", ["col_name", "data_type", "comment"], slow_describe)
+        snapshots = []
+        threads = [threading.Thread(target=lambda: snapshots.append(service.get_snapshot("main", "sales", "orders")))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+        assert service.stats()["loading"] == 1
+        for thread in threads:
+            thread.join()
+        assert len(fake_warehouse.executed(r"^DESCRIBE TABLE EXTENDED")) == 1
+        assert snapshots[0] is snapshots[1] is snapshots[2]
+        assert service.stats()["loading"] == 0
@@ -0,0 +1,76 @@
+"""
+Unit tests for per-request stage timing
+"""
+import asyncio
+
+from executors import BoundedExecutor
+from tracing import (
+    RequestTrace, current_trace, end_trace, record_span, server_timing_header, slow_request_entry, span, start_trace,
+)
+
+
+class TestRequestTrace:
+    """Test recording spans into the current request's trace"""
+
+    def test_spans_with_same_name_are_summed(self):
+        trace, token = start_trace()
+        try:
+            record_span("warehouse_execute", 0.010)
+            record_span("llm", 0.5)
+            record_span("warehouse_execute", 0.020)
+        finally:
+            end_trace(token)
+        assert trace.spans() == [("warehouse_execute", 30.0, 2), ("llm", 500.0, 1)]
+
+    def test_recording_outside_a_request_is_a_noop(self):
+        assert current_trace() is None
+        record_span("audit", 0.1)
+        with span("metadata"):
+            pass
+        assert current_trace() is None
+
+    def test_span_records_when_block_raises(self):
+        trace, token = start_trace()
+        try:
+            try:
+                with span("sql_cleanup"):
+                    raise ValueError("bad sql")
+            except ValueError:
+                pass
+        finally:
+            end_trace(token)
+        assert [name for name, _, _ in trace.spans()] == ["sql_cleanup"]
+
+    def test_executor_jobs_record_into_caller_trace(self):
+        executor = BoundedExecutor("test", max_workers=1, max_pending=2)
+
+        async def main():
+            trace, token = start_trace()
+            try:
+                await executor.run(record_span, "warehouse_fetch", 0.004)
+            finally:
+                end_trace(token)
+            return trace
+
+        trace = asyncio.run(main())
+        executor.shutdown()
+        assert trace.spans() == [("warehouse_fetch", 4.0, 1)]
+
+
+class TestFormatting:
+    """Test the Server-Timing header and slow request log entry"""
+
+    def test_server_timing_header(self):
+        trace = RequestTrace()
+        trace.record("llm", 0.8124)
+        trace.record("audit", 0.0001)
+        trace.record("audit", 0.0002)
+        assert server_timing_header(trace, 1.0) == 'llm;dur=812.4, audit;dur=0.3;desc="2x", total;dur=1000.0'
+
+    def test_slow_request_entry(self):
+        trace = RequestTrace()
+        trace.record("llm", 2.5)
+        entry = slow_request_entry(trace, 3.0, "POST", "/api/generate-sql", "/api/generate-sql", 200)
+        assert entry["event"] == "slow_request"
+        assert entry["duration_ms"] == 3000.0
+        assert entry["spans"] == {"llm": {"duration_ms": 2500.0, "count": 1}}
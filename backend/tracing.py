@@ -0,0 +1,121 @@
+"""
+Per-request stage timing.
+
+A slow response can spend its time fetching table metadata, waiting on the
+LLM, cleaning up generated SQL, on the warehouse or writing audit events,
+and the request log only shows the total. Each request gets a
+``RequestTrace`` in a context variable; code on the request path records
+named spans into it, and the middleware returns them in a
+``Server-Timing`` header (visible in the browser's network panel) and logs
+them as one structured entry when the request is slow.
+
+Spans with the same name are summed, so three warehouse executes show up
+as one ``warehouse_execute`` entry with a count. Spans may overlap (a
+metadata fetch includes its warehouse calls), so they are not expected to
+add up to the total. Recording outside a request is a no-op, which keeps
+background work such as audit flushes out of request timings. Blocking
+work records into the request's trace because the warehouse executor runs
+jobs in a copy of the caller's context.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    """Span durations recorded while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        # span name -> [total seconds, count], in first-recorded order
+        self._spans: Dict[str, List[float]] = {}
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                self._spans[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def spans(self) -> List[Tuple[str, float, int]]:
+        """(name, milliseconds, count) for every recorded span"""
+        with self._lock:
+            return [(name, round(total * 1000, 1), int(count)) for name, (total, count) in self._spans.items()]
+
+
+def start_trace() -> Tuple[RequestTrace, Token]:
+    """Begin tracing the current request; pass the token to ``end_trace``"""
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: Token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def record_span(name: str, seconds: float):
+    """Add ``seconds`` to span ``name`` of the current request, if there is one"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """Record the duration of a ``with`` block as span ``name``, including when it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+def server_timing_header(trace: RequestTrace, total_seconds: float) -> str:
+    """``Server-Timing`` value with every span plus the request total"""
+    entries = []
+    for name, ms, count in trace.spans():
+        entry = f"{name};dur={ms}"
+        if count > 1:
+            entry += f';desc="{count}x"'
+        entries.append(entry)
+    entries.append(f"total;dur={round(total_seconds * 1000, 1)}")
+    return ", ".join(entries)
+
+
+def slow_request_entry(
+    trace: RequestTrace, total_seconds: float, method: str, path: str, route: Optional[str], status: int,
+) -> Dict[str, Any]:
+    """Structured log entry for a request that exceeded the slow threshold"""
+    return {
+        "event": "slow_request",
+        "method": method,
+        "path": path,
+        "route": route,
+        "status": status,
+        "duration_ms": round(total_seconds * 1000, 1),
+        "spans": {name: {"duration_ms": ms, "count": count} for name, ms, count in trace.spans()},
+    }
+
+
+class TracedJSONResponse(JSONResponse):
+    """JSON response whose encoding is recorded as the ``serialize`` span"""
+
+    def render(self, content: Any) -> bytes:
+        with span("serialize"):
+            return super().render(content)
@@ -54,8 +54,8 @@ interface QueryStat {
   catalog: string
   schema_name: string
   table_name: string
-  generated_sql: string
-  business_logic: string
+  generated_sql_preview: string
+  business_logic_preview: string
   total_cost_usd: number
   total_time_ms: number
   total_tokens: number
@@ -209,19 +209,17 @@ export default function Analytics() {
       setLoading(true)
       setError(null)
 
-      const [llmRes, queriesRes, summaryRes] = await Promise.all([
-        fetch('/api/analytics/llm-usage'),
-        fetch('/api/analytics/top-queries'),
-        fetch('/api/analytics/summary'),
-      ])
+      const bundleRes = await fetch('/api/analytics/bundle')
 
-      if (!llmRes.ok || !queriesRes.ok || !summaryRes.ok) {
+      if (!bundleRes.ok) {
         throw new Error('Failed to fetch analytics data')
       }
 
-      const llm = await llmRes.json()
-      const queries = await queriesRes.json()
-      const summaryData = await summaryRes.json()
+      // A section whose query failed is null; render the others
+      const { llm_usage: llm = null, top_queries: queries = null, summary: summaryData = null } = await bundleRes.json()
+      if (!llm && !queries && !summaryData) {
+        throw new Error('Failed to fetch analytics data')
+      }
 
       setLlmUsage(llm)
       setTopQueries(queries)
@@ -965,7 +963,7 @@ export default function Analytics() {
                               </TableCell>
                               <TableCell>
                                 <Typography variant="body2" sx={{ fontSize: '0.7rem', fontFamily: 'monospace' }}>
-                                  {truncateSQL(query.generated_sql)}
+                                  {truncateSQL(query.generated_sql_preview)}
                                 </Typography>
                               </TableCell>
                               <TableCell align="right">
@@ -1013,7 +1011,7 @@ export default function Analytics() {
                               </TableCell>
                               <TableCell>
                                 <Typography variant="body2" sx={{ fontSize: '0.7rem', fontFamily: 'monospace' }}>
-                                  {truncateSQL(query.generated_sql)}
+                                  {truncateSQL(query.generated_sql_preview)}
                                 </Typography>
                               </TableCell>
                               <TableCell align="right">
@@ -1061,7 +1059,7 @@ export default function Analytics() {
                               </TableCell>
                               <TableCell>
                                 <Typography variant="body2" sx={{ fontSize: '0.7rem', fontFamily: 'monospace' }}>
-                                  {truncateSQL(query.generated_sql)}
+                                  {truncateSQL(query.generated_sql_preview)}
                                 </Typography>
                               </TableCell>
                               <TableCell align="right">
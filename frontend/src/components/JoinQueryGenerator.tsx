@@ -50,6 +50,7 @@ import {
   Delete as DeleteIcon,
   Psychology as AiIcon,
 } from '@mui/icons-material'
+import { type SqlResults, rowCountLabel, streamSqlResults } from '../streamSqlResults'
 
 interface Model {
   id: string
@@ -80,6 +81,8 @@ export default function JoinQueryGenerator() {
   const [catalogs, setCatalogs] = useState<string[]>([])
   const [selectedModel, setSelectedModel] = useState('')
   const [businessLogic, setBusinessLogic] = useState('')
+  // Ties suggestions, generation and execution of one query together in the history; cleared once it runs
+  const [sessionId, setSessionId] = useState<string | null>(null)
   const [joinConditions, setJoinConditions] = useState('')
 
   // Dynamic tables array
@@ -90,7 +93,7 @@ export default function JoinQueryGenerator() {
 
   const [generatedSQL, setGeneratedSQL] = useState('')
   const [sqlExplanation, setSqlExplanation] = useState('')
-  const [sqlResults, setSqlResults] = useState<any>(null)
+  const [sqlResults, setSqlResults] = useState<SqlResults | null>(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
 
@@ -275,12 +278,14 @@ export default function JoinQueryGenerator() {
           model_id: selectedModel,
           // Send additional tables for comprehensive context
           additional_tables: additionalTables,
+          session_id: sessionId ?? undefined,
         }),
       })
 
       const data = await response.json()
       if (response.ok) {
         setSuggestions(data.suggestions || [])
+        setSessionId(data.session_id)
       } else {
         setError(data.detail || 'Failed to generate suggestions')
       }
@@ -319,12 +324,14 @@ export default function JoinQueryGenerator() {
             columns: t.columns,
           })),
           model_id: selectedModel,
+          session_id: sessionId ?? undefined,
         }),
       })
 
       const data = await response.json()
       if (response.ok) {
         setJoinConditions(data.join_condition || '')
+        setSessionId(data.session_id)
       } else {
         setError(data.detail || 'Failed to suggest join conditions')
       }
@@ -360,6 +367,7 @@ export default function JoinQueryGenerator() {
         business_logic: businessLogic,
         model_id: selectedModel,
         join_conditions: joinConditions || null,
+        session_id: sessionId ?? undefined,
       }
 
       const response = await fetch('/api/generate-sql', {
@@ -372,6 +380,7 @@ export default function JoinQueryGenerator() {
       if (response.ok) {
         setGeneratedSQL(data.sql_query)
         setSqlExplanation(data.explanation || '')
+        setSessionId(data.session_id)
       } else {
         setError(data.detail || 'Failed to generate SQL')
       }
@@ -390,22 +399,13 @@ export default function JoinQueryGenerator() {
     setSqlResults(null)
 
     try {
-      const response = await fetch('/api/execute-sql', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ sql_query: generatedSQL }),
-      })
-
-      const data = await response.json()
-
-      if (response.ok) {
-        setSqlResults(data)
-      } else {
-        setError(data.detail || 'Failed to execute SQL')
-      }
+      // Rows are shown as they arrive
+      await streamSqlResults(generatedSQL, sessionId, setSqlResults)
     } catch (err) {
-      setError('Failed to execute SQL')
+      setError(err instanceof Error ? err.message : 'Failed to execute SQL')
     } finally {
+      // Running the query ends the session
+      setSessionId(null)
       setLoading(false)
     }
   }
@@ -870,7 +870,7 @@ export default function JoinQueryGenerator() {
           >
             <Paper sx={{ p: 3 }}>
               <Typography variant="h6" gutterBottom>
-                {tables.length + 3}. Query Results ({sqlResults.row_count || 0} rows)
+                {tables.length + 3}. Query Results ({rowCountLabel(sqlResults)})
               </Typography>
 
               {sqlResults.columns && sqlResults.columns.length > 0 ? (
@@ -74,19 +74,18 @@ export default function MainContent({ selectedPage }: MainContentProps) {
       setLoading(true)
       setError(null)
 
-      const [healthRes, statsRes, costsRes] = await Promise.all([
+      const [healthRes, bundleRes] = await Promise.all([
         fetch('/api/health'),
-        fetch('/api/dashboard-statistics'),
-        fetch('/api/llm-costs-by-model'),
+        fetch('/api/analytics/bundle'),
       ])
 
-      if (!healthRes.ok || !statsRes.ok || !costsRes.ok) {
+      if (!healthRes.ok && !bundleRes.ok) {
         throw new Error('Failed to fetch data')
       }
 
-      const health = await healthRes.json()
-      const stats = await statsRes.json()
-      const costs = await costsRes.json()
+      // Show whichever half loaded; the bundle already falls back per section
+      const health = healthRes.ok ? await healthRes.json() : null
+      const { statistics: stats = null, llm_costs: costs = null } = bundleRes.ok ? await bundleRes.json() : {}
 
       // Debug logging for dashboard statistics
       console.log('=== Dashboard API Response ===')
@@ -34,12 +34,16 @@ interface QuerySession {
   table_name: string
   catalog: string
   schema_name: string
-  columns: string[]
-  business_logic: string
-  generated_sql: string
-  business_logic_suggestion: any
-  sql_generation: any
-  sql_execution: any
+  business_logic_preview: string
+  generated_sql_preview: string
+  // Loaded from /api/query-history/{id} when the session is opened
+  details_loaded?: boolean
+  columns?: string[]
+  business_logic?: string
+  generated_sql?: string
+  business_logic_suggestion?: any
+  sql_generation?: any
+  sql_execution?: any
   total_cost_usd: number
   total_tokens: number
   total_time_ms: number
@@ -51,6 +55,8 @@ export default function QueryHistory() {
   const [sessions, setSessions] = useState<QuerySession[]>([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   const fetchQueryHistory = async () => {
     try {
@@ -60,6 +66,7 @@ export default function QueryHistory() {
       if (!response.ok) throw new Error('Failed to fetch query history')
       const data = await response.json()
       setSessions(data.query_sessions || [])
+      setNextCursor(data.next_cursor || null)
     } catch (err) {
       setError(err instanceof Error ? err.message : 'An error occurred')
     } finally {
@@ -67,19 +74,50 @@ export default function QueryHistory() {
     }
   }
 
+  const fetchSessionDetails = async (sessionId: string) => {
+    const session = sessions.find(s => s.session_id === sessionId)
+    if (!session || session.details_loaded) return
+    try {
+      const response = await fetch(`/api/query-history/${encodeURIComponent(sessionId)}`)
+      if (!response.ok) throw new Error('Failed to fetch query details')
+      const details = await response.json()
+      setSessions(prev => prev.map(s => (s.session_id === sessionId ? { ...s, ...details, details_loaded: true } : s)))
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'An error occurred')
+    }
+  }
+
+  const fetchMoreHistory = async () => {
+    if (!nextCursor) return
+    try {
+      setLoadingMore(true)
+      const response = await fetch(`/api/query-history?cursor=${encodeURIComponent(nextCursor)}`)
+      if (!response.ok) throw new Error('Failed to fetch query history')
+      const data = await response.json()
+      setSessions(prev => [...prev, ...(data.query_sessions || [])])
+      setNextCursor(data.next_cursor || null)
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'An error occurred')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   useEffect(() => {
     fetchQueryHistory()
   }, [])
 
   const formatTimestamp = (timestamp: string) => {
-    return new Date(timestamp).toLocaleString()
+    // Audit timestamps are UTC but serialized without an offset
+    const hasOffset = /(Z|[+-]\d\d:?\d\d)$/.test(timestamp)
+    return new Date(hasOffset ? timestamp : `${timestamp}Z`).toLocaleString()
   }
 
   const formatCost = (cost: number) => {
     return `$${cost.toFixed(6)}`
   }
 
-  const parseBusinessLogic = (businessLogic: string) => {
+  const parseBusinessLogic = (businessLogic?: string) => {
     if (!businessLogic) return []
 
     try {
@@ -157,9 +195,10 @@ export default function QueryHistory() {
                 key={session.session_id}
                 initial={{ opacity: 0, y: 20 }}
                 animate={{ opacity: 1, y: 0 }}
-                transition={{ duration: 0.3, delay: index * 0.1 }}
+                transition={{ duration: 0.3, delay: Math.min(index, 10) * 0.1 }}
               >
                 <Accordion
+                  onChange={(_, expanded) => expanded && fetchSessionDetails(session.session_id)}
                   sx={{
                     mb: 3,
                     boxShadow: 2,
@@ -246,7 +285,7 @@ export default function QueryHistory() {
                         )}
                       </Box>
 
-                      {session.generated_sql && (
+                      {session.generated_sql_preview && (
                         <Box
                           sx={{
                             p: 2,
@@ -266,12 +305,17 @@ export default function QueryHistory() {
                           }}
                         >
                           <CodeIcon sx={{ fontSize: '0.875rem', mr: 0.5, verticalAlign: 'middle', float: 'left' }} />
-                          {session.generated_sql}
+                          {session.generated_sql_preview}
                         </Box>
                       )}
                     </Box>
                   </AccordionSummary>
                   <AccordionDetails sx={{ px: 3, py: 3, backgroundColor: 'grey.50' }}>
+                    {!session.details_loaded && (
+                      <Box display="flex" justifyContent="center" sx={{ mb: 2 }}>
+                        <CircularProgress size={24} />
+                      </Box>
+                    )}
                     <Grid container spacing={3}>
                     {/* Business Logic Section */}
                     {session.business_logic_suggestion && (
@@ -544,6 +588,13 @@ export default function QueryHistory() {
               </Accordion>
               </motion.div>
             ))}
+            {nextCursor && (
+              <Box display="flex" justifyContent="center" sx={{ mt: 2 }}>
+                <Button variant="outlined" onClick={fetchMoreHistory} disabled={loadingMore}>
+                  {loadingMore ? 'Loading...' : 'Load more'}
+                </Button>
+              </Box>
+            )}
           </Box>
         )}
       </motion.div>
@@ -47,6 +47,7 @@ import {
   CheckCircle as CheckCircleIcon,
   Error as ErrorIcon,
 } from '@mui/icons-material'
+import { type SqlResults, rowCountLabel, streamSqlResults } from '../streamSqlResults'
 
 interface Model {
   id: string
@@ -73,10 +74,12 @@ export default function SQLGenerator() {
   const [selectedColumns, setSelectedColumns] = useState<string[]>([])
   const [selectedModel, setSelectedModel] = useState('')
   const [businessLogic, setBusinessLogic] = useState('')
+  // Ties suggestions, generation and execution of one query together in the history; cleared once it runs
+  const [sessionId, setSessionId] = useState<string | null>(null)
 
   const [generatedSQL, setGeneratedSQL] = useState('')
   const [sqlExplanation, setSqlExplanation] = useState('')
-  const [sqlResults, setSqlResults] = useState<any>(null)
+  const [sqlResults, setSqlResults] = useState<SqlResults | null>(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
 
@@ -248,12 +251,14 @@ export default function SQLGenerator() {
           table: selectedTable,
           columns: selectedColumns,
           model_id: selectedModel,
+          session_id: sessionId ?? undefined,
         }),
       })
 
       const data = await response.json()
       if (response.ok) {
         setSuggestions(data.suggestions || [])
+        setSessionId(data.session_id)
       } else {
         setError(data.detail || 'Failed to generate suggestions')
       }
@@ -296,6 +301,7 @@ export default function SQLGenerator() {
           ],
           business_logic: businessLogic,
           model_id: selectedModel,
+          session_id: sessionId ?? undefined,
         }),
       })
 
@@ -303,6 +309,7 @@ export default function SQLGenerator() {
       if (response.ok) {
         setGeneratedSQL(data.sql_query)
         setSqlExplanation(data.explanation || '')
+        setSessionId(data.session_id)
       } else {
         setError(data.detail || 'Failed to generate SQL')
       }
@@ -322,27 +329,15 @@ export default function SQLGenerator() {
     setSqlResults(null)
 
     try {
-      const response = await fetch('/api/execute-sql', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ sql_query: generatedSQL }),
-      })
-
-      console.log('📡 Response status:', response.status)
-      const data = await response.json()
-      console.log('📊 Response data:', data)
-
-      if (response.ok) {
-        console.log('✅ Setting SQL results:', data)
-        setSqlResults(data)
-      } else {
-        console.error('❌ Error response:', data)
-        setError(data.detail || 'Failed to execute SQL')
-      }
+      // Rows are shown as they arrive
+      const results = await streamSqlResults(generatedSQL, sessionId, setSqlResults)
+      console.log('📊 Streamed rows:', results.row_count)
     } catch (err) {
-      console.error('❌ Fetch error:', err)
-      setError('Failed to execute SQL')
+      console.error('❌ Execution error:', err)
+      setError(err instanceof Error ? err.message : 'Failed to execute SQL')
     } finally {
+      // Running the query ends the session
+      setSessionId(null)
       setLoading(false)
     }
   }
@@ -744,7 +739,8 @@ export default function SQLGenerator() {
 
       {/* Debug: Show SQL Results State - Collapsible */}
       {sqlResults && (
-        <Accordion sx={{ mb: 2 }}>
+        // Unmounted while collapsed so streamed rows are not re-serialized on every update
+        <Accordion sx={{ mb: 2 }} TransitionProps={{ unmountOnExit: true }}>
           <AccordionSummary expandIcon={<ExpandMoreIcon />}>
             <Typography variant="caption" color="text.secondary" sx={{ fontWeight: 600 }}>
               Debug Output
@@ -770,7 +766,7 @@ export default function SQLGenerator() {
           >
             <Paper sx={{ p: 3 }}>
               <Typography variant="h6" gutterBottom>
-                4. Query Results ({sqlResults.row_count || 0} rows)
+                4. Query Results ({rowCountLabel(sqlResults)})
               </Typography>
 
               {sqlResults.columns && sqlResults.columns.length > 0 ? (
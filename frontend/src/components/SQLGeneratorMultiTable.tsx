@@ -43,6 +43,7 @@ import {
   Add as AddIcon,
   Delete as DeleteIcon,
 } from '@mui/icons-material'
+import { type SqlResults, rowCountLabel, streamSqlResults } from '../streamSqlResults'
 
 interface Model {
   id: string
@@ -88,7 +89,7 @@ export default function SQLGeneratorMultiTable() {
   ])
 
   const [generatedSQL, setGeneratedSQL] = useState('')
-  const [sqlResults, setSqlResults] = useState<any>(null)
+  const [sqlResults, setSqlResults] = useState<SqlResults | null>(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
 
@@ -345,20 +346,10 @@ export default function SQLGeneratorMultiTable() {
     setSqlResults(null)
 
     try {
-      const response = await fetch('/api/execute-sql', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ sql_query: generatedSQL }),
-      })
-
-      const data = await response.json()
-      if (response.ok) {
-        setSqlResults(data)
-      } else {
-        setError(data.detail || 'Failed to execute SQL')
-      }
+      // Rows are shown as they arrive
+      await streamSqlResults(generatedSQL, null, setSqlResults)
     } catch (err) {
-      setError('Failed to execute SQL')
+      setError(err instanceof Error ? err.message : 'Failed to execute SQL')
     } finally {
       setLoading(false)
     }
@@ -741,7 +732,7 @@ export default function SQLGeneratorMultiTable() {
           >
             <Paper sx={{ p: 3 }}>
               <Typography variant="h6" gutterBottom sx={{ color: '#4facfe' }}>
-                4. Query Results ({sqlResults.row_count} rows)
+                4. Query Results ({rowCountLabel(sqlResults)})
               </Typography>
 
               <TableContainer sx={{ mt: 2, maxHeight: 440 }}>
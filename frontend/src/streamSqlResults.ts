@@ -0,0 +1,84 @@
+// Runs a query through /api/execute-sql/stream and reads the NDJSON result as it arrives,
+// so the first rows are shown while the rest are still being fetched from the warehouse.
+
+// Rows fetched for the result tables; the stream says when a result was cut off here
+export const RESULT_MAX_ROWS = 10000
+
+export interface SqlResults {
+  columns: string[]
+  rows: Record<string, unknown>[]
+  row_count: number
+  session_id?: string
+  // Set once the footer line arrives
+  done: boolean
+  truncated: boolean
+}
+
+export async function streamSqlResults(
+  sqlQuery: string,
+  sessionId: string | null,
+  onUpdate: (results: SqlResults) => void,
+): Promise<SqlResults> {
+  const response = await fetch('/api/execute-sql/stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      sql_query: sqlQuery,
+      session_id: sessionId ?? undefined,
+      format: 'ndjson',
+      max_rows: RESULT_MAX_ROWS,
+    }),
+  })
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => ({}))
+    throw new Error(data.detail || 'Failed to execute SQL')
+  }
+
+  const results: SqlResults = { columns: [], rows: [], row_count: 0, done: false, truncated: false }
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffered = ''
+
+  for (;;) {
+    const { value, done } = await reader.read()
+    buffered += decoder.decode(value, { stream: !done })
+    const lines = buffered.split('\n')
+    // The last piece is an incomplete line unless the stream has ended
+    buffered = done ? '' : lines.pop() ?? ''
+
+    for (const line of lines) {
+      if (!line.trim()) continue
+      // Every line is tagged, so result columns named like control fields are still rows
+      const message = JSON.parse(line)
+      if (message.type === 'row') {
+        const row: Record<string, unknown> = {}
+        results.columns.forEach((column, i) => {
+          row[column] = message.values[i]
+        })
+        results.rows.push(row)
+      } else if (message.type === 'header') {
+        results.columns = message.columns
+        results.session_id = message.session_id
+      } else if (message.type === 'end') {
+        results.done = true
+        results.truncated = message.truncated
+      } else if (message.type === 'error') {
+        throw new Error(message.error)
+      }
+    }
+    results.row_count = results.rows.length
+    // One render per network read rather than per row
+    onUpdate({ ...results, rows: [...results.rows] })
+    if (done) break
+  }
+
+  if (!results.done) {
+    throw new Error('The result stream ended early')
+  }
+  return results
+}
+
+export function rowCountLabel(results: SqlResults): string {
+  if (!results.done) return `${results.row_count} rows so far`
+  return results.truncated ? `first ${results.row_count} rows` : `${results.row_count} rows`
+}